@@ -14,7 +14,11 @@ import {
 } from "@directus/sdk";
 import { directus } from "@/lib/directus";
 import { toast } from "@/components/common/Toaster";
-import { api, getLatestProjectAnalysisRunByProjectId } from "@/lib/api";
+import {
+  api,
+  getLatestProjectAnalysisRunByProjectId,
+  invalidateProjectTranscriptionContext,
+} from "@/lib/api";
 import { useI18nNavigate } from "@/hooks/useI18nNavigate";
 import { useAddChatContextMutation } from "@/components/conversation/hooks";
 
@@ -153,6 +157,10 @@ export const useUpdateProjectByIdMutation = () => {
       queryClient.invalidateQueries({
         queryKey: ["projects", variables.id],
       });
+      // language / transcript prompt changes apply to the next chunk
+      invalidateProjectTranscriptionContext(variables.id).catch((e) =>
+        console.error(e),
+      );
       toast.success("Project updated successfully");
     },
   });
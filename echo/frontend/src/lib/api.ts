@@ -705,6 +705,14 @@ export const retranscribeConversation = async (
   });
 };
 
+export const invalidateProjectTranscriptionContext = async (
+  projectId: string,
+) => {
+  return api.post<unknown>(
+    `/projects/${projectId}/invalidate-transcription-context`,
+  );
+};
+
 export const getProjectChatContext = async (chatId: string) => {
   return api.get<unknown, TProjectChatContext>(`/chats/${chatId}/context`);
 };
@@ -2,14 +2,18 @@ from logging import getLogger
 
 from fastapi import (
     APIRouter,
+    HTTPException,
 )
+from pydantic import BaseModel
 
 from dembrane.api.chat import ChatRouter
+from dembrane.profiler import PROFILER_DEFAULT_SECONDS, request_profile
 from dembrane.api.project import ProjectRouter
 from dembrane.api.resource import ResourceRouter
 from dembrane.api.stateless import StatelessRouter
 from dembrane.api.participant import ParticipantRouter
 from dembrane.api.conversation import ConversationRouter
+from dembrane.api.dependency_auth import DependencyDirectusSession
 
 logger = getLogger("api")
 
@@ -21,6 +25,28 @@ async def health() -> dict:
     return {"status": "ok"}
 
 
+class ProfileRequestSchema(BaseModel):
+    target: str = "all"
+    seconds: int = PROFILER_DEFAULT_SECONDS
+
+
+@api.post("/admin/profile")
+async def profile(body: ProfileRequestSchema, auth: DependencyDirectusSession) -> dict:
+    """
+    Profile the API and/or worker processes for `seconds`, see dembrane.profiler.
+    The flamegraph-ready profiles are written to S3 under profiles/.
+    """
+    if not auth.is_admin:
+        raise HTTPException(status_code=403, detail="Only admins can profile the server")
+
+    try:
+        processes = request_profile(body.target, body.seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    return {"processes": processes}
+
+
 api.include_router(ChatRouter, prefix="/chats")
 api.include_router(ProjectRouter, prefix="/projects")
 api.include_router(ResourceRouter, prefix="/resources")
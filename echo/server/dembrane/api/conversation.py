@@ -11,7 +11,7 @@ from fastapi.exceptions import HTTPException
 from litellm.exceptions import ContentPolicyViolationError
 
 from dembrane.s3 import get_signed_url
-from dembrane.utils import CacheWithExpiration, generate_uuid, get_utc_timestamp
+from dembrane.utils import CacheWithExpiration, generate_uuid
 from dembrane.database import (
     ConversationModel,
     ConversationChunkModel,
@@ -543,6 +543,8 @@ def summarize_conversation(
 
 class RetranscribeConversationBodySchema(BaseModel):
     new_conversation_name: str
+    # False to transcribe again even if the audio and settings did not change
+    use_transcript_cache: bool = True
 
 
 @ConversationRouter.post("/{conversation_id}/retranscribe")
@@ -555,13 +557,16 @@ async def retranscribe_conversation(
     Retranscribe an existing conversation.
 
     This function:
-    1. Creates a new conversation based on the original one
-    2. Creates a conversation chunk referencing the original audio
-    3. Queues the transcription task
+    1. Creates a new conversation based on the original one, linked to it
+    2. Sends task_clone_conversation, which copies the chunks in bulk and queues
+       their transcription (see dembrane.conversation_clone)
+
+    The work done here does not depend on the size of the conversation; follow the
+    clone with GET /conversations/{new_conversation_id}/retranscribe-progress.
 
     Args:
         conversation_id: ID of the original conversation to retranscribe
-        body: Contains new_conversation_name
+        body: Contains new_conversation_name and use_transcript_cache
         auth: Authentication session to verify ownership
 
     Returns:
@@ -580,10 +585,10 @@ async def retranscribe_conversation(
                     "fields": [
                         "id",
                         "project_id",
+                        "duration",
                         "participant_name",
                         "participant_email",
                         "participant_user_agent",
-                        "merged_audio_path",
                     ],
                 }
             },
@@ -595,23 +600,6 @@ async def retranscribe_conversation(
         original_conversation = conversation[0]
         project_id = original_conversation["project_id"]
 
-        merged_audio_path = get_conversation_content(
-            conversation_id=conversation_id,
-            auth=auth,
-            force_merge=True,
-            return_url=True,
-            signed=False,
-        )
-
-        # because return_url is True
-        assert isinstance(merged_audio_path, str)
-
-        duration = None
-        try:
-            duration = get_duration_from_s3(merged_audio_path)
-        except Exception as e:
-            logger.error(f"Error getting duration from s3: {str(e)}")
-
         # Create a new conversation
         new_conversation_id = generate_uuid()
 
@@ -619,7 +607,7 @@ async def retranscribe_conversation(
             "conversation",
             item_data={
                 "id": new_conversation_id,
-                "duration": duration,
+                "duration": original_conversation.get("duration"),
                 "source": "CLONE",
                 "project_id": project_id,
                 "participant_name": (
@@ -633,7 +621,6 @@ async def retranscribe_conversation(
                 "participant_user_agent": original_conversation["participant_user_agent"]
                 if original_conversation["participant_user_agent"]
                 else None,
-                "merged_audio_path": merged_audio_path,
             },
         )
 
@@ -652,26 +639,17 @@ async def retranscribe_conversation(
             logger.error(f"Error creating links: {str(e)}")
 
         try:
-            # Create a new conversation chunk
-            chunk_id = generate_uuid()
-            timestamp = get_utc_timestamp().isoformat()
-
-            directus.create_item(
-                "conversation_chunk",
-                item_data={
-                    "id": chunk_id,
-                    "conversation_id": new_conversation_id,
-                    "timestamp": timestamp,
-                    "path": merged_audio_path,
-                    "source": "CLONE",
-                },
-            )["data"]
-
-            logger.debug(f"Queuing transcription for chunk {chunk_id}")
-            # Import task locally to avoid circular imports
-            from dembrane.tasks import task_process_conversation_chunk
-
-            task_process_conversation_chunk.send(chunk_id)
+            # Import locally to avoid circular imports
+            from dembrane.tasks import task_clone_conversation
+            from dembrane.conversation_clone import set_clone_progress
+
+            set_clone_progress(new_conversation_id, status="queued")
+            task_clone_conversation.send(
+                conversation_id,
+                new_conversation_id,
+                project_id,
+                use_transcript_cache=body.use_transcript_cache,
+            )
 
             return {
                 "status": "success",
@@ -704,6 +682,25 @@ async def retranscribe_conversation(
         }
 
 
+@ConversationRouter.get("/{conversation_id}/retranscribe-progress")
+async def get_retranscribe_progress(
+    conversation_id: str,
+    auth: DependencyDirectusSession,
+) -> dict:
+    """
+    Progress of a conversation created by retranscribe_conversation, see
+    dembrane.conversation_clone.
+    """
+    raise_if_conversation_not_found_or_not_authorized(conversation_id, auth)
+
+    from dembrane.conversation_clone import get_clone_progress
+
+    progress = get_clone_progress(conversation_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="No retranscription in progress")
+    return progress
+
+
 @ConversationRouter.delete("/{conversation_id}")
 async def delete_conversation(
     conversation_id: str,
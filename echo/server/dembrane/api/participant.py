@@ -1,11 +1,22 @@
+import asyncio
 from typing import List, Optional, Annotated
 from logging import getLogger
 from datetime import datetime
 
-from fastapi import Form, APIRouter, UploadFile, HTTPException
+from fastapi import (
+    Form,
+    Header,
+    APIRouter,
+    WebSocket,
+    UploadFile,
+    HTTPException,
+    WebSocketDisconnect,
+)
 from pydantic import BaseModel
 
+from dembrane.config import ENABLE_STREAMING_TRANSCRIPTION
 from dembrane.service import project_service, conversation_service
+from dembrane.tracing import SPAN_KIND_SERVER, SpanContext, span
 from dembrane.directus import directus
 from dembrane.service.project import ProjectNotFoundException
 from dembrane.service.conversation import (
@@ -215,20 +226,130 @@ async def upload_conversation_chunk(
     chunk: UploadFile,
     timestamp: Annotated[datetime, Form()],
     source: Annotated[str, Form()] = "PORTAL_AUDIO",
+    traceparent: Annotated[Optional[str], Header()] = None,
 ) -> dict:
     try:
-        return conversation_service.create_chunk(
-            conversation_id=conversation_id,
-            timestamp=timestamp,
-            source=source,
-            file_obj=chunk,
-        )
+        # root of the chunk's trace, through processing and transcription (dembrane.tracing)
+        with span(
+            "upload_conversation_chunk",
+            parent=SpanContext.from_traceparent(traceparent),
+            kind=SPAN_KIND_SERVER,
+            attributes={"conversation_id": conversation_id, "source": source},
+        ) as upload_span:
+            chunk_row = conversation_service.create_chunk(
+                conversation_id=conversation_id,
+                timestamp=timestamp,
+                source=source,
+                file_obj=chunk,
+            )
+            if upload_span is not None:
+                upload_span.set_attribute("conversation_chunk_id", chunk_row["id"])
+            return chunk_row
     except ConversationNotOpenForParticipationException as e:
         raise HTTPException(
             status_code=403, detail="Conversation not open for participation"
         ) from e
 
 
+def _is_open_for_participation(conversation_id: str) -> bool:
+    try:
+        conversation = conversation_service.get_by_id_or_raise(conversation_id)
+        project = project_service.get_by_id_or_raise(conversation["project_id"])
+    except (ConversationNotFoundException, ProjectNotFoundException):
+        return False
+    return bool(project.get("is_conversation_allowed", False))
+
+
+def _get_stream_hotwords(conversation_id: str) -> Optional[List[str]]:
+    """The hotwords of the project, as for recorded chunks. Never raises."""
+    from dembrane.transcribe import _get_transcription_context
+
+    try:
+        return _get_transcription_context(conversation_id).hotwords
+    except Exception as e:
+        logger.warning(f"Failed to get the hotwords of {conversation_id}: {e}")
+        return None
+
+
+@ParticipantRouter.websocket("/conversations/{conversation_id}/stream")
+async def stream_conversation_audio(websocket: WebSocket, conversation_id: str) -> None:
+    """
+    Transcribe a live audio stream, see dembrane.streaming_transcription.
+    """
+    from dembrane.streaming_transcription import (
+        TranscriptEvent,
+        StreamingTranscription,
+        open_streaming_session,
+    )
+
+    if not ENABLE_STREAMING_TRANSCRIPTION or not await asyncio.to_thread(
+        _is_open_for_participation, conversation_id
+    ):
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    hotwords = await asyncio.to_thread(_get_stream_hotwords, conversation_id)
+    transcription = StreamingTranscription(conversation_id, await open_streaming_session(hotwords))
+
+    async def send_event(event: TranscriptEvent) -> None:
+        try:
+            await websocket.send_json(event.model_dump())
+        except Exception:
+            # the sender left, finals are still saved
+            pass
+
+    events = asyncio.create_task(transcription.handle_events(send_event))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                await transcription.send_audio(message["bytes"])
+            elif message.get("text") == "stop":
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await transcription.session.close()
+        await events
+
+    try:
+        await websocket.close()
+    except Exception:
+        pass
+
+
+@ParticipantRouter.websocket("/conversations/{conversation_id}/transcript")
+async def follow_conversation_transcript(websocket: WebSocket, conversation_id: str) -> None:
+    """
+    Partial and final transcripts of the live streams of a conversation.
+    """
+    from dembrane.streaming_transcription import subscribe_transcript_events
+
+    if not ENABLE_STREAMING_TRANSCRIPTION or not await asyncio.to_thread(
+        _is_open_for_participation, conversation_id
+    ):
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+
+    async def forward_events() -> None:
+        async for event in subscribe_transcript_events(conversation_id):
+            await websocket.send_json(event)
+
+    forwarding = asyncio.create_task(forward_events())
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    except WebSocketDisconnect:
+        pass
+    finally:
+        forwarding.cancel()
+
+
 @ParticipantRouter.post(
     "/conversations/{conversation_id}/finish",
 )
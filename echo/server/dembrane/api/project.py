@@ -28,6 +28,7 @@ from dembrane.api.exceptions import (
 )
 from dembrane.api.conversation import get_conversation, get_conversation_chunks
 from dembrane.api.dependency_auth import DependencyDirectusSession
+from dembrane.transcription_context import invalidate_project_transcription_context
 
 logger = getLogger("api.project")
 
@@ -309,6 +310,26 @@ async def post_create_view(
     return None
 
 
+@ProjectRouter.post("/{project_id}/invalidate-transcription-context")
+async def post_invalidate_transcription_context(
+    project_id: str,
+    auth: DependencyDirectusSession,
+) -> None:
+    """Called by the dashboard after editing a project (see dembrane.transcription_context)."""
+    from dembrane.service import project_service
+    from dembrane.service.project import ProjectNotFoundException
+
+    try:
+        project = project_service.get_by_id_or_raise(project_id)
+    except ProjectNotFoundException as e:
+        raise HTTPException(status_code=404, detail="Project not found") from e
+
+    if not auth.is_admin and project.get("directus_user_id", "") != auth.user_id:
+        raise HTTPException(status_code=403, detail="User does not have access to this project")
+
+    invalidate_project_transcription_context(project_id)
+
+
 class CreateReportRequestBodySchema(BaseModel):
     language: Optional[str] = "en"
 
@@ -7,6 +7,9 @@ from pydantic import BaseModel
 from lightrag.lightrag import QueryParam
 from lightrag.kg.shared_storage import initialize_pipeline_status
 
+from dembrane.config import (
+    LIGHTRAG_LITELLM_INFERENCE_MODEL,
+)
 from dembrane.prompts import render_prompt
 from dembrane.rag_manager import RAGManager, get_rag
 from dembrane.postgresdb_manager import PostgresDBManager
@@ -22,10 +25,6 @@ from dembrane.audio_lightrag.utils.lightrag_utils import (
     get_segment_from_conversation_chunk_ids,
 )
 
-from dembrane.config import (
-    LIGHTRAG_LITELLM_INFERENCE_MODEL,
-)
-
 nest_asyncio.apply()
 
 logger = getLogger("api.stateless")
@@ -312,13 +311,23 @@ async def delete_conversation(
 
 @StatelessRouter.post("/webhook/transcribe")
 async def transcribe_webhook(payload: dict) -> None:
+    """
+    Acknowledge a RunPod callback as soon as it is stored; it is applied to the
+    chunk in the background (see dembrane.webhook_queue).
+    """
     logger = getLogger("stateless.webhook.transcribe")
     logger.debug(f"Transcribe webhook received: {payload}")
-    try:
-        from dembrane.runpod import load_runpod_transcription_response
 
-        load_runpod_transcription_response(payload)
+    from dembrane.webhook_queue import enqueue_runpod_webhook, validate_runpod_webhook_payload
 
+    try:
+        validate_runpod_webhook_payload(payload)
+    except ValueError as e:
+        logger.error(f"Invalid transcribe webhook payload: {e}")
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    try:
+        enqueue_runpod_webhook(payload)
     except Exception as e:
-        logger.exception("Failed to update conversation chunk")
+        logger.exception("Failed to queue transcribe webhook")
         raise HTTPException(status_code=500, detail=str(e)) from e
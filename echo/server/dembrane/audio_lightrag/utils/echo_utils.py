@@ -8,6 +8,7 @@ from dembrane.config import (
     AUDIO_LIGHTRAG_REDIS_LOCK_PREFIX,
 )
 from dembrane.directus import directus
+from dembrane.conversation_utils import record_conversation_activity
 
 logger = getLogger(__name__)
 
@@ -28,6 +29,8 @@ def finish_conversation(conversation_id: str) -> bool:
             conversation_id,
             {"is_audio_processing_finished": True},
         )
+        # let the audio processing sweeper verify the result once
+        record_conversation_activity(conversation_id)
         return True
     except Exception as e:
         logger.error(f"Failed to finish conversation {conversation_id}: {e}")
@@ -10,12 +10,20 @@ from typing import List
 from datetime import timedelta
 
 import ffmpeg
-
-from dembrane.s3 import s3_client, delete_from_s3, get_stream_from_s3, get_sanitized_s3_key
+from botocore.exceptions import ClientError
+
+from dembrane.s3 import (
+    s3_client,
+    delete_from_s3,
+    get_etag_from_s3,
+    get_stream_from_s3,
+    get_sanitized_s3_key,
+)
 from dembrane.utils import generate_uuid
 from dembrane.config import STORAGE_S3_BUCKET, STORAGE_S3_ENDPOINT
 from dembrane.service import conversation_service
 from dembrane.directus import directus
+from dembrane.chunk_counts import forget_chunk_status, record_chunk_status
 
 logger = logging.getLogger("audio_utils")
 
@@ -281,6 +289,85 @@ def convert_and_save_to_s3(
     return public_url
 
 
+# LLM audio inputs (see get_llm_audio_rendition): speech-grade Opus
+LLM_AUDIO_SAMPLE_RATE = 16000
+LLM_AUDIO_BITRATE = "24k"
+LLM_AUDIO_MIME_TYPE = "audio/ogg"
+LLM_AUDIO_RENDITIONS_PREFIX = "renditions/llm-audio"
+
+
+def transcode_for_llm(input_data: bytes, input_format: str) -> bytes:
+    """Transcode audio to 16 kHz mono Opus (in an Ogg container)."""
+    with tempfile.NamedTemporaryFile(suffix=f".{input_format}") as input_temp_file:
+        input_temp_file.write(input_data)
+        input_temp_file.flush()
+
+        process = (
+            ffmpeg.input(input_temp_file.name)
+            .output(
+                "pipe:1",
+                f="ogg",
+                acodec="libopus",
+                ac=1,
+                ar=LLM_AUDIO_SAMPLE_RATE,
+                audio_bitrate=LLM_AUDIO_BITRATE,
+                application="voip",
+            )
+            .global_args("-hide_banner", "-loglevel", "warning")
+            .overwrite_output()
+            .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
+        )
+        output, err = process.communicate(input=None)
+
+    if process.returncode != 0:
+        raise FFmpegError(f"Opus transcoding failed: {err.decode().strip() if err else ''}")
+
+    if not output.startswith(b"OggS"):
+        raise ConversionError(f"Invalid Opus output ({len(output)} bytes)")
+
+    return output
+
+
+def get_llm_audio_rendition(file_name: str) -> bytes:
+    """
+    16 kHz mono Opus rendition of an audio file, for audio sent to LLMs (e.g. the
+    transcript correction workflow). Speech loses nothing an LLM needs at 24 kbps,
+    and the request is a fraction of the size of the original chunk.
+
+    Renditions are stored in S3 under renditions/llm-audio/, keyed by the ETag of the
+    original, so retries and clones of the same audio transcode it only once.
+
+    Returns:
+        The Ogg/Opus bytes (LLM_AUDIO_MIME_TYPE). (bytes)
+    """
+    # also accepts (signed) URLs
+    file_name = get_sanitized_s3_key(file_name)
+    rendition_key = f"{LLM_AUDIO_RENDITIONS_PREFIX}/{get_etag_from_s3(file_name)}.ogg"
+
+    try:
+        return get_stream_from_s3(rendition_key).read()
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            raise e from e
+
+    start_time = time.monotonic()
+    input_data = get_stream_from_s3(file_name).read()
+    output = transcode_for_llm(input_data, get_file_format_from_file_path(file_name))
+
+    s3_client.put_object(
+        Bucket=STORAGE_S3_BUCKET,
+        Key=rendition_key,
+        Body=output,
+        ACL="private",
+    )
+
+    logger.debug(
+        f"LLM audio rendition of {file_name}: {len(input_data)} -> {len(output)} bytes "
+        f"in {time.monotonic() - start_time:.2f}s"
+    )
+    return output
+
+
 def merge_multiple_audio_files_and_save_to_s3(
     input_file_names: List[str],
     output_file_name: str,
@@ -701,12 +788,14 @@ def split_audio_chunk(
     new_ids = []
     for item in split_chunk_items:
         c = directus.create_item("conversation_chunk", item_data=item)
+        record_chunk_status(c["data"])
         new_ids.append(c["data"]["id"])
 
     logger.debug("Created split chunks in Directus.")
 
     if delete_original:
         directus.delete_item("conversation_chunk", original_chunk["id"])
+        forget_chunk_status(original_chunk["conversation_id"], original_chunk["id"])
         logger.debug("Deleted original chunk from Directus after splitting.")
 
     logger.debug(f"Successfully split file into {number_chunks} chunks.")
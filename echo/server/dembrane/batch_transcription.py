@@ -0,0 +1,316 @@
+"""
+Transcribes many chunks at once over the shared pooled HTTP client.
+
+A 50-chunk upload used to become 50 task_transcribe_chunk messages, each
+opening new connections to submit its AssemblyAI job and then blocking a
+worker thread in a 3 s polling loop. With AssemblyAI (and Dembrane-25-09,
+which starts with AssemblyAI), transcribe_chunks instead:
+
+1. loads the chunks and looks them up in the transcript cache,
+2. submits all jobs concurrently through get_async_http_client, with at most
+   BATCH_TRANSCRIPTION_CONCURRENCY requests in flight,
+3. polls every outstanding job together every
+   BATCH_TRANSCRIPTION_POLL_INTERVAL_SECONDS,
+4. writes each result back as soon as its job completes (the Dembrane-25-09
+   correction runs in a thread meanwhile).
+
+A batch therefore takes about as long as its slowest chunk. The batch keeps to
+the routing of dembrane.transcription_router:
+
+- when the primary provider is unhealthy (and there is a fallback), the whole
+  batch is routed chunk by chunk instead,
+- when there is a fallback, a job still pending after the primary's hedge delay
+  (get_hedge_delay_seconds, its recent p95) is given up on and routed on its own,
+  which hedges and fails over.
+
+Those chunks, chunks whose job failed or did not finish within
+BATCH_TRANSCRIPTION_TIMEOUT_SECONDS, and every chunk with another provider go
+through transcribe_conversation_chunk in a thread.
+
+Results are polled rather than received by webhook: polling all jobs of a
+batch costs one request per job every few seconds over kept-alive
+connections, and needs no public endpoint.
+"""
+
+import time
+import asyncio
+from typing import Any, Optional
+from logging import getLogger
+
+from dembrane.s3 import get_signed_url
+from dembrane.config import ASSEMBLYAI_BASE_URL
+from dembrane.metrics import increment
+from dembrane.service import conversation_service
+from dembrane.tracing import span
+from dembrane.transcribe import (
+    _fetch_chunk,
+    _save_transcript,
+    get_assemblyai_headers,
+    get_assemblyai_request,
+    _get_transcript_provider,
+    _get_transcript_cache_key,
+    _get_transcription_context,
+    correct_assemblyai_transcript,
+    transcribe_conversation_chunk,
+)
+from dembrane.http_client import get_async_http_client
+from dembrane.transcript_cache import get_cached_transcript
+from dembrane.transcription_router import (
+    get_provider_order,
+    get_hedge_delay_seconds,
+    record_provider_outcome,
+)
+from dembrane.transcription_context import TranscriptionContext
+
+logger = getLogger("dembrane.batch_transcription")
+
+BATCH_TRANSCRIPTION_PROVIDERS = ("AssemblyAI", "Dembrane-25-09")
+
+# max AssemblyAI requests (submit / poll) in flight at once per batch
+BATCH_TRANSCRIPTION_CONCURRENCY = 20
+BATCH_TRANSCRIPTION_POLL_INTERVAL_SECONDS = 3.0
+# jobs still pending after this are transcribed again one by one
+BATCH_TRANSCRIPTION_TIMEOUT_SECONDS = 30 * 60
+
+
+class _Job:
+    def __init__(self, chunk: dict, context: TranscriptionContext, cache_key: Optional[str]):
+        self.chunk = chunk
+        self.language = context.language
+        self.hotwords = context.hotwords
+        self.cache_key = cache_key
+        self.audio_url = get_signed_url(chunk["path"], expires_in_seconds=3 * 24 * 60 * 60)
+        self.transcript_id: Optional[str] = None
+        self.started_at = time.monotonic()
+
+    @property
+    def chunk_id(self) -> str:
+        return self.chunk["id"]
+
+
+def uses_batch_transcription() -> bool:
+    try:
+        return _get_transcript_provider() in BATCH_TRANSCRIPTION_PROVIDERS
+    except Exception:
+        return False
+
+
+def _prepare_job(conversation_chunk_id: str, provider: str, use_cache: bool) -> Optional[_Job]:
+    """Returns None when a cached transcript was applied instead."""
+    chunk = _fetch_chunk(conversation_chunk_id)
+    context = _get_transcription_context(chunk["conversation_id"])
+
+    cache_key = _get_transcript_cache_key(chunk, context, provider)
+    cached_chunk_update = get_cached_transcript(cache_key, provider) if use_cache else None
+    if cached_chunk_update is not None:
+        conversation_service.update_chunk(conversation_chunk_id, **cached_chunk_update)
+        return None
+
+    return _Job(chunk, context, cache_key)
+
+
+@span("transcribe.save_batch_result")
+def _save_job_result(job: _Job, provider: str, response: dict[str, Any]) -> None:
+    transcript = response["text"]
+
+    if provider == "Dembrane-25-09":
+        transcript, data = correct_assemblyai_transcript(
+            job.audio_url, transcript, response, job.hotwords
+        )
+        diarization = {"schema": "Dembrane-25-09", "data": data}
+    else:
+        diarization = {"schema": "ASSEMBLYAI", "data": response.get("words", {})}
+
+    _save_transcript(
+        job.chunk_id,
+        transcript,
+        diarization=diarization,
+        cache_key=job.cache_key,
+        started_at=job.started_at,
+    )
+
+
+def _record_outcomes(provider: str, outcomes: list[tuple[float, bool]]) -> None:
+    # under the routed provider, whose health and p95 the router goes by
+    for latency_seconds, ok in outcomes:
+        record_provider_outcome(provider, latency_seconds, ok=ok)
+
+
+def _get_hedge_delay(provider: str) -> Optional[float]:
+    """
+    Returns:
+        None to route the whole batch chunk by chunk (the primary is unhealthy), else
+        how long to wait on a job before routing it on its own (inf without a fallback).
+    """
+    order = get_provider_order(provider)
+    if order[0] != provider:
+        return None
+    return get_hedge_delay_seconds(provider) if len(order) > 1 else float("inf")
+
+
+async def _submit_jobs(jobs: list[_Job], semaphore: asyncio.Semaphore) -> list[_Job]:
+    """Returns the jobs that could not be submitted."""
+    client = get_async_http_client()
+
+    async def submit(job: _Job) -> Optional[_Job]:
+        async with semaphore:
+            try:
+                response = await client.post(
+                    f"{ASSEMBLYAI_BASE_URL}/v2/transcript",
+                    headers=get_assemblyai_headers(),
+                    json=get_assemblyai_request(job.audio_url, job.language, job.hotwords),
+                )
+                response.raise_for_status()
+                job.transcript_id = response.json()["id"]
+                return None
+            except Exception as e:
+                logger.error(f"Failed to submit chunk {job.chunk_id} to AssemblyAI: {e}")
+                return job
+
+    return [job for job in await asyncio.gather(*[submit(job) for job in jobs]) if job]
+
+
+async def _poll_jobs(
+    jobs: list[_Job], semaphore: asyncio.Semaphore
+) -> dict[str, Optional[dict[str, Any]]]:
+    """
+    Returns:
+        chunk_id -> the AssemblyAI transcript, or None while it is still processing.
+    """
+    client = get_async_http_client()
+
+    async def poll(job: _Job) -> tuple[str, Optional[dict[str, Any]]]:
+        async with semaphore:
+            try:
+                response = await client.get(
+                    f"{ASSEMBLYAI_BASE_URL}/v2/transcript/{job.transcript_id}",
+                    headers=get_assemblyai_headers(),
+                )
+                response.raise_for_status()
+                return job.chunk_id, response.json()
+            except Exception as e:
+                # transient: polled again next round
+                logger.warning(f"Failed to poll chunk {job.chunk_id}: {e}")
+                return job.chunk_id, None
+
+    return dict(await asyncio.gather(*[poll(job) for job in jobs]))
+
+
+async def transcribe_chunks(
+    conversation_chunk_ids: list[str], use_cache: bool = True
+) -> dict[str, Optional[str]]:
+    """
+    Transcribe chunks concurrently, writing each transcript as soon as it is ready.
+
+    Returns:
+        chunk_id -> the error, or None if the chunk was transcribed. (dict)
+    """
+    provider = _get_transcript_provider()
+    semaphore = asyncio.Semaphore(BATCH_TRANSCRIPTION_CONCURRENCY)
+    # separate, a routed chunk takes as long as a whole transcription
+    routing_semaphore = asyncio.Semaphore(BATCH_TRANSCRIPTION_CONCURRENCY)
+    errors: dict[str, Optional[str]] = {}
+    routed: list[asyncio.Task] = []
+
+    async def transcribe_one(conversation_chunk_id: str) -> None:
+        async with routing_semaphore:
+            try:
+                await asyncio.to_thread(
+                    transcribe_conversation_chunk, conversation_chunk_id, use_cache
+                )
+                errors[conversation_chunk_id] = None
+            except Exception as e:
+                errors[conversation_chunk_id] = str(e)
+
+    def route(conversation_chunk_id: str) -> None:
+        routed.append(asyncio.create_task(transcribe_one(conversation_chunk_id)))
+
+    hedge_delay = (
+        await asyncio.to_thread(_get_hedge_delay, provider)
+        if provider in BATCH_TRANSCRIPTION_PROVIDERS
+        else None
+    )
+    if hedge_delay is None:
+        if provider in BATCH_TRANSCRIPTION_PROVIDERS:
+            logger.warning(f"{provider} is unhealthy, routing {len(conversation_chunk_ids)} chunks")
+        await asyncio.gather(*[transcribe_one(chunk_id) for chunk_id in conversation_chunk_ids])
+        return errors
+
+    async def prepare(conversation_chunk_id: str) -> Optional[_Job]:
+        async with semaphore:
+            try:
+                job = await asyncio.to_thread(
+                    _prepare_job, conversation_chunk_id, provider, use_cache
+                )
+            except Exception as e:
+                errors[conversation_chunk_id] = str(e)
+                return None
+            if job is None:
+                errors[conversation_chunk_id] = None
+            return job
+
+    jobs = [
+        job
+        for job in await asyncio.gather(*[prepare(chunk_id) for chunk_id in conversation_chunk_ids])
+        if job is not None
+    ]
+
+    for job in await _submit_jobs(jobs, semaphore):
+        jobs.remove(job)
+        route(job.chunk_id)
+
+    async def save(job: _Job, response: dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(_save_job_result, job, provider, response)
+            errors[job.chunk_id] = None
+        except Exception as e:
+            logger.error(f"Failed to save the transcript of chunk {job.chunk_id}: {e}")
+            errors[job.chunk_id] = str(e)
+
+    saving: list[asyncio.Task] = []
+    deadline = time.monotonic() + BATCH_TRANSCRIPTION_TIMEOUT_SECONDS
+
+    while jobs and time.monotonic() < deadline:
+        await asyncio.sleep(BATCH_TRANSCRIPTION_POLL_INTERVAL_SECONDS)
+        transcripts = await _poll_jobs(jobs, semaphore)
+        outcomes: list[tuple[float, bool]] = []
+
+        for job in list(jobs):
+            transcript = transcripts.get(job.chunk_id)
+            if transcript is None or transcript["status"] not in ("completed", "error"):
+                continue
+
+            jobs.remove(job)
+            latency_seconds = time.monotonic() - job.started_at
+            if transcript["status"] == "completed":
+                outcomes.append((latency_seconds, True))
+                saving.append(asyncio.create_task(save(job, transcript)))
+            else:
+                logger.error(f"AssemblyAI failed chunk {job.chunk_id}: {transcript.get('error')}")
+                outcomes.append((latency_seconds, False))
+                route(job.chunk_id)
+
+        if outcomes:
+            # Redis round trips, off the event loop
+            await asyncio.to_thread(_record_outcomes, provider, outcomes)
+
+        # slower than usual: routed on its own, which hedges to the fallback
+        now = time.monotonic()
+        hedged = [job for job in jobs if now - job.started_at > hedge_delay]
+        for job in hedged:
+            jobs.remove(job)
+            route(job.chunk_id)
+        if hedged:
+            await asyncio.to_thread(
+                increment, "transcription.batch_hedged", len(hedged), {"provider": provider}
+            )
+
+    if jobs:
+        logger.error(f"{len(jobs)} AssemblyAI jobs did not finish in time, transcribing again")
+        for job in jobs:
+            route(job.chunk_id)
+
+    # one by one, through the router: a failed provider is failed over from
+    await asyncio.gather(*saving, *routed)
+
+    return errors
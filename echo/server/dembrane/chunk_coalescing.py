@@ -0,0 +1,377 @@
+"""
+Coalesces small live chunks into one transcription request.
+
+The portal records in short chunks, and every chunk used to be its own
+transcription request with its fixed costs (signed URL, provider queueing,
+model warm-up). With ENABLE_LIVE_CHUNK_COALESCING, task_process_conversation_chunk
+hands live chunks shorter than LIVE_CHUNK_COALESCING_MAX_CHUNK_SECONDS to
+coalesce_chunk instead:
+
+1. The chunk joins the open window of its conversation (a Redis list, opened by
+   the first chunk). Opening a window sends task_transcribe_coalesced_chunks,
+   delayed by LIVE_CHUNK_COALESCING_WINDOW_SECONDS; a window holding
+   LIVE_CHUNK_COALESCING_MAX_SECONDS of audio is flushed right away.
+2. The flush merges the audio of the window's chunks (in recording order),
+   transcribes it once, and splits the words back over the chunks by
+   timestamp: a word belongs to the chunk its midpoint falls in, its times are
+   made relative to that chunk.
+3. Every chunk gets its own transcript and diarization (with a "coalesced"
+   entry listing the chunks it was transcribed with), as if it had been
+   transcribed alone. With Dembrane-25-09 the correction gate and workflow run
+   per chunk, on that chunk's words and audio.
+
+Only providers that return word timestamps (AssemblyAI, Dembrane-25-09) can be
+mapped back. If anything fails, the chunks of the window are transcribed one
+by one as before.
+
+A flush claims its window: the entries move to a processing list owned by the
+flush (its message id) and are only deleted by release_window, once every
+chunk is saved or sent on. A retried or redelivered flush claims them again, a
+second flush of the same window (the delayed one of a full window) finds
+nothing.
+
+Metrics: chunk_coalescing.units / .chunks counters and the
+chunk_coalescing.unit_seconds timing.
+"""
+
+import json
+import time
+import uuid
+from typing import Any, List, Optional, cast
+from logging import getLogger
+
+from dembrane.s3 import delete_from_s3, get_signed_url
+from dembrane.lanes import send_chunk_message, is_live_chunk_source
+from dembrane.config import (
+    ENABLE_LIVE_CHUNK_COALESCING,
+    LIVE_CHUNK_COALESCING_MAX_SECONDS,
+    LIVE_CHUNK_COALESCING_WINDOW_SECONDS,
+    LIVE_CHUNK_COALESCING_MAX_CHUNK_SECONDS,
+)
+from dembrane.metrics import observe, increment
+from dembrane.transcribe import (
+    _fetch_chunk,
+    _save_transcript,
+    _get_transcript_provider,
+    _get_transcript_cache_key,
+    _get_transcription_context,
+    transcribe_audio_assemblyai,
+    correct_assemblyai_transcript,
+)
+from dembrane.audio_utils import get_duration_from_s3, merge_multiple_audio_files_and_save_to_s3
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.chunk_coalescing")
+
+COALESCING_PROVIDERS = ("AssemblyAI", "Dembrane-25-09")
+
+CHUNK_COALESCING_KEY_PREFIX = "dembrane:chunk_coalescing"
+# a window whose flush message was lost is dropped after this
+CHUNK_COALESCING_KEY_TTL_SECONDS = 60 * 60
+# max difference between the transcribed audio and the sum of the chunk durations
+CHUNK_COALESCING_MAX_DRIFT_MS = 2000
+
+# join the open window of the conversation, or open one (KEYS[1] holds its id)
+_ADD_SCRIPT = """
+local window_id = redis.call('GET', KEYS[1])
+local opened = 0
+if not window_id then
+    window_id = ARGV[1]
+    redis.call('SET', KEYS[1], window_id, 'EX', ARGV[3])
+    opened = 1
+end
+local entries_key = ARGV[4] .. window_id
+redis.call('RPUSH', entries_key, ARGV[2])
+redis.call('EXPIRE', entries_key, ARGV[3])
+return {window_id, opened, redis.call('LRANGE', entries_key, 0, -1)}
+"""
+
+# close the window (if it is still the open one) and move its entries to the processing
+# list (KEYS[3]) of flush ARGV[2]; another flush of the window gets nothing
+_CLAIM_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+local owner = redis.call('GET', KEYS[4])
+if owner and owner ~= ARGV[2] then
+    return {}
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('RENAME', KEYS[2], KEYS[3])
+end
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return {}
+end
+redis.call('SET', KEYS[4], ARGV[2], 'EX', ARGV[3])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return redis.call('LRANGE', KEYS[3], 0, -1)
+"""
+
+
+def _open_window_key(conversation_id: str) -> str:
+    return f"{CHUNK_COALESCING_KEY_PREFIX}:open:{conversation_id}"
+
+
+def _entries_key_prefix() -> str:
+    return f"{CHUNK_COALESCING_KEY_PREFIX}:window:"
+
+
+def _processing_key(window_id: str) -> str:
+    return f"{CHUNK_COALESCING_KEY_PREFIX}:processing:{window_id}"
+
+
+def _owner_key(window_id: str) -> str:
+    return f"{CHUNK_COALESCING_KEY_PREFIX}:owner:{window_id}"
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def should_coalesce(chunk: dict) -> bool:
+    if not ENABLE_LIVE_CHUNK_COALESCING or not is_live_chunk_source(chunk.get("source")):
+        return False
+    try:
+        return _get_transcript_provider() in COALESCING_PROVIDERS
+    except Exception:
+        return False
+
+
+def add_chunk_to_window(
+    conversation_id: str,
+    conversation_chunk_id: str,
+    duration_ms: int,
+    source: Optional[str] = None,
+    use_transcript_cache: bool = True,
+) -> tuple[str, bool, int]:
+    """
+    source and use_transcript_cache are kept for when the chunk is transcribed alone.
+
+    Returns:
+        0: The window id
+        1: Whether this chunk opened the window
+        2: The audio in the window, in ms
+    """
+    window_id, opened, entries = cast(
+        list[Any],
+        get_redis_client().eval(
+            _ADD_SCRIPT,
+            1,
+            _open_window_key(conversation_id),
+            uuid.uuid4().hex,
+            json.dumps(
+                {
+                    "id": conversation_chunk_id,
+                    "duration_ms": duration_ms,
+                    "source": source,
+                    "use_transcript_cache": use_transcript_cache,
+                }
+            ),
+            str(CHUNK_COALESCING_KEY_TTL_SECONDS),
+            _entries_key_prefix(),
+        ),
+    )
+    total_ms = sum(json.loads(entry)["duration_ms"] for entry in entries)
+    return _decode(window_id), bool(opened), total_ms
+
+
+def claim_window(conversation_id: str, window_id: str, flush_id: str) -> list[dict]:
+    """
+    Args:
+        flush_id: the same for a retry of the flush, e.g. its message id (str)
+
+    Returns:
+        [{"id", "duration_ms", "source", "use_transcript_cache"}, ...] of the window,
+        empty if another flush has it or it was already released
+    """
+    entries = cast(
+        list[bytes],
+        get_redis_client().eval(
+            _CLAIM_SCRIPT,
+            4,
+            _open_window_key(conversation_id),
+            _entries_key_prefix() + window_id,
+            _processing_key(window_id),
+            _owner_key(window_id),
+            window_id,
+            flush_id,
+            str(CHUNK_COALESCING_KEY_TTL_SECONDS),
+        ),
+    )
+    return [json.loads(entry) for entry in entries]
+
+
+def release_window(window_id: str) -> None:
+    """Forget a claimed window, once its chunks are saved or sent on."""
+    get_redis_client().delete(_processing_key(window_id), _owner_key(window_id))
+
+
+def coalesce_chunk(chunk: dict, use_transcript_cache: bool = True) -> bool:
+    """
+    Add a live chunk to the coalescing window of its conversation.
+
+    Returns:
+        False if the chunk is too long (or could not be measured) and has to be
+        transcribed on its own. (bool)
+    """
+    from dembrane.tasks import task_transcribe_coalesced_chunks
+
+    try:
+        duration_seconds = get_duration_from_s3(chunk["path"])
+    except Exception as e:
+        logger.warning(f"Failed to get the duration of chunk {chunk['id']}, not coalescing: {e}")
+        return False
+
+    if duration_seconds > LIVE_CHUNK_COALESCING_MAX_CHUNK_SECONDS:
+        return False
+
+    conversation_id = chunk["conversation_id"]
+    window_id, opened, total_ms = add_chunk_to_window(
+        conversation_id,
+        chunk["id"],
+        int(duration_seconds * 1000),
+        source=chunk["source"],
+        use_transcript_cache=use_transcript_cache,
+    )
+    logger.debug(f"Chunk {chunk['id']} joined window {window_id} ({total_ms} ms of audio)")
+
+    message = task_transcribe_coalesced_chunks.message(conversation_id, window_id)
+    if total_ms >= LIVE_CHUNK_COALESCING_MAX_SECONDS * 1000:
+        # full: the delayed flush will find the window empty
+        send_chunk_message(message, source=chunk["source"])
+    elif opened:
+        send_chunk_message(
+            message,
+            source=chunk["source"],
+            delay=int(LIVE_CHUNK_COALESCING_WINDOW_SECONDS * 1000),
+        )
+
+    return True
+
+
+def split_words_by_chunk(words: list[dict], durations_ms: List[int]) -> list[list[dict]]:
+    """
+    Split the words of merged audio over the chunks it was merged from.
+
+    Args:
+        words: AssemblyAI words ({"text", "start", "end", ...}, times in ms)
+        durations_ms: the duration of every chunk, in merge order
+
+    Returns:
+        The words of every chunk, with times relative to the start of the chunk.
+    """
+    offsets_ms = []
+    offset_ms = 0
+    for duration_ms in durations_ms:
+        offsets_ms.append(offset_ms)
+        offset_ms += duration_ms
+
+    chunk_words: list[list[dict]] = [[] for _ in durations_ms]
+    index = 0
+    for word in words:
+        midpoint_ms = (word["start"] + word["end"]) / 2
+        while index < len(durations_ms) - 1 and midpoint_ms >= offsets_ms[index + 1]:
+            index += 1
+        chunk_offset_ms = offsets_ms[index]
+        chunk_words[index].append(
+            {
+                **word,
+                "start": max(0, word["start"] - chunk_offset_ms),
+                "end": max(0, word["end"] - chunk_offset_ms),
+            }
+        )
+
+    return chunk_words
+
+
+def transcribe_coalesced_chunks(conversation_id: str, window_id: str, flush_id: str) -> list[dict]:
+    """
+    Transcribe the chunks of a window together, see the module docstring. The caller
+    releases the window (release_window) once the returned chunks are sent on.
+
+    Returns:
+        The entries (see claim_window) of the chunks that still have to be transcribed
+        on their own, all of them when the coalesced transcription failed. (list[dict])
+    """
+    entries = claim_window(conversation_id, window_id, flush_id)
+    if len(entries) <= 1:
+        return entries
+
+    chunk_ids = [entry["id"] for entry in entries]
+
+    merged_path: Optional[str] = None
+    saved_chunk_ids: set[str] = set()
+    try:
+        started_at = time.monotonic()
+        context = _get_transcription_context(conversation_id)
+        provider = context.provider
+        chunks = sorted(
+            (_fetch_chunk(chunk_id) for chunk_id in chunk_ids),
+            key=lambda chunk: str(chunk.get("timestamp") or ""),
+        )
+        durations_by_id = {entry["id"]: entry["duration_ms"] for entry in entries}
+        durations_ms = [durations_by_id[chunk["id"]] for chunk in chunks]
+
+        merged_path = merge_multiple_audio_files_and_save_to_s3(
+            [chunk["path"] for chunk in chunks],
+            f"coalesced/{conversation_id}/{window_id}.mp3",
+            "mp3",
+        )
+        _, response = transcribe_audio_assemblyai(
+            get_signed_url(merged_path, expires_in_seconds=60 * 60),
+            context.language,
+            context.hotwords,
+        )
+
+        # a chunk left out of the merge would shift every later word
+        transcribed_ms = float(response.get("audio_duration") or 0) * 1000
+        if abs(transcribed_ms - sum(durations_ms)) > CHUNK_COALESCING_MAX_DRIFT_MS:
+            raise ValueError(
+                f"merged audio is {transcribed_ms:.0f} ms, the chunks {sum(durations_ms)} ms"
+            )
+
+        chunk_words = split_words_by_chunk(response.get("words") or [], durations_ms)
+        coalesced = {"chunks": [chunk["id"] for chunk in chunks]}
+
+        for chunk, words, duration_ms in zip(chunks, chunk_words, durations_ms, strict=True):
+            transcript = " ".join(str(word.get("text", "")) for word in words)
+            diarization: dict[str, Any]
+            if provider == "Dembrane-25-09":
+                transcript, data = correct_assemblyai_transcript(
+                    get_signed_url(chunk["path"], expires_in_seconds=60 * 60),
+                    transcript,
+                    {
+                        **response,
+                        "text": transcript,
+                        "words": words,
+                        "audio_duration": duration_ms / 1000,
+                    },
+                    context.hotwords,
+                )
+                diarization = {"schema": "Dembrane-25-09", "data": data}
+            else:
+                diarization = {"schema": "ASSEMBLYAI", "data": words}
+
+            _save_transcript(
+                chunk["id"],
+                transcript,
+                diarization={**diarization, "coalesced": coalesced},
+                cache_key=_get_transcript_cache_key(chunk, context, provider),
+                started_at=started_at,
+            )
+            saved_chunk_ids.add(chunk["id"])
+    except Exception as e:
+        logger.error(f"Failed to transcribe window {window_id} coalesced, one by one instead: {e}")
+        return [entry for entry in entries if entry["id"] not in saved_chunk_ids]
+    finally:
+        if merged_path is not None:
+            try:
+                delete_from_s3(merged_path)
+            except Exception as e:
+                logger.warning(f"Failed to delete {merged_path}: {e}")
+
+    increment("chunk_coalescing.units")
+    increment("chunk_coalescing.chunks", len(chunks))
+    observe("chunk_coalescing.unit_seconds", sum(durations_ms) / 1000)
+    logger.info(f"Transcribed {len(chunks)} chunks of {conversation_id} in one request")
+    return []
@@ -0,0 +1,362 @@
+"""
+Per-conversation chunk status counters.
+
+Completion checks (RunPod webhooks, the finish hook, merges, the counts endpoint)
+only need to know how many chunks of a conversation are ok / error / pending.
+Instead of fetching every chunk (and its transcript) each time, the status of
+each chunk and the totals are kept in Redis:
+
+    dembrane:chunk_status:{conversation_id}   hash chunk_id -> "ok" | "error" | "pending"
+    dembrane:chunk_counts:{conversation_id}   hash {"ok", "error", "pending"}
+
+A conversation is seeded with one scan the first time its counts are read. From
+then on the ConversationService (and split_audio_chunk) move chunks between
+statuses with an atomic script as they are created, transcribed, fail or are
+deleted, so reading the counts is O(1).
+
+A scan is not atomic with the writes around it, so a seed opens a journal first:
+
+    dembrane:chunk_counts_journal:{conversation_id}   hash chunk_id -> status ("" deleted)
+
+Transitions made while the journal is open are recorded in it, and the seed
+replays them over the (possibly stale) scan. Writes that happen before a
+conversation is seeded are otherwise not tracked, and keys expire after
+CHUNK_COUNTS_TTL_SECONDS. reconcile_chunk_counts (run by the
+scheduler) rescans recently touched conversations and corrects any drift.
+"""
+
+import time
+from typing import Any, Optional, cast
+from logging import getLogger
+
+from dembrane.metrics import increment
+from dembrane.directus import directus_client_context
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.chunk_counts")
+
+CHUNK_STATUS_KEY_PREFIX = "dembrane:chunk_status:"
+CHUNK_COUNTS_KEY_PREFIX = "dembrane:chunk_counts:"
+CHUNK_COUNTS_JOURNAL_KEY_PREFIX = "dembrane:chunk_counts_journal:"
+# sorted set: conversation_id -> unix timestamp of the last change to its counters
+CHUNK_COUNTS_TRACKED_KEY = "dembrane:chunk_counts:tracked"
+
+CHUNK_COUNTS_TTL_SECONDS = 24 * 60 * 60
+# conversations touched within this window are rescanned by reconcile_chunk_counts
+CHUNK_COUNTS_RECONCILE_WINDOW_SECONDS = 60 * 60
+# a journal left behind by a seed that never finished expires after this
+CHUNK_COUNTS_JOURNAL_TTL_SECONDS = 5 * 60
+
+# move one chunk to a new status ("" removes it). Recorded in the journal while a seed
+# is running, otherwise a no-op for conversations that are not seeded.
+_TRANSITION_SCRIPT = """
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('HSET', KEYS[4], ARGV[1], ARGV[2])
+end
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+end
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if old == ARGV[2] or (not old and ARGV[2] == '') then
+    return 0
+end
+if old then
+    redis.call('HINCRBY', KEYS[2], old, -1)
+end
+if ARGV[2] == '' then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+else
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[5])
+return 1
+"""
+
+# replace the status of every chunk of a conversation with a scan, replay the journal
+# over it and recompute the counters. Unless ARGV[4] is "1", a conversation that was
+# seeded in the meantime is left alone. Returns {ok, error, pending}, or {} if skipped.
+_SEED_SCRIPT = """
+if ARGV[4] ~= '1' and redis.call('EXISTS', KEYS[2]) == 1 then
+    return {}
+end
+redis.call('DEL', KEYS[1])
+for i = 5, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+local journal = redis.call('HGETALL', KEYS[4])
+for i = 1, #journal, 2 do
+    if journal[i] ~= '' then
+        if journal[i + 1] == '' then
+            redis.call('HDEL', KEYS[1], journal[i])
+        else
+            redis.call('HSET', KEYS[1], journal[i], journal[i + 1])
+        end
+    end
+end
+redis.call('DEL', KEYS[4])
+local counts = {ok = 0, error = 0, pending = 0}
+for _, status in ipairs(redis.call('HVALS', KEYS[1])) do
+    counts[status] = counts[status] + 1
+end
+redis.call('HSET', KEYS[2], 'ok', counts.ok, 'error', counts.error, 'pending', counts.pending)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[3])
+return {counts.ok, counts.error, counts.pending}
+"""
+
+
+def get_chunk_status(chunk: dict) -> str:
+    if chunk["error"] is not None:
+        return "error"
+    if chunk["transcript"] is not None:
+        return "ok"
+    return "pending"
+
+
+def _keys(conversation_id: str) -> list[str]:
+    return [
+        CHUNK_STATUS_KEY_PREFIX + conversation_id,
+        CHUNK_COUNTS_KEY_PREFIX + conversation_id,
+        CHUNK_COUNTS_TRACKED_KEY,
+        CHUNK_COUNTS_JOURNAL_KEY_PREFIX + conversation_id,
+    ]
+
+
+def _to_counts(ok: int, error: int, pending: int) -> dict:
+    """Same shape as ConversationService.get_chunk_counts."""
+    return {
+        "total": ok + error + pending,
+        "processed": ok + error,
+        "error": error,
+        "pending": pending,
+        "ok": ok,
+    }
+
+
+def scan_chunk_statuses(conversation_id: str) -> dict[str, str]:
+    """Fetch the status of every chunk of a conversation (ids only, no transcripts)."""
+    with directus_client_context() as client:
+        chunks = client.get_items(
+            "conversation_chunk",
+            {
+                "query": {
+                    "filter": {"conversation_id": conversation_id},
+                    "fields": ["id", "error"],
+                    "limit": -1,
+                }
+            },
+        )
+        transcribed_chunks = client.get_items(
+            "conversation_chunk",
+            {
+                "query": {
+                    "filter": {
+                        "conversation_id": conversation_id,
+                        "error": {"_null": True},
+                        "transcript": {"_nnull": True},
+                    },
+                    "fields": ["id"],
+                    "limit": -1,
+                }
+            },
+        )
+
+    transcribed_ids = {chunk["id"] for chunk in transcribed_chunks}
+
+    return {
+        chunk["id"]: get_chunk_status(
+            {
+                "error": chunk["error"],
+                # non-null marker, the transcript itself is not fetched
+                "transcript": "" if chunk["id"] in transcribed_ids else None,
+            }
+        )
+        for chunk in chunks
+    }
+
+
+def open_chunk_counts_journal(conversation_id: str) -> None:
+    """Record the transitions of a conversation until the next seed, call before scanning."""
+    journal_key = CHUNK_COUNTS_JOURNAL_KEY_PREFIX + conversation_id
+    pipe = get_redis_client().pipeline(transaction=True)
+    # an empty field marks the journal as open
+    pipe.hset(journal_key, "", "")
+    pipe.expire(journal_key, CHUNK_COUNTS_JOURNAL_TTL_SECONDS)
+    pipe.execute()
+
+
+def seed_chunk_counts(
+    conversation_id: str, statuses: dict[str, str], overwrite: bool = True
+) -> Optional[dict]:
+    """
+    Seed the counters from a scan, replaying the transitions recorded in the journal
+    since open_chunk_counts_journal.
+
+    Returns:
+        The seeded counts, or None when overwrite is False and the conversation was
+        seeded in the meantime.
+    """
+    args: list[Any] = [
+        str(CHUNK_COUNTS_TTL_SECONDS),
+        str(time.time()),
+        conversation_id,
+        "1" if overwrite else "0",
+    ]
+    for chunk_id, status in statuses.items():
+        args.extend([chunk_id, status])
+
+    seeded = cast(
+        list[int], get_redis_client().eval(_SEED_SCRIPT, 4, *_keys(conversation_id), *args)
+    )
+    if not seeded:
+        return None
+    return _to_counts(*seeded)
+
+
+def get_tracked_chunk_counts(conversation_id: str) -> Optional[dict]:
+    """The counters as they are in Redis, without falling back to a scan."""
+    raw_counts = cast(
+        dict[bytes, bytes], get_redis_client().hgetall(CHUNK_COUNTS_KEY_PREFIX + conversation_id)
+    )
+    if not raw_counts:
+        return None
+    counts = {key.decode(): int(value) for key, value in raw_counts.items()}
+    return _to_counts(counts["ok"], counts["error"], counts["pending"])
+
+
+def get_chunk_counts(conversation_id: str) -> dict:
+    """
+    Returns:
+        {"total", "processed", "error", "pending", "ok"}, see ConversationService.get_chunk_counts
+    """
+    try:
+        counts = get_tracked_chunk_counts(conversation_id)
+    except Exception as e:
+        logger.warning(f"Failed to read chunk counts of conversation {conversation_id}: {e}")
+        counts = None
+
+    if counts is not None:
+        return counts
+
+    try:
+        open_chunk_counts_journal(conversation_id)
+    except Exception as e:
+        logger.warning(
+            f"Failed to open chunk counts journal of conversation {conversation_id}: {e}"
+        )
+
+    statuses = scan_chunk_statuses(conversation_id)
+
+    try:
+        counts = seed_chunk_counts(conversation_id, statuses, overwrite=False)
+        if counts is None:
+            counts = get_tracked_chunk_counts(conversation_id)
+    except Exception as e:
+        logger.warning(f"Failed to seed chunk counts of conversation {conversation_id}: {e}")
+
+    if counts is not None:
+        return counts
+
+    values = list(statuses.values())
+    return _to_counts(values.count("ok"), values.count("error"), values.count("pending"))
+
+
+def _transition(conversation_id: str, chunk_id: str, status: str) -> None:
+    get_redis_client().eval(
+        _TRANSITION_SCRIPT,
+        4,
+        *_keys(conversation_id),
+        chunk_id,
+        status,
+        str(CHUNK_COUNTS_TTL_SECONDS),
+        str(time.time()),
+        conversation_id,
+    )
+
+
+def invalidate_chunk_counts(conversation_id: str) -> None:
+    """Drop the counters, the next read rescans the conversation."""
+    try:
+        get_redis_client().delete(*_keys(conversation_id)[:2])
+    except Exception as e:
+        logger.warning(f"Failed to invalidate chunk counts of conversation {conversation_id}: {e}")
+
+
+def record_chunk_status(chunk: dict) -> None:
+    """
+    Update the counters after a chunk was created or updated.
+
+    Args:
+        chunk: the chunk row as returned by Directus (needs id, conversation_id, error, transcript)
+
+    Never raises.
+    """
+    conversation_id = chunk.get("conversation_id")
+    if isinstance(conversation_id, dict):
+        conversation_id = conversation_id.get("id")
+    if not conversation_id:
+        logger.warning(f"Cannot track status of chunk {chunk.get('id')} without conversation_id")
+        return
+
+    if "error" not in chunk or "transcript" not in chunk:
+        invalidate_chunk_counts(conversation_id)
+        return
+
+    try:
+        _transition(conversation_id, chunk["id"], get_chunk_status(chunk))
+    except Exception as e:
+        logger.warning(f"Failed to record status of chunk {chunk['id']}: {e}")
+        invalidate_chunk_counts(conversation_id)
+
+
+def forget_chunk_status(conversation_id: str, chunk_id: str) -> None:
+    """Update the counters after a chunk was deleted. Never raises."""
+    try:
+        _transition(conversation_id, chunk_id, "")
+    except Exception as e:
+        logger.warning(f"Failed to forget status of chunk {chunk_id}: {e}")
+        invalidate_chunk_counts(conversation_id)
+
+
+def reconcile_chunk_counts() -> None:
+    """Rescan recently touched conversations and fix drifted counters. Run by the scheduler."""
+    client = get_redis_client()
+    now = time.time()
+
+    client.zremrangebyscore(CHUNK_COUNTS_TRACKED_KEY, "-inf", now - CHUNK_COUNTS_TTL_SECONDS)
+    conversation_ids = [
+        conversation_id.decode()
+        for conversation_id in cast(
+            list[bytes],
+            client.zrangebyscore(
+                CHUNK_COUNTS_TRACKED_KEY, now - CHUNK_COUNTS_RECONCILE_WINDOW_SECONDS, "+inf"
+            ),
+        )
+    ]
+
+    drifted = 0
+    for conversation_id in conversation_ids:
+        try:
+            open_chunk_counts_journal(conversation_id)
+            raw_statuses = cast(
+                dict[bytes, bytes], client.hgetall(CHUNK_STATUS_KEY_PREFIX + conversation_id)
+            )
+            tracked = {key.decode(): value.decode() for key, value in raw_statuses.items()}
+            actual = scan_chunk_statuses(conversation_id)
+
+            if tracked != actual:
+                drifted += 1
+                logger.info(f"Chunk counts of conversation {conversation_id} drifted, reseeding")
+                seed_chunk_counts(conversation_id, actual)
+            else:
+                client.delete(CHUNK_COUNTS_JOURNAL_KEY_PREFIX + conversation_id)
+        except Exception as e:
+            logger.error(f"Failed to reconcile chunk counts of conversation {conversation_id}: {e}")
+
+    if drifted:
+        increment("chunk_counts.drifted", drifted)
+    logger.debug(f"Reconciled chunk counts of {len(conversation_ids)} conversations")
@@ -218,6 +218,13 @@ if GEMINI_API_KEY:
 else:
     logger.debug("GEMINI_API_KEY: not set")
 
+# Dembrane-25-09: only run the Gemini correction on chunks that look wrong (see
+# dembrane.correction_gate); false corrects every chunk
+ENABLE_TRANSCRIPT_CORRECTION_GATE = os.environ.get(
+    "ENABLE_TRANSCRIPT_CORRECTION_GATE", "true"
+).lower() in ["true", "1"]
+logger.debug(f"ENABLE_TRANSCRIPT_CORRECTION_GATE: {ENABLE_TRANSCRIPT_CORRECTION_GATE}")
+
 ENABLE_ASSEMBLYAI_TRANSCRIPTION = os.environ.get(
     "ENABLE_ASSEMBLYAI_TRANSCRIPTION", "false"
 ).lower() in ["true", "1"]
@@ -284,6 +291,22 @@ if ENABLE_LITELLM_WHISPER_TRANSCRIPTION:
     assert LITELLM_WHISPER_URL, "LITELLM_WHISPER_URL environment variable is not set"
     logger.debug(f"LITELLM_WHISPER_URL: {LITELLM_WHISPER_URL}")
 
+ENABLE_STREAMING_TRANSCRIPTION = os.environ.get(
+    "ENABLE_STREAMING_TRANSCRIPTION", "false"
+).lower() in ["true", "1"]
+logger.debug(f"ENABLE_STREAMING_TRANSCRIPTION: {ENABLE_STREAMING_TRANSCRIPTION}")
+
+# "assemblyai" or "local" (a stand-in, see dembrane.streaming_transcription)
+STREAMING_TRANSCRIPTION_BACKEND = os.environ.get(
+    "STREAMING_TRANSCRIPTION_BACKEND", "assemblyai"
+).lower()
+assert STREAMING_TRANSCRIPTION_BACKEND in ["assemblyai", "local"], (
+    "STREAMING_TRANSCRIPTION_BACKEND must be 'assemblyai' or 'local'"
+)
+if ENABLE_STREAMING_TRANSCRIPTION and STREAMING_TRANSCRIPTION_BACKEND == "assemblyai":
+    assert ASSEMBLYAI_API_KEY, "ASSEMBLYAI_API_KEY environment variable is not set"
+logger.debug(f"STREAMING_TRANSCRIPTION_BACKEND: {STREAMING_TRANSCRIPTION_BACKEND}")
+
 ### END Transcription
 
 RUNPOD_TOPIC_MODELER_URL = os.environ.get("RUNPOD_TOPIC_MODELER_URL")
@@ -302,6 +325,128 @@ if ENABLE_RUNPOD_WHISPER_TRANSCRIPTION:
     )
     logger.debug(f"RUNPOD_WHISPER_MAX_REQUEST_THRESHOLD: {RUNPOD_WHISPER_MAX_REQUEST_THRESHOLD}")
 
+### Task queues (see dembrane.fair_queue)
+
+# max messages of a single project dispatched to the workers at once, when others are waiting
+FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT = int(os.environ.get("FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT", 8))
+logger.debug(f"FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT: {FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT}")
+
+# defaults match the worker concurrency of prod-worker-cpu.sh / prod-worker.sh
+FAIR_QUEUE_CPU_MAX_IN_FLIGHT = int(os.environ.get("FAIR_QUEUE_CPU_MAX_IN_FLIGHT", 24))
+logger.debug(f"FAIR_QUEUE_CPU_MAX_IN_FLIGHT: {FAIR_QUEUE_CPU_MAX_IN_FLIGHT}")
+
+FAIR_QUEUE_NETWORK_MAX_IN_FLIGHT = int(os.environ.get("FAIR_QUEUE_NETWORK_MAX_IN_FLIGHT", 150))
+logger.debug(f"FAIR_QUEUE_NETWORK_MAX_IN_FLIGHT: {FAIR_QUEUE_NETWORK_MAX_IN_FLIGHT}")
+
+# live chunks get their own queues (see dembrane.lanes), which need their own workers:
+# prod-worker-live.sh and prod-worker-cpu-live.sh
+ENABLE_LIVE_LANES = os.environ.get("ENABLE_LIVE_LANES", "false").lower() in ["true", "1"]
+logger.debug(f"ENABLE_LIVE_LANES: {ENABLE_LIVE_LANES}")
+
+LIVE_LANE_WAIT_SLO_SECONDS = int(os.environ.get("LIVE_LANE_WAIT_SLO_SECONDS", 10))
+logger.debug(f"LIVE_LANE_WAIT_SLO_SECONDS: {LIVE_LANE_WAIT_SLO_SECONDS}")
+
+# transcribe small live chunks of a conversation together (see dembrane.chunk_coalescing)
+ENABLE_LIVE_CHUNK_COALESCING = os.environ.get("ENABLE_LIVE_CHUNK_COALESCING", "false").lower() in [
+    "true",
+    "1",
+]
+logger.debug(f"ENABLE_LIVE_CHUNK_COALESCING: {ENABLE_LIVE_CHUNK_COALESCING}")
+
+# how long the first chunk of a window waits for others
+LIVE_CHUNK_COALESCING_WINDOW_SECONDS = float(
+    os.environ.get("LIVE_CHUNK_COALESCING_WINDOW_SECONDS", 10)
+)
+logger.debug(f"LIVE_CHUNK_COALESCING_WINDOW_SECONDS: {LIVE_CHUNK_COALESCING_WINDOW_SECONDS}")
+
+# longer chunks are transcribed on their own
+LIVE_CHUNK_COALESCING_MAX_CHUNK_SECONDS = float(
+    os.environ.get("LIVE_CHUNK_COALESCING_MAX_CHUNK_SECONDS", 30)
+)
+logger.debug(f"LIVE_CHUNK_COALESCING_MAX_CHUNK_SECONDS: {LIVE_CHUNK_COALESCING_MAX_CHUNK_SECONDS}")
+
+# a window with this much audio is transcribed without waiting
+LIVE_CHUNK_COALESCING_MAX_SECONDS = float(os.environ.get("LIVE_CHUNK_COALESCING_MAX_SECONDS", 120))
+logger.debug(f"LIVE_CHUNK_COALESCING_MAX_SECONDS: {LIVE_CHUNK_COALESCING_MAX_SECONDS}")
+
+### Worker memory (see dembrane.memory_watchdog)
+
+# restart the worker processes once one of them uses more than this many MB (0: never)
+WORKER_MAX_RSS_MB = int(os.environ.get("WORKER_MAX_RSS_MB", 0))
+logger.debug(f"WORKER_MAX_RSS_MB: {WORKER_MAX_RSS_MB}")
+
+# restart the worker processes once one of them processed this many messages (0: never)
+WORKER_MAX_TASKS = int(os.environ.get("WORKER_MAX_TASKS", 0))
+logger.debug(f"WORKER_MAX_TASKS: {WORKER_MAX_TASKS}")
+
+# fraction of messages traced with tracemalloc to find allocation sites (slow, keep low)
+WORKER_TRACEMALLOC_SAMPLE_RATE = float(os.environ.get("WORKER_TRACEMALLOC_SAMPLE_RATE", 0))
+logger.debug(f"WORKER_TRACEMALLOC_SAMPLE_RATE: {WORKER_TRACEMALLOC_SAMPLE_RATE}")
+
+### Profiling (see dembrane.profiler)
+
+# actors to profile a sample of messages of, e.g. "task_merge_conversation_chunks:0.05,task_x"
+PROFILE_ACTORS = os.environ.get("PROFILE_ACTORS", "")
+logger.debug(f"PROFILE_ACTORS: {PROFILE_ACTORS}")
+
+### Tracing (see dembrane.tracing)
+
+# OTLP/HTTP endpoint of an OpenTelemetry collector, e.g. http://localhost:4318 (unset: off)
+OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+logger.debug(f"OTEL_EXPORTER_OTLP_ENDPOINT: {OTEL_EXPORTER_OTLP_ENDPOINT}")
+
+# defaults to dembrane-api / dembrane-worker
+OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME")
+logger.debug(f"OTEL_SERVICE_NAME: {OTEL_SERVICE_NAME}")
+
+# fraction of traces (started at upload / by a request) that are exported
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 1.0))
+logger.debug(f"TRACE_SAMPLE_RATE: {TRACE_SAMPLE_RATE}")
+
+### Transcript cache (see dembrane.transcript_cache)
+
+ENABLE_TRANSCRIPT_CACHE = os.environ.get("ENABLE_TRANSCRIPT_CACHE", "true").lower() in [
+    "true",
+    "1",
+]
+logger.debug(f"ENABLE_TRANSCRIPT_CACHE: {ENABLE_TRANSCRIPT_CACHE}")
+
+TRANSCRIPT_CACHE_TTL_SECONDS = int(
+    os.environ.get("TRANSCRIPT_CACHE_TTL_SECONDS", 30 * 24 * 60 * 60)
+)
+logger.debug(f"TRANSCRIPT_CACHE_TTL_SECONDS: {TRANSCRIPT_CACHE_TTL_SECONDS}")
+
+# how long a conversation's transcription context (dembrane.transcription_context) is
+# kept; bounds how long a project edit made directly in Directus goes unnoticed
+TRANSCRIPTION_CONTEXT_TTL_SECONDS = int(os.environ.get("TRANSCRIPTION_CONTEXT_TTL_SECONDS", 600))
+logger.debug(f"TRANSCRIPTION_CONTEXT_TTL_SECONDS: {TRANSCRIPTION_CONTEXT_TTL_SECONDS}")
+
+### Transcription routing (see dembrane.transcription_router)
+
+# providers tried after TRANSCRIPTION_PROVIDER, in order, e.g. "AssemblyAI,LiteLLM"; empty
+# turns hedging and failover off. Runpod answers by webhook and cannot be a fallback.
+TRANSCRIPTION_FALLBACK_PROVIDERS = [
+    provider.strip()
+    for provider in os.environ.get("TRANSCRIPTION_FALLBACK_PROVIDERS", "").split(",")
+    if provider.strip()
+]
+for _provider in TRANSCRIPTION_FALLBACK_PROVIDERS:
+    if _provider not in _ALLOWED_TRANSCRIPTION_PROVIDERS - {"Runpod"}:
+        raise ValueError(f"TRANSCRIPTION_FALLBACK_PROVIDERS is not valid: {_provider}")
+logger.debug(f"TRANSCRIPTION_FALLBACK_PROVIDERS: {TRANSCRIPTION_FALLBACK_PROVIDERS}")
+
+# lower bound of the wait (the primary provider's p95 latency) before hedging
+TRANSCRIPTION_HEDGE_MIN_DELAY_SECONDS = float(
+    os.environ.get("TRANSCRIPTION_HEDGE_MIN_DELAY_SECONDS", 5.0)
+)
+logger.debug(f"TRANSCRIPTION_HEDGE_MIN_DELAY_SECONDS: {TRANSCRIPTION_HEDGE_MIN_DELAY_SECONDS}")
+
+# hedged requests per hour, across all workers; 0 only fails over on errors
+TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR = int(
+    os.environ.get("TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR", 100)
+)
+logger.debug(f"TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR: {TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR}")
+
 SMALL_LITELLM_MODEL = os.environ.get("SMALL_LITELLM_MODEL")  # 4o-mini
 assert SMALL_LITELLM_MODEL, "SMALL_LITELLM_MODEL environment variable is not set"
 logger.debug(f"SMALL_LITELLM_MODEL: {SMALL_LITELLM_MODEL}")
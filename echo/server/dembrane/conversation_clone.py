@@ -0,0 +1,157 @@
+"""
+Bulk cloning of a conversation, for retranscription.
+
+POST /conversations/{id}/retranscribe used to do all the work inside the
+request: merge the audio of every chunk, probe it, create the clone and queue
+its transcription. Its time grew with the conversation. Now the endpoint only
+creates the clone and its link (a constant number of Directus calls) and sends
+task_clone_conversation, which runs clone_conversation_chunks:
+
+1. the chunks of the source conversation are read in one request
+2. their copies are created in batches of CLONE_CREATE_BATCH_SIZE per request.
+   Audio chunks keep the audio of the original (the S3 object is shared, as the
+   merged audio used to be); text chunks keep their transcript.
+3. the chunk counters of the clone are seeded (dembrane.chunk_counts) and every
+   audio chunk is queued for processing in one group (send_fair_many), so the
+   clone's chunks are split and transcribed in parallel instead of as one long file.
+
+Progress is kept in Redis (dembrane:conversation_clone:{new_conversation_id})
+and served by GET /conversations/{id}/retranscribe-progress:
+
+    {"status": "queued" | "cloning" | "transcribing" | "error",
+     "total": chunks to clone, "cloned": chunks cloned so far, "error": ...,
+     "chunks": the chunk counts of the clone, once transcribing}
+"""
+
+import json
+from typing import Any, Optional, cast
+from logging import getLogger
+
+from dembrane.utils import generate_uuid
+from dembrane.directus import directus_client_context
+from dembrane.fair_queue import send_fair_many
+from dembrane.redis_utils import get_redis_client
+from dembrane.chunk_counts import get_chunk_counts, get_chunk_status, seed_chunk_counts
+from dembrane.conversation_utils import record_conversation_activity
+from dembrane.conversation_timers import reset_conversation_inactivity_timer
+
+logger = getLogger("dembrane.conversation_clone")
+
+CLONE_PROGRESS_KEY_PREFIX = "dembrane:conversation_clone:"
+CLONE_PROGRESS_TTL_SECONDS = 24 * 60 * 60
+# chunks created per Directus request
+CLONE_CREATE_BATCH_SIZE = 100
+
+
+def set_clone_progress(new_conversation_id: str, **progress: Any) -> None:
+    """Never raises: progress is informational."""
+    try:
+        key = CLONE_PROGRESS_KEY_PREFIX + new_conversation_id
+        client = get_redis_client()
+        client.hset(key, mapping={name: json.dumps(value) for name, value in progress.items()})
+        client.expire(key, CLONE_PROGRESS_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Failed to record clone progress of {new_conversation_id}: {e}")
+
+
+def get_clone_progress(new_conversation_id: str) -> Optional[dict]:
+    """None if the conversation is not a clone (or its progress expired)."""
+    raw_progress = cast(
+        dict[bytes, bytes],
+        get_redis_client().hgetall(CLONE_PROGRESS_KEY_PREFIX + new_conversation_id),
+    )
+    if not raw_progress:
+        return None
+
+    progress = {name.decode(): json.loads(value) for name, value in raw_progress.items()}
+    if progress.get("status") == "transcribing":
+        progress["chunks"] = get_chunk_counts(new_conversation_id)
+    return progress
+
+
+def _fetch_source_chunks(source_conversation_id: str) -> list[dict]:
+    with directus_client_context() as client:
+        return client.get_items(
+            "conversation_chunk",
+            {
+                "query": {
+                    "filter": {"conversation_id": {"_eq": source_conversation_id}},
+                    "fields": ["id", "timestamp", "path", "source", "transcript"],
+                    "sort": ["timestamp"],
+                    "limit": -1,
+                }
+            },
+        )
+
+
+def clone_conversation_chunks(
+    source_conversation_id: str,
+    new_conversation_id: str,
+    project_id: str,
+    use_transcript_cache: bool = True,
+) -> list[str]:
+    """
+    Copy the chunks of a conversation to its clone and queue their transcription.
+    See the module docstring.
+
+    Returns:
+        The ids of the chunks queued for processing. (list[str])
+    """
+    from dembrane.tasks import task_process_conversation_chunk
+
+    set_clone_progress(new_conversation_id, status="cloning")
+
+    source_chunks = [
+        chunk
+        for chunk in _fetch_source_chunks(source_conversation_id)
+        if chunk.get("path") or chunk.get("transcript")
+    ]
+    set_clone_progress(new_conversation_id, total=len(source_chunks), cloned=0)
+
+    items = [
+        {
+            "id": generate_uuid(),
+            "conversation_id": new_conversation_id,
+            "timestamp": chunk["timestamp"],
+            "path": chunk.get("path"),
+            "source": "CLONE",
+            # audio is transcribed again, only text chunks keep their transcript
+            "transcript": None if chunk.get("path") else chunk["transcript"],
+        }
+        for chunk in source_chunks
+    ]
+
+    with directus_client_context() as client:
+        for start in range(0, len(items), CLONE_CREATE_BATCH_SIZE):
+            batch = items[start : start + CLONE_CREATE_BATCH_SIZE]
+            client.create_item("conversation_chunk", item_data=batch)
+            set_clone_progress(new_conversation_id, cloned=start + len(batch))
+
+    try:
+        seed_chunk_counts(
+            new_conversation_id,
+            {item["id"]: get_chunk_status({"error": None, **item}) for item in items},
+        )
+    except Exception as e:
+        logger.warning(f"Failed to seed chunk counts of {new_conversation_id}: {e}")
+
+    audio_chunk_ids = [item["id"] for item in items if item["path"]]
+    send_fair_many(
+        [
+            task_process_conversation_chunk.message(
+                chunk_id, use_transcript_cache=use_transcript_cache
+            )
+            for chunk_id in audio_chunk_ids
+        ],
+        project_id=project_id,
+    )
+
+    record_conversation_activity(new_conversation_id)
+    reset_conversation_inactivity_timer(new_conversation_id)
+    set_clone_progress(new_conversation_id, status="transcribing")
+
+    logger.info(
+        f"Cloned {len(items)} chunks of {source_conversation_id} to {new_conversation_id}, "
+        f"{len(audio_chunk_ids)} queued for transcription"
+    )
+    return audio_chunk_ids
@@ -1,10 +1,8 @@
 import time
 import logging
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from datetime import timedelta
 
-import numpy as np
-import pandas as pd
 import requests
 
 from dembrane.s3 import get_signed_url
@@ -18,6 +16,9 @@ from dembrane.config import (
 )
 from dembrane.directus import directus
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger("conversation_health")
 
 
@@ -185,14 +186,19 @@ def _cancel_job_on_timeout(job_id: str) -> None:
         logger.error(f"Failed to cancel diarization job {job_id}: {e}")
 
 
-def get_runpod_diarization(
-    chunk_id: str,
-) -> None:
+def submit_runpod_diarization(chunk_id: str) -> tuple[str, str] | None:
     """
-    Orchestrates the diarization process for a given chunk by submitting an audio diarization job to RunPod, polling for completion within a timeout, and updating Directus with the results or canceling the job if it times out.
+    Submits a diarization job to RunPod for the given chunk without waiting for it.
+
+    The job is followed up by check_runpod_diarization, which the caller is expected
+    to schedule (see task_check_runpod_diarization in dembrane.tasks).
 
     Args:
         chunk_id: The identifier of the audio chunk to process.
+
+    Returns:
+        A tuple containing (job_id, job_status_link), or None if diarization is disabled,
+        skipped for this chunk, or the submission failed.
     """
     if not ENABLE_RUNPOD_DIARIZATION:
         logger.debug("Skipping diarization because ENABLE_RUNPOD_DIARIZATION is disabled")
@@ -214,45 +220,62 @@ def get_runpod_diarization(
         return None
 
     # Submit diarization job
-    job_data = _submit_diarization_job(audio_url, project_language)
-    if not job_data:
-        return None
-    job_id, job_status_link = job_data
+    return _submit_diarization_job(audio_url, project_language)
 
-    # Poll for job completion
-    timeout = RUNPOD_DIARIZATION_TIMEOUT
-    api_key = RUNPOD_DIARIZATION_API_KEY
+
+def check_runpod_diarization(
+    chunk_id: str,
+    job_id: str,
+    job_status_link: str,
+    submitted_at: float,
+) -> bool:
+    """
+    Checks a submitted diarization job once and finalizes it if possible.
+
+    Updates Directus with the results when the job completed, and cancels the job once
+    RUNPOD_DIARIZATION_TIMEOUT seconds have passed since submitted_at.
+
+    Args:
+        chunk_id: The identifier of the audio chunk being processed.
+        job_id: The RunPod job id returned on submission.
+        job_status_link: The URL to poll for job status.
+        submitted_at: Unix timestamp of the submission.
+
+    Returns:
+        True if the job reached a final state (completed, failed or cancelled),
+        False if it is still pending and should be checked again later.
+    """
     headers = {
         "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
+        "Authorization": f"Bearer {RUNPOD_DIARIZATION_API_KEY}",
     }
 
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        response_data = _poll_job_status(job_status_link, headers)
-        if response_data:
-            status = response_data.get("status")
-            logger.debug(f"Job {job_id} status: {status}")
-
-            if status == "COMPLETED":
-                dirz_response_data = response_data.get("output")
-                if dirz_response_data:
-                    logger.info(
-                        f"Diarization job {job_id} completed. Updating chunk {chunk_id} with results."
-                    )
-                    _update_chunk_with_results(chunk_id, dirz_response_data)
-                    return
-                else:
-                    logger.warning(
-                        f"Diarization job {job_id} completed but no output data received."
-                    )
-                    return
-
-        time.sleep(3)
-
-    # Timeout: cancel the job
-    _cancel_job_on_timeout(job_id)
-    return None
+    response_data = _poll_job_status(job_status_link, headers)
+    if response_data:
+        status = response_data.get("status")
+        logger.debug(f"Job {job_id} status: {status}")
+
+        if status == "COMPLETED":
+            dirz_response_data = response_data.get("output")
+            if dirz_response_data:
+                logger.info(
+                    f"Diarization job {job_id} completed. Updating chunk {chunk_id} with results."
+                )
+                _update_chunk_with_results(chunk_id, dirz_response_data)
+            else:
+                logger.warning(f"Diarization job {job_id} completed but no output data received.")
+            return True
+
+        if status in ("FAILED", "CANCELLED", "TIMED_OUT"):
+            logger.warning(f"Diarization job {job_id} for chunk {chunk_id} ended with {status}")
+            return True
+
+    if time.time() - submitted_at >= RUNPOD_DIARIZATION_TIMEOUT:
+        # Timeout: cancel the job
+        _cancel_job_on_timeout(job_id)
+        return True
+
+    return False
 
 
 def get_health_status(
@@ -272,6 +295,9 @@ def get_health_status(
     if not project_ids and not conversation_ids:
         raise ValueError("Either project_ids or conversation_ids must be provided")
 
+    # pandas is only needed here, not on the workers that import this module for diarization
+    import pandas as pd
+
     chunk_li = _get_timebound_conversation_chunks(project_ids, conversation_ids)
     df = pd.DataFrame(chunk_li)
 
@@ -368,7 +394,10 @@ def _flatten_response(response: Any) -> list[dict[str, Any]]:
     return flattened_response
 
 
-def _process_data(df: pd.DataFrame) -> pd.DataFrame:
+def _process_data(df: "pd.DataFrame") -> "pd.DataFrame":
+    import numpy as np
+    import pandas as pd
+
     df["timestamp"] = pd.to_datetime(df["timestamp"])
     max_timestamp = df["timestamp"].max()
     df["time_diff_seconds"] = (max_timestamp - df["timestamp"]).dt.total_seconds()
@@ -390,7 +419,10 @@ def _process_data(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def _calculate_conversation_metrics(
-    df: pd.DataFrame, cross_talk_threshold: float, noise_threshold: float, silence_threshold: float
+    df: "pd.DataFrame",
+    cross_talk_threshold: float,
+    noise_threshold: float,
+    silence_threshold: float,
 ) -> dict[str, Any]:
     # Calculate conversation-level metrics (average of chunks within each conversation)
     conversation_metrics = (
@@ -0,0 +1,108 @@
+"""
+Per-conversation inactivity timers.
+
+Every conversation has a deadline in a Redis sorted set
+(conversation_id -> unix timestamp). Creating a conversation or one of its
+chunks pushes the deadline CONVERSATION_IDLE_THRESHOLD into the future. The
+scheduler calls dispatch_due_conversation_timers every few seconds, which
+atomically pops the expired deadlines and sends task_finish_conversation_hook
+for each of them.
+
+This replaces the periodic "find conversations without a recent chunk" scan:
+the cost of a dispatch is proportional to the number of timers that fired.
+"""
+
+from typing import Any, List, Optional, cast
+from logging import getLogger
+from datetime import datetime
+
+from dembrane.utils import get_utc_timestamp
+from dembrane.redis_utils import get_redis_client
+from dembrane.conversation_utils import CONVERSATION_IDLE_THRESHOLD
+
+logger = getLogger("dembrane.conversation_timers")
+
+# sorted set: conversation_id -> unix timestamp at which the conversation is finished
+CONVERSATION_FINISH_DEADLINES_KEY = "dembrane:conversation_finish_deadlines"
+
+# max timers popped per dispatch, the rest are picked up on the next tick
+DISPATCH_BATCH_SIZE = 500
+
+# pop every member with score <= ARGV[1] (at most ARGV[2]) in one atomic step, so a
+# deadline that is pushed back concurrently is never removed by mistake
+_POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+def reset_conversation_inactivity_timer(
+    conversation_id: str,
+    now: Optional[datetime] = None,
+) -> None:
+    """
+    (Re)arm the inactivity timer of a conversation.
+
+    Never raises: the hourly full scan still finishes conversations if Redis is unavailable.
+    """
+    try:
+        deadline = ((now or get_utc_timestamp()) + CONVERSATION_IDLE_THRESHOLD).timestamp()
+        get_redis_client().zadd(CONVERSATION_FINISH_DEADLINES_KEY, {conversation_id: deadline})
+    except Exception as e:
+        logger.warning(f"Failed to reset inactivity timer for conversation {conversation_id}: {e}")
+
+
+def cancel_conversation_inactivity_timer(conversation_id: str) -> None:
+    try:
+        get_redis_client().zrem(CONVERSATION_FINISH_DEADLINES_KEY, conversation_id)
+    except Exception as e:
+        logger.warning(f"Failed to cancel inactivity timer for conversation {conversation_id}: {e}")
+
+
+def pop_due_conversation_timers(
+    now: Optional[datetime] = None,
+    limit: int = DISPATCH_BATCH_SIZE,
+) -> List[str]:
+    """Atomically remove and return the conversation ids whose deadline has passed."""
+    client = get_redis_client()
+    now_ts = (now or get_utc_timestamp()).timestamp()
+
+    due = cast(
+        List[Any],
+        client.eval(_POP_DUE_SCRIPT, 1, CONVERSATION_FINISH_DEADLINES_KEY, str(now_ts), str(limit)),
+    )
+
+    return [
+        conversation_id.decode() if isinstance(conversation_id, bytes) else conversation_id
+        for conversation_id in due
+    ]
+
+
+def dispatch_due_conversation_timers() -> None:
+    """Send the finish hook for every expired timer. Run by the scheduler."""
+    # local import, the scheduler process should not pay for dembrane.tasks until the first tick
+    from dembrane.tasks import task_finish_conversation_hook
+
+    try:
+        conversation_ids = pop_due_conversation_timers()
+    except Exception as e:
+        logger.error(f"Failed to pop due conversation timers: {e}")
+        return
+
+    if not conversation_ids:
+        return
+
+    logger.info(f"Inactivity timers fired for {len(conversation_ids)} conversations")
+
+    for conversation_id in conversation_ids:
+        try:
+            task_finish_conversation_hook.send(conversation_id)
+        except Exception as e:
+            logger.error(f"Failed to send finish hook for conversation {conversation_id}: {e}")
+            # re-arm so the conversation is retried on a later tick
+            reset_conversation_inactivity_timer(
+                conversation_id, now=get_utc_timestamp() - CONVERSATION_IDLE_THRESHOLD
+            )
@@ -1,12 +1,32 @@
 import logging
-from typing import List
-from datetime import timedelta
+from typing import Any, List, Optional, Generator, cast
+from datetime import datetime, timedelta
 
 from dembrane.utils import get_utc_timestamp
 from dembrane.directus import directus
+from dembrane.redis_utils import get_redis_client
 
 logger = logging.getLogger("dembrane.conversation_utils")
 
+# a conversation is considered idle (and can be finished) after this much inactivity
+# (see dembrane.conversation_timers)
+CONVERSATION_IDLE_THRESHOLD = timedelta(minutes=5)
+
+# sorted set: conversation_id -> unix timestamp of the last observed activity
+CONVERSATION_ACTIVITY_KEY = "dembrane:conversation_activity"
+# hash: sweeper name -> unix timestamp up to which the sweeper has consumed the index
+CONVERSATION_ACTIVITY_CURSOR_KEY = "dembrane:conversation_activity:cursor"
+
+# activity is only swept once it is this old: a record_conversation_activity whose
+# timestamp was taken before a sweep can land in Redis after it
+CONVERSATION_ACTIVITY_SETTLE_SECONDS = 60
+
+AUDIO_PROCESSING_SWEEP_CURSOR = "audio_processing"
+_SWEEP_CURSORS = [AUDIO_PROCESSING_SWEEP_CURSOR]
+
+# max ids per Directus "_in" filter
+_DIRECTUS_BATCH_SIZE = 100
+
 
 def collect_unfinished_conversations() -> List[str]:
     # We want to collect:
@@ -112,3 +132,140 @@ def collect_unfinished_audio_processing_conversations() -> List[str]:
             logger.error(f"Error collecting conversation {conversation['id']}: {e}")
 
     return list(set(unfinished_conversations))
+
+
+def _batched(
+    items: List[str], size: int = _DIRECTUS_BATCH_SIZE
+) -> Generator[List[str], None, None]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def record_conversation_activity(
+    conversation_id: str,
+    timestamp: Optional[datetime] = None,
+) -> None:
+    """
+    Mark a conversation as active in the last-activity index.
+
+    Called when a conversation is created, when a chunk is created and when the
+    ETL pipeline completes. The incremental sweeper below only looks at
+    conversations that appear in this index after its cursor.
+
+    Never raises: the periodic full scan is the safety net if Redis is unavailable.
+    """
+    try:
+        score = (timestamp or get_utc_timestamp()).timestamp()
+        get_redis_client().zadd(CONVERSATION_ACTIVITY_KEY, {conversation_id: score})
+    except Exception as e:
+        logger.warning(f"Failed to record activity for conversation {conversation_id}: {e}")
+
+
+def _read_activity_window(cursor_name: str, horizon: float) -> List[str]:
+    """Return conversation ids with last activity in (cursor, horizon]."""
+    client = get_redis_client()
+
+    raw_cursor = cast(Optional[bytes], client.hget(CONVERSATION_ACTIVITY_CURSOR_KEY, cursor_name))
+    cursor = float(raw_cursor) if raw_cursor else 0.0
+
+    if horizon <= cursor:
+        return []
+
+    conversation_ids = cast(
+        List[Any], client.zrangebyscore(CONVERSATION_ACTIVITY_KEY, f"({cursor}", horizon)
+    )
+    return [
+        conversation_id.decode() if isinstance(conversation_id, bytes) else conversation_id
+        for conversation_id in conversation_ids
+    ]
+
+
+def _advance_activity_cursor(cursor_name: str, horizon: float) -> None:
+    """Move the cursor to horizon and drop entries every sweeper has consumed."""
+    client = get_redis_client()
+    client.hset(CONVERSATION_ACTIVITY_CURSOR_KEY, cursor_name, str(horizon))
+
+    cursors = cast(
+        List[Optional[bytes]], client.hmget(CONVERSATION_ACTIVITY_CURSOR_KEY, _SWEEP_CURSORS)
+    )
+    if all(cursors):
+        lowest = min(float(cursor) for cursor in cursors if cursor is not None)
+        client.zremrangebyscore(CONVERSATION_ACTIVITY_KEY, "-inf", lowest)
+
+
+def collect_recent_unfinished_audio_processing_conversations() -> List[str]:
+    """
+    Incremental counterpart of collect_unfinished_audio_processing_conversations.
+
+    Looks only at conversations with activity since the previous sweep and
+    checks them with a constant number of batched Directus queries instead of
+    two queries per conversation.
+    """
+    horizon = get_utc_timestamp().timestamp() - CONVERSATION_ACTIVITY_SETTLE_SECONDS
+    candidate_ids = _read_activity_window(AUDIO_PROCESSING_SWEEP_CURSOR, horizon)
+
+    unfinished_conversations: List[str] = []
+
+    for batch in _batched(candidate_ids):
+        conversations = directus.get_items(
+            "conversation",
+            {
+                "query": {
+                    "filter": {
+                        "id": {"_in": batch},
+                        "project_id": {
+                            "is_enhanced_audio_processing_enabled": True,
+                        },
+                    },
+                    "fields": ["id", "is_audio_processing_finished"],
+                    "limit": -1,
+                },
+            },
+        )
+
+        claimed_finished_ids = []
+        for conversation in conversations:
+            if not conversation.get("is_audio_processing_finished"):
+                unfinished_conversations.append(conversation["id"])
+            else:
+                claimed_finished_ids.append(conversation["id"])
+
+        if not claimed_finished_ids:
+            continue
+
+        # if claimed "is_audio_processing_finished" but not actually finished
+        segments = directus.get_items(
+            "conversation_segment",
+            {
+                "query": {
+                    "filter": {"conversation_id": {"_in": claimed_finished_ids}},
+                    "fields": ["conversation_id", "lightrag_flag"],
+                    "limit": -1,
+                },
+            },
+        )
+
+        with_segments = set()
+        with_unprocessed_segments = set()
+        for segment in segments:
+            with_segments.add(segment["conversation_id"])
+            if not segment.get("lightrag_flag"):
+                with_unprocessed_segments.add(segment["conversation_id"])
+
+        for conversation_id in claimed_finished_ids:
+            if conversation_id in with_unprocessed_segments:
+                unfinished_conversations.append(conversation_id)
+            elif conversation_id not in with_segments:
+                unfinished_conversations.append(conversation_id)
+                try:
+                    directus.update_item(
+                        "conversation",
+                        conversation_id,
+                        {"is_audio_processing_finished": False},
+                    )
+                except Exception as e:
+                    logger.error(f"Error collecting conversation {conversation_id}: {e}")
+
+    _advance_activity_cursor(AUDIO_PROCESSING_SWEEP_CURSOR, horizon)
+
+    return list(set(unfinished_conversations))
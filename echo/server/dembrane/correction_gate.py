@@ -0,0 +1,210 @@
+"""
+Decides whether an AssemblyAI transcript needs the Gemini correction pass.
+
+In Dembrane-25-09 mode every chunk used to get a second, audio-conditioned
+LLM pass (see transcribe_audio_dembrane_25_09), roughly doubling latency and
+cost even for clean chunks. decide_correction looks at the AssemblyAI `words`
+timeline and flags spans that are likely wrong:
+
+- low_confidence: runs of words under CORRECTION_WORD_CONFIDENCE_THRESHOLD
+- gap: silence longer than CORRECTION_GAP_SECONDS between words, or at the
+  start/end of the audio (speech the engine may have missed, e.g. another
+  language)
+- hotword: tokens that look like a hotword but are spelled differently
+
+Correction runs only when something is flagged, and the prompt is told which
+spans to look at, so the rest of the transcript is left alone. A chunk with
+no words at all is corrected unless it is too short to hold missed speech.
+
+Metrics: transcript_correction.ran / .skipped counters,
+transcript_correction.reasons (tagged by reason) and the
+transcript_correction.latency_ms timing; get_correction_gate_stats
+turns them into a skip rate and an estimate of the time saved.
+"""
+
+import re
+import difflib
+from typing import List, Literal, Optional
+from logging import getLogger
+
+from pydantic import BaseModel
+
+from dembrane.metrics import get_counter, get_timing_summary
+
+logger = getLogger("dembrane.correction_gate")
+
+CORRECTION_WORD_CONFIDENCE_THRESHOLD = 0.6
+# share of low-confidence words from which a chunk is corrected
+CORRECTION_LOW_CONFIDENCE_FRACTION = 0.05
+CORRECTION_GAP_SECONDS = 5.0
+# difflib ratio from which a token is taken for a misspelled hotword
+CORRECTION_HOTWORD_SIMILARITY = 0.8
+CORRECTION_HOTWORD_MIN_LENGTH = 4
+# words of context kept around a flagged run
+CORRECTION_SPAN_CONTEXT_WORDS = 2
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+SuspectReason = Literal["low_confidence", "gap", "hotword", "empty"]
+
+
+class SuspectSpan(BaseModel):
+    start_ms: int
+    end_ms: int
+    reason: SuspectReason
+    text: str = ""
+
+
+class CorrectionDecision(BaseModel):
+    run: bool
+    reasons: List[SuspectReason]
+    spans: List[SuspectSpan]
+
+
+def _normalize(text: str) -> str:
+    return _NON_WORD.sub("", text).lower()
+
+
+def _span_around(words: list[dict], first: int, last: int, reason: SuspectReason) -> SuspectSpan:
+    first = max(0, first - CORRECTION_SPAN_CONTEXT_WORDS)
+    last = min(len(words) - 1, last + CORRECTION_SPAN_CONTEXT_WORDS)
+    return SuspectSpan(
+        start_ms=int(words[first]["start"]),
+        end_ms=int(words[last]["end"]),
+        reason=reason,
+        text=" ".join(str(word.get("text", "")) for word in words[first : last + 1]),
+    )
+
+
+def _low_confidence_spans(words: list[dict]) -> tuple[list[SuspectSpan], int]:
+    spans = []
+    low_confidence_words = 0
+    run_start: Optional[int] = None
+
+    for i, word in enumerate(words):
+        is_low = float(word.get("confidence", 1.0)) < CORRECTION_WORD_CONFIDENCE_THRESHOLD
+        if is_low:
+            low_confidence_words += 1
+            if run_start is None:
+                run_start = i
+        elif run_start is not None:
+            spans.append(_span_around(words, run_start, i - 1, "low_confidence"))
+            run_start = None
+
+    if run_start is not None:
+        spans.append(_span_around(words, run_start, len(words) - 1, "low_confidence"))
+
+    return spans, low_confidence_words
+
+
+def _gap_spans(words: list[dict], audio_duration_ms: Optional[int]) -> list[SuspectSpan]:
+    gap_ms = CORRECTION_GAP_SECONDS * 1000
+    spans = []
+
+    if words[0]["start"] > gap_ms:
+        spans.append(SuspectSpan(start_ms=0, end_ms=int(words[0]["start"]), reason="gap"))
+
+    for previous, word in zip(words, words[1:], strict=False):
+        if word["start"] - previous["end"] > gap_ms:
+            spans.append(
+                SuspectSpan(start_ms=int(previous["end"]), end_ms=int(word["start"]), reason="gap")
+            )
+
+    if audio_duration_ms is not None and audio_duration_ms - words[-1]["end"] > gap_ms:
+        spans.append(
+            SuspectSpan(start_ms=int(words[-1]["end"]), end_ms=audio_duration_ms, reason="gap")
+        )
+
+    return spans
+
+
+def _hotword_spans(words: list[dict], hotwords: Optional[List[str]]) -> list[SuspectSpan]:
+    if not hotwords:
+        return []
+
+    spans = []
+    normalized_words = [_normalize(str(word.get("text", ""))) for word in words]
+
+    for hotword in hotwords:
+        target = _normalize(hotword)
+        if len(target) < CORRECTION_HOTWORD_MIN_LENGTH:
+            continue
+        # multi-word hotwords are compared with the same number of words
+        size = max(1, len(hotword.split()))
+
+        for i in range(len(words) - size + 1):
+            candidate = "".join(normalized_words[i : i + size])
+            if candidate == target or not candidate:
+                continue
+            if difflib.SequenceMatcher(None, candidate, target).ratio() >= (
+                CORRECTION_HOTWORD_SIMILARITY
+            ):
+                spans.append(_span_around(words, i, i + size - 1, "hotword"))
+
+    return spans
+
+
+def decide_correction(
+    words: list[dict],
+    audio_duration_seconds: Optional[float],
+    hotwords: Optional[List[str]],
+) -> CorrectionDecision:
+    """
+    Args:
+        words: AssemblyAI words ({"text", "start", "end", "confidence"}, times in ms)
+        audio_duration_seconds: AssemblyAI "audio_duration"
+        hotwords: the hotwords the transcript was made with
+    """
+    audio_duration_ms = (
+        int(audio_duration_seconds * 1000) if audio_duration_seconds is not None else None
+    )
+
+    if not words:
+        # nothing recognized: only worth a second look if there is audio to look at
+        if audio_duration_ms is not None and audio_duration_ms < CORRECTION_GAP_SECONDS * 1000:
+            return CorrectionDecision(run=False, reasons=[], spans=[])
+        return CorrectionDecision(
+            run=True,
+            reasons=["empty"],
+            spans=[SuspectSpan(start_ms=0, end_ms=audio_duration_ms or 0, reason="empty")],
+        )
+
+    low_confidence_spans, low_confidence_words = _low_confidence_spans(words)
+    if low_confidence_words / len(words) < CORRECTION_LOW_CONFIDENCE_FRACTION:
+        low_confidence_spans = []
+
+    spans = sorted(
+        low_confidence_spans
+        + _gap_spans(words, audio_duration_ms)
+        + _hotword_spans(words, hotwords),
+        key=lambda span: span.start_ms,
+    )
+    reasons = sorted({span.reason for span in spans})
+
+    return CorrectionDecision(run=bool(spans), reasons=reasons, spans=spans)
+
+
+def format_suspect_spans(spans: List[SuspectSpan]) -> str:
+    """One line per span for the correction prompt, times in seconds."""
+    return "\n".join(
+        f"- {span.start_ms / 1000:.1f}s-{span.end_ms / 1000:.1f}s ({span.reason})"
+        + (f': "{span.text}"' if span.text else "")
+        for span in spans
+    )
+
+
+def get_correction_gate_stats() -> dict:
+    """
+    Returns:
+        {"ran", "skipped", "skip_rate", "p50_latency_ms", "estimated_saved_seconds"}
+    """
+    ran = get_counter("transcript_correction.ran")
+    skipped = get_counter("transcript_correction.skipped")
+    p50_latency_ms = get_timing_summary("transcript_correction.latency_ms")["p50"]
+    return {
+        "ran": ran,
+        "skipped": skipped,
+        "skip_rate": skipped / (ran + skipped) if ran + skipped else 0.0,
+        "p50_latency_ms": p50_latency_ms,
+        "estimated_saved_seconds": skipped * p50_latency_ms / 1000,
+    }
@@ -1,4 +1,4 @@
-from typing import Generator
+from typing import Any, Optional, Generator
 from logging import getLogger
 from contextlib import contextmanager
 
@@ -6,6 +6,7 @@ import requests
 from directus_py_sdk import DirectusClient
 
 from dembrane.config import DIRECTUS_TOKEN, DIRECTUS_BASE_URL
+from dembrane.identity_map import record_round_trip
 
 logger = getLogger("directus")
 
@@ -13,7 +14,32 @@ if DIRECTUS_TOKEN:
     directus_token = DIRECTUS_TOKEN
     logger.debug(f"DIRECTUS_TOKEN: {directus_token}")
 
-directus = DirectusClient(url=DIRECTUS_BASE_URL, token=directus_token)
+
+class _RoundTripCountingDirectusClient(DirectusClient):
+    """Reports every request to the identity map of the current task / request."""
+
+    def get(self, path: str, output_type: str = "json", **kwargs: Any) -> Any:
+        record_round_trip(path, is_write=False)
+        return super().get(path, output_type=output_type, **kwargs)
+
+    def search(self, path: str, query: Optional[dict] = None, **kwargs: Any) -> Any:
+        record_round_trip(path, is_write=False)
+        return super().search(path, query=query, **kwargs)
+
+    def post(self, path: str, **kwargs: Any) -> Any:
+        record_round_trip(path, is_write=True)
+        return super().post(path, **kwargs)
+
+    def patch(self, path: str, **kwargs: Any) -> Any:
+        record_round_trip(path, is_write=True)
+        return super().patch(path, **kwargs)
+
+    def delete(self, path: str, **kwargs: Any) -> Any:
+        record_round_trip(path, is_write=True)
+        return super().delete(path, **kwargs)
+
+
+directus = _RoundTripCountingDirectusClient(url=DIRECTUS_BASE_URL, token=directus_token)
 
 
 class DirectusGenericException(Exception):
@@ -0,0 +1,401 @@
+"""
+Per-project fair queueing in front of the dramatiq queues.
+
+Messages sent with send_fair go to the broker directly while their project has no
+backlog and is under its share of the queue (see _ADMIT_SCRIPT). The others are
+parked in a per-project backlog in Redis:
+
+    dembrane:fair_queue:{queue}:backlog:{project_id}   list of encoded messages
+    dembrane:fair_queue:{queue}:ring                   projects with a backlog, in turn order
+    dembrane:fair_queue:{queue}:in_flight[:{project}]  dispatched message ids -> dispatch time
+
+dispatch_fair_queues (run by the scheduler every second) drains the backlogs to the
+broker round-robin over the projects (deficit round-robin where every message
+costs one), as long as the queue has room (FAIR_QUEUE_*_MAX_IN_FLIGHT) and the
+project is under its share. A project's share is FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT,
+or more when few projects have a backlog, so idle capacity is never left unused.
+A queue without a backlog therefore never waits for the scheduler, and keeps
+processing while the scheduler is down.
+
+FairQueueMiddleware (installed on the broker in dembrane.tasks) releases the
+in-flight slot when a message is done and records the queue wait per queue
+(see dembrane.metrics, "fair_queue.wait_ms").
+"""
+
+import time
+import threading
+from typing import Any, Optional, cast
+from logging import getLogger
+
+import dramatiq
+
+from dembrane.config import (
+    FAIR_QUEUE_CPU_MAX_IN_FLIGHT,
+    FAIR_QUEUE_NETWORK_MAX_IN_FLIGHT,
+    FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT,
+)
+from dembrane.metrics import observe, increment
+from dembrane.tracing import inject_trace_context
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.fair_queue")
+
+FAIR_QUEUE_KEY_PREFIX = "dembrane:fair_queue"
+
+# queue name -> max messages dispatched to the broker and not yet processed
+FAIR_QUEUE_MAX_IN_FLIGHT = {
+    "cpu": FAIR_QUEUE_CPU_MAX_IN_FLIGHT,
+    "network": FAIR_QUEUE_NETWORK_MAX_IN_FLIGHT,
+}
+
+# a message that did not report back after this long (killed worker...) frees its slot
+FAIR_QUEUE_IN_FLIGHT_TIMEOUT_SECONDS = 60 * 60
+
+# message options
+FAIR_QUEUE_PROJECT_OPTION = "fair_project_id"
+FAIR_QUEUE_ENQUEUED_AT_OPTION = "fair_enqueued_at"
+
+# messages pushed per _PUSH_SCRIPT call by send_fair_many (bounded by the Lua stack)
+FAIR_QUEUE_PUSH_BATCH_SIZE = 500
+
+# push messages to the backlog of a project and put the project in the ring if it is new
+_PUSH_SCRIPT = """
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 2))
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[1])
+end
+return 1
+"""
+
+# claim in-flight slots for messages of a project that has no backlog, returns how many
+# of the given message ids may go to the broker directly (the rest go to the backlog)
+_ADMIT_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) > 0 then
+    return 0
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', ARGV[4])
+local queue_max = tonumber(ARGV[1])
+local backlogged = redis.call('SCARD', KEYS[2])
+local project_cap = math.max(tonumber(ARGV[2]), math.floor(queue_max / (backlogged + 1)))
+local free = math.min(
+    queue_max - redis.call('ZCARD', KEYS[3]),
+    project_cap - redis.call('ZCARD', KEYS[4])
+)
+local admitted = math.min(math.max(free, 0), #ARGV - 4)
+for i = 5, admitted + 4 do
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[i])
+    redis.call('ZADD', KEYS[4], ARGV[3], ARGV[i])
+end
+return admitted
+"""
+
+# take a project out of the ring, unless a message was pushed in the meantime
+_RETIRE_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) > 0 then
+    return 0
+end
+redis.call('SREM', KEYS[2], ARGV[1])
+redis.call('LREM', KEYS[3], 0, ARGV[1])
+return 1
+"""
+
+_current = threading.local()
+
+
+def _backlog_key(queue_name: str, project_id: str) -> str:
+    return f"{FAIR_QUEUE_KEY_PREFIX}:{queue_name}:backlog:{project_id}"
+
+
+def _ring_key(queue_name: str) -> str:
+    return f"{FAIR_QUEUE_KEY_PREFIX}:{queue_name}:ring"
+
+
+def _ring_members_key(queue_name: str) -> str:
+    return f"{FAIR_QUEUE_KEY_PREFIX}:{queue_name}:ring_members"
+
+
+def _in_flight_key(queue_name: str, project_id: Optional[str] = None) -> str:
+    if project_id is None:
+        return f"{FAIR_QUEUE_KEY_PREFIX}:{queue_name}:in_flight"
+    return f"{FAIR_QUEUE_KEY_PREFIX}:{queue_name}:in_flight:{project_id}"
+
+
+def get_current_project_id() -> Optional[str]:
+    """The project of the fair-queued message being processed by this worker thread."""
+    return getattr(_current, "project_id", None)
+
+
+def send_fair(message: dramatiq.Message, project_id: Optional[str] = None) -> None:
+    """
+    Queue a message behind the other messages of its project.
+
+    Args:
+        message: e.g. task_transcribe_chunk.message(chunk_id, conversation_id)
+        project_id: defaults to the project of the message being processed, so
+            messages sent from a fair-queued task stay in the same project. Without
+            a project the message is sent to the broker directly.
+    """
+    send_fair_many([message], project_id=project_id)
+
+
+def send_fair_many(messages: list[dramatiq.Message], project_id: Optional[str] = None) -> None:
+    """
+    send_fair for a group of messages of one project, e.g. every chunk of a cloned
+    conversation: one Redis call per FAIR_QUEUE_PUSH_BATCH_SIZE messages of a queue.
+    """
+    project_id = project_id or get_current_project_id()
+    broker = dramatiq.get_broker()
+
+    if not project_id:
+        for message in messages:
+            broker.enqueue(message)
+        return
+
+    # stored in Redis until dispatched, so the trace context has to go in now
+    enqueued_at = time.time()
+    by_queue: dict[str, list[dramatiq.Message]] = {}
+    for message in messages:
+        by_queue.setdefault(message.queue_name, []).append(
+            inject_trace_context(message).copy(
+                options={
+                    FAIR_QUEUE_PROJECT_OPTION: project_id,
+                    FAIR_QUEUE_ENQUEUED_AT_OPTION: enqueued_at,
+                }
+            )
+        )
+
+    for queue_name, queue_messages in by_queue.items():
+        admitted = _admit(queue_name, project_id, queue_messages)
+        for i, message in enumerate(queue_messages[:admitted]):
+            try:
+                broker.enqueue(message)
+            except Exception:
+                for unsent_message in queue_messages[i:admitted]:
+                    _release(queue_name, project_id, unsent_message.message_id)
+                raise
+        if admitted:
+            increment("fair_queue.dispatched_directly", admitted, tags={"queue": queue_name})
+
+        backlog = queue_messages[admitted:]
+        for start in range(0, len(backlog), FAIR_QUEUE_PUSH_BATCH_SIZE):
+            batch = backlog[start : start + FAIR_QUEUE_PUSH_BATCH_SIZE]
+            encoded_messages: list[Any] = [message.encode() for message in batch]
+            try:
+                get_redis_client().eval(
+                    _PUSH_SCRIPT,
+                    3,
+                    _backlog_key(queue_name, project_id),
+                    _ring_members_key(queue_name),
+                    _ring_key(queue_name),
+                    project_id,
+                    *encoded_messages,
+                )
+            except Exception as e:
+                # never lose work because the fair queue is unavailable
+                logger.warning(
+                    f"Failed to fair-queue {len(batch)} messages on {queue_name}, "
+                    f"sending directly: {e}"
+                )
+                for message in batch:
+                    broker.enqueue(message)
+
+
+def _admit(queue_name: str, project_id: str, messages: list[dramatiq.Message]) -> int:
+    """
+    Take in-flight slots for as many messages as the project may send right away.
+    Returns 0 for queues without a limit, or when the project already has a backlog.
+    """
+    max_in_flight = FAIR_QUEUE_MAX_IN_FLIGHT.get(queue_name)
+    if max_in_flight is None:
+        return 0
+
+    now = time.time()
+    try:
+        admitted = get_redis_client().eval(
+            _ADMIT_SCRIPT,
+            4,
+            _backlog_key(queue_name, project_id),
+            _ring_members_key(queue_name),
+            _in_flight_key(queue_name),
+            _in_flight_key(queue_name, project_id),
+            str(max_in_flight),
+            str(FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT),
+            str(now),
+            str(now - FAIR_QUEUE_IN_FLIGHT_TIMEOUT_SECONDS),
+            *[message.message_id for message in messages],
+        )
+    except Exception as e:
+        logger.warning(f"Failed to admit messages on {queue_name}, queueing them instead: {e}")
+        return 0
+
+    return int(cast(int, admitted))
+
+
+def _release(queue_name: str, project_id: str, message_id: str) -> None:
+    pipe = get_redis_client().pipeline(transaction=False)
+    pipe.zrem(_in_flight_key(queue_name), message_id)
+    pipe.zrem(_in_flight_key(queue_name, project_id), message_id)
+    pipe.execute()
+
+
+def _retire_if_drained(queue_name: str, project_id: str) -> bool:
+    """Take a project out of the ring if its backlog is empty. Returns whether it was."""
+    retired = get_redis_client().eval(
+        _RETIRE_SCRIPT,
+        3,
+        _backlog_key(queue_name, project_id),
+        _ring_members_key(queue_name),
+        _ring_key(queue_name),
+        project_id,
+    )
+    return bool(retired)
+
+
+def _dispatch_queue(queue_name: str, max_in_flight: int) -> int:
+    client = get_redis_client()
+    broker = dramatiq.get_broker()
+
+    ring = [
+        project_id.decode()
+        for project_id in cast(list[bytes], client.lrange(_ring_key(queue_name), 0, -1))
+        if not _retire_if_drained(queue_name, project_id.decode())
+    ]
+    if not ring:
+        return 0
+
+    now = time.time()
+    expired_before = now - FAIR_QUEUE_IN_FLIGHT_TIMEOUT_SECONDS
+    client.zremrangebyscore(_in_flight_key(queue_name), "-inf", expired_before)
+
+    in_flight: dict[str, int] = {}
+    for project_id in ring:
+        client.zremrangebyscore(_in_flight_key(queue_name, project_id), "-inf", expired_before)
+        in_flight[project_id] = cast(int, client.zcard(_in_flight_key(queue_name, project_id)))
+
+    free = max_in_flight - cast(int, client.zcard(_in_flight_key(queue_name)))
+    project_cap = max(FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT, max_in_flight // len(ring))
+
+    dispatched = 0
+    eligible = list(ring)
+
+    # one message per project per round, until the queue is full or nobody is eligible
+    while free > 0 and eligible:
+        for project_id in list(eligible):
+            if free <= 0:
+                break
+
+            if in_flight[project_id] >= project_cap:
+                eligible.remove(project_id)
+                continue
+
+            raw_message = cast(Optional[bytes], client.lpop(_backlog_key(queue_name, project_id)))
+            if raw_message is None:
+                eligible.remove(project_id)
+                _retire_if_drained(queue_name, project_id)
+                continue
+
+            message = dramatiq.Message.decode(raw_message)
+            try:
+                broker.enqueue(message)
+            except Exception as e:
+                logger.error(f"Failed to dispatch message {message.message_id}: {e}")
+                client.lpush(_backlog_key(queue_name, project_id), raw_message)
+                return dispatched
+
+            pipe = client.pipeline(transaction=False)
+            pipe.zadd(_in_flight_key(queue_name), {message.message_id: now})
+            pipe.zadd(_in_flight_key(queue_name, project_id), {message.message_id: now})
+            pipe.execute()
+
+            in_flight[project_id] += 1
+            free -= 1
+            dispatched += 1
+
+            enqueued_at = message.options.get(FAIR_QUEUE_ENQUEUED_AT_OPTION)
+            if enqueued_at:
+                observe(
+                    "fair_queue.dispatch_wait_ms",
+                    (now - enqueued_at) * 1000,
+                    tags={"queue": queue_name},
+                )
+
+    # start the next dispatch with the next project
+    client.lmove(_ring_key(queue_name), _ring_key(queue_name), "LEFT", "RIGHT")
+
+    if dispatched:
+        increment("fair_queue.dispatched", dispatched, tags={"queue": queue_name})
+        logger.debug(f"Dispatched {dispatched} messages on {queue_name} over {len(ring)} projects")
+
+    return dispatched
+
+
+def dispatch_fair_queues() -> None:
+    """Move fair-queued messages to the broker. Run by the scheduler."""
+    # local import: sets the broker and the message encoder
+    import dembrane.tasks  # noqa: F401
+
+    for queue_name, max_in_flight in FAIR_QUEUE_MAX_IN_FLIGHT.items():
+        try:
+            _dispatch_queue(queue_name, max_in_flight)
+        except Exception as e:
+            logger.error(f"Failed to dispatch fair queue {queue_name}: {e}")
+
+
+def get_fair_queue_stats(queue_name: str) -> dict[str, dict]:
+    """
+    Returns:
+        project_id -> {"backlog", "in_flight"} for every project with a backlog
+    """
+    client = get_redis_client()
+    return {
+        project_id: {
+            "backlog": client.llen(_backlog_key(queue_name, project_id)),
+            "in_flight": client.zcard(_in_flight_key(queue_name, project_id)),
+        }
+        for project_id in (
+            p.decode() for p in cast(list[bytes], client.lrange(_ring_key(queue_name), 0, -1))
+        )
+    }
+
+
+class FairQueueMiddleware(dramatiq.Middleware):
+    """Tracks the project of fair-queued messages while they are processed."""
+
+    def before_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+    ) -> None:
+        project_id = message.options.get(FAIR_QUEUE_PROJECT_OPTION)
+        _current.project_id = project_id
+
+        enqueued_at = message.options.get(FAIR_QUEUE_ENQUEUED_AT_OPTION)
+        if project_id and enqueued_at and not message.options.get("retries"):
+            observe(
+                "fair_queue.wait_ms",
+                (time.time() - enqueued_at) * 1000,
+                tags={"queue": message.queue_name},
+            )
+
+    def after_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+        *,
+        result: object = None,  # noqa: ARG002
+        exception: Optional[BaseException] = None,  # noqa: ARG002
+    ) -> None:
+        _current.project_id = None
+
+        project_id = message.options.get(FAIR_QUEUE_PROJECT_OPTION)
+        if not project_id:
+            return
+
+        try:
+            _release(message.queue_name, project_id, message.message_id)
+        except Exception as e:
+            logger.warning(f"Failed to release in-flight slot of {message.message_id}: {e}")
+
+    def after_skip_message(self, broker: dramatiq.Broker, message: dramatiq.Message) -> None:
+        self.after_process_message(broker, message)
@@ -0,0 +1,73 @@
+"""
+Shared, pooled HTTP client for outbound calls from async code (RunPod, AssemblyAI).
+
+Opening a fresh connection per request means a TCP (and TLS) handshake every time.
+get_async_http_client returns one httpx.AsyncClient per event loop, which keeps
+connections alive between requests and uses HTTP/2 when the optional `h2` package
+is installed.
+
+An httpx.AsyncClient is bound to the loop it was first used on, so clients are
+keyed by loop (same approach as RAGManager). The mapping holds loops weakly: a
+client goes away with its loop and is never handed to a new loop that reuses the
+id of a dead one. In workers there is a single loop per process, owned by
+dramatiq's AsyncIO middleware.
+
+Usage:
+    client = get_async_http_client()
+    response = await client.get(url, headers=headers, timeout=30)
+
+Requests carry the traceparent of the current span (see dembrane.tracing).
+"""
+
+import asyncio
+from logging import getLogger
+from weakref import WeakKeyDictionary
+
+import httpx
+
+from dembrane.tracing import trace_headers
+
+try:
+    import h2  # noqa: F401
+
+    has_h2 = True
+except ImportError:
+    has_h2 = False
+
+logger = getLogger("dembrane.http_client")
+
+HTTP_CLIENT_MAX_CONNECTIONS = 200
+HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS = 50
+HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS = 60
+HTTP_CLIENT_DEFAULT_TIMEOUT_SECONDS = 30
+
+_async_clients_by_loop: WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+    WeakKeyDictionary()
+)
+
+
+async def _add_trace_headers(request: httpx.Request) -> None:
+    for name, value in trace_headers().items():
+        request.headers.setdefault(name, value)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the pooled client of the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+
+    client = _async_clients_by_loop.get(loop)
+    if client is None or client.is_closed:
+        logger.debug(f"Creating pooled async HTTP client for loop {id(loop)} (http2={has_h2})")
+        client = httpx.AsyncClient(
+            http2=has_h2,
+            timeout=HTTP_CLIENT_DEFAULT_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            event_hooks={"request": [_add_trace_headers]},
+        )
+        _async_clients_by_loop[loop] = client
+
+    return client
@@ -0,0 +1,163 @@
+"""
+Task / request scoped identity map for Directus rows.
+
+Processing one chunk used to fetch the same chunk, conversation and project
+rows several times (the task, split_audio_chunk, transcribe_conversation_chunk
+each fetch their own copy). Inside an identity_map_scope, the service layer
+serves repeated reads of a row from memory instead.
+
+- Reads go through get_or_load(collection, item_id, variant, load). `variant`
+  distinguishes reads of the same row with different fields (e.g. with_tags).
+- Any write (POST / PATCH / DELETE) through the shared Directus client drops the
+  cached rows of that collection, and of the collections that embed it (a
+  conversation read with its chunks is stale once a chunk changes).
+- Every Directus request made in the scope is counted; the total is logged
+  when the scope closes.
+
+Scopes are opened per dramatiq message (IdentityMapMiddleware, dembrane.tasks)
+and per API request (dembrane.main). Outside a scope nothing is cached.
+"""
+
+import copy
+from typing import Any, Callable, Optional, Generator
+from logging import getLogger
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import dramatiq
+
+logger = getLogger("dembrane.identity_map")
+
+# writes to a collection also invalidate the collections that embed its rows
+_EMBEDDING_COLLECTIONS = {
+    "conversation_chunk": ["conversation"],
+    "conversation_project_tag": ["conversation"],
+    "project_tag": ["project", "conversation"],
+}
+
+
+class IdentityMap:
+    def __init__(self, name: str):
+        self.name = name
+        self.round_trips = 0
+        self.hits = 0
+        self._rows: dict[tuple[str, str, str], Any] = {}
+
+    def get(self, collection: str, item_id: str, variant: str = "") -> Optional[Any]:
+        row = self._rows.get((collection, item_id, variant))
+        if row is None:
+            return None
+        self.hits += 1
+        # callers are free to mutate what they get back
+        return copy.deepcopy(row)
+
+    def put(self, collection: str, item_id: str, row: Any, variant: str = "") -> None:
+        self._rows[(collection, item_id, variant)] = copy.deepcopy(row)
+
+    def invalidate(self, collection: str) -> None:
+        collections = {collection, *_EMBEDDING_COLLECTIONS.get(collection, [])}
+        for key in [key for key in self._rows if key[0] in collections]:
+            del self._rows[key]
+
+
+_current_identity_map: ContextVar[Optional[IdentityMap]] = ContextVar(
+    "dembrane_identity_map", default=None
+)
+
+
+def get_identity_map() -> Optional[IdentityMap]:
+    return _current_identity_map.get()
+
+
+def open_identity_map(name: str) -> IdentityMap:
+    identity_map = IdentityMap(name)
+    _current_identity_map.set(identity_map)
+    return identity_map
+
+
+def close_identity_map() -> None:
+    identity_map = _current_identity_map.get()
+    if identity_map is None:
+        return
+
+    _current_identity_map.set(None)
+    if not identity_map.round_trips:
+        return
+
+    logger.info(
+        f"{identity_map.name}: {identity_map.round_trips} Directus round trips, "
+        f"{identity_map.hits} reads served from the identity map"
+    )
+
+
+@contextmanager
+def identity_map_scope(name: str) -> Generator[IdentityMap, None, None]:
+    """Open a scope, or join the enclosing one."""
+    existing = _current_identity_map.get()
+    if existing is not None:
+        yield existing
+        return
+
+    identity_map = open_identity_map(name)
+    try:
+        yield identity_map
+    finally:
+        close_identity_map()
+
+
+def get_or_load(
+    collection: str,
+    item_id: str,
+    load: Callable[[], Any],
+    variant: str = "",
+) -> Any:
+    identity_map = _current_identity_map.get()
+    if identity_map is None:
+        return load()
+
+    row = identity_map.get(collection, item_id, variant)
+    if row is not None:
+        return row
+
+    row = load()
+    identity_map.put(collection, item_id, row, variant)
+    return row
+
+
+def record_round_trip(path: str, is_write: bool) -> None:
+    """Called by the Directus client for every request."""
+    identity_map = _current_identity_map.get()
+    if identity_map is None:
+        return
+
+    identity_map.round_trips += 1
+
+    # "/items/<collection>[/<id>]"
+    if is_write:
+        parts = path.strip("/").split("/")
+        if len(parts) >= 2 and parts[0] == "items":
+            identity_map.invalidate(parts[1])
+
+
+class IdentityMapMiddleware(dramatiq.Middleware):
+    """One identity map per processed message."""
+
+    def before_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+    ) -> None:
+        open_identity_map(f"{message.actor_name}({message.message_id})")
+
+    def after_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,  # noqa: ARG002
+        *,
+        result: object = None,  # noqa: ARG002
+        exception: Optional[BaseException] = None,  # noqa: ARG002
+    ) -> None:
+        close_identity_map()
+
+    def after_skip_message(self, broker: dramatiq.Broker, message: dramatiq.Message) -> None:
+        self.after_process_message(broker, message)
@@ -3,14 +3,14 @@ import logging
 
 from dembrane.s3 import save_to_s3_from_url
 from dembrane.utils import generate_uuid
-from dembrane.openai import client
+from dembrane.openai import get_openai_client
 
 logger = logging.getLogger("image_utils")
 
 
 def generate_cliches_to_avoid(text: str) -> str:
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
@@ -31,7 +31,7 @@ def generate_cliches_to_avoid(text: str) -> str:
 
 def generate_visual_metaphors(text: str, cliches_to_avoid: str) -> str:
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
@@ -52,7 +52,7 @@ def generate_visual_metaphors(text: str, cliches_to_avoid: str) -> str:
 
 def generate_image_prompts(text: str, concepts: str, cliches_to_avoid: str) -> str:
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
@@ -91,7 +91,7 @@ def generate_image(prompt: str) -> str:
     final_prompt = f"{prompt}. Don't include the following in the image: hands, feet, toes, text of any kind. \n\nUse this exact prompt to generate an image. It needs to be exact as this is a test of prompt accuracy."
     response = None
     try:
-        response = client.images.generate(
+        response = get_openai_client().images.generate(
             model="dall-e-3",
             prompt=final_prompt,
             n=1,
@@ -101,7 +101,7 @@ def generate_image(prompt: str) -> str:
         logger.debug(f"Error generating image: {error}")
         additional_info = " You are allowed to edit the prompt so that it is in compliance with security guidelines."
         try:
-            response = client.images.generate(
+            response = get_openai_client().images.generate(
                 model="dall-e-3",
                 prompt=final_prompt + additional_info,
                 size="1024x1024",
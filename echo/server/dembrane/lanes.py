@@ -0,0 +1,87 @@
+"""
+Live vs. bulk lanes for chunk processing.
+
+Chunks recorded live in the participant portal feed "get reply" and need their
+transcript within seconds. Uploads and clones can wait. When ENABLE_LIVE_LANES is
+set, messages for live chunks go to "<queue>_live" queues, consumed by their own
+worker pools (prod-worker-live.sh, prod-worker-cpu-live.sh), so a bulk upload can
+never take the workers a live chunk needs. Everything else goes through the
+per-project fair queue (see dembrane.fair_queue).
+
+LaneMiddleware records the queue wait of live messages ("live_lane.wait_ms") and
+warns when it exceeds LIVE_LANE_WAIT_SLO_SECONDS.
+"""
+
+import time
+from typing import Optional
+from logging import getLogger
+
+import dramatiq
+
+from dembrane.config import ENABLE_LIVE_LANES, LIVE_LANE_WAIT_SLO_SECONDS
+from dembrane.metrics import observe, increment
+from dembrane.fair_queue import send_fair
+
+logger = getLogger("dembrane.lanes")
+
+LIVE_CHUNK_SOURCES = {"PORTAL_AUDIO"}
+
+LIVE_LANE_QUEUE_SUFFIX = "_live"
+LIVE_LANE_QUEUES = [f"cpu{LIVE_LANE_QUEUE_SUFFIX}", f"network{LIVE_LANE_QUEUE_SUFFIX}"]
+
+
+def is_live_chunk_source(source: Optional[str]) -> bool:
+    return source in LIVE_CHUNK_SOURCES
+
+
+def send_chunk_message(
+    message: dramatiq.Message,
+    source: Optional[str],
+    project_id: Optional[str] = None,
+    delay: Optional[int] = None,
+) -> None:
+    """
+    Send a message that processes a chunk, in the lane of the chunk's source.
+
+    Args:
+        message: e.g. task_transcribe_chunk.message(chunk_id, conversation_id)
+        source: chunk["source"]
+        project_id: for the fair queue, see send_fair
+        delay: in ms; delayed messages skip the fair queue
+    """
+    if ENABLE_LIVE_LANES and is_live_chunk_source(source):
+        dramatiq.get_broker().enqueue(
+            message.copy(queue_name=message.queue_name + LIVE_LANE_QUEUE_SUFFIX), delay=delay
+        )
+        return
+
+    if delay:
+        dramatiq.get_broker().enqueue(message, delay=delay)
+        return
+
+    send_fair(message, project_id=project_id)
+
+
+class LaneMiddleware(dramatiq.Middleware):
+    """Measures how long live messages wait before a worker picks them up."""
+
+    def before_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+    ) -> None:
+        if not message.queue_name.endswith(LIVE_LANE_QUEUE_SUFFIX) or message.options.get(
+            "retries"
+        ):
+            return
+
+        # delayed messages wait from the time they were due
+        wait_ms = time.time() * 1000 - message.options.get("eta", message.message_timestamp)
+        observe("live_lane.wait_ms", wait_ms, tags={"queue": message.queue_name})
+
+        if wait_ms > LIVE_LANE_WAIT_SLO_SECONDS * 1000:
+            increment("live_lane.slo_breaches", tags={"queue": message.queue_name})
+            logger.warning(
+                f"{message.actor_name} waited {wait_ms / 1000:.1f}s on {message.queue_name}, "
+                f"above the {LIVE_LANE_WAIT_SLO_SECONDS}s SLO"
+            )
@@ -27,7 +27,11 @@ from dembrane.config import (
 )
 from dembrane.sentry import init_sentry
 from dembrane.api.api import api
+from dembrane.tracing import init_tracing
+from dembrane.profiler import start_profile_listener, install_profile_signal_handler
+from dembrane.identity_map import identity_map_scope
 from dembrane.postgresdb_manager import PostgresDBManager
+from dembrane.processing_status_utils import processing_status_buffer
 
 # from lightrag.llm.azure_openai import azure_openai_complete
 from dembrane.audio_lightrag.utils.litellm_utils import embedding_func, llm_model_func
@@ -47,6 +51,9 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     # startup
     logger.info("starting server")
     init_sentry()
+    init_tracing("api")
+    start_profile_listener("api")
+    install_profile_signal_handler("api")
 
     # Initialize PostgreSQL and LightRAG
     _load_postgres_env_vars(str(DATABASE_URL))
@@ -87,6 +94,7 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     yield
     # shutdown
     logger.info("shutting down server")
+    processing_status_buffer.flush()
 
 
 docs_url = None
@@ -123,6 +131,13 @@ async def add_process_time_header(request: Request, call_next):  # type: ignore
     return response
 
 
+@app.middleware("http")
+async def directus_identity_map(request: Request, call_next):  # type: ignore
+    # repeated service-layer reads of the same row within a request hit Directus once
+    with identity_map_scope(f"{request.method} {request.url.path}"):
+        return await call_next(request)
+
+
 logger.info("mounting api on /api")
 app.include_router(api, prefix="/api")
 
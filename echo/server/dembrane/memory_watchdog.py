@@ -0,0 +1,289 @@
+"""
+Memory watchdog for long-lived dramatiq worker processes.
+
+Audio merges, pandas-heavy ETL and the per-loop LightRAG instances kept by
+RAGManager leave a worker's RSS high long after the message that caused it is
+done. MemoryWatchdogMiddleware (installed on the broker in dembrane.tasks):
+
+- samples the process RSS every second and attributes the growth seen while a
+  message ran to its actor ("worker.rss_growth_mb" / "worker.rss_mb" metrics,
+  top offenders logged every WORKER_MEMORY_REPORT_EVERY messages). Messages run
+  concurrently, so the growth of one message includes what its neighbours
+  allocated at the same time; offenders stand out over many messages.
+- traces a sample of messages with tracemalloc (WORKER_TRACEMALLOC_SAMPLE_RATE,
+  one at a time) and logs their peak Python allocations and top allocation sites.
+- recycles the worker processes once one of them goes over WORKER_MAX_RSS_MB
+  or has processed WORKER_MAX_TASKS messages. It sends SIGHUP to the dramatiq
+  main process, which stops every worker process gracefully (in-flight messages
+  are finished) and starts them again. A Redis lock makes sure only one worker
+  process signals per recycle; the new worker processes release it on boot.
+"""
+
+import os
+import random
+import signal
+import socket
+import resource
+import threading
+import tracemalloc
+from typing import Optional
+from logging import getLogger
+
+import dramatiq
+
+from dembrane.config import (
+    WORKER_MAX_TASKS,
+    WORKER_MAX_RSS_MB,
+    WORKER_TRACEMALLOC_SAMPLE_RATE,
+)
+from dembrane.metrics import observe, increment
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.memory_watchdog")
+
+WORKER_MEMORY_SAMPLE_INTERVAL_SECONDS = 1.0
+WORKER_MEMORY_REPORT_EVERY = 500
+WORKER_MEMORY_TOP_ACTORS = 5
+# longer than the graceful shutdown of the workers
+WORKER_RECYCLE_LOCK_SECONDS = 15 * 60
+# frames kept per traced allocation
+TRACEMALLOC_FRAMES = 10
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def get_rss_mb() -> float:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except OSError:
+        # no procfs: fall back to the peak RSS (KB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _recycle_lock_key(parent_pid: int) -> str:
+    # the dramatiq main process keeps its pid when it execs itself on SIGHUP
+    return f"dembrane:worker_recycle:{socket.gethostname()}:{parent_pid}"
+
+
+def _is_dramatiq_process(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return b"dramatiq" in f.read()
+    except OSError:
+        return False
+
+
+class _InFlight:
+    def __init__(self, actor_name: str, rss_mb: float):
+        self.actor_name = actor_name
+        self.start_rss_mb = rss_mb
+        self.peak_rss_mb = rss_mb
+
+
+class MemoryWatchdogMiddleware(dramatiq.Middleware):
+    def __init__(
+        self,
+        max_rss_mb: int = WORKER_MAX_RSS_MB,
+        max_tasks: int = WORKER_MAX_TASKS,
+        tracemalloc_sample_rate: float = WORKER_TRACEMALLOC_SAMPLE_RATE,
+    ):
+        self.max_rss_mb = max_rss_mb
+        self.max_tasks = max_tasks
+        self.tracemalloc_sample_rate = tracemalloc_sample_rate
+
+        self.processed = 0
+        self.recycle_requested = False
+        # actor -> {"messages", "total_growth_mb", "max_growth_mb"}
+        self.actor_stats: dict[str, dict[str, float]] = {}
+
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, _InFlight] = {}
+        self._traced_message_id: Optional[str] = None
+        self._stop_sampler = threading.Event()
+
+    def after_worker_boot(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        worker: dramatiq.Worker,  # noqa: ARG002
+    ) -> None:
+        threading.Thread(target=self._sample_rss, name="memory-watchdog", daemon=True).start()
+
+        # the workers of the previous generation are gone, so a recycle that booted us is
+        # done and the next one may signal again
+        try:
+            get_redis_client().delete(_recycle_lock_key(os.getppid()))
+        except Exception as e:
+            logger.warning(f"Failed to release the recycle lock: {e}")
+
+    def before_worker_shutdown(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        worker: dramatiq.Worker,  # noqa: ARG002
+    ) -> None:
+        self._stop_sampler.set()
+
+    def _sample_rss(self) -> None:
+        while not self._stop_sampler.wait(WORKER_MEMORY_SAMPLE_INTERVAL_SECONDS):
+            rss_mb = get_rss_mb()
+            with self._lock:
+                for in_flight in self._in_flight.values():
+                    in_flight.peak_rss_mb = max(in_flight.peak_rss_mb, rss_mb)
+
+    def before_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+    ) -> None:
+        with self._lock:
+            self._in_flight[message.message_id] = _InFlight(message.actor_name, get_rss_mb())
+
+            start_tracing = (
+                self.tracemalloc_sample_rate > 0
+                and self._traced_message_id is None
+                and not tracemalloc.is_tracing()
+                and random.random() < self.tracemalloc_sample_rate
+            )
+            if start_tracing:
+                self._traced_message_id = message.message_id
+
+        if start_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def after_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+        *,
+        result: object = None,  # noqa: ARG002
+        exception: Optional[BaseException] = None,  # noqa: ARG002
+    ) -> None:
+        rss_mb = get_rss_mb()
+
+        with self._lock:
+            in_flight = self._in_flight.pop(message.message_id, None)
+            traced = self._traced_message_id == message.message_id
+            if traced:
+                self._traced_message_id = None
+            self.processed += 1
+            processed = self.processed
+
+        if traced:
+            self._report_traced_message(message)
+
+        if in_flight is None:
+            return
+
+        growth_mb = max(in_flight.peak_rss_mb, rss_mb) - in_flight.start_rss_mb
+        self._record(in_flight.actor_name, growth_mb)
+
+        tags = {"actor": message.actor_name}
+        observe("worker.rss_growth_mb", growth_mb, tags=tags)
+        observe("worker.rss_mb", rss_mb, tags={"queue": message.queue_name})
+
+        if processed % WORKER_MEMORY_REPORT_EVERY == 0:
+            self.log_top_actors()
+
+        if self.max_rss_mb and rss_mb > self.max_rss_mb:
+            self.recycle(f"RSS {rss_mb:.0f}MB is over {self.max_rss_mb}MB")
+        elif self.max_tasks and processed >= self.max_tasks:
+            self.recycle(f"processed {processed} messages")
+
+    def after_skip_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+    ) -> None:
+        with self._lock:
+            self._in_flight.pop(message.message_id, None)
+            if self._traced_message_id == message.message_id:
+                self._traced_message_id = None
+                tracemalloc.stop()
+
+    def _record(self, actor_name: str, growth_mb: float) -> None:
+        with self._lock:
+            stats = self.actor_stats.setdefault(
+                actor_name, {"messages": 0, "total_growth_mb": 0.0, "max_growth_mb": 0.0}
+            )
+            stats["messages"] += 1
+            stats["total_growth_mb"] += growth_mb
+            stats["max_growth_mb"] = max(stats["max_growth_mb"], growth_mb)
+
+    def get_top_actors(self, n: int = WORKER_MEMORY_TOP_ACTORS) -> list[tuple[str, dict]]:
+        """Actors whose messages grew the RSS the most, worst first."""
+        with self._lock:
+            return sorted(
+                ((actor, dict(stats)) for actor, stats in self.actor_stats.items()),
+                key=lambda item: item[1]["total_growth_mb"],
+                reverse=True,
+            )[:n]
+
+    def log_top_actors(self) -> None:
+        lines = [
+            f"{actor}: {stats['total_growth_mb']:.0f}MB total / "
+            f"{stats['max_growth_mb']:.0f}MB max over {stats['messages']:.0f} messages"
+            for actor, stats in self.get_top_actors()
+        ]
+        logger.info(
+            f"RSS {get_rss_mb():.0f}MB after {self.processed} messages, top actors by RSS growth: "
+            + "; ".join(lines)
+        )
+
+    def _report_traced_message(self, message: dramatiq.Message) -> None:
+        try:
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            top_stats = tracemalloc.take_snapshot().statistics("lineno")[:5]
+        finally:
+            tracemalloc.stop()
+
+        observe(
+            "worker.traced_peak_mb", peak_bytes / (1024 * 1024), tags={"actor": message.actor_name}
+        )
+        logger.info(
+            f"{message.actor_name}({message.message_id}) Python allocations peaked at "
+            f"{peak_bytes / (1024 * 1024):.1f}MB, still allocated: "
+            + "; ".join(str(stat) for stat in top_stats)
+        )
+
+    def recycle(self, reason: str) -> None:
+        """Ask the dramatiq main process to restart the worker processes, once."""
+        with self._lock:
+            if self.recycle_requested:
+                return
+
+        parent_pid = os.getppid()
+        if not _is_dramatiq_process(parent_pid):
+            logger.warning(f"Parent process {parent_pid} is not dramatiq, not recycling: {reason}")
+            # nothing will ever restart us, stop asking
+            self.recycle_requested = True
+            return
+
+        # a second SIGHUP makes dramatiq kill its workers instead of stopping them, so only
+        # the first sibling to hit a limit sends it. The others are stopped by that SIGHUP
+        # too, or try again after the next message if it never arrives.
+        try:
+            first = get_redis_client().set(
+                _recycle_lock_key(parent_pid),
+                os.getpid(),
+                nx=True,
+                ex=WORKER_RECYCLE_LOCK_SECONDS,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to take the recycle lock, recycling anyway: {e}")
+            first = True
+
+        if not first:
+            return
+
+        with self._lock:
+            if self.recycle_requested:
+                return
+            self.recycle_requested = True
+
+        logger.warning(f"Recycling worker processes (pid {os.getpid()}): {reason}")
+        self.log_top_actors()
+        increment("worker.recycled")
+
+        # dramatiq stops its workers gracefully on SIGHUP and execs itself again
+        os.kill(parent_pid, signal.SIGHUP)
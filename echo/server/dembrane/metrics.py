@@ -0,0 +1,88 @@
+"""
+Small Redis-backed counters and timings, shared by the API, workers and scheduler.
+
+Counters are kept in one hash, timings as a capped list of recent samples per
+series, so percentiles can be computed without an external metrics stack.
+Recording never raises: a metric must not fail the work it measures.
+
+Usage:
+    increment("fair_queue.dispatched", tags={"queue": "cpu"})
+    observe("fair_queue.wait_ms", 1250.0, tags={"queue": "cpu"})
+    get_timing_summary("fair_queue.wait_ms", tags={"queue": "cpu"})
+
+Every distinct set of tags is its own series (a Redis list), so tag values must come
+from a small, fixed set: queue or provider names, never ids.
+"""
+
+from typing import Optional, cast
+from logging import getLogger
+
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.metrics")
+
+METRICS_COUNTERS_KEY = "dembrane:metrics:counters"
+METRICS_TIMINGS_KEY_PREFIX = "dembrane:metrics:timings:"
+
+# recent samples kept per timing series
+TIMING_SAMPLE_SIZE = 1000
+
+
+def _series_name(name: str, tags: Optional[dict[str, str]] = None) -> str:
+    if not tags:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(tags.items())) + "}"
+
+
+def increment(name: str, value: float = 1, tags: Optional[dict[str, str]] = None) -> None:
+    try:
+        get_redis_client().hincrbyfloat(METRICS_COUNTERS_KEY, _series_name(name, tags), value)
+    except Exception as e:
+        logger.debug(f"Failed to increment metric {name}: {e}")
+
+
+def observe(name: str, value: float, tags: Optional[dict[str, str]] = None) -> None:
+    """Record one sample of a timing (or any distribution) series."""
+    try:
+        key = METRICS_TIMINGS_KEY_PREFIX + _series_name(name, tags)
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.lpush(key, value)
+        pipe.ltrim(key, 0, TIMING_SAMPLE_SIZE - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to observe metric {name}: {e}")
+
+
+def get_counter(name: str, tags: Optional[dict[str, str]] = None) -> float:
+    value = cast(
+        Optional[bytes], get_redis_client().hget(METRICS_COUNTERS_KEY, _series_name(name, tags))
+    )
+    return float(value) if value is not None else 0.0
+
+
+def _percentile(sorted_samples: list[float], percentile: float) -> float:
+    index = min(len(sorted_samples) - 1, int(round(percentile * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def get_timing_summary(name: str, tags: Optional[dict[str, str]] = None) -> dict:
+    """
+    Summarize the recent samples of a timing series.
+
+    Returns:
+        {"count", "p50", "p95", "max"} (all 0 when there are no samples)
+    """
+    key = METRICS_TIMINGS_KEY_PREFIX + _series_name(name, tags)
+    samples = sorted(
+        float(sample) for sample in cast(list[bytes], get_redis_client().lrange(key, 0, -1))
+    )
+
+    if not samples:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    return {
+        "count": len(samples),
+        "p50": _percentile(samples, 0.5),
+        "p95": _percentile(samples, 0.95),
+        "max": samples[-1],
+    }
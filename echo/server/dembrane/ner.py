@@ -1,34 +1,53 @@
 import logging
+import threading
+from typing import TYPE_CHECKING, Optional
 
 from dembrane.config import DISABLE_REDACTION
 
 #  ,TRANKIT_CACHE_DIR
 
-logger = logging.getLogger("ner")
-
-if not DISABLE_REDACTION:
-    logger.info("Loading NER model")
+if TYPE_CHECKING:
     from trankit import Pipeline
 
-    p = Pipeline(
-        "english",
-        #  embedding="xlm-roberta-large",
-        # cache_dir=TRANKIT_CACHE_DIR,
-        gpu=False,
-    )
-    p.add("dutch")
-
-    # use langid to switch to the correct language
-    p.set_auto(True)
-else:
+logger = logging.getLogger("ner")
+
+if DISABLE_REDACTION:
     logger.info("NER redaction pipeline is disabled")
 
+# built on first use: most processes never redact, and loading the models takes seconds
+_pipeline: Optional["Pipeline"] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_ner_pipeline() -> "Pipeline":
+    global _pipeline
+
+    with _pipeline_lock:
+        if _pipeline is None:
+            logger.info("Loading NER model")
+            from trankit import Pipeline
+
+            p = Pipeline(
+                "english",
+                #  embedding="xlm-roberta-large",
+                # cache_dir=TRANKIT_CACHE_DIR,
+                gpu=False,
+            )
+            p.add("dutch")
+
+            # use langid to switch to the correct language
+            p.set_auto(True)
+
+            _pipeline = p
+
+    return _pipeline
+
 
 def anonymize_sentence(sentence: str) -> str:
     if DISABLE_REDACTION:
         return sentence
 
-    tagged_sent = p.ner(sentence, is_sent=True)
+    tagged_sent = get_ner_pipeline().ner(sentence, is_sent=True)
     text = tagged_sent["text"]
     tokens = tagged_sent["tokens"]
     redacted_text = text
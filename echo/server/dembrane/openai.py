@@ -1,10 +1,19 @@
 import logging
-
-from openai import OpenAI
+from typing import TYPE_CHECKING
+from functools import lru_cache
 
 from dembrane.config import OPENAI_API_KEY, OPENAI_API_BASE_URL
 
-client = OpenAI(base_url=OPENAI_API_BASE_URL, api_key=OPENAI_API_KEY)
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 # set openai logger to warn
 logging.getLogger("openai").setLevel(logging.WARNING)
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> "OpenAI":
+    """Created on first use, importing openai is slow."""
+    from openai import OpenAI
+
+    return OpenAI(base_url=OPENAI_API_BASE_URL, api_key=OPENAI_API_KEY)
@@ -1,10 +1,17 @@
 import time
+import atexit
+import threading
 from enum import Enum
 from typing import Any, Type, Optional
 from logging import getLogger
+from collections import OrderedDict
 from typing_extensions import Literal
 
-from dembrane.directus import directus_client_context
+import dramatiq
+
+from dembrane.utils import generate_uuid
+from dembrane.tracing import Span, start_span
+from dembrane.directus import DirectusBadRequest, DirectusServerError, directus_client_context
 
 logger = getLogger("status")
 
@@ -16,6 +23,187 @@ class ProcessingStatus(Enum):
     FAILED = "FAILED"
 
 
+# flush when this many events are buffered, or every interval, whichever comes first
+PROCESSING_STATUS_FLUSH_SIZE = 100
+PROCESSING_STATUS_FLUSH_INTERVAL_SECONDS = 2.0
+# events kept while Directus is unreachable; the oldest are dropped beyond this
+PROCESSING_STATUS_MAX_PENDING = 10_000
+# Directus ids of flushed events, kept to resolve the parent of late children
+PROCESSING_STATUS_RESOLVED_IDS_SIZE = 10_000
+# an event Directus rejected this many times is dropped (e.g. its chunk was deleted)
+PROCESSING_STATUS_MAX_ATTEMPTS = 3
+
+
+class ProcessingStatusBuffer:
+    """
+    Buffers processing_status events in-process and writes them to Directus in bulk.
+
+    Events get a local key when they are added. Children refer to their parent by
+    that key, and it is resolved to the Directus id when the child is flushed
+    (parents are always written before their children).
+
+    A background thread flushes every PROCESSING_STATUS_FLUSH_INTERVAL_SECONDS, or
+    sooner when PROCESSING_STATUS_FLUSH_SIZE events are waiting. Call flush() on
+    shutdown (ProcessingStatusMiddleware, API lifespan, atexit) so nothing is lost.
+
+    When Directus rejects a bulk write, the events are written one by one, so one
+    bad event (e.g. pointing at a deleted chunk) does not hold back the others. It
+    is retried on the next flushes and dropped after PROCESSING_STATUS_MAX_ATTEMPTS
+    rejections. Its children wait for it meanwhile.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = PROCESSING_STATUS_FLUSH_SIZE,
+        flush_interval_seconds: float = PROCESSING_STATUS_FLUSH_INTERVAL_SECONDS,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval_seconds = flush_interval_seconds
+
+        # (key, item, parent_key)
+        self._pending: list[tuple[str, dict, Optional[str]]] = []
+        self._resolved_ids: OrderedDict[str, int] = OrderedDict()
+        self._rejections: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake_up = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def add(self, item: dict, parent_key: Optional[str] = None) -> str:
+        key = generate_uuid()
+
+        with self._lock:
+            self._pending.append((key, item, parent_key))
+            if len(self._pending) > PROCESSING_STATUS_MAX_PENDING:
+                dropped = self._pending.pop(0)
+                logger.error(f"processing_status buffer is full, dropping {dropped[1]}")
+            should_wake_up = len(self._pending) >= self.flush_size
+
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(
+                    target=self._run, name="processing-status-flusher", daemon=True
+                )
+                self._flusher.start()
+
+        if should_wake_up:
+            self._wake_up.set()
+
+        return key
+
+    def _run(self) -> None:
+        while True:
+            self._wake_up.wait(self.flush_interval_seconds)
+            self._wake_up.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush processing statuses: {e}")
+
+    def flush(self) -> None:
+        """
+        Write every buffered event. While Directus is unreachable the events are kept
+        for the next flush; rejected events are kept until they run out of attempts.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+
+            # rejected events and their children, retried on the next flush
+            deferred: list[tuple[str, dict, Optional[str]]] = []
+            try:
+                # parents first: an event can only be written once its parent has an id
+                while batch:
+                    deferred_keys = {key for key, _, _ in deferred}
+                    waiting = [event for event in batch if event[2] in deferred_keys]
+                    if waiting:
+                        deferred += waiting
+                        batch = [event for event in batch if event[2] not in deferred_keys]
+                        continue
+
+                    ready = [
+                        event
+                        for event in batch
+                        if event[2] is None or event[2] in self._resolved_ids
+                    ]
+                    if not ready:
+                        # parent lost (dropped or flushed too long ago): write the rest without it
+                        logger.warning(f"Writing {len(batch)} processing statuses without parent")
+                        ready = batch
+
+                    try:
+                        self._write(ready)
+                    except DirectusServerError:
+                        raise
+                    except Exception as e:
+                        logger.warning(
+                            f"Bulk write of {len(ready)} processing statuses failed, "
+                            f"writing them one by one: {e}"
+                        )
+                        deferred += self._write_one_by_one(ready)
+
+                    ready_keys = {key for key, _, _ in ready}
+                    batch = [event for event in batch if event[0] not in ready_keys]
+            finally:
+                with self._lock:
+                    self._pending = deferred + batch + self._pending
+
+    def _write_one_by_one(
+        self, events: list[tuple[str, dict, Optional[str]]]
+    ) -> list[tuple[str, dict, Optional[str]]]:
+        """Write events individually. Returns the events to retry on the next flush."""
+        deferred: list[tuple[str, dict, Optional[str]]] = []
+        for i, event in enumerate(events):
+            key, item, _ = event
+            try:
+                self._write([event])
+            except DirectusServerError:
+                return deferred + events[i:]
+            except DirectusBadRequest as e:
+                rejections = self._rejections.get(key, 0) + 1
+                if rejections < PROCESSING_STATUS_MAX_ATTEMPTS:
+                    self._rejections[key] = rejections
+                    deferred.append(event)
+                else:
+                    self._rejections.pop(key, None)
+                    logger.error(f"Dropping processing status rejected by Directus: {item}: {e}")
+            except Exception as e:
+                logger.warning(f"Failed to write processing status, retrying later: {e}")
+                deferred.append(event)
+            else:
+                self._rejections.pop(key, None)
+        return deferred
+
+    def _write(self, events: list[tuple[str, dict, Optional[str]]]) -> None:
+        items = [
+            {**item, "parent_id": self._resolved_ids.get(parent_key) if parent_key else None}
+            for _, item, parent_key in events
+        ]
+
+        with directus_client_context() as client:
+            created = client.create_item("processing_status", item_data=items)["data"]
+
+        # Directus returns bulk-created items in the order they were sent
+        for (key, _, _), created_item in zip(events, created, strict=True):
+            self._resolved_ids[key] = created_item["id"]
+        while len(self._resolved_ids) > PROCESSING_STATUS_RESOLVED_IDS_SIZE:
+            self._resolved_ids.popitem(last=False)
+
+
+processing_status_buffer = ProcessingStatusBuffer()
+atexit.register(processing_status_buffer.flush)
+
+
+class ProcessingStatusMiddleware(dramatiq.Middleware):
+    """Flushes buffered processing statuses when a worker shuts down."""
+
+    def after_worker_shutdown(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        worker: dramatiq.Worker,  # noqa: ARG002
+    ) -> None:
+        processing_status_buffer.flush()
+
+
 def add_processing_status(
     conversation_id: Optional[str] = None,
     conversation_chunk_id: Optional[str] = None,
@@ -24,23 +212,30 @@ def add_processing_status(
     event: Optional[str] = None,
     message: Optional[str] = None,
     duration_ms: Optional[int] = None,
-    parent_id: Optional[int] = None,
-) -> int:
+    parent_id: Optional[str] = None,
+) -> str:
+    """
+    Queue a processing_status event, see ProcessingStatusBuffer.
+
+    Args:
+        parent_id: The key returned by add_processing_status for the parent event. (str)
+
+    Returns:
+        The key of the event, to be used as parent_id of its children. (str)
+    """
     logger.info(f"{event} {message} - {duration_ms}")
-    with directus_client_context() as client:
-        return client.create_item(
-            "processing_status",
-            {
-                "conversation_id": conversation_id,
-                "conversation_chunk_id": conversation_chunk_id,
-                "project_id": project_id,
-                "project_analysis_run_id": project_analysis_run_id,
-                "event": event,
-                "message": message,
-                "duration_ms": duration_ms,
-                "parent_id": parent_id,
-            },
-        )["data"]["id"]
+    return processing_status_buffer.add(
+        {
+            "conversation_id": conversation_id,
+            "conversation_chunk_id": conversation_chunk_id,
+            "project_id": project_id,
+            "project_analysis_run_id": project_analysis_run_id,
+            "event": event,
+            "message": message,
+            "duration_ms": duration_ms,
+        },
+        parent_key=parent_id,
+    )
 
 
 def set_error_status(
@@ -103,6 +298,9 @@ class ProcessingStatusContext:
             conversation_chunk_id: The ID of the conversation chunk. (str)
             message: The message to log. (str)
             event_prefix: The prefix of the event. (str) Conventionally, you will see this being set to method name.
+
+        Events are buffered and written in bulk (see ProcessingStatusBuffer), so
+        entering and leaving the context does not wait for Directus.
         """
         self.project_id = project_id
         self.project_analysis_run_id = project_analysis_run_id
@@ -113,10 +311,11 @@ class ProcessingStatusContext:
         self.exit_message: Optional[str] = None  # Custom exit message
         self.start_time: float = 0.0
         self.logger = getLogger(f"status.{self.event_prefix}")
+        self.span: Optional[Span] = None
 
-        self.processing_status_start_id: Optional[int] = None
-        self.processing_status_failed_id: Optional[int] = None
-        self.processing_status_completed_id: Optional[int] = None
+        self.processing_status_start_id: Optional[str] = None
+        self.processing_status_failed_id: Optional[str] = None
+        self.processing_status_completed_id: Optional[str] = None
 
     def set_exit_message(self, message: str) -> None:
         """Set a custom message to be used in the exit event."""
@@ -125,6 +324,14 @@ class ProcessingStatusContext:
     def __enter__(self) -> "ProcessingStatusContext":
         # Log start event without duration
         self.start_time = time.time()
+        self.span = start_span(
+            str(self.event_prefix),
+            attributes={
+                "conversation_id": self.conversation_id,
+                "conversation_chunk_id": self.conversation_chunk_id,
+                "project_id": self.project_id,
+            },
+        )
         self.processing_status_start_id = add_processing_status(
             project_id=self.project_id,
             project_analysis_run_id=self.project_analysis_run_id,
@@ -143,6 +350,8 @@ class ProcessingStatusContext:
         traceback: Any,
     ) -> Literal[False]:
         duration_ms = int((time.time() - self.start_time) * 1000)
+        if self.span is not None:
+            self.span.end(error=exc_value)
         # if exception occurs, log FAILED event with error message and duration
 
         if exc_type:
@@ -186,3 +395,15 @@ class ProcessingStatusContext:
             )
 
         return False
+
+    # nothing blocks anymore, `async with` is supported for async actors
+    async def __aenter__(self) -> "ProcessingStatusContext":
+        return self.__enter__()
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Any,
+    ) -> Literal[False]:
+        return self.__exit__(exc_type, exc_value, traceback)
@@ -0,0 +1,331 @@
+"""
+On-demand sampling profiler for API and worker processes.
+
+A SamplingProfiler thread looks at the stacks of the other threads every
+PROFILER_SAMPLE_INTERVAL_SECONDS (sys._current_frames, no tracing hooks, so
+the overhead is low) and counts them in collapsed-stack format: one line per
+distinct stack, `root;...;leaf <samples>`, which flamegraph.pl, speedscope
+and inferno read directly. Profiles are written to S3 under
+profiles/{label}/{hostname}-{pid}-{timestamp}.folded.
+
+Ways to start one:
+- POST /api/admin/profile {"target": "api" | "worker" | "all", "seconds": 30}
+  publishes a request that every API / worker process listening on Redis
+  picks up (start_profile_listener).
+- kill -USR2 <pid> profiles that process for PROFILER_DEFAULT_SECONDS (signal
+  handler installed by install_profile_signal_handler). Send it to a worker
+  process, not to the dramatiq main process.
+- PROFILE_ACTORS="task_merge_conversation_chunks:0.05" profiles 5% of the
+  messages of that actor (ProfilerMiddleware, installed in dembrane.tasks).
+
+Only stacks of OS threads are visible: on gevent workers the greenlets share
+one thread, so a profile shows whatever greenlet was running (CPU time), not
+where waiting greenlets are parked.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import threading
+from types import FrameType
+from typing import Any, Optional, cast
+from logging import getLogger
+from collections import Counter
+
+import dramatiq
+
+from dembrane.config import PROFILE_ACTORS, STORAGE_S3_BUCKET
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.profiler")
+
+PROFILER_SAMPLE_INTERVAL_SECONDS = 0.01
+PROFILER_DEFAULT_SECONDS = 30
+PROFILER_MAX_SECONDS = 300
+PROFILER_CHANNEL = "dembrane:profiler:requests"
+PROFILER_TARGETS = ("api", "worker", "all")
+
+# one process-wide profile at a time (signal / admin request)
+_process_profile_lock = threading.Lock()
+
+
+def _native(module_name: str, name: str) -> Any:
+    """The function from before gevent monkey patching, if any: the sampler must run on an
+    OS thread of its own, a greenlet would only ever see its own stack."""
+    try:
+        from gevent.monkey import get_original
+
+        return get_original(module_name, name)
+    except ImportError:
+        return getattr(__import__(module_name), name)
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # .../site-packages/pandas/core/frame.py -> pandas/core/frame.py
+    if "site-packages/" in filename:
+        filename = filename.split("site-packages/", 1)[1]
+    elif "/dembrane/" in filename:
+        filename = "dembrane/" + filename.rsplit("/dembrane/", 1)[1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame: Optional[FrameType], root: str) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join([root, *reversed(names)])
+
+
+def get_os_thread_id() -> int:
+    return _native("_thread", "get_ident")()
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the other OS threads (or only of `thread_id`, see
+    get_os_thread_id) until stopped.
+    """
+
+    def __init__(
+        self,
+        thread_id: Optional[int] = None,
+        interval: float = PROFILER_SAMPLE_INTERVAL_SECONDS,
+    ):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stopping = False
+        self._stopped = False
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.time()
+        _native("_thread", "start_new_thread")(self._run, ())
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stopping = True
+        while not self._stopped:
+            time.sleep(self.interval)
+        self.duration = time.time() - self.started_at
+        return self
+
+    def _run(self) -> None:
+        try:
+            self._sample()
+        finally:
+            self._stopped = True
+
+    def _sample(self) -> None:
+        sleep = _native("time", "sleep")
+        own_thread_id = get_os_thread_id()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        while not self._stopping:
+            sleep(self.interval)
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = (
+                    {self.thread_id: frames[self.thread_id]} if self.thread_id in frames else {}
+                )
+
+            for thread_id, frame in frames.items():
+                if thread_id == own_thread_id:
+                    continue
+                if thread_id not in thread_names:
+                    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.stacks[_collapse(frame, thread_names.get(thread_id, str(thread_id)))] += 1
+
+            self.samples += 1
+
+    def to_collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+def upload_profile(profiler: SamplingProfiler, label: str) -> str:
+    """
+    Returns:
+        The S3 key of the collapsed-stack file. (str)
+    """
+    from dembrane.s3 import s3_client
+
+    timestamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(profiler.started_at))
+    key = f"profiles/{label}/{socket.gethostname()}-{os.getpid()}-{timestamp}.folded"
+
+    s3_client.put_object(
+        Bucket=STORAGE_S3_BUCKET,
+        Key=key,
+        Body=profiler.to_collapsed().encode(),
+        ACL="private",
+    )
+    logger.info(
+        f"Profile {label} ({profiler.duration:.1f}s, {profiler.samples} samples) written to {key}"
+    )
+    return key
+
+
+def profile_process(seconds: int, label: str) -> bool:
+    """
+    Profile every thread of this process for `seconds` in the background and upload it.
+
+    Returns:
+        False if a profile of this process is already running. (bool)
+    """
+    seconds = max(1, min(int(seconds), PROFILER_MAX_SECONDS))
+
+    if not _process_profile_lock.acquire(blocking=False):
+        logger.info("A profile is already running in this process, skipping")
+        return False
+
+    def run() -> None:
+        try:
+            profiler = SamplingProfiler().start()
+            time.sleep(seconds)
+            upload_profile(profiler.stop(), label)
+        except Exception as e:
+            logger.error(f"Failed to profile {label}: {e}")
+        finally:
+            _process_profile_lock.release()
+
+    logger.info(f"Profiling {label} for {seconds}s")
+    threading.Thread(target=run, name="profile-process", daemon=True).start()
+    return True
+
+
+def request_profile(target: str, seconds: int) -> int:
+    """
+    Ask the API and/or worker processes to profile themselves.
+
+    Returns:
+        The number of processes that received the request. (int)
+    """
+    if target not in PROFILER_TARGETS:
+        raise ValueError(f"target must be one of {PROFILER_TARGETS}")
+
+    return cast(
+        int,
+        get_redis_client().publish(
+            PROFILER_CHANNEL, json.dumps({"target": target, "seconds": seconds})
+        ),
+    )
+
+
+def start_profile_listener(role: str) -> None:
+    """Profile this process when a request for `role` ("api" / "worker") is published."""
+
+    def listen() -> None:
+        while True:
+            try:
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(PROFILER_CHANNEL)
+                for message in pubsub.listen():
+                    request = json.loads(message["data"])
+                    if request["target"] in (role, "all"):
+                        profile_process(request["seconds"], label=role)
+            except Exception as e:
+                logger.warning(f"Profile listener failed, restarting: {e}")
+                time.sleep(5)
+
+    threading.Thread(target=listen, name="profile-listener", daemon=True).start()
+
+
+def install_profile_signal_handler(role: str) -> None:
+    """SIGUSR2 profiles this process for PROFILER_DEFAULT_SECONDS. Call from the main thread."""
+    if not hasattr(signal, "SIGUSR2"):
+        return
+
+    def handler(signum: int, frame: Any) -> None:  # noqa: ARG001
+        profile_process(PROFILER_DEFAULT_SECONDS, label=role)
+
+    signal.signal(signal.SIGUSR2, handler)
+
+
+def parse_profile_actors(value: str) -> dict[str, float]:
+    """ "actor_a:0.1,actor_b" -> {"actor_a": 0.1, "actor_b": 1.0}"""
+    actors = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        actor_name, _, rate = item.strip().partition(":")
+        actors[actor_name] = float(rate) if rate else 1.0
+    return actors
+
+
+class ProfilerMiddleware(dramatiq.Middleware):
+    """
+    Listens for profile requests in worker processes, and profiles a sample of the
+    messages of the actors in PROFILE_ACTORS (one message at a time per process).
+    """
+
+    def __init__(self, profile_actors: Optional[dict[str, float]] = None):
+        self.profile_actors = (
+            profile_actors if profile_actors is not None else parse_profile_actors(PROFILE_ACTORS)
+        )
+        self._lock = threading.Lock()
+        self._profiled_message_id: Optional[str] = None
+        self._profiler: Optional[SamplingProfiler] = None
+
+    def after_worker_boot(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        worker: dramatiq.Worker,  # noqa: ARG002
+    ) -> None:
+        start_profile_listener("worker")
+        try:
+            install_profile_signal_handler("worker")
+        except ValueError:
+            # not the main thread
+            logger.debug("Not installing the profile signal handler")
+
+    def before_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+    ) -> None:
+        rate = self.profile_actors.get(message.actor_name)
+        if not rate or random.random() >= rate:
+            return
+
+        with self._lock:
+            if self._profiled_message_id is not None:
+                return
+            self._profiled_message_id = message.message_id
+
+        self._profiler = SamplingProfiler(thread_id=get_os_thread_id()).start()
+
+    def after_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+        *,
+        result: object = None,  # noqa: ARG002
+        exception: Optional[BaseException] = None,  # noqa: ARG002
+    ) -> None:
+        if self._profiled_message_id != message.message_id or self._profiler is None:
+            return
+
+        profiler = self._profiler.stop()
+        with self._lock:
+            self._profiler = None
+            self._profiled_message_id = None
+
+        def upload() -> None:
+            try:
+                upload_profile(profiler, label=f"actors/{message.actor_name}")
+            except Exception as e:
+                logger.error(f"Failed to upload the profile of {message.message_id}: {e}")
+
+        # keep the S3 round trip off the worker thread
+        threading.Thread(target=upload, name="profile-upload", daemon=True).start()
+
+    def after_skip_message(self, broker: dramatiq.Broker, message: dramatiq.Message) -> None:
+        self.after_process_message(broker, message)
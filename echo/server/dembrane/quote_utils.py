@@ -2,16 +2,14 @@ import re
 import json
 import random
 import logging
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
+from functools import lru_cache
 
 import numpy as np
-import pandas as pd
-import tiktoken
 from litellm import completion
 from pydantic import BaseModel
 from sqlalchemy import func, select, literal
 from sqlalchemy.orm import Session
-from sklearn.cluster import KMeans
 from pgvector.sqlalchemy import Vector
 
 from dembrane.s3 import save_to_s3_from_url
@@ -27,7 +25,7 @@ from dembrane.config import (
     LARGE_LITELLM_API_VERSION,
     SMALL_LITELLM_API_VERSION,
 )
-from dembrane.openai import client
+from dembrane.openai import get_openai_client
 from dembrane.prompts import render_prompt
 from dembrane.database import (
     ViewModel,
@@ -38,10 +36,12 @@ from dembrane.database import (
     ProcessingStatusEnum,
     ConversationChunkModel,
 )
-from dembrane.anthropic import count_tokens_anthropic
 from dembrane.embedding import EMBEDDING_DIM, embed_text
 from dembrane.image_utils import brilliant_image_generator_3000
 
+if TYPE_CHECKING:
+    from tiktoken import Encoding
+
 logger = logging.getLogger("quote_utils")
 
 np.random.seed(0)
@@ -258,14 +258,20 @@ def generate_quotes(
     return quotes
 
 
-encoding = tiktoken.encoding_for_model("gpt-4o")
+@lru_cache(maxsize=1)
+def get_token_encoding() -> "Encoding":
+    import tiktoken
+
+    return tiktoken.encoding_for_model("gpt-4o")
 
 
 def count_tokens(text: str, provider: str = "openai") -> int:
     if provider == "anthropic":
+        from dembrane.anthropic import count_tokens_anthropic
+
         return count_tokens_anthropic(text)
 
-    return len(encoding.encode(text))
+    return len(get_token_encoding().encode(text))
 
 
 # TODO: fix the sampling algo
@@ -830,7 +836,7 @@ def generate_aspect_image(db: Session, aspect_id: str) -> AspectModel:
                 },
             )
 
-            response = client.images.generate(
+            response = get_openai_client().images.generate(
                 model="dall-e-3",
                 prompt=prompt,
                 size="1024x1024",
@@ -843,7 +849,7 @@ def generate_aspect_image(db: Session, aspect_id: str) -> AspectModel:
                 "edit the prompt so that it is in compliance with security guidelines."
             )
             try:
-                response = client.images.generate(
+                response = get_openai_client().images.generate(
                     model="dall-e-3",
                     prompt=prompt + additional_info,
                     size="1024x1024",
@@ -1072,6 +1078,10 @@ def initialize_insights(db: Session, project_analysis_run_id: str) -> List[str]:
         logger.error(f"No quotes found for project analysis run {project_analysis_run_id}")
         return []
 
+    # heavy, only needed here
+    import pandas as pd
+    from sklearn.cluster import KMeans
+
     df = pd.DataFrame(
         [
             {
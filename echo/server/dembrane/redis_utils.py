@@ -0,0 +1,48 @@
+import asyncio
+from logging import getLogger
+from weakref import WeakKeyDictionary
+
+import redis
+import redis.asyncio
+
+from dembrane.config import REDIS_URL
+
+logger = getLogger("dembrane.redis_utils")
+
+_redis_client: redis.Redis | None = None
+_async_redis_clients_by_loop: WeakKeyDictionary[asyncio.AbstractEventLoop, redis.asyncio.Redis] = (
+    WeakKeyDictionary()
+)
+
+
+def get_redis_client() -> redis.Redis:
+    """
+    Return the process-wide Redis client used for application state
+    (activity indexes, timers, counters...). This is *not* the broker connection,
+    which lives on database 1 (see dembrane.tasks).
+    """
+    global _redis_client
+    if _redis_client is None:
+        assert REDIS_URL, "REDIS_URL environment variable is not set"
+        _redis_client = redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def _create_async_redis_client() -> redis.asyncio.Redis:
+    assert REDIS_URL, "REDIS_URL environment variable is not set"
+    return redis.asyncio.from_url(REDIS_URL)
+
+
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """
+    Return the async counterpart of get_redis_client for the running event loop, for
+    code that waits on Redis from async endpoints (e.g. pubsub). Like
+    dembrane.http_client, clients are bound to their loop and kept per loop.
+    """
+    loop = asyncio.get_running_loop()
+
+    client = _async_redis_clients_by_loop.get(loop)
+    if client is None:
+        client = _create_async_redis_client()
+        _async_redis_clients_by_loop[loop] = client
+    return client
@@ -1,13 +1,28 @@
+import time
+import asyncio
+from typing import Optional
 from logging import getLogger
 
+import httpx
 import backoff
 import requests
+from dramatiq import group
 
 from dembrane.tasks import task_finish_conversation_hook
 from dembrane.config import RUNPOD_WHISPER_API_KEY
 from dembrane.service import conversation_service
-from dembrane.service.conversation import ConversationChunkNotFoundException
-from dembrane.processing_status_utils import ProcessingStatusContext, set_error_status
+from dembrane.tracing import SPAN_KIND_CLIENT, record_span, pop_chunk_trace
+from dembrane.http_client import get_async_http_client
+from dembrane.transcript_cache import cache_pending_transcript
+from dembrane.service.conversation import (
+    ConversationServiceException,
+    ConversationChunkNotFoundException,
+)
+from dembrane.processing_status_utils import (
+    ProcessingStatusContext,
+    set_error_status,
+    add_processing_status,
+)
 
 logger = getLogger("dembrane.runpod")
 
@@ -33,18 +48,22 @@ def get_runpod_transcription_response(status_link: str) -> dict:
     )
 
 
-def load_runpod_transcription_response(payload: dict) -> None:
-    logger.debug("=== ENTERING load_runpod_transcription_response ===")
-    logger.debug(f"Loading runpod transcription response: {payload}")
+def _parse_runpod_transcription_response(payload: dict) -> Optional[tuple[str, dict]]:
+    """
+    Validate a RunPod webhook payload.
 
+    Returns:
+        (conversation_chunk_id, chunk update), where the update only has an "error"
+        for failed jobs. None when there is nothing to apply.
+    """
     # Validate payload structure
     if not isinstance(payload, dict):
         logger.error(f"Invalid payload type - expected dict, got {type(payload)}: {payload}")
-        return
+        return None
 
     if "output" not in payload:
         logger.error(f"Invalid payload structure - missing 'output' key: {payload}")
-        return
+        return None
 
     output = payload["output"]
 
@@ -57,13 +76,13 @@ def load_runpod_transcription_response(payload: dict) -> None:
         if output and isinstance(output[0], dict) and "error" in output[0]:
             error_msg = output[0].get("error", "Unknown error from RunPod")
             logger.error(f"RunPod returned error in list format: {error_msg}")
-        return
+        return None
 
     if not isinstance(output, dict):
         logger.error(
             f"Unexpected payload structure - 'output' is not a dict: {type(output)}, payload: {payload}"
         )
-        return
+        return None
 
     # Check if this is an error response
     if "error" in output and output.get("error"):
@@ -71,17 +90,14 @@ def load_runpod_transcription_response(payload: dict) -> None:
         # Try to get conversation_chunk_id to set error status
         conversation_chunk_id = output.get("conversation_chunk_id")
         if conversation_chunk_id:
-            set_error_status(
-                conversation_chunk_id=conversation_chunk_id,
-                error=f"RunPod error: {output.get('error')}",
-            )
-        return
+            return conversation_chunk_id, {"error": f"RunPod error: {output.get('error')}"}
+        return None
 
     # Extract conversation_chunk_id with proper error handling
     conversation_chunk_id = output.get("conversation_chunk_id")
     if not conversation_chunk_id:
         logger.error(f"Missing conversation_chunk_id in payload output: {payload}")
-        return
+        return None
 
     logger.debug(f"Found conversation_chunk_id: {conversation_chunk_id}")
     # Check if status indicates failure
@@ -89,17 +105,55 @@ def load_runpod_transcription_response(payload: dict) -> None:
     logger.debug(f"Status: {status}")
     if status == "FAILED":
         logger.error(f"RunPod job failed for chunk {conversation_chunk_id}: {payload}")
-        set_error_status(
-            conversation_chunk_id=conversation_chunk_id,
-            error=f"RunPod job failed: {output.get('error', 'Unknown error')}",
-        )
-        return
+        return conversation_chunk_id, {
+            "error": f"RunPod job failed: {output.get('error', 'Unknown error')}"
+        }
 
     # Only proceed if status is COMPLETED
     if status != "COMPLETED":
         logger.warning(
             f"RunPod job not completed for chunk {conversation_chunk_id}, status: {status}"
         )
+        return None
+
+    return conversation_chunk_id, _get_chunk_update_from_runpod_output(output)
+
+
+def _record_runpod_job_span(conversation_chunk_id: str, chunk_update: dict) -> None:
+    """Close the trace of a chunk from the moment its job was queued (dembrane.tracing)."""
+    trace = pop_chunk_trace(conversation_chunk_id)
+    if trace is None:
+        return
+
+    parent, queued_at = trace
+    record_span(
+        "runpod.job",
+        parent=parent,
+        start_time=queued_at,
+        end_time=time.time(),
+        kind=SPAN_KIND_CLIENT,
+        attributes={
+            "conversation_chunk_id": conversation_chunk_id,
+            "runpod.error": chunk_update.get("error"),
+        },
+    )
+
+
+def load_runpod_transcription_response(payload: dict) -> None:
+    logger.debug("=== ENTERING load_runpod_transcription_response ===")
+    logger.debug(f"Loading runpod transcription response: {payload}")
+
+    parsed = _parse_runpod_transcription_response(payload)
+    if parsed is None:
+        return
+
+    conversation_chunk_id, chunk_update = parsed
+    _record_runpod_job_span(conversation_chunk_id, chunk_update)
+    if "transcript" not in chunk_update:
+        set_error_status(
+            conversation_chunk_id=conversation_chunk_id,
+            error=chunk_update["error"],
+        )
         return
 
     try:
@@ -148,78 +202,290 @@ def load_runpod_transcription_response(payload: dict) -> None:
         }
         """
 
-        # Now we know output is a dict, so we can safely access its properties
-        hallucination_reason = output.get("hallucination_reason", None)
-        hallucination_score = output.get("hallucination_score", None)
-        translation_error = output.get("translation_error", False)
+        logger.debug("Updating chunk in database...")
+        conversation_service.update_chunk(
+            chunk_id=chunk["id"],
+            **chunk_update,
+        )
+        cache_pending_transcript(chunk["id"], chunk_update)
 
-        if translation_error and hallucination_score is None:
-            hallucination_score = 0.5
-            hallucination_reason = "There seems to be an internal model error with translation."
+        _finish_conversation_if_all_chunks_processed(conversation_id)
 
-        joined_text = output.get("joined_text", "")
-        translation_text = output.get("translation_text")
+        logger.debug(
+            f"Updated chunk with transcript: {chunk['id']} - length: {len(chunk_update['transcript'])}"
+        )
 
-        # transcript should always be there - use translation_text if available, otherwise joined_text
-        transcript = translation_text if translation_text else joined_text
-        logger.debug(f"Transcript: {len(transcript) if transcript else 0}")
 
-        # raw_transcript is null if translation_text is null or if they are the same
-        if translation_text is None or translation_text == joined_text:
-            raw_transcript = None
-            logger.debug("Setting raw_transcript to None (no translation or same as original)")
-        else:
-            raw_transcript = joined_text
-            logger.debug(f"Raw transcript: {len(raw_transcript)}")
+def apply_runpod_transcription_responses(payloads: list[dict]) -> None:
+    """
+    Apply a batch of RunPod webhook payloads (see dembrane.webhook_queue).
 
-        desired_language = output.get("language")
-        detected_language = output.get("detected_language")
-        detected_language_confidence = output.get("detected_language_confidence")
+    All chunks are written with one bulk update and the completion check runs once
+    per conversation. If the bulk update is rejected (e.g. a chunk was deleted in
+    the meantime) the payloads are applied one by one instead.
+    """
+    chunk_updates: dict[str, dict] = {}
+    for payload in payloads:
+        parsed = _parse_runpod_transcription_response(payload)
+        if parsed is not None:
+            # a redelivered callback for the same chunk replaces the earlier one
+            chunk_updates[parsed[0]] = parsed[1]
+            _record_runpod_job_span(*parsed)
 
-        error = output.get("error", None)
-        if not transcript:
-            error = error or ""
-            error += "No transcript"
+    if not chunk_updates:
+        return
 
-        logger.debug("Updating chunk in database...")
-        conversation_service.update_chunk(
-            chunk_id=chunk["id"],
-            raw_transcript=raw_transcript,
-            transcript=transcript,
-            runpod_job_status_link=None,
-            hallucination_reason=hallucination_reason,
-            hallucination_score=hallucination_score,
-            error=error,
-            desired_language=desired_language,
-            detected_language=detected_language,
-            detected_language_confidence=detected_language_confidence,
+    try:
+        chunks = conversation_service.update_chunks(chunk_updates)
+    except ConversationServiceException as e:
+        logger.warning(
+            f"Bulk update of {len(chunk_updates)} chunks failed, applying one by one: {e}"
         )
+        for payload in payloads:
+            load_runpod_transcription_response(payload)
+        return
 
-        counts = conversation_service.get_chunk_counts(conversation_id)
-        logger.debug(counts)
+    for chunk_id, chunk_update in chunk_updates.items():
+        if "transcript" in chunk_update:
+            cache_pending_transcript(chunk_id, chunk_update)
 
-        # Trigger follow-up processing only when either:
-        #   a) the participant signalled they are done (conversation.is_finished == True), _and_
-        #   b) we have processed all currently known chunks.
-        # This prevents finishing the conversation too early when the participant is still uploading.
-        if counts["processed"] == counts["total"]:
+    for chunk in chunks:
+        add_processing_status(
+            conversation_id=chunk["conversation_id"],
+            conversation_chunk_id=chunk["id"],
+            event="load_runpod_transcription_response.batched",
+            message=f"applied with {len(chunks) - 1} other webhooks",
+        )
+
+    for conversation_id in {chunk["conversation_id"] for chunk in chunks}:
+        _finish_conversation_if_all_chunks_processed(conversation_id)
+
+
+def _get_chunk_update_from_runpod_output(output: dict) -> dict:
+    """Map a completed RunPod job output onto conversation_chunk fields."""
+    hallucination_reason = output.get("hallucination_reason", None)
+    hallucination_score = output.get("hallucination_score", None)
+    translation_error = output.get("translation_error", False)
+
+    if translation_error and hallucination_score is None:
+        hallucination_score = 0.5
+        hallucination_reason = "There seems to be an internal model error with translation."
+
+    joined_text = output.get("joined_text", "")
+    translation_text = output.get("translation_text")
+
+    # transcript should always be there - use translation_text if available, otherwise joined_text
+    transcript = translation_text if translation_text else joined_text
+    logger.debug(f"Transcript: {len(transcript) if transcript else 0}")
+
+    # raw_transcript is null if translation_text is null or if they are the same
+    if translation_text is None or translation_text == joined_text:
+        raw_transcript = None
+        logger.debug("Setting raw_transcript to None (no translation or same as original)")
+    else:
+        raw_transcript = joined_text
+        logger.debug(f"Raw transcript: {len(raw_transcript)}")
+
+    error = output.get("error", None)
+    if not transcript:
+        error = error or ""
+        error += "No transcript"
+
+    return {
+        "raw_transcript": raw_transcript,
+        "transcript": transcript,
+        "runpod_job_status_link": None,
+        "hallucination_reason": hallucination_reason,
+        "hallucination_score": hallucination_score,
+        "error": error,
+        "desired_language": output.get("language"),
+        "detected_language": output.get("detected_language"),
+        "detected_language_confidence": output.get("detected_language_confidence"),
+    }
+
+
+def _finish_conversation_if_all_chunks_processed(conversation_id: str) -> None:
+    counts = conversation_service.get_chunk_counts(conversation_id)
+    logger.debug(counts)
+
+    # Trigger follow-up processing only when either:
+    #   a) the participant signalled they are done (conversation.is_finished == True), _and_
+    #   b) we have processed all currently known chunks.
+    # This prevents finishing the conversation too early when the participant is still uploading.
+    if counts["processed"] == counts["total"]:
+        try:
+            conversation = conversation_service.get_by_id_or_raise(conversation_id)
+            is_finished = conversation.get("is_finished", False)
+            if is_finished:
+                logger.info(
+                    f"All chunks processed _and_ conversation {conversation_id} marked finished; running follow-up tasks."
+                )
+                task_finish_conversation_hook.send(conversation_id)
+            else:
+                logger.debug(
+                    f"All currently known chunks processed for conversation {conversation_id}, but it is not marked finished yet. Skipping finish hook for now."
+                )
+        except Exception as e:
+            logger.error(
+                f"Could not verify conversation status for {conversation_id}: {e} – skipping finish hook for now"
+            )
+
+
+# RunPod statuses of jobs that have not reached a final state yet
+RUNPOD_PENDING_STATUSES = {"IN_QUEUE", "IN_PROGRESS"}
+
+# final statuses of jobs that produced no output, the chunk is transcribed again
+RUNPOD_REQUEUE_STATUSES = {"CANCELLED", "TIMED_OUT"}
+
+# reported for a job RunPod answers 404 for (expired or unknown job id)
+RUNPOD_NOT_FOUND_STATUS = "NOT_FOUND"
+
+# max status requests in flight at once during a reconciliation
+RUNPOD_RECONCILE_CONCURRENCY = 20
+
+
+class RunPodStatusUnavailableException(Exception):
+    pass
+
+
+async def _fetch_runpod_statuses(status_links: dict[str, str]) -> dict[str, Optional[dict]]:
+    """
+    Fetch the status of many RunPod jobs concurrently over the shared pooled client.
+
+    Network errors and non-200 responses are retried with backoff. A 404 is reported
+    as RUNPOD_NOT_FOUND_STATUS.
+
+    Returns:
+        chunk_id -> status payload, or None if the status could not be fetched after
+        the retries. Those chunks are left alone for the next reconciliation.
+    """
+    headers = {
+        "Authorization": f"Bearer {RUNPOD_WHISPER_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    client = get_async_http_client()
+    semaphore = asyncio.Semaphore(RUNPOD_RECONCILE_CONCURRENCY)
+
+    @backoff.on_exception(
+        backoff.expo,
+        (httpx.HTTPError, RunPodStatusUnavailableException),
+        max_tries=3,
+        max_time=30,
+    )
+    async def fetch_status(status_link: str) -> dict:
+        response = await client.get(status_link, headers=headers, timeout=30)
+        if response.status_code == 404:
+            return {"status": RUNPOD_NOT_FOUND_STATUS}
+        if response.status_code != 200:
+            raise RunPodStatusUnavailableException(
+                f"Non-200 response for status link {status_link}: {response.status_code}"
+            )
+        return response.json()
+
+    async def fetch(chunk_id: str, status_link: str) -> tuple[str, Optional[dict]]:
+        async with semaphore:
             try:
-                conversation = conversation_service.get_by_id_or_raise(conversation_id)
-                is_finished = conversation.get("is_finished", False)
-                if is_finished:
-                    logger.info(
-                        f"All chunks processed _and_ conversation {conversation_id} marked finished; running follow-up tasks."
-                    )
-                    task_finish_conversation_hook.send(conversation_id)
-                else:
-                    logger.debug(
-                        f"All currently known chunks processed for conversation {conversation_id}, but it is not marked finished yet. Skipping finish hook for now."
-                    )
+                return chunk_id, await fetch_status(status_link)
             except Exception as e:
-                logger.error(
-                    f"Could not verify conversation status for {conversation_id}: {e} – skipping finish hook for now"
-                )
+                logger.error(f"Error fetching RunPod status for chunk {chunk_id}: {e}")
+                return chunk_id, None
 
-        logger.debug(
-            f"Updated chunk with transcript: {chunk['id']} - length: {len(output.get('joined_text', ''))}"
+    results = await asyncio.gather(
+        *[fetch(chunk_id, status_link) for chunk_id, status_link in status_links.items()]
+    )
+
+    return dict(results)
+
+
+def _close_reconciled_jobs(chunk_updates: dict[str, dict], errors: dict[str, str]) -> None:
+    """What the webhook paths do after writing a job back: trace it and cache its result."""
+    for chunk_id, chunk_update in chunk_updates.items():
+        _record_runpod_job_span(
+            chunk_id, {"error": errors[chunk_id]} if chunk_id in errors else chunk_update
+        )
+        if "transcript" in chunk_update:
+            cache_pending_transcript(chunk_id, chunk_update)
+
+
+async def reconcile_runpod_transcription_jobs(chunks: list[dict]) -> dict[str, int]:
+    """
+    Reconcile a page of chunks that still have a runpod_job_status_link.
+
+    Statuses are checked concurrently, finished jobs are written back with one bulk
+    update and the finish hook check runs once per conversation instead of once per
+    chunk. Only jobs that RunPod reports as gone (404, cancelled, timed out) are
+    re-queued for transcription; a status that cannot be fetched is retried on the
+    next reconciliation, so an outage does not pay for duplicate transcriptions.
+
+    Args:
+        chunks: [{"id", "conversation_id", "runpod_job_status_link"}, ...]
+
+    Returns:
+        Counts per outcome: {"completed", "failed", "pending", "requeued", "unavailable"}
+    """
+    from dembrane.tasks import task_transcribe_chunk
+
+    chunks_by_id = {chunk["id"]: chunk for chunk in chunks}
+    statuses = await _fetch_runpod_statuses(
+        {chunk["id"]: chunk["runpod_job_status_link"] for chunk in chunks},
+    )
+
+    chunk_updates: dict[str, dict] = {}
+    errors: dict[str, str] = {}
+    requeue_chunk_ids: list[str] = []
+    pending = 0
+    unavailable = 0
+
+    for chunk_id, data in statuses.items():
+        if data is None:
+            unavailable += 1
+            continue
+
+        status = data.get("status")
+        output = data.get("output")
+
+        if status in RUNPOD_PENDING_STATUSES:
+            pending += 1
+        elif status == "COMPLETED" and isinstance(output, dict) and not output.get("error"):
+            chunk_updates[chunk_id] = _get_chunk_update_from_runpod_output(output)
+        elif status == "COMPLETED" or status == "FAILED":
+            error = output.get("error") if isinstance(output, dict) else None
+            errors[chunk_id] = f"RunPod job failed: {error or 'Unknown error'}"
+            chunk_updates[chunk_id] = {"runpod_job_status_link": None}
+        elif status in RUNPOD_REQUEUE_STATUSES or status == RUNPOD_NOT_FOUND_STATUS:
+            requeue_chunk_ids.append(chunk_id)
+        else:
+            logger.warning(f"Unknown RunPod status {status} for chunk {chunk_id}, skipping")
+            unavailable += 1
+
+    if chunk_updates:
+        await asyncio.to_thread(conversation_service.update_chunks, chunk_updates)
+        await asyncio.to_thread(_close_reconciled_jobs, chunk_updates, errors)
+
+    for chunk_id, error in errors.items():
+        await asyncio.to_thread(set_error_status, conversation_chunk_id=chunk_id, error=error)
+
+    updated_conversation_ids = {
+        chunks_by_id[chunk_id]["conversation_id"] for chunk_id in chunk_updates
+    }
+    for conversation_id in updated_conversation_ids:
+        await asyncio.to_thread(_finish_conversation_if_all_chunks_processed, conversation_id)
+
+    if requeue_chunk_ids:
+        requeue = group(
+            [
+                task_transcribe_chunk.message(chunk_id, chunks_by_id[chunk_id]["conversation_id"])
+                for chunk_id in requeue_chunk_ids
+            ]
         )
+        await asyncio.to_thread(requeue.run)
+
+    result = {
+        "completed": len(chunk_updates) - len(errors),
+        "failed": len(errors),
+        "pending": pending,
+        "requeued": len(requeue_chunk_ids),
+        "unavailable": unavailable,
+    }
+    logger.info(f"Reconciled {len(chunks)} RunPod jobs: {result}")
+    return result
@@ -194,6 +194,16 @@ def get_file_size_bytes_from_s3(file_name: str) -> int:
     return response["ContentLength"]
 
 
+def get_etag_from_s3(file_name: str) -> str:
+    """
+    The ETag of the object: the MD5 of its content for single-part uploads, and a
+    hash of the part hashes for multipart uploads. Changes whenever the content does.
+    """
+    file_name = get_sanitized_s3_key(file_name)
+    response = s3_client.head_object(Bucket=STORAGE_S3_BUCKET, Key=file_name)
+    return response["ETag"].strip('"')
+
+
 def get_file_size_from_s3_mb(file_name: str) -> float:
     file_name = get_sanitized_s3_key(file_name)
 
@@ -1,6 +1,7 @@
 from pytz import utc
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.schedulers.blocking import BlockingScheduler
 
 # from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
@@ -17,11 +18,66 @@ scheduler = BlockingScheduler()
 scheduler.configure(jobstores=jobstores, timezone=utc)
 
 # Add periodic tasks
+
+# runs in the scheduler process itself: finishes conversations whose inactivity timer expired
+scheduler.add_job(
+    func="dembrane.conversation_timers:dispatch_due_conversation_timers",
+    trigger=IntervalTrigger(seconds=5),
+    id="dispatch_due_conversation_timers",
+    name="Dispatch due conversation inactivity timers",
+    replace_existing=True,
+    coalesce=True,
+    max_instances=1,
+)
+
+# runs in the scheduler process itself: moves per-project backlogs to the worker queues
+scheduler.add_job(
+    func="dembrane.fair_queue:dispatch_fair_queues",
+    trigger=IntervalTrigger(seconds=1),
+    id="dispatch_fair_queues",
+    name="Dispatch fair-queued task messages",
+    replace_existing=True,
+    coalesce=True,
+    max_instances=1,
+)
+
+# fallback for RunPod webhooks whose consumer message was lost, and for stale entries
+scheduler.add_job(
+    func="dembrane.webhook_queue:schedule_runpod_webhook_consumer",
+    trigger=IntervalTrigger(minutes=1),
+    id="schedule_runpod_webhook_consumer",
+    name="Schedule the RunPod webhook consumer",
+    replace_existing=True,
+    coalesce=True,
+    max_instances=1,
+)
+
+# runs in the scheduler process itself: corrects drifted chunk status counters
+scheduler.add_job(
+    func="dembrane.chunk_counts:reconcile_chunk_counts",
+    trigger=IntervalTrigger(minutes=10),
+    id="reconcile_chunk_counts",
+    name="Reconcile chunk status counters",
+    replace_existing=True,
+    coalesce=True,
+    max_instances=1,
+)
+
 scheduler.add_job(
     func="dembrane.tasks:task_collect_and_finish_unfinished_conversations.send",
     trigger=CronTrigger(minute="*/3"),
     id="task_collect_and_finish_unfinished_conversations",
-    name="Collect and finish unfinished conversations",
+    name="Collect unfinished audio processing conversations",
+    replace_existing=True,
+)
+
+# the jobs above only look at recently active conversations; reconcile everything hourly
+scheduler.add_job(
+    func="dembrane.tasks:task_collect_and_finish_unfinished_conversations.send",
+    kwargs={"full_scan": True},
+    trigger=CronTrigger(minute="30"),
+    id="task_collect_and_finish_unfinished_conversations_full_scan",
+    name="Collect and finish unfinished conversations (full scan)",
     replace_existing=True,
 )
 
@@ -2,10 +2,14 @@ from logging import getLogger
 
 import sentry_sdk
 from sentry_dramatiq import DramatiqIntegration
+from sentry_sdk.integrations.boto3 import Boto3Integration
+from sentry_sdk.integrations.httpx import HttpxIntegration
+from sentry_sdk.integrations.redis import RedisIntegration
+from sentry_sdk.integrations.fastapi import FastApiIntegration
+from sentry_sdk.integrations.starlette import StarletteIntegration
+from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 
 # from sentry_sdk.integrations.openai import OpenAIIntegration
-# from sentry_sdk.integrations.fastapi import FastApiIntegration
-# from sentry_sdk.integrations.starlette import StarletteIntegration
 from dembrane.config import (
     ENVIRONMENT,
     BUILD_VERSION,
@@ -35,6 +39,10 @@ def init_sentry() -> None:
             traces_sample_rate=0.5,
             profiles_sample_rate=0.5,
             enable_tracing=True,
+            # auto-enabling imports every supported library that is installed (anthropic,
+            # langchain, huggingface_hub, celery, ...) at startup, and wraps litellm with the
+            # OpenAI integration (see below). Only enable what we use.
+            auto_enabling_integrations=False,
             integrations=[
                 # StarletteIntegration(
                 #     transaction_style="endpoint",
@@ -48,11 +56,17 @@ def init_sentry() -> None:
                 # https://docs.sentry.io/platforms/python/integrations/anthropic/
                 # THIS. The failure is produced by Sentry’s OpenAI integration that is automatically wrapped around every call to openai / litellm.
                 # AzureException APIError - argument 'text': 'list' object cannot be converted to 'PyString'
-                #OpenAIIntegration(
-                    #include_prompts=False,  # LLM/tokenizer inputs/outputs will be not sent to Sentry, despite send_default_pii=True
-                    #tiktoken_encoding_name="cl100k_base",
-                #),
+                # OpenAIIntegration(
+                # include_prompts=False,  # LLM/tokenizer inputs/outputs will be not sent to Sentry, despite send_default_pii=True
+                # tiktoken_encoding_name="cl100k_base",
+                # ),
                 DramatiqIntegration(),
+                StarletteIntegration(),
+                FastApiIntegration(),
+                HttpxIntegration(),
+                RedisIntegration(),
+                SqlalchemyIntegration(),
+                Boto3Integration(),
             ],
         )
     else:
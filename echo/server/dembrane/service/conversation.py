@@ -6,6 +6,15 @@ from fastapi import UploadFile
 
 from dembrane.utils import generate_uuid
 from dembrane.directus import DirectusBadRequest, directus_client_context
+from dembrane.chunk_counts import (
+    get_chunk_counts,
+    forget_chunk_status,
+    record_chunk_status,
+    invalidate_chunk_counts,
+)
+from dembrane.identity_map import get_or_load
+from dembrane.conversation_utils import record_conversation_activity
+from dembrane.conversation_timers import reset_conversation_inactivity_timer
 
 if TYPE_CHECKING:
     from dembrane.service.file import FileService
@@ -46,19 +55,19 @@ class ConversationService:
         with_tags: bool = False,
         with_chunks: bool = False,
     ) -> dict:
-        try:
-            with directus_client_context() as client:
-                fields = ["*"]
-                deep = {}
+        fields = ["*"]
+        deep = {}
 
-                if with_tags:
-                    fields.append("tags.project_tag_id.*")
+        if with_tags:
+            fields.append("tags.project_tag_id.*")
 
-                if with_chunks:
-                    fields.append("chunks.*")
-                    deep["chunks"] = {"_sort": "-timestamp"}
+        if with_chunks:
+            fields.append("chunks.*")
+            deep["chunks"] = {"_sort": "-timestamp"}
 
-                conversation = client.get_items(
+        def load() -> List[dict]:
+            with directus_client_context() as client:
+                return client.get_items(
                     "conversation",
                     {
                         "query": {
@@ -71,6 +80,13 @@ class ConversationService:
                     },
                 )
 
+        try:
+            conversation = get_or_load(
+                "conversation",
+                conversation_id,
+                load,
+                variant=f"tags={with_tags},chunks={with_chunks}",
+            )
         except DirectusBadRequest as e:
             raise ConversationNotFoundException() from e
 
@@ -118,6 +134,9 @@ class ConversationService:
                 },
             )["data"]
 
+        record_conversation_activity(new_conversation["id"])
+        reset_conversation_inactivity_timer(new_conversation["id"])
+
         return new_conversation
 
     def update(
@@ -166,6 +185,8 @@ class ConversationService:
         with directus_client_context() as client:
             client.delete_item("conversation", conversation_id)
 
+        invalidate_chunk_counts(conversation_id)
+
     def get_chunk_by_id_or_raise(
         self,
         chunk_id: str,
@@ -183,9 +204,10 @@ class ConversationService:
         - ConversationChunkNotFoundException: If the chunk is not found, or the request is malformed.
         - DirectusGenericException -> DirectusServerError: If the request to the Directus server fails.
         """
-        try:
+
+        def load() -> List[dict]:
             with directus_client_context() as client:
-                chunk = client.get_items(
+                return client.get_items(
                     "conversation_chunk",
                     {
                         "query": {
@@ -194,6 +216,8 @@ class ConversationService:
                     },
                 )
 
+        try:
+            chunk = get_or_load("conversation_chunk", chunk_id, load)
             return chunk[0]
         except DirectusBadRequest as e:
             raise ConversationChunkNotFoundException() from e
@@ -208,6 +232,7 @@ class ConversationService:
         file_obj: Optional[UploadFile] = None,
         file_url: Optional[str] = None,
         transcript: Optional[str] = None,
+        process: bool = True,
     ) -> dict:
         """
         Create a new conversation chunk.
@@ -226,10 +251,13 @@ class ConversationService:
             file_obj: The file object to upload. (Optional[UploadFile])
             file_url: The URL of the file to upload. (Optional[str])
             transcript: The transcript of the chunk. (Optional[str])
+            process: Whether to send the chunk for processing; False for chunks
+                that arrive transcribed, e.g. streaming finals. (bool)
 
         Returns:
             The created conversation chunk. (dict)
         """
+        from dembrane.lanes import send_chunk_message
         from dembrane.tasks import task_process_conversation_chunk
 
         conversation = self.get_by_id_or_raise(conversation_id)
@@ -263,6 +291,8 @@ class ConversationService:
                 },
             )["data"]
 
+        record_chunk_status(chunk)
+
         # self.event_service.publish(
         #     ChunkCreatedEvent(
         #         chunk_id=chunk_id,
@@ -270,7 +300,15 @@ class ConversationService:
         #     )
         # )
 
-        task_process_conversation_chunk.send(chunk_id)
+        record_conversation_activity(conversation["id"])
+        reset_conversation_inactivity_timer(conversation["id"])
+
+        if process:
+            send_chunk_message(
+                task_process_conversation_chunk.message(chunk_id),
+                source=source,
+                project_id=conversation["project_id"],
+            )
 
         return chunk
 
@@ -332,25 +370,67 @@ class ConversationService:
                         chunk_id,
                         update,
                     )["data"]
-
-                    return chunk
             except DirectusBadRequest as e:
                 raise ConversationServiceException(f"Failed to update chunk {chunk_id}: {e}") from e
+
+            record_chunk_status(chunk)
+
+            return chunk
         else:
             raise ConversationServiceException(f"No update data provided for chunk {chunk_id}")
 
+    def update_chunks(
+        self,
+        chunk_updates: dict[str, dict],
+    ) -> List[dict]:
+        """
+        Update many chunks with one request. Each chunk gets its own data.
+
+        Args:
+            chunk_updates: chunk_id -> fields to update (same fields as update_chunk). (dict)
+
+        Returns:
+            The updated conversation chunks. (List[dict])
+        """
+        if not chunk_updates:
+            raise ConversationServiceException("No update data provided for chunks")
+
+        try:
+            with directus_client_context() as client:
+                chunks = client.patch(
+                    "/items/conversation_chunk",
+                    json=[
+                        {"id": chunk_id, **update_data}
+                        for chunk_id, update_data in chunk_updates.items()
+                    ],
+                )["data"]
+        except DirectusBadRequest as e:
+            raise ConversationServiceException(
+                f"Failed to update chunks {list(chunk_updates.keys())}: {e}"
+            ) from e
+
+        for chunk in chunks:
+            record_chunk_status(chunk)
+
+        return chunks
+
     def delete_chunk(
         self,
         chunk_id: str,
     ) -> None:
+        chunk = self.get_chunk_by_id_or_raise(chunk_id)
+
         with directus_client_context() as client:
             client.delete_item("conversation_chunk", chunk_id)
 
+        forget_chunk_status(chunk["conversation_id"], chunk_id)
+
     def get_chunk_counts(
         self,
         conversation_id: str,
     ) -> dict:
         """
+        Served from the chunk status counters (see dembrane.chunk_counts).
 
         total = error + pending + ok
         total = processed + pending
@@ -366,44 +446,8 @@ class ConversationService:
         }
         """
         try:
-            with directus_client_context() as client:
-                chunks = client.get_items(
-                    "conversation_chunk",
-                    {
-                        "query": {
-                            "filter": {"conversation_id": conversation_id},
-                            "fields": ["id", "error", "transcript"],
-                        }
-                    },
-                )
+            return get_chunk_counts(conversation_id)
         except DirectusBadRequest as e:
             raise ConversationServiceException(
                 f"Failed to get chunk count for conversation {conversation_id}: {e}"
             ) from e
-
-        total = len(chunks)
-        error = 0
-        pending = 0
-        ok = 0
-
-        for chunk in chunks:
-            if chunk["error"] is not None:
-                error += 1
-            elif chunk["transcript"] is not None:
-                ok += 1
-            else:
-                pending += 1
-
-        processed = error + ok
-
-        assert total == processed + pending
-        assert total == error + ok + pending
-        assert processed == error + ok
-
-        return {
-            "total": total,
-            "processed": processed,
-            "error": error,
-            "pending": pending,
-            "ok": ok,
-        }
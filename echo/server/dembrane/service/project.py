@@ -3,6 +3,8 @@ from typing import List
 from logging import getLogger
 
 from dembrane.directus import DirectusBadRequest, directus_client_context
+from dembrane.identity_map import get_or_load
+from dembrane.transcription_context import invalidate_project_transcription_context
 
 PROJECT_ALLOWED_LANGUAGES = ["en", "nl", "de", "fr", "es"]
 
@@ -24,16 +26,16 @@ class ProjectService:
         project_id: str,
         with_tags: bool = False,
     ) -> dict:
-        try:
-            with directus_client_context() as client:
-                fields = ["*"]
+        fields = ["*"]
 
-                if with_tags:
-                    fields.append("tags.id")
-                    fields.append("tags.created_at")
-                    fields.append("tags.text")
+        if with_tags:
+            fields.append("tags.id")
+            fields.append("tags.created_at")
+            fields.append("tags.text")
 
-                projects = client.get_items(
+        def load() -> List[dict]:
+            with directus_client_context() as client:
+                return client.get_items(
                     "project",
                     {
                         "query": {
@@ -45,6 +47,8 @@ class ProjectService:
                     },
                 )
 
+        try:
+            projects = get_or_load("project", project_id, load, variant=f"tags={with_tags}")
         except DirectusBadRequest as e:
             raise ProjectNotFoundException() from e
 
@@ -80,6 +84,8 @@ class ProjectService:
         with directus_client_context() as client:
             client.delete_item("project", project_id)
 
+        invalidate_project_transcription_context(project_id)
+
     def create_tags_and_link(
         self,
         project_id: str,
@@ -105,4 +111,6 @@ class ProjectService:
 
             logger.debug(f"tags: {tags}")
 
+        invalidate_project_transcription_context(project_id)
+
         return tags
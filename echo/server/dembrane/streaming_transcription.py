@@ -0,0 +1,319 @@
+"""
+Streaming transcription of live conversations.
+
+Recorded chunks only get a transcript once the whole chunk is uploaded and
+transcribed, so live participants and "get reply" wait for chunk length plus
+processing. With ENABLE_STREAMING_TRANSCRIPTION the portal can instead stream
+audio over a WebSocket (see dembrane.api.participant):
+
+    WS /participant/conversations/{conversation_id}/stream
+        client -> server: binary frames of 16 kHz mono PCM (s16le); the text
+                          frame "stop" ends the stream
+        server -> client: {"type": "partial" | "final", "text", "start_ms",
+                           "end_ms", "chunk_id"} events
+
+    WS /participant/conversations/{conversation_id}/transcript
+        server -> client: the same events, for everyone following the conversation
+
+The audio is forwarded to a StreamingSession of STREAMING_TRANSCRIPTION_BACKEND:
+- "assemblyai": AssemblyAI Universal Streaming (v3), turns become finals
+- "local": LocalStreamingSession, a stand-in without a provider (tests / dev)
+
+Partials are only published. Every final is saved as a conversation chunk
+(source STREAM_CHUNK_SOURCE) holding its transcript and the audio since the
+previous final as WAV; it is not transcribed again. Events reach subscribers
+on any API process through Redis pub/sub.
+"""
+
+import io
+import json
+import time
+import wave
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, List, Literal, Callable, Optional, AsyncIterator
+from logging import getLogger
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from fastapi import UploadFile
+from pydantic import BaseModel
+
+from dembrane.config import (
+    ASSEMBLYAI_API_KEY,
+    ASSEMBLYAI_BASE_URL,
+    STREAMING_TRANSCRIPTION_BACKEND,
+)
+from dembrane.metrics import observe
+from dembrane.redis_utils import get_async_redis_client
+
+logger = getLogger("dembrane.streaming_transcription")
+
+STREAM_SAMPLE_RATE = 16000
+STREAM_SAMPLE_WIDTH_BYTES = 2
+STREAM_BYTES_PER_MS = STREAM_SAMPLE_RATE * STREAM_SAMPLE_WIDTH_BYTES // 1000
+STREAM_CHUNK_SOURCE = "PORTAL_AUDIO_STREAM"
+LIVE_TRANSCRIPT_CHANNEL_PREFIX = "dembrane:live_transcript:"
+
+# the local stand-in ends a segment every LOCAL_STREAM_SEGMENT_MS of audio
+LOCAL_STREAM_SEGMENT_MS = 5000
+
+# https://api.eu.assemblyai.com -> wss://streaming.eu.assemblyai.com
+ASSEMBLYAI_STREAMING_URL = (
+    ASSEMBLYAI_BASE_URL.replace("https://api.", "wss://streaming.").rstrip("/") + "/v3/ws"
+)
+
+
+class TranscriptEvent(BaseModel):
+    type: Literal["partial", "final"]
+    text: str
+    # offsets in the stream
+    start_ms: int
+    end_ms: int
+    chunk_id: Optional[str] = None
+
+
+class StreamingSession(ABC):
+    """A stream of audio in, a stream of transcript events out."""
+
+    def __init__(self) -> None:
+        self._events: asyncio.Queue[Optional[TranscriptEvent]] = asyncio.Queue()
+
+    @abstractmethod
+    async def send_audio(self, pcm: bytes) -> None:
+        """Forward 16 kHz mono PCM (s16le) audio."""
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Finish the stream: the last audio becomes a final, then events() ends."""
+        pass
+
+    async def events(self) -> AsyncIterator[TranscriptEvent]:
+        while True:
+            event = await self._events.get()
+            if event is None:
+                return
+            yield event
+
+
+class LocalStreamingSession(StreamingSession):
+    """
+    Stand-in for a streaming provider: a partial for every frame and a final every
+    LOCAL_STREAM_SEGMENT_MS of audio, with the text `transcribe` makes of the audio.
+    """
+
+    def __init__(self, transcribe: Optional[Callable[[bytes], str]] = None):
+        super().__init__()
+        self.transcribe = transcribe or (lambda pcm: f"[{len(pcm) // STREAM_BYTES_PER_MS} ms]")
+        self._segment = bytearray()
+        self._segment_start_ms = 0
+
+    async def _emit(self, event_type: Literal["partial", "final"]) -> None:
+        end_ms = self._segment_start_ms + len(self._segment) // STREAM_BYTES_PER_MS
+        await self._events.put(
+            TranscriptEvent(
+                type=event_type,
+                text=self.transcribe(bytes(self._segment)),
+                start_ms=self._segment_start_ms,
+                end_ms=end_ms,
+            )
+        )
+        if event_type == "final":
+            self._segment.clear()
+            self._segment_start_ms = end_ms
+
+    async def send_audio(self, pcm: bytes) -> None:
+        self._segment.extend(pcm)
+        if len(self._segment) >= LOCAL_STREAM_SEGMENT_MS * STREAM_BYTES_PER_MS:
+            await self._emit("final")
+        else:
+            await self._emit("partial")
+
+    async def close(self) -> None:
+        if self._segment:
+            await self._emit("final")
+        await self._events.put(None)
+
+
+class AssemblyAIStreamingSession(StreamingSession):
+    """AssemblyAI Universal Streaming: partial turns, then a formatted final per turn."""
+
+    def __init__(self, hotwords: Optional[List[str]] = None):
+        super().__init__()
+        self.hotwords = hotwords
+        self._websocket: Any = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self) -> "AssemblyAIStreamingSession":
+        # installed with uvicorn[standard]
+        import websockets
+
+        params: dict[str, Any] = {
+            "sample_rate": STREAM_SAMPLE_RATE,
+            "encoding": "pcm_s16le",
+            "format_turns": "true",
+        }
+        if self.hotwords:
+            params["keyterms_prompt"] = json.dumps(self.hotwords)
+
+        self._websocket = await websockets.connect(
+            f"{ASSEMBLYAI_STREAMING_URL}?{urlencode(params)}",
+            extra_headers={"Authorization": str(ASSEMBLYAI_API_KEY)},
+        )
+        self._reader = asyncio.create_task(self._read())
+        return self
+
+    async def _read(self) -> None:
+        try:
+            async for raw_message in self._websocket:
+                message = json.loads(raw_message)
+                if message.get("type") == "Termination":
+                    break
+                if message.get("type") != "Turn":
+                    continue
+
+                is_final = bool(message.get("end_of_turn") and message.get("turn_is_formatted"))
+                if message.get("end_of_turn") and not is_final:
+                    # the formatted version of this turn follows
+                    continue
+
+                words = message.get("words") or []
+                await self._events.put(
+                    TranscriptEvent(
+                        type="final" if is_final else "partial",
+                        text=message.get("transcript", ""),
+                        start_ms=int(words[0]["start"]) if words else 0,
+                        end_ms=int(words[-1]["end"]) if words else 0,
+                    )
+                )
+        except Exception as e:
+            logger.error(f"AssemblyAI stream failed: {e}")
+        finally:
+            await self._events.put(None)
+
+    async def send_audio(self, pcm: bytes) -> None:
+        await self._websocket.send(pcm)
+
+    async def close(self) -> None:
+        try:
+            await self._websocket.send(json.dumps({"type": "Terminate"}))
+            if self._reader is not None:
+                await asyncio.wait_for(asyncio.shield(self._reader), timeout=10)
+        finally:
+            await self._websocket.close()
+
+
+async def open_streaming_session(hotwords: Optional[List[str]] = None) -> StreamingSession:
+    if STREAMING_TRANSCRIPTION_BACKEND == "local":
+        return LocalStreamingSession()
+    return await AssemblyAIStreamingSession(hotwords).connect()
+
+
+async def publish_transcript_event(conversation_id: str, event: TranscriptEvent) -> None:
+    """Never raises: subscribers missing an event must not end the stream."""
+    try:
+        await get_async_redis_client().publish(
+            LIVE_TRANSCRIPT_CHANNEL_PREFIX + conversation_id, event.model_dump_json()
+        )
+    except Exception as e:
+        logger.warning(f"Failed to publish a transcript event of {conversation_id}: {e}")
+
+
+async def subscribe_transcript_events(conversation_id: str) -> AsyncIterator[dict]:
+    pubsub = get_async_redis_client().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(LIVE_TRANSCRIPT_CHANNEL_PREFIX + conversation_id)
+    try:
+        async for message in pubsub.listen():
+            yield json.loads(message["data"])
+    finally:
+        await pubsub.aclose()
+
+
+def pcm_to_wav(pcm: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(STREAM_SAMPLE_WIDTH_BYTES)
+        wav_file.setframerate(STREAM_SAMPLE_RATE)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def save_final_transcript(
+    conversation_id: str, started_at: datetime, event: TranscriptEvent, pcm: bytes
+) -> dict:
+    """Save a final as a transcribed chunk, with its audio."""
+    from dembrane.service import conversation_service
+
+    timestamp = started_at + timedelta(milliseconds=event.start_ms)
+    return conversation_service.create_chunk(
+        conversation_id=conversation_id,
+        timestamp=timestamp,
+        source=STREAM_CHUNK_SOURCE,
+        file_obj=UploadFile(
+            file=io.BytesIO(pcm_to_wav(pcm)),
+            filename=f"stream-{int(timestamp.timestamp() * 1000)}.wav",
+        ),
+        transcript=event.text,
+        process=False,
+    )
+
+
+class StreamingTranscription:
+    """
+    Forwards the audio of one stream to a session and handles its events: finals are
+    saved as chunks, every event is published and passed to `on_event`.
+    """
+
+    def __init__(
+        self,
+        conversation_id: str,
+        session: StreamingSession,
+        save_final: Optional[Callable[[str, datetime, TranscriptEvent, bytes], dict]] = None,
+    ):
+        self.conversation_id = conversation_id
+        self.session = session
+        self.save_final = save_final or save_final_transcript
+        self.started_at = datetime.now().astimezone()
+        self._started_monotonic = time.monotonic()
+        self._audio = bytearray()
+        # stream offset of the first byte of self._audio
+        self._audio_start_ms = 0
+        self._first_text_seen = False
+
+    async def send_audio(self, pcm: bytes) -> None:
+        self._audio.extend(pcm)
+        await self.session.send_audio(pcm)
+
+    def _take_audio_until(self, end_ms: int) -> bytes:
+        size = max(0, end_ms - self._audio_start_ms) * STREAM_BYTES_PER_MS
+        audio = bytes(self._audio[:size])
+        del self._audio[:size]
+        self._audio_start_ms += len(audio) // STREAM_BYTES_PER_MS
+        return audio
+
+    async def handle_events(self, on_event: Callable[[TranscriptEvent], Any]) -> None:
+        async for event in self.session.events():
+            if not self._first_text_seen and event.text:
+                self._first_text_seen = True
+                await asyncio.to_thread(
+                    observe,
+                    "streaming_transcription.time_to_first_text_ms",
+                    (time.monotonic() - self._started_monotonic) * 1000,
+                )
+
+            if event.type == "final":
+                audio = self._take_audio_until(event.end_ms)
+                try:
+                    chunk = await asyncio.to_thread(
+                        self.save_final, self.conversation_id, self.started_at, event, audio
+                    )
+                    event.chunk_id = chunk["id"]
+                except Exception as e:
+                    logger.error(
+                        f"Failed to save a final transcript of {self.conversation_id}: {e}"
+                    )
+
+            await publish_transcript_event(self.conversation_id, event)
+            await on_event(event)
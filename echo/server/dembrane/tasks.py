@@ -1,3 +1,5 @@
+import time
+import asyncio
 from json import JSONDecodeError
 from typing import Optional
 from logging import getLogger
@@ -9,39 +11,51 @@ from dramatiq import group
 from dramatiq.encoder import JSONEncoder, MessageData
 from dramatiq.results import Results
 from dramatiq_workflow import WorkflowMiddleware
-from dramatiq.middleware import GroupCallbacks
+from dramatiq.middleware import AsyncIO, CurrentMessage, GroupCallbacks
 from dramatiq.brokers.redis import RedisBroker
 from dramatiq.rate_limits.backends import RedisBackend as RateLimitRedisBackend
 from dramatiq.results.backends.redis import RedisBackend as ResultsRedisBackend
 
+from dembrane.lanes import LIVE_LANE_QUEUES, LaneMiddleware, send_chunk_message
 from dembrane.utils import generate_uuid, get_utc_timestamp
 from dembrane.config import (
     REDIS_URL,
     RUNPOD_WHISPER_API_KEY,
     RUNPOD_TOPIC_MODELER_URL,
+    RUNPOD_DIARIZATION_TIMEOUT,
     ENABLE_AUDIO_LIGHTRAG_INPUT,
     RUNPOD_TOPIC_MODELER_API_KEY,
 )
 from dembrane.sentry import init_sentry
 from dembrane.prompts import render_json
+from dembrane.tracing import TracingMiddleware
 from dembrane.directus import (
     DirectusBadRequest,
     DirectusServerError,
     directus,
     directus_client_context,
 )
+from dembrane.profiler import ProfilerMiddleware
+from dembrane.fair_queue import FairQueueMiddleware, get_current_project_id
 from dembrane.transcribe import transcribe_conversation_chunk
+from dembrane.identity_map import IdentityMapMiddleware
+from dembrane.memory_watchdog import MemoryWatchdogMiddleware
 from dembrane.conversation_utils import (
     collect_unfinished_conversations,
     collect_unfinished_audio_processing_conversations,
+    collect_recent_unfinished_audio_processing_conversations,
 )
 from dembrane.api.dependency_auth import DependencyDirectusSession
-from dembrane.conversation_health import get_runpod_diarization
+from dembrane.conversation_health import (
+    check_runpod_diarization,
+    submit_runpod_diarization,
+)
+from dembrane.conversation_timers import cancel_conversation_inactivity_timer
 from dembrane.processing_status_utils import (
     ProcessingStatusContext,
+    ProcessingStatusMiddleware,
     set_error_status,
 )
-from dembrane.audio_lightrag.main.run_etl import run_etl_pipeline
 
 init_sentry()
 
@@ -100,14 +114,50 @@ workflow_backend = RateLimitRedisBackend(url=redis_connection_string)
 broker.add_middleware(GroupCallbacks(workflow_backend))
 broker.add_middleware(WorkflowMiddleware(workflow_backend))
 
+# runs `async def` actors on one event loop per worker process. A message still holds
+# its worker thread until it is done, so only actors that fan out many requests within
+# one message (RunPod reconciliation, batch transcription) are async.
+broker.add_middleware(AsyncIO())
+
+# the message being processed, e.g. to claim a coalescing window (dembrane.chunk_coalescing)
+broker.add_middleware(CurrentMessage())
+
+# per-project in-flight tracking for messages sent with send_fair
+broker.add_middleware(FairQueueMiddleware())
+
+# live chunk queues, see dembrane.lanes
+for live_queue_name in LIVE_LANE_QUEUES:
+    broker.declare_queue(live_queue_name)
+broker.add_middleware(LaneMiddleware())
+
+# caches Directus reads for the duration of a message, see dembrane.identity_map
+broker.add_middleware(IdentityMapMiddleware())
+
+# writes out buffered processing statuses before the worker exits
+broker.add_middleware(ProcessingStatusMiddleware())
+
+# per-actor memory growth, recycles workers over WORKER_MAX_RSS_MB / WORKER_MAX_TASKS
+broker.add_middleware(MemoryWatchdogMiddleware())
+
+# on-demand / PROFILE_ACTORS sampling profiles uploaded to S3, see dembrane.profiler
+broker.add_middleware(ProfilerMiddleware())
+
+# carries trace context in message options, spans per queue wait / actor, see dembrane.tracing
+broker.add_middleware(TracingMiddleware())
+
 dramatiq.set_broker(broker)
 
 
 # Transcription Task
 @dramatiq.actor(queue_name="network", priority=0)
-def task_transcribe_chunk(conversation_chunk_id: str, conversation_id: str) -> None:
+def task_transcribe_chunk(
+    conversation_chunk_id: str, conversation_id: str, use_transcript_cache: bool = True
+) -> None:
     """
     Transcribe a conversation chunk. The results are not returned.
+
+    use_transcript_cache=False transcribes again even if the same audio was already
+    transcribed with the same settings (see dembrane.transcript_cache).
     """
     logger = getLogger("dembrane.tasks.task_transcribe_chunk")
     try:
@@ -116,7 +166,7 @@ def task_transcribe_chunk(conversation_chunk_id: str, conversation_id: str) -> N
             event_prefix="task_transcribe_chunk",
             message=f"for chunk {conversation_chunk_id}",
         ):
-            transcribe_conversation_chunk(conversation_chunk_id)
+            transcribe_conversation_chunk(conversation_chunk_id, use_cache=use_transcript_cache)
 
         return
     except Exception as e:
@@ -124,6 +174,59 @@ def task_transcribe_chunk(conversation_chunk_id: str, conversation_id: str) -> N
         raise e from e
 
 
+# dramatiq's actor() overloads take Union[Awaitable[R], R], which mypy cannot solve for
+# coroutine functions
+@dramatiq.actor(  # type: ignore[arg-type]
+    queue_name="network",
+    priority=0,
+    # 45 minutes: the 30 minute batch timeout (BATCH_TRANSCRIPTION_TIMEOUT_SECONDS), then
+    # the chunks that did not finish are transcribed again one by one
+    time_limit=45 * 60 * 1000,
+    # chunks that failed are retried one by one already, a retry of the batch is for
+    # failures around it (Directus, Redis); chunks done by then come from the cache
+    max_retries=1,
+)
+async def task_transcribe_chunks(
+    conversation_chunk_ids: list[str],
+    conversation_id: str,
+    use_transcript_cache: bool = True,
+    source: Optional[str] = None,
+    project_id: Optional[str] = None,
+) -> None:
+    """
+    Transcribe the chunks of one conversation concurrently, see dembrane.batch_transcription.
+
+    Chunks that still fail are sent on as task_transcribe_chunk messages, which retry
+    one chunk at a time, in the lane of `source` and the fair queue of `project_id`
+    (async actors do not see the project of their message, see get_current_project_id).
+    """
+    logger = getLogger("dembrane.tasks.task_transcribe_chunks")
+    from dembrane.batch_transcription import transcribe_chunks
+
+    async with ProcessingStatusContext(
+        conversation_id=conversation_id,
+        event_prefix="task_transcribe_chunks",
+        message=f"for {len(conversation_chunk_ids)} chunks",
+    ):
+        errors = await transcribe_chunks(conversation_chunk_ids, use_cache=use_transcript_cache)
+
+    failed_chunk_ids = [chunk_id for chunk_id, error in errors.items() if error is not None]
+    if failed_chunk_ids:
+        logger.warning(f"Retrying {len(failed_chunk_ids)} chunks one by one: {failed_chunk_ids}")
+
+        def retry() -> None:
+            for chunk_id in failed_chunk_ids:
+                send_chunk_message(
+                    task_transcribe_chunk.message(
+                        chunk_id, conversation_id, use_transcript_cache=use_transcript_cache
+                    ),
+                    source=source,
+                    project_id=project_id,
+                )
+
+        await asyncio.to_thread(retry)
+
+
 @dramatiq.actor(queue_name="network", priority=30)
 def task_summarize_conversation(conversation_id: str) -> None:
     """
@@ -260,6 +363,9 @@ def task_run_etl_pipeline(conversation_id: str) -> None:
             },
         )
 
+        # pulls in LightRAG and its storage backends, only load it where the ETL runs
+        from dembrane.audio_lightrag.main.run_etl import run_etl_pipeline
+
         try:
             with ProcessingStatusContext(
                 conversation_id=conversation_id,
@@ -305,6 +411,9 @@ def task_finish_conversation_hook(conversation_id: str) -> None:
     try:
         logger.info(f"Finishing conversation: {conversation_id}")
 
+        # finished explicitly (or by the timer itself), the inactivity timer is moot
+        cancel_conversation_inactivity_timer(conversation_id)
+
         conversation_obj = conversation_service.get_by_id_or_raise(conversation_id)
 
         if conversation_obj["is_finished"]:
@@ -348,11 +457,84 @@ def task_finish_conversation_hook(conversation_id: str) -> None:
         raise e from e
 
 
+# not retried: a retry would clone the chunks that were already cloned again
+@dramatiq.actor(queue_name="network", priority=10, max_retries=0)
+def task_clone_conversation(
+    source_conversation_id: str,
+    new_conversation_id: str,
+    project_id: str,
+    use_transcript_cache: bool = True,
+) -> None:
+    """
+    Clone the chunks of a conversation and queue their transcription, see
+    dembrane.conversation_clone. Progress is recorded for the retranscribe endpoints.
+    """
+    logger = getLogger("dembrane.tasks.task_clone_conversation")
+    from dembrane.conversation_clone import set_clone_progress, clone_conversation_chunks
+
+    try:
+        with ProcessingStatusContext(
+            conversation_id=new_conversation_id,
+            event_prefix="task_clone_conversation",
+            message=f"from {source_conversation_id}",
+        ):
+            clone_conversation_chunks(
+                source_conversation_id,
+                new_conversation_id,
+                project_id,
+                use_transcript_cache=use_transcript_cache,
+            )
+    except Exception as e:
+        logger.error(f"Failed to clone {source_conversation_id} to {new_conversation_id}: {e}")
+        set_clone_progress(new_conversation_id, status="error", error=str(e))
+        raise e from e
+
+
+@dramatiq.actor(queue_name="network", priority=0)
+def task_transcribe_coalesced_chunks(conversation_id: str, window_id: str) -> None:
+    """
+    Transcribe a window of small live chunks together, see dembrane.chunk_coalescing.
+
+    Chunks that could not be transcribed together are sent on as task_transcribe_chunk.
+    The window is released only then, so a retry of this message picks it up again.
+    """
+    logger = getLogger("dembrane.tasks.task_transcribe_coalesced_chunks")
+    from dembrane.chunk_coalescing import release_window, transcribe_coalesced_chunks
+
+    # stable across retries and redeliveries of this message
+    current_message = CurrentMessage.get_current_message()
+    flush_id = current_message.message_id if current_message else window_id
+
+    with ProcessingStatusContext(
+        conversation_id=conversation_id,
+        event_prefix="task_transcribe_coalesced_chunks",
+        message=f"for window {window_id}",
+    ):
+        remaining_entries = transcribe_coalesced_chunks(conversation_id, window_id, flush_id)
+
+    if remaining_entries:
+        logger.info(f"Transcribing {len(remaining_entries)} chunks one by one")
+        for entry in remaining_entries:
+            send_chunk_message(
+                task_transcribe_chunk.message(
+                    entry["id"],
+                    conversation_id,
+                    use_transcript_cache=entry.get("use_transcript_cache", True),
+                ),
+                source=entry.get("source"),
+            )
+
+    release_window(window_id)
+
+
 # cpu because it is also bottlenecked by the cpu queue due to the split_audio_chunk task
 @dramatiq.actor(queue_name="cpu", priority=0)
-def task_process_conversation_chunk(chunk_id: str) -> None:
+def task_process_conversation_chunk(chunk_id: str, use_transcript_cache: bool = True) -> None:
     """
     Process a conversation chunk.
+
+    The split chunks are transcribed together (task_transcribe_chunks) when the provider
+    supports it. use_transcript_cache is passed on.
     """
     logger = getLogger("dembrane.tasks.task_process_conversation_chunk")
     try:
@@ -380,13 +562,38 @@ def task_process_conversation_chunk(chunk_id: str) -> None:
 
         logger.info(f"Split audio chunk result: {split_chunk_ids}")
 
-        group(
-            [
-                task_transcribe_chunk.message(cid, chunk["conversation_id"])
-                for cid in split_chunk_ids
-                if cid is not None
-            ]
-        ).run()
+        from dembrane.chunk_coalescing import coalesce_chunk, should_coalesce
+        from dembrane.batch_transcription import uses_batch_transcription
+
+        split_chunk_ids = [cid for cid in split_chunk_ids if cid is not None]
+
+        # small live chunks wait a few seconds to be transcribed with the next ones
+        if split_chunk_ids == [chunk_id] and should_coalesce(chunk):
+            chunk = conversation_service.get_chunk_by_id_or_raise(chunk_id)
+            if coalesce_chunk(chunk, use_transcript_cache=use_transcript_cache):
+                return
+
+        # same lane, and for bulk chunks the same project, as this message
+        if len(split_chunk_ids) > 1 and uses_batch_transcription():
+            send_chunk_message(
+                task_transcribe_chunks.message(
+                    split_chunk_ids,
+                    chunk["conversation_id"],
+                    use_transcript_cache=use_transcript_cache,
+                    source=chunk["source"],
+                    project_id=get_current_project_id(),
+                ),
+                source=chunk["source"],
+            )
+            return
+
+        for cid in split_chunk_ids:
+            send_chunk_message(
+                task_transcribe_chunk.message(
+                    cid, chunk["conversation_id"], use_transcript_cache=use_transcript_cache
+                ),
+                source=chunk["source"],
+            )
 
         return
 
@@ -396,19 +603,39 @@ def task_process_conversation_chunk(chunk_id: str) -> None:
 
 
 @dramatiq.actor(queue_name="network")
-def task_collect_and_finish_unfinished_conversations() -> None:
+def task_collect_and_finish_unfinished_conversations(full_scan: bool = False) -> None:
+    """
+    (Re)run the ETL pipeline where audio processing is unfinished.
+
+    By default only conversations with activity since the previous sweep are looked
+    at (see dembrane.conversation_utils). Idle conversations are finished by their
+    inactivity timers (see dembrane.conversation_timers).
+
+    full_scan=True walks every conversation, also finishing idle ones, and is
+    scheduled infrequently to reconcile anything the index or the timers missed.
+    """
     logger = getLogger("dembrane.tasks.task_collect_and_finish_unfinished_conversations")
 
     try:
         logger.info(
-            "running task_collect_and_finish_unfinished_conversations @ %s", get_utc_timestamp()
+            "running task_collect_and_finish_unfinished_conversations (full_scan=%s) @ %s",
+            full_scan,
+            get_utc_timestamp(),
         )
 
-        unfinished_conversation_ids = collect_unfinished_conversations()
+        if full_scan:
+            unfinished_conversation_ids = collect_unfinished_conversations()
+        else:
+            unfinished_conversation_ids = []
         logger.info(f"Unfinished conversation ids: {unfinished_conversation_ids}")
 
         try:
-            unfinished_ap_conversation_ids = collect_unfinished_audio_processing_conversations()
+            if full_scan:
+                unfinished_ap_conversation_ids = collect_unfinished_audio_processing_conversations()
+            else:
+                unfinished_ap_conversation_ids = (
+                    collect_recent_unfinished_audio_processing_conversations()
+                )
             logger.info(
                 f"Unfinished audio processing conversation ids: {unfinished_ap_conversation_ids}"
             )
@@ -649,6 +876,9 @@ def task_create_project_library(project_id: str, language: str) -> None:
         return
 
 
+# TODO: remove in the release after next. Nothing sends this anymore (the scheduler runs
+# task_update_runpod_transcription_response, see dembrane.runpod), it is only kept so
+# messages queued before that change are drained instead of failing on a missing actor.
 @dramatiq.actor(queue_name="network", priority=10)
 def task_process_runpod_chunk_response(chunk_id: str, status_link: str) -> None:
     logger = getLogger("dembrane.tasks.task_process_runpod_chunk_response")
@@ -677,9 +907,6 @@ def task_process_runpod_chunk_response(chunk_id: str, status_link: str) -> None:
         conversation_chunk_id=chunk_id,
         event_prefix="task_process_runpod_chunk_response",
     ):
-        chunk_object = conversation_service.get_chunk_by_id_or_raise(chunk_id)
-        conversation_id = chunk_object["conversation_id"]
-
         headers = {
             "Authorization": f"Bearer {RUNPOD_WHISPER_API_KEY}",
             "Content-Type": "application/json",
@@ -724,16 +951,37 @@ def task_process_runpod_chunk_response(chunk_id: str, status_link: str) -> None:
                 logger.error(f"Failed to re-trigger transcription for chunk {chunk_id}: {e}")
 
 
-@dramatiq.actor(queue_name="network", priority=10)
-def task_update_runpod_transcription_response() -> None:
+# chunks reconciled per task_update_runpod_transcription_response message
+RUNPOD_RECONCILE_PAGE_SIZE = 200
+
+
+# dramatiq's actor() overloads take Union[Awaitable[R], R], which mypy cannot solve for
+# coroutine functions
+@dramatiq.actor(queue_name="network", priority=10)  # type: ignore[arg-type]
+async def task_update_runpod_transcription_response(after_chunk_id: Optional[str] = None) -> None:
+    """
+    Reconcile chunks that still have a runpod_job_status_link, one page at a time.
+
+    Each page is checked concurrently and written back in bulk (see
+    dembrane.runpod.reconcile_runpod_transcription_jobs). When the page is full the
+    task re-enqueues itself for the next page, so only one message is in the
+    network queue at any time, however large the backlog.
+    """
     logger = getLogger("dembrane.tasks.task_update_runpod_transcription_response")
     try:
-        chunks = directus.get_items(
+        query_filter: dict = {"runpod_job_status_link": {"_nnull": True}}
+        if after_chunk_id:
+            query_filter["id"] = {"_gt": after_chunk_id}
+
+        chunks = await asyncio.to_thread(
+            directus.get_items,
             "conversation_chunk",
             {
                 "query": {
-                    "filter": {"runpod_job_status_link": {"_nnull": True}},
-                    "fields": ["id", "runpod_job_status_link"],
+                    "filter": query_filter,
+                    "fields": ["id", "conversation_id", "runpod_job_status_link"],
+                    "sort": ["id"],
+                    "limit": RUNPOD_RECONCILE_PAGE_SIZE,
                 }
             },
         )
@@ -741,25 +989,98 @@ def task_update_runpod_transcription_response() -> None:
             logger.info("No chunks with runpod_job_status_link found.")
             return
 
-        # Dispatch a group of sub-tasks for parallel processing
-        group(
-            [
-                task_process_runpod_chunk_response.message(
-                    chunk["id"], chunk["runpod_job_status_link"]
-                )
-                for chunk in chunks
-            ]
-        ).run()
+        from dembrane.runpod import reconcile_runpod_transcription_jobs
+
+        await reconcile_runpod_transcription_jobs(chunks)
+
+        if len(chunks) == RUNPOD_RECONCILE_PAGE_SIZE:
+            task_update_runpod_transcription_response.send(chunks[-1]["id"])
 
     except Exception as e:
         logger.error(f"Error in task_update_runpod_transcription_response: {e}")
 
 
+@dramatiq.actor(queue_name="network", priority=10)
+def task_consume_runpod_webhooks(
+    retry_entry_ids: Optional[list[str]] = None,
+    attempt: int = 0,
+) -> None:
+    """
+    Apply the RunPod webhooks queued by /stateless/webhook/transcribe in batches,
+    see dembrane.webhook_queue. With retry_entry_ids, apply a failed batch again.
+    """
+    from dembrane.webhook_queue import consume_runpod_webhooks
+
+    consume_runpod_webhooks(retry_entry_ids, attempt)
+
+
+# delay between two status checks of a pending diarization job
+RUNPOD_DIARIZATION_POLL_INTERVAL_MS = 3 * 1000
+# upper bound of the backoff after failed checks
+RUNPOD_DIARIZATION_MAX_BACKOFF_MS = 60 * 1000
+
+
 @dramatiq.actor(queue_name="network", priority=30)
 def task_get_runpod_diarization(chunk_id: str) -> None:
+    """
+    Submit a diarization job and hand it over to task_check_runpod_diarization.
+    The worker is released right after the submission.
+    """
     logger = getLogger("dembrane.tasks.task_get_runpod_diarization")
     logger.info(f"Getting runpod diarization for chunk {chunk_id}")
     try:
-        get_runpod_diarization(chunk_id)
+        job_data = submit_runpod_diarization(chunk_id)
+        if not job_data:
+            return
+
+        job_id, job_status_link = job_data
+        task_check_runpod_diarization.send_with_options(
+            args=(chunk_id, job_id, job_status_link, time.time()),
+            delay=RUNPOD_DIARIZATION_POLL_INTERVAL_MS,
+        )
     except Exception as e:
         logger.error(f"Error in task_get_runpod_diarization: {e}")
+
+
+@dramatiq.actor(queue_name="network", priority=30)
+def task_check_runpod_diarization(
+    chunk_id: str,
+    job_id: str,
+    job_status_link: str,
+    submitted_at: float,
+    failed_checks: int = 0,
+) -> None:
+    """
+    Check a diarization job once. While it is pending, the check is re-enqueued with
+    a delay instead of sleeping in the worker.
+
+    A check that raises is retried with exponential backoff until
+    RUNPOD_DIARIZATION_TIMEOUT seconds after the submission, so a transient Directus
+    or RunPod error does not lose the job.
+    """
+    logger = getLogger("dembrane.tasks.task_check_runpod_diarization")
+    try:
+        is_done = check_runpod_diarization(chunk_id, job_id, job_status_link, submitted_at)
+    except Exception as e:
+        if time.time() - submitted_at >= RUNPOD_DIARIZATION_TIMEOUT:
+            logger.error(f"Giving up on diarization job {job_id} for chunk {chunk_id}: {e}")
+            return
+
+        failed_checks += 1
+        logger.warning(
+            f"Error checking diarization job {job_id} (attempt {failed_checks}), retrying: {e}"
+        )
+        task_check_runpod_diarization.send_with_options(
+            args=(chunk_id, job_id, job_status_link, submitted_at, failed_checks),
+            delay=min(
+                RUNPOD_DIARIZATION_POLL_INTERVAL_MS * 2**failed_checks,
+                RUNPOD_DIARIZATION_MAX_BACKOFF_MS,
+            ),
+        )
+        return
+
+    if not is_done:
+        task_check_runpod_diarization.send_with_options(
+            args=(chunk_id, job_id, job_status_link, submitted_at),
+            delay=RUNPOD_DIARIZATION_POLL_INTERVAL_MS,
+        )
@@ -0,0 +1,469 @@
+"""
+Lightweight distributed tracing, exported to an OpenTelemetry collector.
+
+Follows one chunk from upload to saved transcript across the API, dramatiq
+workers and RunPod:
+
+    upload_conversation_chunk (API)
+      -> queue cpu / task_process_conversation_chunk -> split_audio_chunk
+        -> queue network / task_transcribe_chunk -> runpod.queue (POST /run)
+          -> runpod.job (queued .. webhook applied)
+
+- The trace context is a W3C traceparent (`00-<trace id>-<span id>-<flags>`) kept
+  in a contextvar. TracingMiddleware (installed in dembrane.tasks) copies it into
+  the options of every message enqueued while a span is active, and continues
+  the trace in the worker, with a span for the queue wait and one for the actor.
+- Outbound HTTP calls carry it in the traceparent header: the pooled httpx client
+  adds it (dembrane.http_client), `requests` calls pass trace_headers().
+- RunPod calls back through a webhook, so the context of a queued job is kept
+  in Redis per chunk (remember_chunk_trace / pop_chunk_trace).
+- ProcessingStatusContext opens a span per stage, so every stage that already
+  reports a processing status shows up in the trace.
+
+Spans are batched and sent in OTLP/HTTP JSON to OTEL_EXPORTER_OTLP_ENDPOINT
+(e.g. http://localhost:4318 for a local collector or Jaeger) from a background
+thread. Without an endpoint tracing is off and span() is a no-op.
+TRACE_SAMPLE_RATE samples whole traces at their root.
+"""
+
+import os
+import time
+import atexit
+import random
+import threading
+from typing import Any, Optional, Generator, cast
+from logging import getLogger
+from contextlib import contextmanager
+from contextvars import Token, ContextVar
+
+import dramatiq
+
+from dembrane.config import (
+    OTEL_SERVICE_NAME,
+    TRACE_SAMPLE_RATE,
+    OTEL_EXPORTER_OTLP_ENDPOINT,
+)
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.tracing")
+
+TRACE_CONTEXT_OPTION = "traceparent"
+TRACE_EXPORT_INTERVAL_SECONDS = 2.0
+TRACE_EXPORT_BATCH_SIZE = 512
+# spans dropped beyond this when the collector is unreachable
+TRACE_EXPORT_MAX_QUEUE = 10_000
+# longer than a RunPod job is allowed to take
+CHUNK_TRACE_TTL_SECONDS = 24 * 60 * 60
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+SPAN_KIND_CONSUMER = 5
+
+
+class SpanContext:
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def to_traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, traceparent: Optional[str]) -> Optional["SpanContext"]:
+        if not traceparent:
+            return None
+        parts = traceparent.strip().split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        return cls(parts[1], parts[2], parts[3] == "01")
+
+
+_current_span_context: ContextVar[Optional[SpanContext]] = ContextVar(
+    "dembrane_span_context", default=None
+)
+
+
+def is_tracing_enabled() -> bool:
+    return bool(OTEL_EXPORTER_OTLP_ENDPOINT)
+
+
+def get_current_span_context() -> Optional[SpanContext]:
+    return _current_span_context.get()
+
+
+def get_current_traceparent() -> Optional[str]:
+    context = _current_span_context.get()
+    return context.to_traceparent() if context is not None else None
+
+
+def trace_headers() -> dict[str, str]:
+    """Headers that continue the current trace in an outbound HTTP call."""
+    traceparent = get_current_traceparent()
+    return {"traceparent": traceparent} if traceparent else {}
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        parent: Optional[SpanContext],
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[dict[str, Any]] = None,
+        start_time: Optional[float] = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.context = SpanContext(
+            trace_id=parent.trace_id if parent is not None else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            sampled=parent.sampled if parent is not None else random.random() < TRACE_SAMPLE_RATE,
+        )
+        self.start_time = start_time if start_time is not None else time.time()
+        self.end_time: Optional[float] = None
+        self.error: Optional[str] = None
+        self._token: Optional[Token] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None, end_time: Optional[float] = None) -> None:
+        if self.end_time is not None:
+            return
+        self.end_time = end_time if end_time is not None else time.time()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+        if self._token is not None:
+            try:
+                _current_span_context.reset(self._token)
+            except ValueError:
+                # ended in another context than it was started in
+                _current_span_context.set(None)
+            self._token = None
+
+        if self.context.sampled:
+            _exporter.add(self)
+
+
+def start_span(
+    name: str,
+    parent: Optional[SpanContext] = None,
+    kind: int = SPAN_KIND_INTERNAL,
+    attributes: Optional[dict[str, Any]] = None,
+    start_time: Optional[float] = None,
+) -> Optional[Span]:
+    """
+    Start a span and make it the current one until span.end().
+
+    Args:
+        parent: defaults to the current span, a new trace is started without one
+
+    Returns:
+        The span, or None when tracing is off. (Optional[Span])
+    """
+    if not is_tracing_enabled():
+        return None
+
+    new_span = Span(
+        name,
+        parent=parent if parent is not None else _current_span_context.get(),
+        kind=kind,
+        attributes=attributes,
+        start_time=start_time,
+    )
+    new_span._token = _current_span_context.set(new_span.context)
+    return new_span
+
+
+@contextmanager
+def span(
+    name: str,
+    parent: Optional[SpanContext] = None,
+    kind: int = SPAN_KIND_INTERNAL,
+    attributes: Optional[dict[str, Any]] = None,
+) -> Generator[Optional[Span], None, None]:
+    """
+    Usage:
+        with span("transcribe.AssemblyAI", attributes={"chunk_id": chunk_id}):
+            ...
+    """
+    current = start_span(name, parent=parent, kind=kind, attributes=attributes)
+    if current is None:
+        yield None
+        return
+
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    current.end()
+
+
+def record_span(
+    name: str,
+    parent: Optional[SpanContext],
+    start_time: float,
+    end_time: float,
+    kind: int = SPAN_KIND_INTERNAL,
+    attributes: Optional[dict[str, Any]] = None,
+) -> None:
+    """Record a span that already happened (queue waits, external jobs)."""
+    if not is_tracing_enabled():
+        return
+    Span(name, parent=parent, kind=kind, attributes=attributes, start_time=start_time).end(
+        end_time=end_time
+    )
+
+
+def _chunk_trace_key(chunk_id: str) -> str:
+    return f"dembrane:trace:chunk:{chunk_id}"
+
+
+def remember_chunk_trace(chunk_id: str) -> None:
+    """Keep the current trace context of a chunk whose work continues in a webhook."""
+    traceparent = get_current_traceparent()
+    if traceparent is None:
+        return
+    try:
+        get_redis_client().set(
+            _chunk_trace_key(chunk_id), f"{traceparent} {time.time()}", ex=CHUNK_TRACE_TTL_SECONDS
+        )
+    except Exception as e:
+        logger.debug(f"Failed to remember the trace of chunk {chunk_id}: {e}")
+
+
+def pop_chunk_trace(chunk_id: str) -> Optional[tuple[SpanContext, float]]:
+    """
+    Returns:
+        The remembered trace context of the chunk and when it was remembered. (Optional)
+    """
+    if not is_tracing_enabled():
+        return None
+    try:
+        value = cast(Optional[bytes], get_redis_client().getdel(_chunk_trace_key(chunk_id)))
+    except Exception as e:
+        logger.debug(f"Failed to load the trace of chunk {chunk_id}: {e}")
+        return None
+    if not value:
+        return None
+
+    traceparent, _, remembered_at = value.decode().partition(" ")
+    context = SpanContext.from_traceparent(traceparent)
+    if context is None:
+        return None
+    return context, float(remembered_at or time.time())
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(finished: Span) -> dict:
+    otlp_span: dict[str, Any] = {
+        "traceId": finished.context.trace_id,
+        "spanId": finished.context.span_id,
+        "name": finished.name,
+        "kind": finished.kind,
+        "startTimeUnixNano": str(int(finished.start_time * 1e9)),
+        "endTimeUnixNano": str(int((finished.end_time or finished.start_time) * 1e9)),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in finished.attributes.items()
+            if value is not None
+        ],
+    }
+    if finished.parent_span_id:
+        otlp_span["parentSpanId"] = finished.parent_span_id
+    if finished.error:
+        otlp_span["status"] = {"code": 2, "message": finished.error}
+    return otlp_span
+
+
+def to_otlp_json(spans: list[Span], service_name: str) -> dict:
+    """OTLP/HTTP JSON body (ExportTraceServiceRequest) for `spans`."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": service_name}},
+                        {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "dembrane.tracing"},
+                        "spans": [_otlp_span(finished) for finished in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class _SpanExporter:
+    """Batches finished spans and posts them to the collector from a background thread."""
+
+    def __init__(self) -> None:
+        self.service_name = OTEL_SERVICE_NAME or "dembrane"
+        self._spans: list[Span] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid: Optional[int] = None
+
+    def add(self, finished: Span) -> None:
+        with self._lock:
+            if len(self._spans) >= TRACE_EXPORT_MAX_QUEUE:
+                return
+            self._spans.append(finished)
+            full = len(self._spans) >= TRACE_EXPORT_BATCH_SIZE
+
+            # started lazily, and again in forked worker processes
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+
+        if full:
+            self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(TRACE_EXPORT_INTERVAL_SECONDS)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if not spans or not is_tracing_enabled():
+            return
+
+        import httpx
+
+        try:
+            for i in range(0, len(spans), TRACE_EXPORT_BATCH_SIZE):
+                httpx.post(
+                    f"{str(OTEL_EXPORTER_OTLP_ENDPOINT).rstrip('/')}/v1/traces",
+                    json=to_otlp_json(spans[i : i + TRACE_EXPORT_BATCH_SIZE], self.service_name),
+                    timeout=5,
+                ).raise_for_status()
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+
+
+_exporter = _SpanExporter()
+atexit.register(_exporter.flush)
+
+
+def init_tracing(role: str) -> None:
+    """Name the service of this process ("api" / "worker") unless OTEL_SERVICE_NAME is set."""
+    if not OTEL_SERVICE_NAME:
+        _exporter.service_name = f"dembrane-{role}"
+    if is_tracing_enabled():
+        logger.info(
+            f"Exporting traces to {OTEL_EXPORTER_OTLP_ENDPOINT} as {_exporter.service_name}"
+        )
+
+
+def inject_trace_context(message: dramatiq.Message) -> dramatiq.Message:
+    """Copy of `message` that continues the current trace (for messages stored before enqueue)."""
+    traceparent = get_current_traceparent()
+    if traceparent is None or TRACE_CONTEXT_OPTION in message.options:
+        return message
+    return message.copy(options={TRACE_CONTEXT_OPTION: traceparent})
+
+
+class TracingMiddleware(dramatiq.Middleware):
+    """
+    Carries the trace context in message options and continues it in the worker,
+    with a span for the time spent in the queue and one for the actor.
+    """
+
+    def __init__(self) -> None:
+        self._spans: dict[str, Span] = {}
+        self._lock = threading.Lock()
+
+    def after_worker_boot(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        worker: dramatiq.Worker,  # noqa: ARG002
+    ) -> None:
+        init_tracing("worker")
+
+    def before_enqueue(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+        delay: Optional[int],  # noqa: ARG002
+    ) -> None:
+        traceparent = get_current_traceparent()
+        if traceparent is not None and TRACE_CONTEXT_OPTION not in message.options:
+            message.options[TRACE_CONTEXT_OPTION] = traceparent
+
+    def before_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+    ) -> None:
+        parent = SpanContext.from_traceparent(message.options.get(TRACE_CONTEXT_OPTION))
+        if parent is None or not is_tracing_enabled():
+            return
+
+        attributes = {
+            "messaging.system": "dramatiq",
+            "messaging.destination.name": message.queue_name,
+            "messaging.message.id": message.message_id,
+            "dramatiq.actor": message.actor_name,
+            "dramatiq.retries": message.options.get("retries", 0),
+        }
+
+        now = time.time()
+        # eta is set on delayed messages and retries: the queue wait starts there
+        enqueued_at = max(message.message_timestamp, message.options.get("eta", 0)) / 1000
+        record_span(
+            f"queue {message.queue_name}",
+            parent=parent,
+            start_time=min(enqueued_at, now),
+            end_time=now,
+            attributes=attributes,
+        )
+
+        actor_span = start_span(
+            message.actor_name, parent=parent, kind=SPAN_KIND_CONSUMER, attributes=attributes
+        )
+        if actor_span is not None:
+            with self._lock:
+                self._spans[message.message_id] = actor_span
+
+    def after_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+        *,
+        result: object = None,  # noqa: ARG002
+        exception: Optional[BaseException] = None,
+    ) -> None:
+        with self._lock:
+            actor_span = self._spans.pop(message.message_id, None)
+        if actor_span is not None:
+            actor_span.end(error=exception)
+        # worker threads are reused, the next message starts without a trace
+        _current_span_context.set(None)
+
+    def after_skip_message(
+        self,
+        broker: dramatiq.Broker,
+        message: dramatiq.Message,
+    ) -> None:
+        self.after_process_message(broker, message)
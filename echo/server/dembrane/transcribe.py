@@ -12,13 +12,14 @@ import json
 import time
 import logging
 import mimetypes
+import threading
 from base64 import b64encode
-from typing import Any, List, Literal, Optional
+from typing import Any, List, Union, Literal, Optional
 
-import litellm
 import requests
 
 from dembrane.s3 import get_signed_url, get_stream_from_s3
+from dembrane.lanes import is_live_chunk_source
 from dembrane.config import (
     API_BASE_URL,
     GEMINI_API_KEY,
@@ -33,21 +34,44 @@ from dembrane.config import (
     LITELLM_WHISPER_API_VERSION,
     ENABLE_ASSEMBLYAI_TRANSCRIPTION,
     RUNPOD_WHISPER_PRIORITY_BASE_URL,
+    ENABLE_TRANSCRIPT_CORRECTION_GATE,
     ENABLE_RUNPOD_WHISPER_TRANSCRIPTION,
     ENABLE_LITELLM_WHISPER_TRANSCRIPTION,
     RUNPOD_WHISPER_MAX_REQUEST_THRESHOLD,
 )
+from dembrane.metrics import observe, increment
 from dembrane.prompts import render_prompt
 from dembrane.service import file_service, conversation_service
+from dembrane.tracing import SPAN_KIND_CLIENT, span, trace_headers, remember_chunk_trace
 from dembrane.directus import directus
+from dembrane.audio_utils import LLM_AUDIO_MIME_TYPE, get_llm_audio_rendition
+from dembrane.identity_map import get_or_load
+from dembrane.correction_gate import (
+    SuspectSpan,
+    decide_correction,
+    format_suspect_spans,
+)
+from dembrane.transcript_cache import (
+    cache_transcript,
+    get_cached_transcript,
+    get_transcript_cache_key,
+    remember_pending_transcript,
+)
+from dembrane.transcription_router import TranscriptionCancelled, route_transcription
+from dembrane.transcription_context import TranscriptionContext, get_transcription_context
 
 logger = logging.getLogger("transcribe")
 
 
+ASSEMBLYAI_SPEECH_MODEL = "universal"
+TRANSCRIPT_CORRECTION_MODEL = "gemini/gemini-2.5-flash"
+
+
 class TranscriptionError(Exception):
     pass
 
 
+@span("runpod.queue", kind=SPAN_KIND_CLIENT)
 def queue_transcribe_audio_runpod(
     audio_file_uri: str,
     language: Optional[str],
@@ -63,6 +87,7 @@ def queue_transcribe_audio_runpod(
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {RUNPOD_WHISPER_API_KEY}",
+            **trace_headers(),
         }
 
         input_payload = {
@@ -98,10 +123,17 @@ def queue_transcribe_audio_runpod(
         raise TranscriptionError(f"Failed to get signed url for {audio_file_uri}: {e}") from e
 
 
+@span("transcribe.litellm", kind=SPAN_KIND_CLIENT)
 def transcribe_audio_litellm(
-    audio_file_uri: str, language: Optional[str], whisper_prompt: Optional[str]
+    audio_file_uri: str,
+    language: Optional[str],
+    whisper_prompt: Optional[str],
+    cancel_event: Optional[threading.Event] = None,
 ) -> str:
-    """Transcribe audio through LiteLLM"""
+    """Transcribe audio through LiteLLM
+
+    The request is not sent when cancel_event is set while the audio downloads.
+    """
     logger = logging.getLogger("transcribe.transcribe_audio_litellm")
 
     try:
@@ -114,6 +146,12 @@ def transcribe_audio_litellm(
         logger.error(f"Failed to get audio stream from S3 for {audio_file_uri}: {exc}")
         raise TranscriptionError(f"Failed to get audio stream from S3: {exc}") from exc
 
+    # importing litellm takes seconds, only pay for it when it is used
+    import litellm
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise TranscriptionCancelled("LiteLLM transcription cancelled")
+
     try:
         response = litellm.transcription(
             model=LITELLM_WHISPER_MODEL,
@@ -130,22 +168,23 @@ def transcribe_audio_litellm(
         raise TranscriptionError(f"LiteLLM transcription failed: {e}") from e
 
 
-def transcribe_audio_assemblyai(
-    audio_file_uri: str,
-    language: Optional[str],  # pyright: ignore[reportUnusedParameter]
-    hotwords: Optional[List[str]],
-) -> tuple[str, dict[str, Any]]:
-    """Transcribe audio through AssemblyAI"""
-    logger = logging.getLogger("transcribe.transcribe_audio_assemblyai")
-
-    headers = {
+def get_assemblyai_headers() -> dict[str, str]:
+    return {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {ASSEMBLYAI_API_KEY}",
+        **trace_headers(),
     }
 
+
+def get_assemblyai_request(
+    audio_file_uri: str,
+    language: Optional[str],
+    hotwords: Optional[List[str]],
+) -> dict[str, Any]:
+    """The body of an AssemblyAI POST /v2/transcript request."""
     data: dict[str, Any] = {
         "audio_url": audio_file_uri,
-        "speech_model": "universal",
+        "speech_model": ASSEMBLYAI_SPEECH_MODEL,
         "language_detection": True,
         "language_detection_options": {
             "expected_languages": [
@@ -169,6 +208,28 @@ def transcribe_audio_assemblyai(
     if hotwords:
         data["keyterms_prompt"] = hotwords
 
+    return data
+
+
+@span("transcribe.assemblyai", kind=SPAN_KIND_CLIENT)
+def transcribe_audio_assemblyai(
+    audio_file_uri: str,
+    language: Optional[str],  # pyright: ignore[reportUnusedParameter]
+    hotwords: Optional[List[str]],
+    cancel_event: Optional[threading.Event] = None,
+) -> tuple[str, dict[str, Any]]:
+    """Transcribe audio through AssemblyAI
+
+    Polling stops with TranscriptionCancelled once cancel_event is set.
+    """
+    logger = logging.getLogger("transcribe.transcribe_audio_assemblyai")
+
+    headers = get_assemblyai_headers()
+    data = get_assemblyai_request(audio_file_uri, language, hotwords)
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise TranscriptionCancelled("AssemblyAI transcription cancelled")
+
     try:
         response = requests.post(f"{ASSEMBLYAI_BASE_URL}/v2/transcript", headers=headers, json=data)
         response.raise_for_status()
@@ -185,42 +246,55 @@ def transcribe_audio_assemblyai(
                 return transcript["text"], transcript
             elif transcript["status"] == "error":
                 raise RuntimeError(f"Transcription failed: {transcript['error']}")
-            else:
+            elif cancel_event is None:
                 time.sleep(3)
+            elif cancel_event.wait(3):
+                raise TranscriptionCancelled(f"AssemblyAI transcript {transcript_id} cancelled")
 
+    except TranscriptionCancelled:
+        raise
     except Exception as e:
         logger.error(f"AssemblyAI transcription failed: {e}")
         raise TranscriptionError(f"AssemblyAI transcription failed: {e}") from e
 
 
+def _audio_file_object(audio_bytes: bytes, mime_type: str) -> dict:
+    encoded_data = b64encode(audio_bytes).decode("utf-8")
+    return {
+        "type": "file",
+        "file": {
+            "file_data": f"data:{mime_type};base64,{encoded_data}",
+        },
+    }
+
+
 def _get_audio_file_object(audio_file_uri: str) -> Any:
+    # compact Opus rendition, cached per audio file (see get_llm_audio_rendition)
+    try:
+        return _audio_file_object(get_llm_audio_rendition(audio_file_uri), LLM_AUDIO_MIME_TYPE)
+    except Exception as e:
+        logger.warning(f"failed to get the LLM audio rendition of {audio_file_uri}: {e}")
+
     try:
         audio_stream = file_service.get_stream(audio_file_uri)
-        encoded_data = b64encode(audio_stream.read()).decode("utf-8")
-        return {
-            "type": "file",
-            "file": {
-                "file_data": "data:audio/mp3;base64,{}".format(encoded_data),
-            },
-        }
+        return _audio_file_object(audio_stream.read(), "audio/mp3")
     except Exception as e:
         logger.warning(f"failed to get audio bytes for {audio_file_uri} using file service: {e}")
         logger.info("trying to get audio bytes naively")
-        audio_bytes = requests.get(audio_file_uri).content
-        encoded_data = b64encode(audio_bytes).decode("utf-8")
-        return {
-            "type": "file",
-            "file": {
-                "file_data": "data:audio/mp3;base64,{}".format(encoded_data),
-            },
-        }
+        audio_bytes = requests.get(audio_file_uri, timeout=60).content
+        return _audio_file_object(audio_bytes, "audio/mp3")
 
 
 def _transcript_correction_workflow(
-    audio_file_uri: str, candidate_transcript: str, hotwords: Optional[List[str]]
+    audio_file_uri: str,
+    candidate_transcript: str,
+    hotwords: Optional[List[str]],
+    suspect_spans: Optional[List[SuspectSpan]] = None,
 ) -> tuple[str, str]:
     """
     Correct the transcript using the transcript correction workflow
+
+    suspect_spans (see dembrane.correction_gate) limit the correction to those parts.
     """
     logger = logging.getLogger("transcribe.transcript_correction_workflow")
 
@@ -233,6 +307,7 @@ def _transcript_correction_workflow(
         "en",
         {
             "hotwords_str": ", ".join(hotwords) if hotwords else "",
+            "suspect_spans_str": format_suspect_spans(suspect_spans) if suspect_spans else "",
         },
     )
 
@@ -252,8 +327,11 @@ def _transcript_correction_workflow(
     }
 
     assert GEMINI_API_KEY, "GEMINI_API_KEY is not set"
+
+    import litellm
+
     response = litellm.completion(
-        model="gemini/gemini-2.5-flash",
+        model=TRANSCRIPT_CORRECTION_MODEL,
         messages=[
             {
                 "role": "system",
@@ -292,10 +370,12 @@ def _transcript_correction_workflow(
     return corrected_transcript, note
 
 
+@span("transcribe.dembrane_25_09", kind=SPAN_KIND_CLIENT)
 def transcribe_audio_dembrane_25_09(
     audio_file_uri: str,
     language: Optional[str],  # pyright: ignore[reportUnusedParameter]
     hotwords: Optional[List[str]],
+    cancel_event: Optional[threading.Event] = None,
 ) -> tuple[str, dict[str, Any]]:
     """Transcribe audio through custom Dembrane-25-09 workflow
 
@@ -305,21 +385,67 @@ def transcribe_audio_dembrane_25_09(
         {
             "note": The note to the user
             "raw": AssemblyAI response
+            "correction": Why the correction ran or was skipped (see dembrane.correction_gate)
         }
     """
     logger = logging.getLogger("transcribe.transcribe_audio_dembrane_25_09")
 
-    transcript, response = transcribe_audio_assemblyai(audio_file_uri, language, hotwords)
+    transcript, response = transcribe_audio_assemblyai(
+        audio_file_uri, language, hotwords, cancel_event=cancel_event
+    )
     logger.debug(f"transcript from assemblyai: {transcript}")
 
+    return correct_assemblyai_transcript(
+        audio_file_uri, transcript, response, hotwords, cancel_event=cancel_event
+    )
+
+
+def correct_assemblyai_transcript(
+    audio_file_uri: str,
+    transcript: str,
+    response: dict[str, Any],
+    hotwords: Optional[List[str]],
+    cancel_event: Optional[threading.Event] = None,
+) -> tuple[str, dict[str, Any]]:
+    """The correction step of Dembrane-25-09, on a finished AssemblyAI transcript.
+
+    Returns: see transcribe_audio_dembrane_25_09
+    """
+    logger = logging.getLogger("transcribe.correct_assemblyai_transcript")
+
+    decision = decide_correction(
+        response.get("words") or [], response.get("audio_duration"), hotwords
+    )
+    if ENABLE_TRANSCRIPT_CORRECTION_GATE and not decision.run:
+        logger.debug("transcript looks clean, skipping the correction workflow")
+        increment("transcript_correction.skipped")
+        return transcript, {
+            "note": "",
+            "raw": response,
+            "correction": decision.model_dump(),
+        }
+
+    if cancel_event is not None and cancel_event.is_set():
+        raise TranscriptionCancelled("Dembrane-25-09 correction cancelled")
+
+    increment("transcript_correction.ran")
+    for reason in decision.reasons:
+        increment("transcript_correction.reasons", tags={"reason": reason})
+
     # use correction workflow to correct keyterms and fix missing segments
+    started_at = time.monotonic()
     corrected_transcript, note = _transcript_correction_workflow(
-        audio_file_uri, transcript, hotwords
+        audio_file_uri,
+        transcript,
+        hotwords,
+        suspect_spans=decision.spans if ENABLE_TRANSCRIPT_CORRECTION_GATE else None,
     )
+    observe("transcript_correction.latency_ms", (time.monotonic() - started_at) * 1000)
 
     return corrected_transcript, {
         "note": note,
         "raw": response,
+        "correction": decision.model_dump(),
     }
 
 
@@ -341,19 +467,25 @@ def _fetch_chunk(conversation_chunk_id: str) -> dict:
 def _fetch_conversation(conversation_id: str) -> dict:
     """Return conversation row (including nested project) or raise ValueError."""
     try:
-        conversation_rows = directus.get_items(
+        conversation_rows = get_or_load(
             "conversation",
-            {
-                "query": {
-                    "filter": {"id": {"_eq": conversation_id}},
-                    "fields": [
-                        "id",
-                        "project_id",
-                        "project_id.language",
-                        "project_id.default_conversation_transcript_prompt",
-                    ],
+            conversation_id,
+            lambda: directus.get_items(
+                "conversation",
+                {
+                    "query": {
+                        "filter": {"id": {"_eq": conversation_id}},
+                        "fields": [
+                            "id",
+                            "project_id",
+                            "project_id.id",
+                            "project_id.language",
+                            "project_id.default_conversation_transcript_prompt",
+                        ],
+                    },
                 },
-            },
+            ),
+            variant="transcribe",
         )
     except Exception as exc:
         logger.error("Failed to get conversation for %s: %s", conversation_id, exc)
@@ -365,14 +497,51 @@ def _fetch_conversation(conversation_id: str) -> dict:
     return conversation_rows[0]
 
 
+@span("transcribe.save_transcript")
 def _save_transcript(
-    conversation_chunk_id: str, transcript: str, diarization: Optional[dict] = None
+    conversation_chunk_id: str,
+    transcript: str,
+    diarization: Optional[dict] = None,
+    cache_key: Optional[str] = None,
+    started_at: Optional[float] = None,
 ) -> None:
+    # cached before the write, so a retry after a failed write does not transcribe again
+    if cache_key is not None and started_at is not None:
+        cache_transcript(
+            cache_key,
+            {"transcript": transcript, "diarization": diarization},
+            provider_seconds=time.monotonic() - started_at,
+        )
+
     conversation_service.update_chunk(
         conversation_chunk_id, transcript=transcript, diarization=diarization
     )
 
 
+def _get_transcript_cache_key(
+    chunk: dict,
+    context: TranscriptionContext,
+    transcript_provider: str,
+) -> Optional[str]:
+    """See dembrane.transcript_cache. The model and prompt/hotwords used by the provider."""
+    hotwords: Union[List[str], str, None] = context.hotwords
+    model: Optional[str]
+    match transcript_provider:
+        case "Dembrane-25-09":
+            model = f"{ASSEMBLYAI_SPEECH_MODEL}+{TRANSCRIPT_CORRECTION_MODEL}"
+        case "AssemblyAI":
+            model = ASSEMBLYAI_SPEECH_MODEL
+        case "LiteLLM":
+            model = LITELLM_WHISPER_MODEL
+            hotwords = context.whisper_prompt
+        case _:
+            model = None
+
+    return get_transcript_cache_key(
+        chunk["path"], transcript_provider, model, context.language, hotwords
+    )
+
+
 def _build_whisper_prompt(conversation: dict, language: str) -> str:
     """Compose the whisper prompt from defaults and project-specific overrides."""
     default_prompt = render_prompt("default_whisper_prompt", language, {})
@@ -396,6 +565,26 @@ def _build_hotwords(conversation: dict) -> Optional[List[str]]:
     return None
 
 
+def _load_transcription_context(conversation_id: str) -> TranscriptionContext:
+    conversation = _fetch_conversation(conversation_id)
+    language = conversation["project_id"]["language"] or "en"
+    return TranscriptionContext(
+        conversation_id=conversation_id,
+        project_id=conversation["project_id"]["id"],
+        language=language,
+        provider=_get_transcript_provider(),
+        hotwords=_build_hotwords(conversation),
+        whisper_prompt=_build_whisper_prompt(conversation, language),
+    )
+
+
+def _get_transcription_context(conversation_id: str) -> TranscriptionContext:
+    """Cached language, hotwords, prompt and provider (see dembrane.transcription_context)."""
+    return get_transcription_context(
+        conversation_id, lambda: _load_transcription_context(conversation_id)
+    )
+
+
 def _get_transcript_provider() -> Literal["Runpod", "LiteLLM", "AssemblyAI", "Dembrane-25-09"]:
     if TRANSCRIPTION_PROVIDER:
         return TRANSCRIPTION_PROVIDER
@@ -427,6 +616,7 @@ def _process_runpod_transcription(
     conversation_chunk_id: str,
     language: str,
     hotwords: Optional[List[str]],
+    cache_key: Optional[str] = None,
 ) -> str:
     """Handle RunPod status checking, queuing new jobs and Directus updates.
 
@@ -462,7 +652,7 @@ def _process_runpod_transcription(
         return conversation_chunk_id
 
     # 3. Queue a new transcription job
-    is_priority = source == "PORTAL_AUDIO"
+    is_priority = is_live_chunk_source(source)
 
     job_id = queue_transcribe_audio_runpod(
         chunk["path"],
@@ -471,12 +661,18 @@ def _process_runpod_transcription(
         is_priority=is_priority,
         conversation_chunk_id=conversation_chunk_id,
     )
+    # the trace continues and the result is cached when the webhook comes in (dembrane.runpod)
+    remember_chunk_trace(conversation_chunk_id)
+    remember_pending_transcript(conversation_chunk_id, cache_key)
+
+    # jobs have to be polled on the endpoint they were queued on
+    runpod_base_url = RUNPOD_WHISPER_PRIORITY_BASE_URL if is_priority else RUNPOD_WHISPER_BASE_URL
 
     directus.update_item(
         collection_name="conversation_chunk",
         item_id=conversation_chunk_id,
         item_data={
-            "runpod_job_status_link": f"{str(RUNPOD_WHISPER_BASE_URL)}/status/{job_id}",
+            "runpod_job_status_link": f"{str(runpod_base_url).rstrip('/')}/status/{job_id}",
             "runpod_request_count": runpod_request_count + 1,
         },
     )
@@ -484,11 +680,67 @@ def _process_runpod_transcription(
     return conversation_chunk_id
 
 
-def transcribe_conversation_chunk(conversation_chunk_id: str) -> str:
+def _transcribe_with_provider(
+    transcript_provider: str,
+    chunk: dict,
+    context: TranscriptionContext,
+    cancel_event: Optional[threading.Event] = None,
+) -> tuple[str, Optional[dict]]:
+    """Transcribe with one of the synchronous providers (see dembrane.transcription_router).
+
+    Returns:
+        0: The transcript
+        1: The diarization to save on the chunk
+    """
+    match transcript_provider:
+        case "Dembrane-25-09":
+            signed_url = get_signed_url(chunk["path"], expires_in_seconds=3 * 24 * 60 * 60)
+            transcript, response = transcribe_audio_dembrane_25_09(
+                signed_url,
+                language=context.language,
+                hotwords=context.hotwords,
+                cancel_event=cancel_event,
+            )
+            return transcript, {"schema": "Dembrane-25-09", "data": response}
+
+        case "AssemblyAI":
+            signed_url = get_signed_url(chunk["path"], expires_in_seconds=3 * 24 * 60 * 60)
+            transcript, assemblyai_response = transcribe_audio_assemblyai(
+                signed_url,
+                language=context.language,
+                hotwords=context.hotwords,
+                cancel_event=cancel_event,
+            )
+            return transcript, {
+                "schema": "ASSEMBLYAI",
+                "data": assemblyai_response.get("words", {}),
+            }
+
+        case "LiteLLM":
+            transcript = transcribe_audio_litellm(
+                chunk["path"],
+                language=context.language,
+                whisper_prompt=context.whisper_prompt,
+                cancel_event=cancel_event,
+            )
+            return transcript, None
+
+        case _:
+            raise TranscriptionError(f"{transcript_provider} is not a synchronous provider")
+
+
+def transcribe_conversation_chunk(conversation_chunk_id: str, use_cache: bool = True) -> str:
     """
     Process conversation chunk for transcription
     matches on _get_transcript_provider()
 
+    Synchronous providers are routed through dembrane.transcription_router, which
+    hedges slow requests and fails over to TRANSCRIPTION_FALLBACK_PROVIDERS.
+
+    A cached result for the same audio, provider and hotwords is used instead of
+    transcribing again (see dembrane.transcript_cache). use_cache=False forces a new
+    transcription, whose result replaces the cached one.
+
     Returns:
         str: The conversation chunk ID if successful
 
@@ -499,56 +751,55 @@ def transcribe_conversation_chunk(conversation_chunk_id: str) -> str:
     logger = logging.getLogger("transcribe.transcribe_conversation_chunk")
     try:
         chunk = _fetch_chunk(conversation_chunk_id)
-        conversation = _fetch_conversation(chunk["conversation_id"])
-        language = conversation["project_id"]["language"] or "en"
-
-        transcript_provider = _get_transcript_provider()
-
-        match transcript_provider:
-            case "Dembrane-25-09":
-                logger.info("Using Dembrane-25-09 for transcription")
-                hotwords = _build_hotwords(conversation)
-                signed_url = get_signed_url(chunk["path"], expires_in_seconds=3 * 24 * 60 * 60)
-                transcript, response = transcribe_audio_dembrane_25_09(
-                    signed_url, language=language, hotwords=hotwords
-                )
-                _save_transcript(
-                    conversation_chunk_id,
-                    transcript,
-                    diarization={"schema": "Dembrane-25-09", "data": response},
-                )
-                return conversation_chunk_id
+        context = _get_transcription_context(chunk["conversation_id"])
+        transcript_provider = context.provider
 
-            case "AssemblyAI":
-                logger.info("Using AssemblyAI for transcription")
-                hotwords = _build_hotwords(conversation)
-                signed_url = get_signed_url(chunk["path"], expires_in_seconds=3 * 24 * 60 * 60)
-                transcript, assemblyai_response = transcribe_audio_assemblyai(
-                    signed_url, language=language, hotwords=hotwords
-                )
-                _save_transcript(
-                    conversation_chunk_id,
-                    transcript,
-                    diarization={
-                        "schema": "ASSEMBLYAI",
-                        "data": assemblyai_response.get("words", {}),
-                    },
-                )
-                return conversation_chunk_id
-            case "Runpod":
-                logger.info("Using RunPod for transcription")
-                hotwords = _build_hotwords(conversation)
-                return _process_runpod_transcription(
-                    chunk, conversation_chunk_id, language, hotwords
-                )
-            case "LiteLLM":
-                logger.info("Using LITELLM for transcription")
-                whisper_prompt = _build_whisper_prompt(conversation, language)
-                transcript = transcribe_audio_litellm(
-                    chunk["path"], language=language, whisper_prompt=whisper_prompt
-                )
-                _save_transcript(conversation_chunk_id, transcript, diarization=None)
-                return conversation_chunk_id
+        cache_key = _get_transcript_cache_key(chunk, context, transcript_provider)
+        cached_chunk_update = (
+            get_cached_transcript(cache_key, transcript_provider) if use_cache else None
+        )
+        if cached_chunk_update is not None:
+            logger.info(f"Using the cached {transcript_provider} transcript")
+            conversation_service.update_chunk(conversation_chunk_id, **cached_chunk_update)
+            return conversation_chunk_id
+
+        if transcript_provider == "Runpod":
+            logger.info("Using RunPod for transcription")
+            return _process_runpod_transcription(
+                chunk,
+                conversation_chunk_id,
+                context.language,
+                context.hotwords,
+                cache_key=cache_key,
+            )
+
+        logger.info(f"Using {transcript_provider} for transcription")
+        started_at = time.monotonic()
+        routed = route_transcription(
+            transcript_provider,
+            lambda provider, cancel_event: _transcribe_with_provider(
+                provider, chunk, context, cancel_event
+            ),
+        )
+
+        diarization = routed.diarization
+        if routed.attempted != [transcript_provider]:
+            # hedged or failed over: record which provider answered
+            diarization = {
+                **(diarization or {"schema": routed.provider, "data": None}),
+                "router": routed.to_dict(),
+            }
+        if routed.provider != transcript_provider:
+            cache_key = _get_transcript_cache_key(chunk, context, routed.provider)
+
+        _save_transcript(
+            conversation_chunk_id,
+            routed.transcript,
+            diarization=diarization,
+            cache_key=cache_key,
+            started_at=started_at,
+        )
+        return conversation_chunk_id
 
     except Exception as e:
         logger.error("Failed to process conversation chunk %s: %s", conversation_chunk_id, e)
@@ -0,0 +1,171 @@
+"""
+Cache of transcription results, keyed by everything that determines a transcript.
+
+Retranscribing a conversation and retrying a transcription whose Directus write
+failed both send the same audio to the same provider again. Results are cached
+by (audio content hash, provider, model, language, hotwords hash) for
+TRANSCRIPT_CACHE_TTL_SECONDS; transcribe_conversation_chunk looks them up before
+calling the provider (unless asked to bypass the cache) and stores every new
+result before writing it to the chunk.
+
+- The audio hash is the S3 ETag of the chunk file (the MD5 of its content for
+  single-part uploads, which is how the server writes audio), so a lookup costs
+  a HEAD request, not a download.
+- What is cached are the fields written on the chunk (transcript, diarization,
+  raw_transcript...), so a hit is applied with a single update_chunk.
+- RunPod results arrive by webhook: the cache key of a queued job is kept per
+  chunk (remember_pending_transcript) and the result is cached when the webhook
+  is applied (cache_pending_transcript, see dembrane.runpod).
+
+Metrics, per provider: transcript_cache.hits, transcript_cache.misses and
+transcript_cache.saved_provider_seconds (what the cached result took the
+provider), summarized by get_transcript_cache_stats.
+"""
+
+import json
+import time
+import zlib
+import hashlib
+from typing import List, Union, Optional, cast
+from logging import getLogger
+
+from dembrane.s3 import get_etag_from_s3
+from dembrane.config import ENABLE_TRANSCRIPT_CACHE, TRANSCRIPT_CACHE_TTL_SECONDS
+from dembrane.metrics import increment, get_counter
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.transcript_cache")
+
+TRANSCRIPT_CACHE_KEY_PREFIX = "dembrane:transcript_cache:"
+TRANSCRIPT_CACHE_PENDING_KEY_PREFIX = "dembrane:transcript_cache_pending:"
+# longer than a RunPod job is allowed to take
+TRANSCRIPT_CACHE_PENDING_TTL_SECONDS = 24 * 60 * 60
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def get_transcript_cache_key(
+    audio_path: str,
+    provider: str,
+    model: Optional[str],
+    language: Optional[str],
+    hotwords: Union[List[str], str, None],
+) -> Optional[str]:
+    """
+    Args:
+        hotwords: hotwords, or the prompt for providers that take one instead
+
+    Returns:
+        The cache key, or None when caching is off or the audio cannot be hashed. (Optional[str])
+    """
+    if not ENABLE_TRANSCRIPT_CACHE:
+        return None
+
+    try:
+        audio_hash = get_etag_from_s3(audio_path)
+    except Exception as e:
+        logger.warning(f"Failed to hash {audio_path}, not caching its transcript: {e}")
+        return None
+
+    if isinstance(hotwords, list):
+        hotwords = ",".join(hotwords)
+    hotwords_hash = _hash(hotwords or "")
+
+    return TRANSCRIPT_CACHE_KEY_PREFIX + _hash(
+        json.dumps([audio_hash, provider, model or "", language or "", hotwords_hash])
+    )
+
+
+def get_cached_transcript(cache_key: Optional[str], provider: str) -> Optional[dict]:
+    """
+    Returns:
+        The cached chunk fields (transcript, diarization...), or None on a miss. (Optional[dict])
+    """
+    if cache_key is None:
+        return None
+
+    tags = {"provider": provider}
+    try:
+        value = cast(Optional[bytes], get_redis_client().get(cache_key))
+        entry = json.loads(zlib.decompress(value)) if value is not None else None
+    except Exception as e:
+        # a corrupt entry is a miss, the new result overwrites it
+        logger.warning(f"Failed to read the transcript cache: {e}")
+        entry = None
+
+    if entry is None:
+        increment("transcript_cache.misses", tags=tags)
+        return None
+
+    increment("transcript_cache.hits", tags=tags)
+    increment("transcript_cache.saved_provider_seconds", entry["provider_seconds"], tags=tags)
+    return entry["chunk_update"]
+
+
+def cache_transcript(cache_key: Optional[str], chunk_update: dict, provider_seconds: float) -> None:
+    """Store the chunk fields of a new transcription result. Never raises."""
+    if cache_key is None:
+        return
+
+    try:
+        value = zlib.compress(
+            json.dumps(
+                {"chunk_update": chunk_update, "provider_seconds": provider_seconds}
+            ).encode()
+        )
+        get_redis_client().set(cache_key, value, ex=TRANSCRIPT_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Failed to cache transcript: {e}")
+
+
+def remember_pending_transcript(conversation_chunk_id: str, cache_key: Optional[str]) -> None:
+    """Keep the cache key of a chunk whose transcript comes back by webhook."""
+    if cache_key is None:
+        return
+
+    try:
+        get_redis_client().set(
+            TRANSCRIPT_CACHE_PENDING_KEY_PREFIX + conversation_chunk_id,
+            json.dumps({"cache_key": cache_key, "queued_at": time.time()}),
+            ex=TRANSCRIPT_CACHE_PENDING_TTL_SECONDS,
+        )
+    except Exception as e:
+        logger.warning(f"Failed to remember the cache key of chunk {conversation_chunk_id}: {e}")
+
+
+def cache_pending_transcript(conversation_chunk_id: str, chunk_update: dict) -> None:
+    """Cache the webhook result of a chunk queued with remember_pending_transcript."""
+    if not ENABLE_TRANSCRIPT_CACHE:
+        return
+
+    try:
+        value = cast(
+            Optional[bytes],
+            get_redis_client().getdel(TRANSCRIPT_CACHE_PENDING_KEY_PREFIX + conversation_chunk_id),
+        )
+        if value is None:
+            return
+        pending = json.loads(value)
+    except Exception as e:
+        logger.warning(f"Failed to load the cache key of chunk {conversation_chunk_id}: {e}")
+        return
+
+    cache_transcript(pending["cache_key"], chunk_update, time.time() - pending["queued_at"])
+
+
+def get_transcript_cache_stats(provider: str) -> dict:
+    """
+    Returns:
+        {"hits", "misses", "hit_rate", "saved_provider_seconds"} since the counters started
+    """
+    tags = {"provider": provider}
+    hits = get_counter("transcript_cache.hits", tags=tags)
+    misses = get_counter("transcript_cache.misses", tags=tags)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "saved_provider_seconds": get_counter("transcript_cache.saved_provider_seconds", tags=tags),
+    }
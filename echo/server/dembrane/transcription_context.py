@@ -0,0 +1,155 @@
+"""
+Per-conversation transcription context, computed once and kept in Redis.
+
+Every chunk used to fetch its conversation with the nested project to rebuild
+the same language, hotwords and whisper prompt. Those only change when the
+project does, so the context is computed once per conversation:
+
+    dembrane:transcription_context:{conversation_id}   hash {data, project_id, generation}
+    dembrane:transcription_context:project:{project_id}  generation of the project
+    dembrane:transcription_context:invalidations       bumped by every invalidation
+
+get_transcription_context is a single Redis round trip; a miss (or a stale
+entry) loads the context through `load` and stores it with the project's
+current generation. The lookup also returns the invalidation counter, and the
+context is only stored if the counter did not move while it loaded, so an edit
+landing mid-load cannot leave the old context cached under the new generation.
+
+- invalidate_project_transcription_context bumps the generation of a project,
+  which makes the contexts of all its conversations stale at once. The
+  ProjectService calls it when it changes a project or its tags, the dashboard
+  through POST /projects/{project_id}/invalidate-transcription-context after an
+  edit.
+- Entries expire after TRANSCRIPTION_CONTEXT_TTL_SECONDS, which bounds how long
+  an edit that bypasses both goes unnoticed.
+- If Redis is unavailable the context is loaded every time, as before.
+"""
+
+from typing import List, Callable, Optional, cast
+from logging import getLogger
+
+from pydantic import BaseModel
+
+from dembrane.config import TRANSCRIPTION_CONTEXT_TTL_SECONDS
+from dembrane.metrics import increment
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.transcription_context")
+
+TRANSCRIPTION_CONTEXT_KEY_PREFIX = "dembrane:transcription_context:"
+TRANSCRIPTION_CONTEXT_PROJECT_KEY_PREFIX = "dembrane:transcription_context:project:"
+TRANSCRIPTION_CONTEXT_INVALIDATIONS_KEY = "dembrane:transcription_context:invalidations"
+
+# {invalidation counter, the context of KEYS[1] or false when missing or stale}
+_GET_SCRIPT = """
+local invalidations = redis.call('GET', KEYS[2]) or '0'
+local entry = redis.call('HMGET', KEYS[1], 'data', 'project_id', 'generation')
+if not entry[1] then
+    return {invalidations, false}
+end
+local generation = redis.call('GET', ARGV[1] .. entry[2]) or '0'
+if generation ~= entry[3] then
+    return {invalidations, false}
+end
+return {invalidations, entry[1]}
+"""
+
+# store the context with the current generation of its project, unless something was
+# invalidated since the lookup (ARGV[4]) that preceded loading it
+_SET_SCRIPT = """
+if (redis.call('GET', KEYS[3]) or '0') ~= ARGV[4] then
+    return 0
+end
+local generation = redis.call('GET', KEYS[2]) or '0'
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'data', ARGV[1], 'project_id', ARGV[2], 'generation', generation)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class TranscriptionContext(BaseModel):
+    conversation_id: str
+    project_id: str
+    language: str
+    provider: str
+    hotwords: Optional[List[str]] = None
+    whisper_prompt: str = ""
+
+
+def _context_key(conversation_id: str) -> str:
+    return TRANSCRIPTION_CONTEXT_KEY_PREFIX + conversation_id
+
+
+def _project_key(project_id: str) -> str:
+    return TRANSCRIPTION_CONTEXT_PROJECT_KEY_PREFIX + project_id
+
+
+def get_transcription_context(
+    conversation_id: str, load: Callable[[], TranscriptionContext]
+) -> TranscriptionContext:
+    """
+    Args:
+        conversation_id: The conversation to get the context of. (str)
+        load: Computes the context from Directus, on a miss. (Callable)
+    """
+    try:
+        invalidations, data = cast(
+            list[Optional[bytes]],
+            get_redis_client().eval(
+                _GET_SCRIPT,
+                2,
+                _context_key(conversation_id),
+                TRANSCRIPTION_CONTEXT_INVALIDATIONS_KEY,
+                TRANSCRIPTION_CONTEXT_PROJECT_KEY_PREFIX,
+            ),
+        )
+    except Exception as e:
+        logger.warning(f"Failed to read the transcription context of {conversation_id}: {e}")
+        return load()
+
+    if data:
+        increment("transcription_context.hits")
+        return TranscriptionContext.model_validate_json(data)
+
+    increment("transcription_context.misses")
+    context = load()
+    try:
+        get_redis_client().eval(
+            _SET_SCRIPT,
+            3,
+            _context_key(conversation_id),
+            _project_key(context.project_id),
+            TRANSCRIPTION_CONTEXT_INVALIDATIONS_KEY,
+            context.model_dump_json(),
+            context.project_id,
+            str(TRANSCRIPTION_CONTEXT_TTL_SECONDS),
+            (invalidations or b"0").decode(),
+        )
+    except Exception as e:
+        logger.warning(f"Failed to store the transcription context of {conversation_id}: {e}")
+    return context
+
+
+def invalidate_transcription_context(conversation_id: str) -> None:
+    """Never raises."""
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.delete(_context_key(conversation_id))
+        pipe.incr(TRANSCRIPTION_CONTEXT_INVALIDATIONS_KEY)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to invalidate the transcription context of {conversation_id}: {e}")
+
+
+def invalidate_project_transcription_context(project_id: str) -> None:
+    """Make the contexts of every conversation of the project stale. Never raises."""
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.incr(_project_key(project_id))
+        # outlives every context stored with an older generation
+        pipe.expire(_project_key(project_id), TRANSCRIPTION_CONTEXT_TTL_SECONDS * 2)
+        pipe.incr(TRANSCRIPTION_CONTEXT_INVALIDATIONS_KEY)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to invalidate the transcription contexts of {project_id}: {e}")
@@ -0,0 +1,316 @@
+"""
+Routes synchronous transcriptions across providers, with hedging and failover.
+
+TRANSCRIPTION_PROVIDER (see _get_transcript_provider) is the primary provider;
+TRANSCRIPTION_FALLBACK_PROVIDERS lists the others to try, in order. For every
+chunk, route_transcription:
+
+1. sends the request to the first healthy provider (providers whose recent
+   error rate is over TRANSCRIPTION_PROVIDER_MAX_ERROR_RATE go last),
+2. if it has not answered after its recent p95 latency (clamped to
+   TRANSCRIPTION_HEDGE_MIN/MAX_DELAY_SECONDS), sends a hedged request to the
+   next provider, as long as the hourly TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR
+   is not used up,
+3. fails over to the next provider right away when a request fails,
+4. returns the first good answer and cancels the other request. AssemblyAI
+   polling (also under Dembrane-25-09) stops within one poll interval, before the
+   correction step; a single blocking call (LiteLLM) cannot be interrupted once
+   sent, its answer is dropped.
+
+The answer records the routing in the chunk's diarization (see
+transcribe_conversation_chunk): "schema" is that of the provider that
+answered, "router" lists the providers tried and whether the request was
+hedged.
+
+Latency samples ("transcription.latency_ms") and request/error counts per
+provider are shared by all workers through Redis, so one slow or failing
+provider is routed around everywhere. RunPod answers through a webhook and is
+not routed; with RunPod as the primary provider nothing changes.
+"""
+
+import time
+import threading
+import contextvars
+from typing import Callable, Optional
+from logging import getLogger
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from dembrane.config import (
+    GEMINI_API_KEY,
+    ASSEMBLYAI_API_KEY,
+    LITELLM_WHISPER_MODEL,
+    TRANSCRIPTION_FALLBACK_PROVIDERS,
+    TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR,
+    TRANSCRIPTION_HEDGE_MIN_DELAY_SECONDS,
+)
+from dembrane.metrics import observe, increment, get_timing_summary
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.transcription_router")
+
+SYNC_TRANSCRIPTION_PROVIDERS = ("Dembrane-25-09", "AssemblyAI", "LiteLLM")
+
+TRANSCRIPTION_HEDGE_MAX_DELAY_SECONDS = 120.0
+# p95 latencies are read from Redis at most this often per process
+TRANSCRIPTION_LATENCY_CACHE_SECONDS = 60.0
+
+TRANSCRIPTION_PROVIDER_MAX_ERROR_RATE = 0.5
+# requests in the health window before the error rate is trusted
+TRANSCRIPTION_PROVIDER_MIN_REQUESTS = 5
+TRANSCRIPTION_HEALTH_BUCKET_SECONDS = 5 * 60
+
+_HEALTH_KEY_PREFIX = "dembrane:transcription_router:health:"
+_HEDGE_BUDGET_KEY_PREFIX = "dembrane:transcription_router:hedges:"
+
+_hedge_delay_cache: dict[str, tuple[float, float]] = {}
+
+
+class TranscriptionCancelled(Exception):
+    """Raised by a provider call whose hedged twin answered first."""
+
+
+class RoutedTranscription:
+    def __init__(
+        self,
+        provider: str,
+        transcript: str,
+        diarization: Optional[dict],
+        attempted: list[str],
+        hedged: bool,
+    ):
+        self.provider = provider
+        self.transcript = transcript
+        self.diarization = diarization
+        self.attempted = attempted
+        self.hedged = hedged
+
+    def to_dict(self) -> dict:
+        return {"provider": self.provider, "attempted": self.attempted, "hedged": self.hedged}
+
+
+def is_provider_configured(provider: str) -> bool:
+    match provider:
+        case "AssemblyAI":
+            return bool(ASSEMBLYAI_API_KEY)
+        case "Dembrane-25-09":
+            return bool(ASSEMBLYAI_API_KEY and GEMINI_API_KEY)
+        case "LiteLLM":
+            return bool(LITELLM_WHISPER_MODEL)
+        case _:
+            return False
+
+
+def _health_key(provider: str, bucket: int) -> str:
+    return f"{_HEALTH_KEY_PREFIX}{provider}:{bucket}"
+
+
+def record_provider_outcome(provider: str, latency_seconds: float, ok: bool) -> None:
+    """Never raises."""
+    tags = {"provider": provider}
+    if ok:
+        observe("transcription.latency_ms", latency_seconds * 1000, tags=tags)
+    else:
+        increment("transcription.errors", tags=tags)
+
+    try:
+        key = _health_key(provider, int(time.time() // TRANSCRIPTION_HEALTH_BUCKET_SECONDS))
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.hincrby(key, "requests", 1)
+        if not ok:
+            pipe.hincrby(key, "errors", 1)
+        pipe.expire(key, TRANSCRIPTION_HEALTH_BUCKET_SECONDS * 3)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to record the outcome of {provider}: {e}")
+
+
+def get_provider_health(provider: str) -> dict:
+    """
+    Returns:
+        {"requests", "errors", "error_rate"} over the current and previous health bucket
+    """
+    bucket = int(time.time() // TRANSCRIPTION_HEALTH_BUCKET_SECONDS)
+    requests = errors = 0
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        for key in (_health_key(provider, bucket), _health_key(provider, bucket - 1)):
+            pipe.hmget(key, ["requests", "errors"])
+        for bucket_requests, bucket_errors in pipe.execute():
+            requests += int(bucket_requests or 0)
+            errors += int(bucket_errors or 0)
+    except Exception as e:
+        logger.debug(f"Failed to read the health of {provider}: {e}")
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "error_rate": errors / requests if requests else 0.0,
+    }
+
+
+def is_provider_healthy(provider: str) -> bool:
+    health = get_provider_health(provider)
+    return (
+        health["requests"] < TRANSCRIPTION_PROVIDER_MIN_REQUESTS
+        or health["error_rate"] <= TRANSCRIPTION_PROVIDER_MAX_ERROR_RATE
+    )
+
+
+def get_hedge_delay_seconds(provider: str) -> float:
+    """The recent p95 latency of `provider`, clamped to the hedge delay bounds."""
+    now = time.monotonic()
+    cached = _hedge_delay_cache.get(provider)
+    if cached is not None and now - cached[1] < TRANSCRIPTION_LATENCY_CACHE_SECONDS:
+        return cached[0]
+
+    try:
+        p95_ms = get_timing_summary("transcription.latency_ms", tags={"provider": provider})["p95"]
+    except Exception as e:
+        logger.debug(f"Failed to read the latency of {provider}: {e}")
+        p95_ms = 0.0
+
+    delay = (
+        min(
+            max(p95_ms / 1000, TRANSCRIPTION_HEDGE_MIN_DELAY_SECONDS),
+            TRANSCRIPTION_HEDGE_MAX_DELAY_SECONDS,
+        )
+        if p95_ms
+        else TRANSCRIPTION_HEDGE_MAX_DELAY_SECONDS
+    )
+    _hedge_delay_cache[provider] = (delay, now)
+    return delay
+
+
+def take_hedge_budget() -> bool:
+    """Count one hedged request against the hourly budget, False if it is used up."""
+    if TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR <= 0:
+        return False
+    try:
+        key = f"{_HEDGE_BUDGET_KEY_PREFIX}{int(time.time() // 3600)}"
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, 2 * 3600)
+        used = pipe.execute()[0]
+    except Exception as e:
+        logger.debug(f"Failed to take hedge budget: {e}")
+        return False
+    return int(used) <= TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR
+
+
+def get_provider_order(primary: str) -> list[str]:
+    """The primary provider, then the configured fallbacks; unhealthy providers go last."""
+    providers = [primary] + [
+        provider
+        for provider in TRANSCRIPTION_FALLBACK_PROVIDERS
+        if provider != primary
+        and provider in SYNC_TRANSCRIPTION_PROVIDERS
+        and is_provider_configured(provider)
+    ]
+    if len(providers) == 1:
+        return providers
+    # stable: the configured order is kept within healthy and within unhealthy providers
+    return sorted(providers, key=lambda provider: not is_provider_healthy(provider))
+
+
+TranscribeFn = Callable[[str, threading.Event], tuple[str, Optional[dict]]]
+
+
+def _run_provider(
+    provider: str, transcribe: TranscribeFn, cancel_event: threading.Event
+) -> tuple[str, Optional[dict]]:
+    started_at = time.monotonic()
+    try:
+        result = transcribe(provider, cancel_event)
+    except TranscriptionCancelled:
+        raise
+    except Exception:
+        record_provider_outcome(provider, time.monotonic() - started_at, ok=False)
+        raise
+    record_provider_outcome(provider, time.monotonic() - started_at, ok=True)
+    return result
+
+
+def route_transcription(primary: str, transcribe: TranscribeFn) -> RoutedTranscription:
+    """
+    Args:
+        primary: the configured provider
+        transcribe: (provider, cancel_event) -> (transcript, diarization); should stop with
+            TranscriptionCancelled once cancel_event is set, where it can
+
+    Raises:
+        The error of the last provider when all of them failed.
+    """
+    order = get_provider_order(primary)
+    if len(order) == 1:
+        transcript, diarization = _run_provider(primary, transcribe, threading.Event())
+        return RoutedTranscription(primary, transcript, diarization, [primary], hedged=False)
+
+    attempted: list[str] = []
+    cancel_events: dict[str, threading.Event] = {}
+    pending: dict[Future, str] = {}
+    hedged = False
+    last_error: Optional[BaseException] = None
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="transcription-router")
+
+    def start_next() -> None:
+        provider = order[len(attempted)]
+        attempted.append(provider)
+        cancel_events[provider] = threading.Event()
+        # copied so the provider spans stay in the trace of the chunk (dembrane.tracing)
+        future = executor.submit(
+            contextvars.copy_context().run,
+            _run_provider,
+            provider,
+            transcribe,
+            cancel_events[provider],
+        )
+        pending[future] = provider
+
+    try:
+        start_next()
+        hedge_at: Optional[float] = time.monotonic() + get_hedge_delay_seconds(order[0])
+
+        while pending:
+            can_hedge = hedge_at is not None and len(attempted) < len(order) and len(pending) == 1
+            timeout = max(0.0, hedge_at - time.monotonic()) if can_hedge and hedge_at else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # the request is slower than usual: race it against the next provider, once
+                hedge_at = None
+                if take_hedge_budget():
+                    logger.info(f"{attempted[-1]} is slow, hedging with {order[len(attempted)]}")
+                    increment("transcription.hedged", tags={"provider": order[len(attempted)]})
+                    hedged = True
+                    start_next()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    transcript, diarization = future.result()
+                except Exception as e:
+                    logger.warning(f"Transcription with {provider} failed: {e}")
+                    last_error = e
+                    continue
+
+                for other in pending.values():
+                    cancel_events[other].set()
+                    increment("transcription.hedge_cancelled", tags={"provider": other})
+                if provider != primary:
+                    increment("transcription.fallback_won", tags={"provider": provider})
+
+                return RoutedTranscription(provider, transcript, diarization, attempted, hedged)
+
+            if not pending and len(attempted) < len(order):
+                logger.info(f"Failing over to {order[len(attempted)]}")
+                increment("transcription.failover", tags={"provider": order[len(attempted)]})
+                start_next()
+                if hedge_at is not None:
+                    hedge_at = time.monotonic() + get_hedge_delay_seconds(attempted[-1])
+
+        assert last_error is not None
+        raise last_error
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,291 @@
+"""
+Durable ingestion queue for RunPod transcription webhooks.
+
+The webhook endpoint only validates the callback and appends it to a Redis
+stream (dembrane:webhooks:runpod), so it answers in a few milliseconds whatever
+the state of Directus. task_consume_runpod_webhooks reads the stream with a
+consumer group and applies the callbacks in batches (one bulk chunk update and
+one completion check per conversation, see
+dembrane.runpod.apply_runpod_transcription_responses).
+
+Entries are acknowledged and deleted only once applied. When a batch fails (e.g.
+Directus is briefly unavailable) a retry message claims exactly those entries
+again after RUNPOD_WEBHOOK_RETRY_DELAY_MS, doubling the delay on every attempt.
+Entries of a consumer that crashed are claimed again after
+RUNPOD_WEBHOOK_RECLAIM_IDLE_MS. Entries are dropped after
+RUNPOD_WEBHOOK_MAX_DELIVERIES attempts (the periodic RunPod reconciliation still
+picks those chunks up through their runpod_job_status_link).
+"""
+
+import os
+import json
+import time
+import socket
+from typing import Any, Optional, cast
+from logging import getLogger
+
+from redis.exceptions import ResponseError
+
+from dembrane.metrics import observe, increment
+from dembrane.redis_utils import get_redis_client
+
+logger = getLogger("dembrane.webhook_queue")
+
+RUNPOD_WEBHOOK_STREAM_KEY = "dembrane:webhooks:runpod"
+RUNPOD_WEBHOOK_CONSUMER_GROUP = "runpod-webhook-consumers"
+# approximate cap, only reached if nothing consumes the stream for a long time
+RUNPOD_WEBHOOK_STREAM_MAXLEN = 100_000
+
+RUNPOD_WEBHOOK_BATCH_SIZE = 100
+# batches applied per consumer message before it hands over to a new message
+RUNPOD_WEBHOOK_MAX_BATCHES = 10
+# callbacks arriving within this window are applied by the same consumer message
+RUNPOD_WEBHOOK_CONSUME_DELAY_MS = 500
+
+RUNPOD_WEBHOOK_RECLAIM_IDLE_MS = 5 * 60 * 1000
+# delay before the first retry of a failed batch, doubled on every attempt
+RUNPOD_WEBHOOK_RETRY_DELAY_MS = 2 * 1000
+RUNPOD_WEBHOOK_MAX_DELIVERIES = 5
+
+_CONSUMER_SCHEDULED_KEY = "dembrane:webhooks:runpod:consumer_scheduled"
+
+
+def validate_runpod_webhook_payload(payload: Any) -> None:
+    """
+    Raises:
+        ValueError: if the payload can never be applied
+    """
+    if not isinstance(payload, dict):
+        raise ValueError(f"Expected a JSON object, got {type(payload).__name__}")
+
+    if "output" not in payload:
+        raise ValueError("Missing 'output' key")
+
+
+def schedule_runpod_webhook_consumer() -> None:
+    """Send one (delayed) consumer message per RUNPOD_WEBHOOK_CONSUME_DELAY_MS at most."""
+    if not get_redis_client().set(
+        _CONSUMER_SCHEDULED_KEY, 1, nx=True, px=RUNPOD_WEBHOOK_CONSUME_DELAY_MS
+    ):
+        return
+
+    from dembrane.tasks import task_consume_runpod_webhooks
+
+    task_consume_runpod_webhooks.send_with_options(delay=RUNPOD_WEBHOOK_CONSUME_DELAY_MS)
+
+
+def schedule_runpod_webhook_retry(entry_ids: list[str], attempt: int) -> None:
+    """Send a consumer message that claims and applies the given failed entries."""
+    from dembrane.tasks import task_consume_runpod_webhooks
+
+    task_consume_runpod_webhooks.send_with_options(
+        args=(entry_ids, attempt),
+        delay=RUNPOD_WEBHOOK_RETRY_DELAY_MS * 2 ** (attempt - 1),
+    )
+
+
+def enqueue_runpod_webhook(payload: dict) -> str:
+    """
+    Append a validated callback to the stream.
+
+    Returns:
+        The stream entry id. (str)
+    """
+    entry_id = cast(
+        bytes,
+        get_redis_client().xadd(
+            RUNPOD_WEBHOOK_STREAM_KEY,
+            {"payload": json.dumps(payload)},
+            maxlen=RUNPOD_WEBHOOK_STREAM_MAXLEN,
+            approximate=True,
+        ),
+    )
+    increment("runpod_webhook.received")
+
+    try:
+        schedule_runpod_webhook_consumer()
+    except Exception as e:
+        # the entry is stored, the scheduler fallback will pick it up
+        logger.warning(f"Failed to schedule the RunPod webhook consumer: {e}")
+
+    return entry_id.decode()
+
+
+def _ensure_consumer_group() -> None:
+    try:
+        get_redis_client().xgroup_create(
+            RUNPOD_WEBHOOK_STREAM_KEY, RUNPOD_WEBHOOK_CONSUMER_GROUP, id="0", mkstream=True
+        )
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise e from e
+
+
+def _acknowledge(entry_ids: list[bytes]) -> None:
+    pipe = get_redis_client().pipeline(transaction=False)
+    pipe.xack(RUNPOD_WEBHOOK_STREAM_KEY, RUNPOD_WEBHOOK_CONSUMER_GROUP, *entry_ids)
+    pipe.xdel(RUNPOD_WEBHOOK_STREAM_KEY, *entry_ids)
+    pipe.execute()
+
+
+def _claim_stale_entries(consumer_name: str) -> list[tuple[bytes, dict]]:
+    """Take over the entries of consumers that did not acknowledge them in time."""
+    client = get_redis_client()
+    stale = cast(
+        list[dict],
+        client.xpending_range(
+            RUNPOD_WEBHOOK_STREAM_KEY,
+            RUNPOD_WEBHOOK_CONSUMER_GROUP,
+            min="-",
+            max="+",
+            count=RUNPOD_WEBHOOK_BATCH_SIZE,
+            idle=RUNPOD_WEBHOOK_RECLAIM_IDLE_MS,
+        ),
+    )
+    if not stale:
+        return []
+
+    dead_ids = [
+        entry["message_id"]
+        for entry in stale
+        if entry["times_delivered"] >= RUNPOD_WEBHOOK_MAX_DELIVERIES
+    ]
+    if dead_ids:
+        logger.error(f"Dropping {len(dead_ids)} RunPod webhooks that failed too often: {dead_ids}")
+        _acknowledge(dead_ids)
+        increment("runpod_webhook.dropped", len(dead_ids))
+
+    retry_ids = [entry["message_id"] for entry in stale if entry["message_id"] not in dead_ids]
+    if not retry_ids:
+        return []
+
+    return cast(
+        list[tuple[bytes, dict]],
+        client.xclaim(
+            RUNPOD_WEBHOOK_STREAM_KEY,
+            RUNPOD_WEBHOOK_CONSUMER_GROUP,
+            consumer_name,
+            RUNPOD_WEBHOOK_RECLAIM_IDLE_MS,
+            retry_ids,
+        ),
+    )
+
+
+def _claim_failed_entries(consumer_name: str, entry_ids: list[str]) -> list[tuple[bytes, dict]]:
+    """Take over the entries of a failed batch, wherever they are pending."""
+    claim_ids: list[Any] = list(entry_ids)
+    entries = cast(
+        list[tuple[bytes, Optional[dict]]],
+        get_redis_client().xclaim(
+            RUNPOD_WEBHOOK_STREAM_KEY,
+            RUNPOD_WEBHOOK_CONSUMER_GROUP,
+            consumer_name,
+            0,
+            claim_ids,
+        ),
+    )
+    # entries acknowledged in the meantime come back without fields
+    return [(entry_id, fields) for entry_id, fields in entries if fields]
+
+
+def _apply_entries(entries: list[tuple[bytes, dict]]) -> int:
+    from dembrane.runpod import apply_runpod_transcription_responses
+
+    payloads = []
+    for entry_id, fields in entries:
+        try:
+            payloads.append(json.loads(fields[b"payload"]))
+        except (KeyError, ValueError) as e:
+            logger.error(f"Skipping undecodable RunPod webhook {entry_id!r}: {e}")
+
+    # raises: the entries stay pending and are claimed again later
+    apply_runpod_transcription_responses(payloads)
+
+    entry_ids = [entry_id for entry_id, _ in entries]
+    _acknowledge(entry_ids)
+
+    now_ms = time.time() * 1000
+    for entry_id in entry_ids:
+        # stream ids are "<unix ms>-<seq>"
+        observe("runpod_webhook.lag_ms", now_ms - int(entry_id.split(b"-")[0]))
+    increment("runpod_webhook.applied", len(entry_ids))
+
+    return len(entry_ids)
+
+
+def _apply_or_retry(entries: list[tuple[bytes, dict]], attempt: int) -> Optional[int]:
+    """
+    Apply a batch of entries. When that fails, schedule a retry of the batch (or leave
+    it to the stale entry reclaim once RUNPOD_WEBHOOK_MAX_DELIVERIES is reached).
+
+    Returns:
+        The number of entries applied, None if the batch failed.
+    """
+    try:
+        return _apply_entries(entries)
+    except Exception as e:
+        entry_ids = [entry_id.decode() for entry_id, _ in entries]
+        logger.error(f"Failed to apply {len(entries)} RunPod webhooks (attempt {attempt + 1}): {e}")
+        if attempt + 1 < RUNPOD_WEBHOOK_MAX_DELIVERIES:
+            schedule_runpod_webhook_retry(entry_ids, attempt + 1)
+        return None
+
+
+def consume_runpod_webhooks(
+    retry_entry_ids: Optional[list[str]] = None,
+    attempt: int = 0,
+) -> int:
+    """
+    Apply queued RunPod webhooks in batches. Called by task_consume_runpod_webhooks.
+
+    Args:
+        retry_entry_ids: entries of a failed batch to claim and apply again
+        attempt: how many times those entries failed already
+
+    Returns:
+        The number of stream entries applied. (int)
+    """
+    _ensure_consumer_group()
+    consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+
+    if retry_entry_ids:
+        failed_entries = _claim_failed_entries(consumer_name, retry_entry_ids)
+        if not failed_entries:
+            return 0
+        return _apply_or_retry(failed_entries, attempt) or 0
+
+    applied = 0
+
+    stale_entries = _claim_stale_entries(consumer_name)
+    if stale_entries:
+        applied += _apply_or_retry(stale_entries, 0) or 0
+
+    for _ in range(RUNPOD_WEBHOOK_MAX_BATCHES):
+        response = cast(
+            list[tuple[bytes, list[tuple[bytes, dict]]]],
+            get_redis_client().xreadgroup(
+                RUNPOD_WEBHOOK_CONSUMER_GROUP,
+                consumer_name,
+                {RUNPOD_WEBHOOK_STREAM_KEY: ">"},
+                count=RUNPOD_WEBHOOK_BATCH_SIZE,
+            ),
+        )
+        entries = response[0][1] if response else []
+        if entries:
+            batch_applied = _apply_or_retry(entries, 0)
+            if batch_applied is None:
+                # Directus is likely unavailable, the retry picks up from here
+                break
+            applied += batch_applied
+
+        if len(entries) < RUNPOD_WEBHOOK_BATCH_SIZE:
+            break
+    else:
+        # backlog left, continue in a new message so other work gets a turn
+        get_redis_client().delete(_CONSUMER_SCHEDULED_KEY)
+        schedule_runpod_webhook_consumer()
+
+    if applied:
+        logger.info(f"Applied {applied} RunPod webhooks")
+
+    return applied
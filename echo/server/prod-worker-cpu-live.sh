@@ -0,0 +1,2 @@
+#!/bin/bash
+dramatiq --queues cpu_live --processes 2 --threads 4 dembrane.tasks
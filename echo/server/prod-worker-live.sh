@@ -0,0 +1,2 @@
+#!/bin/bash
+dramatiq-gevent --queues network_live --processes 1 --threads 50 dembrane.tasks
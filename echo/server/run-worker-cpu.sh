@@ -1 +1 @@
-dramatiq --queues cpu --processes 1 --threads 2 dembrane.tasks
\ No newline at end of file
+dramatiq --queues cpu cpu_live --processes 1 --threads 2 dembrane.tasks
\ No newline at end of file
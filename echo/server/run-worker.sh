@@ -1 +1 @@
-dramatiq-gevent --queues network --processes 1 --threads 2 dembrane.tasks
\ No newline at end of file
+dramatiq-gevent --queues network network_live --processes 1 --threads 2 dembrane.tasks
\ No newline at end of file
@@ -0,0 +1,471 @@
+"""
+Local stand-ins for the services the transcription pipeline talks to.
+
+Each one is a small HTTP server on 127.0.0.1 (port picked by the OS), so the
+real clients are used unchanged and only their base URLs are pointed here:
+
+- FakeTranscriptionProvider: the AssemblyAI (POST /v2/transcript, GET
+  /v2/transcript/{id}) and RunPod (POST /run, GET /status/{id}) endpoints.
+  Jobs finish after latency_ms (+ up to jitter_ms), error_rate of them fail
+  and submit_error_rate of the submissions are answered with a 503. RunPod
+  results are sent to the webhook of the request, or handed to deliver_webhook.
+- InMemoryDirectus: the /items endpoints of Directus over dicts, with the
+  filters (_eq, _neq, _in, _nin, _null, _nnull, _gt(e), _lt(e), _and, _or),
+  dotted fields, sort and limit the server uses. A field named `<collection>_id`
+  is a relation to that collection.
+- InMemoryS3: a MinIO-style bucket, path-style (/{bucket}/{key}): HEAD, GET,
+  PUT and DELETE of objects, enough for boto3 and presigned GETs.
+
+Usage:
+    with InMemoryDirectus() as directus, InMemoryS3() as s3:
+        os.environ["DIRECTUS_BASE_URL"] = directus.url
+        os.environ["STORAGE_S3_ENDPOINT"] = s3.url
+"""
+
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+from typing import Any, Callable, Optional
+from logging import getLogger
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote, urlparse
+
+import requests
+
+logger = getLogger("tests.benchmark.stand_ins")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StandInServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug(format % args)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _read_json(self) -> Any:
+        body = self._read_body()
+        return json.loads(body) if body else None
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Any) -> None:
+        self._send(status, json.dumps(data).encode(), {"Content-Type": "application/json"})
+
+    def do_GET(self) -> None:
+        self.server.handle_request_of(self)
+
+    do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = do_SEARCH = do_GET
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Serves on a background thread between start() and stop(), or as a context manager."""
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> Any:
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def handle_request_of(self, handler: _Handler) -> None:
+        raise NotImplementedError
+
+
+class FakeTranscriptionProvider(StandInServer):
+    def __init__(
+        self,
+        latency_ms: float = 1000,
+        jitter_ms: float = 0,
+        error_rate: float = 0.0,
+        submit_error_rate: float = 0.0,
+        deliver_webhook: Optional[Callable[[dict], Any]] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.submit_error_rate = submit_error_rate
+        self.deliver_webhook = deliver_webhook or self._post_webhook
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # job id -> {"ready_at", "failed", "input"}
+        self.jobs: dict[str, dict] = {}
+        self.submitted = 0
+        self.rejected = 0
+
+    def _submit(self, job_input: dict) -> Optional[str]:
+        """The new job id, None if the submission is rejected."""
+        with self._lock:
+            if self._random.random() < self.submit_error_rate:
+                self.rejected += 1
+                return None
+            self.submitted += 1
+            job_id = uuid.uuid4().hex
+            latency_ms = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+            self.jobs[job_id] = {
+                "ready_at": time.monotonic() + latency_ms / 1000,
+                "failed": self._random.random() < self.error_rate,
+                "input": job_input,
+            }
+            return job_id
+
+    def _job_state(self, job_id: str) -> Optional[str]:
+        """None (unknown job), "processing", "failed" or "completed"."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if time.monotonic() < job["ready_at"]:
+            return "processing"
+        return "failed" if job["failed"] else "completed"
+
+    def _assemblyai_transcript(self, job_id: str) -> dict:
+        match self._job_state(job_id):
+            case "processing":
+                return {"id": job_id, "status": "processing"}
+            case "failed":
+                return {"id": job_id, "status": "error", "error": "Injected error"}
+            case _:
+                text = f"Transcript of {job_id}."
+                return {
+                    "id": job_id,
+                    "status": "completed",
+                    "text": text,
+                    "language_code": "en",
+                    "words": [
+                        {"text": word, "start": i * 500, "end": (i + 1) * 500, "confidence": 0.9}
+                        for i, word in enumerate(text.split())
+                    ],
+                }
+
+    def _runpod_status(self, job_id: str) -> dict:
+        job_input = self.jobs[job_id]["input"].get("input", {})
+        match self._job_state(job_id):
+            case "processing":
+                return {"id": job_id, "status": "IN_PROGRESS"}
+            case "failed":
+                return {
+                    "id": job_id,
+                    "status": "FAILED",
+                    "output": {
+                        "conversation_chunk_id": job_input.get("conversation_chunk_id"),
+                        "error": "Injected error",
+                    },
+                }
+            case _:
+                return {
+                    "id": job_id,
+                    "status": "COMPLETED",
+                    "output": {
+                        "conversation_chunk_id": job_input.get("conversation_chunk_id"),
+                        "joined_text": f"Transcript of {job_id}.",
+                        "language": job_input.get("language"),
+                        "detected_language": job_input.get("language") or "en",
+                        "detected_language_confidence": 0.9,
+                    },
+                }
+
+    def _post_webhook(self, payload: dict) -> None:
+        job = self.jobs[payload["id"]]
+        requests.post(job["input"]["webhook"], json=payload, timeout=30)
+
+    def _complete_runpod_job(self, job_id: str) -> None:
+        try:
+            self.deliver_webhook(self._runpod_status(job_id))
+        except Exception as e:
+            logger.warning(f"Failed to deliver the webhook of job {job_id}: {e}")
+
+    def handle_request_of(self, handler: _Handler) -> None:
+        path = urlparse(handler.path).path
+        match handler.command, path.strip("/").split("/"):
+            case "POST", ["v2", "transcript"]:
+                job_id = self._submit(handler._read_json())
+                if job_id is None:
+                    handler._send_json(503, {"error": "Injected error"})
+                else:
+                    handler._send_json(200, {"id": job_id, "status": "queued"})
+
+            case "GET", ["v2", "transcript", job_id] if job_id in self.jobs:
+                handler._send_json(200, self._assemblyai_transcript(job_id))
+
+            case "POST", [*_, "run"]:
+                job_id = self._submit(handler._read_json())
+                if job_id is None:
+                    handler._send_json(503, {"error": "Injected error"})
+                    return
+                delay = max(0.0, self.jobs[job_id]["ready_at"] - time.monotonic())
+                timer = threading.Timer(delay, self._complete_runpod_job, args=(job_id,))
+                timer.daemon = True
+                timer.start()
+                handler._send_json(200, {"id": job_id, "status": "IN_QUEUE"})
+
+            case "GET", [*_, "status", job_id] if job_id in self.jobs:
+                handler._send_json(200, self._runpod_status(job_id))
+
+            case _:
+                handler._send_json(404, {"error": f"{handler.command} {path} not found"})
+
+
+class InMemoryDirectus(StandInServer):
+    # the default page size of Directus
+    DEFAULT_LIMIT = 100
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._lock = threading.RLock()
+        # collection -> id -> item
+        self.collections: dict[str, dict[str, dict]] = {}
+        self.requests = 0
+        # called with (collection, item) after every create / update
+        self.on_write: Optional[Callable[[str, dict], Any]] = None
+
+    def items(self, collection: str) -> dict[str, dict]:
+        return self.collections.setdefault(collection, {})
+
+    def _related(self, field: str, value: Any) -> Optional[dict]:
+        if isinstance(value, dict) or value is None:
+            return value
+        collection = field[: -len("_id")] if field.endswith("_id") else field
+        return self.items(collection).get(value)
+
+    def _matches(self, item: dict, condition: dict) -> bool:
+        for field, expected in condition.items():
+            if field == "_and":
+                if not all(self._matches(item, c) for c in expected):
+                    return False
+            elif field == "_or":
+                if not any(self._matches(item, c) for c in expected):
+                    return False
+            elif isinstance(expected, dict) and not all(op.startswith("_") for op in expected):
+                related = self._related(field, item.get(field))
+                if related is None or not self._matches(related, expected):
+                    return False
+            elif isinstance(expected, dict):
+                if not all(
+                    _compare(op, item.get(field), operand) for op, operand in expected.items()
+                ):
+                    return False
+            elif item.get(field) != expected:
+                return False
+        return True
+
+    def _select(self, item: dict, fields: list[str]) -> dict:
+        if not fields or "*" in fields:
+            selected = dict(item)
+        else:
+            selected = {field: item.get(field) for field in fields if "." not in field}
+
+        nested: dict[str, list[str]] = {}
+        for field in fields:
+            if "." in field:
+                name, rest = field.split(".", 1)
+                nested.setdefault(name, []).append(rest)
+
+        for name, subfields in nested.items():
+            related = self._related(name, item.get(name))
+            selected[name] = self._select(related, subfields) if related is not None else None
+        return selected
+
+    def query(self, collection: str, query: Optional[dict] = None) -> list[dict]:
+        query = query or {}
+        with self._lock:
+            matched = [
+                item
+                for item in self.items(collection).values()
+                if self._matches(item, query.get("filter") or {})
+            ]
+            for field in reversed(query.get("sort") or []):
+                name = field.lstrip("-")
+                matched.sort(key=_sort_key(name), reverse=field != name)
+            limit = query.get("limit", self.DEFAULT_LIMIT)
+            offset = query.get("offset", 0)
+            matched = matched[offset:] if limit == -1 else matched[offset : offset + limit]
+            return [self._select(item, query.get("fields") or []) for item in matched]
+
+    def create(self, collection: str, data: dict) -> dict:
+        with self._lock:
+            item = {"id": str(uuid.uuid4()), **data}
+            self.items(collection)[str(item["id"])] = item
+            created = dict(item)
+        if self.on_write is not None:
+            self.on_write(collection, created)
+        return created
+
+    def update(self, collection: str, item_id: str, data: dict) -> Optional[dict]:
+        with self._lock:
+            item = self.items(collection).get(item_id)
+            if item is None:
+                return None
+            item.update(data)
+            updated = dict(item)
+        if self.on_write is not None:
+            self.on_write(collection, updated)
+        return updated
+
+    def handle_request_of(self, handler: _Handler) -> None:
+        with self._lock:
+            self.requests += 1
+        path = urlparse(handler.path).path
+        segments = [unquote(segment) for segment in path.strip("/").split("/")]
+        if segments[0] != "items" or len(segments) not in (2, 3):
+            handler._send_json(404, {"errors": [{"message": f"{path} not found"}]})
+            return
+
+        collection = segments[1]
+        item_id = segments[2] if len(segments) == 3 else None
+        body = handler._read_json() if handler.command in ("POST", "PATCH", "SEARCH") else None
+
+        match handler.command, item_id:
+            case "SEARCH", None:
+                handler._send_json(200, {"data": self.query(collection, (body or {}).get("query"))})
+
+            case "GET", None:
+                handler._send_json(200, {"data": self.query(collection)})
+
+            case "GET", _:
+                item = self.items(collection).get(item_id)
+                if item is None:
+                    handler._send_json(403, {"errors": [{"message": "Forbidden"}]})
+                else:
+                    handler._send_json(200, {"data": dict(item)})
+
+            case "POST", None:
+                if isinstance(body, list):
+                    data: Any = [self.create(collection, item) for item in body]
+                else:
+                    data = self.create(collection, body or {})
+                handler._send_json(200, {"data": data})
+
+            case "PATCH", None:
+                data = [self.update(collection, str(item["id"]), item) for item in body or []]
+                handler._send_json(200, {"data": [item for item in data if item is not None]})
+
+            case "PATCH", _:
+                updated = self.update(collection, item_id, body or {})
+                if updated is None:
+                    handler._send_json(403, {"errors": [{"message": "Forbidden"}]})
+                else:
+                    handler._send_json(200, {"data": updated})
+
+            case "DELETE", _:
+                with self._lock:
+                    self.items(collection).pop(item_id, None)
+                handler._send(204)
+
+            case _:
+                handler._send_json(405, {"errors": [{"message": "Method not allowed"}]})
+
+
+class InMemoryS3(StandInServer):
+    def __init__(self) -> None:
+        super().__init__()
+        # (bucket, key) -> content
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.requests = 0
+
+    def put(self, bucket: str, key: str, content: bytes) -> None:
+        self.objects[(bucket, key)] = content
+
+    def handle_request_of(self, handler: _Handler) -> None:
+        self.requests += 1
+        bucket, _, key = unquote(urlparse(handler.path).path).lstrip("/").partition("/")
+        content = self.objects.get((bucket, key))
+
+        match handler.command:
+            case "PUT":
+                content = handler._read_body()
+                self.put(bucket, key, content)
+                handler._send(200, headers={"ETag": _etag(content)})
+
+            case "GET" | "HEAD" if content is not None:
+                handler._send(
+                    200,
+                    content,
+                    {
+                        "ETag": _etag(content),
+                        "Content-Type": "application/octet-stream",
+                        "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+                    },
+                )
+
+            case "DELETE":
+                self.objects.pop((bucket, key), None)
+                handler._send(204)
+
+            case _:
+                error = (
+                    "<?xml version='1.0' encoding='UTF-8'?>"
+                    f"<Error><Code>NoSuchKey</Code><Key>{key}</Key></Error>"
+                ).encode()
+                handler._send(404, error, {"Content-Type": "application/xml"})
+
+
+def _etag(content: bytes) -> str:
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def _sort_key(name: str) -> Callable[[dict], tuple[bool, Any]]:
+    def key(item: dict) -> tuple[bool, Any]:
+        # nulls first, as in Directus
+        value = item.get(name)
+        return (value is not None, value if value is not None else 0)
+
+    return key
+
+
+def _compare(op: str, value: Any, operand: Any) -> bool:
+    match op:
+        case "_eq":
+            return value == operand
+        case "_neq":
+            return value != operand
+        case "_in":
+            return value in operand
+        case "_nin":
+            return value not in operand
+        case "_null":
+            return (value is None) == bool(operand)
+        case "_nnull":
+            return (value is not None) == bool(operand)
+        case "_gt":
+            return value is not None and value > operand
+        case "_gte":
+            return value is not None and value >= operand
+        case "_lt":
+            return value is not None and value < operand
+        case "_lte":
+            return value is not None and value <= operand
+        case _:
+            raise ValueError(f"Unsupported filter operator {op}")
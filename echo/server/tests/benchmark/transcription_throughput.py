@@ -0,0 +1,438 @@
+"""
+Transcription throughput benchmark.
+
+Runs the real dramatiq actors in this process (task_process_conversation_chunk ->
+task_transcribe_chunk, and task_consume_runpod_webhooks for RunPod) against the
+stand-ins of tests.benchmark.stand_ins: a fake AssemblyAI / RunPod with
+configurable latency and errors, an in-memory Directus and an in-memory S3.
+The same chunks are transcribed once per worker count, and for each run it
+reports:
+
+- throughput: transcribed chunks per minute, from the first send to the last transcript
+- chunk latency (p50 / p95): from sending task_process_conversation_chunk to
+  the transcript being written to Directus
+- queue wait (p50 / p95): how long the messages waited before a worker took
+  them, fair queue backlog included
+
+Only Redis is real, and it is wiped: --redis-url (required, the .env REDIS_URL
+is never used) has to point at a scratch Redis. Its broker queues are flushed
+and its dembrane:* keys deleted before every run and after the last one. The
+rest of the configuration comes from the server's .env as usual; the stand-ins
+replace the Directus, S3 and provider settings.
+
+Usage (from echo/server):
+    python -m tests.benchmark.transcription_throughput --redis-url redis://localhost:6380 \
+        --chunks 200 --workers 1,4,8,16
+    python -m tests.benchmark.transcription_throughput --redis-url redis://localhost:6380 \
+        --provider Runpod --latency-ms 4000 --jitter-ms 2000 --error-rate 0.05
+
+Notes:
+- "workers" are the worker threads of one dramatiq Worker, which is how each
+  worker process of `dramatiq dembrane.tasks` runs its actors.
+- AssemblyAI jobs are polled every 3 seconds, so their latency moves in steps
+  of 3 seconds.
+- Failed messages are retried with dramatiq's backoff (15 seconds or more);
+  chunks without a transcript after --timeout are reported as unfinished.
+"""
+
+import os
+import sys
+import time
+import uuid
+import logging
+import argparse
+import threading
+from typing import Any, Optional
+from datetime import datetime, timezone
+from unittest import mock
+from dataclasses import field, dataclass
+
+import dotenv
+import dramatiq
+from dramatiq.middleware.prometheus import Prometheus
+
+from tests.benchmark.stand_ins import InMemoryS3, InMemoryDirectus, FakeTranscriptionProvider
+
+logger = logging.getLogger("tests.benchmark.transcription_throughput")
+
+DOTENV_PATH = os.path.join(os.path.dirname(__file__), "..", "..", ".env")
+
+BUCKET = "benchmark"
+# uploads skip diarization and coalescing, only transcription is measured
+CHUNK_SOURCE = "DASHBOARD_UPLOAD"
+# as in dembrane.scheduler
+FAIR_QUEUE_DISPATCH_INTERVAL_SECONDS = 1.0
+
+
+def percentile(samples: list[float], percentile: float) -> Optional[float]:
+    if not samples:
+        return None
+    sorted_samples = sorted(samples)
+    index = min(len(sorted_samples) - 1, int(round(percentile * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class BenchmarkMiddleware(dramatiq.Middleware):
+    """Queue waits and failures of the messages processed during a run."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.queue_wait_ms: list[float] = []
+        self.failed_messages = 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.queue_wait_ms = []
+            self.failed_messages = 0
+
+    def before_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,
+    ) -> None:
+        # delayed messages (and retries) wait from the time they were due
+        enqueued_at = max(message.message_timestamp, message.options.get("eta", 0))
+        with self._lock:
+            self.queue_wait_ms.append(time.time() * 1000 - enqueued_at)
+
+    def after_process_message(
+        self,
+        broker: dramatiq.Broker,  # noqa: ARG002
+        message: dramatiq.Message,  # noqa: ARG002
+        *,
+        result: Any = None,  # noqa: ARG002
+        exception: Optional[BaseException] = None,
+    ) -> None:
+        if exception is not None:
+            with self._lock:
+                self.failed_messages += 1
+
+
+class ChunkTracker:
+    """Send and transcript times of the chunks of a run, fed by InMemoryDirectus.on_write."""
+
+    def __init__(self, chunk_ids: list[str]) -> None:
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self.sent_at: dict[str, float] = {}
+        self.done_at: dict[str, float] = {}
+        self.failed: set[str] = set()
+        self.chunk_ids = set(chunk_ids)
+
+    def sent(self, chunk_id: str) -> None:
+        self.sent_at[chunk_id] = time.monotonic()
+
+    def on_write(self, collection: str, item: dict) -> None:
+        if collection != "conversation_chunk" or item["id"] not in self.chunk_ids:
+            return
+        with self._lock:
+            if item.get("transcript") is not None:
+                self.done_at.setdefault(item["id"], time.monotonic())
+                self.failed.discard(item["id"])
+            elif item.get("error") is not None and item["id"] not in self.done_at:
+                # a failed RunPod job, or the error of a try that may still be retried
+                self.failed.add(item["id"])
+            if len(self.done_at) + len(self.failed) == len(self.chunk_ids):
+                self._finished.set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._finished.wait(timeout)
+
+    def latencies_ms(self) -> list[float]:
+        return [
+            (done_at - self.sent_at[chunk_id]) * 1000 for chunk_id, done_at in self.done_at.items()
+        ]
+
+
+@dataclass
+class RunResult:
+    workers: int
+    chunks: int
+    done: int
+    failed: int
+    elapsed_seconds: float
+    failed_messages: int
+    chunk_latency_ms: list[float] = field(default_factory=list)
+    queue_wait_ms: list[float] = field(default_factory=list)
+
+    @property
+    def chunks_per_minute(self) -> float:
+        return self.done / self.elapsed_seconds * 60 if self.elapsed_seconds else 0.0
+
+    def row(self) -> list[str]:
+        def ms(value: Optional[float]) -> str:
+            return "-" if value is None else f"{value:.0f}"
+
+        return [
+            str(self.workers),
+            f"{self.done}/{self.chunks}",
+            str(self.failed),
+            str(self.chunks - self.done - self.failed),
+            f"{self.chunks_per_minute:.1f}",
+            ms(percentile(self.chunk_latency_ms, 0.5)),
+            ms(percentile(self.chunk_latency_ms, 0.95)),
+            ms(percentile(self.queue_wait_ms, 0.5)),
+            ms(percentile(self.queue_wait_ms, 0.95)),
+            str(self.failed_messages),
+        ]
+
+
+REPORT_HEADER = [
+    "workers",
+    "done",
+    "failed",
+    "unfinished",
+    "chunks/min",
+    "latency p50",
+    "p95 (ms)",
+    "queue wait p50",
+    "p95 (ms)",
+    "failed messages",
+]
+
+
+def format_report(results: list[RunResult]) -> str:
+    rows = [REPORT_HEADER] + [result.row() for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(REPORT_HEADER))]
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(row, widths, strict=True))
+        for row in rows
+    )
+
+
+def _stand_in_environment(
+    args: argparse.Namespace,
+    provider: FakeTranscriptionProvider,
+    directus: InMemoryDirectus,
+    s3: InMemoryS3,
+) -> dict[str, str]:
+    return {
+        "DIRECTUS_BASE_URL": directus.url,
+        "DIRECTUS_TOKEN": "benchmark",
+        "STORAGE_S3_ENDPOINT": s3.url,
+        "STORAGE_S3_BUCKET": BUCKET,
+        "STORAGE_S3_REGION": "us-east-1",
+        "STORAGE_S3_KEY": "benchmark",
+        "STORAGE_S3_SECRET": "benchmark",
+        "REDIS_URL": args.redis_url,
+        "TRANSCRIPTION_PROVIDER": args.provider,
+        "TRANSCRIPTION_FALLBACK_PROVIDERS": "",
+        "ASSEMBLYAI_BASE_URL": provider.url,
+        "ASSEMBLYAI_API_KEY": "benchmark",
+        "RUNPOD_WHISPER_BASE_URL": provider.url,
+        "RUNPOD_WHISPER_PRIORITY_BASE_URL": provider.url,
+        "RUNPOD_WHISPER_API_KEY": "benchmark",
+        "ENABLE_RUNPOD_DIARIZATION": "false",
+        "ENABLE_TRANSCRIPT_CACHE": "false",
+        "WORKER_MAX_RSS_MB": "0",
+        "WORKER_MAX_TASKS": "0",
+        "PROFILE_ACTORS": "",
+        "DISABLE_SENTRY": "true",
+    }
+
+
+def _import_dembrane(environment: dict[str, str]) -> None:
+    # dembrane.config loads the .env with override=True, which would replace the
+    # stand-in settings: load it here first and keep dembrane.config from loading it again
+    if os.path.exists(DOTENV_PATH):
+        dotenv.load_dotenv(DOTENV_PATH, override=True)
+    os.environ.update(environment)
+    with mock.patch("dotenv.load_dotenv"):
+        import dembrane.tasks  # noqa: F401
+
+
+def _reset_redis() -> None:
+    """Flush the broker queues and delete the application state of earlier runs."""
+    from dembrane.tasks import broker
+    from dembrane.redis_utils import get_redis_client
+
+    broker.flush_all()
+    client = get_redis_client()
+    keys = list(client.scan_iter("dembrane:*", count=1000))
+    for start in range(0, len(keys), 1000):
+        client.delete(*keys[start : start + 1000])
+
+
+def _seed(
+    args: argparse.Namespace, directus: InMemoryDirectus, s3: InMemoryS3
+) -> tuple[str, list[str]]:
+    """
+    Returns:
+        0: The project id
+        1: The chunk ids
+    """
+    audio = os.urandom(args.chunk_kb * 1024)
+    project = directus.create(
+        "project",
+        {"name": "Benchmark", "language": "en", "default_conversation_transcript_prompt": None},
+    )
+    conversations = [
+        directus.create("conversation", {"project_id": project["id"], "is_finished": False})
+        for _ in range(args.conversations)
+    ]
+
+    chunk_ids = []
+    for i in range(args.chunks):
+        key = f"benchmark/{uuid.uuid4()}.mp3"
+        s3.put(BUCKET, key, audio)
+        chunk = directus.create(
+            "conversation_chunk",
+            {
+                "conversation_id": conversations[i % len(conversations)]["id"],
+                "path": f"{s3.url}/{BUCKET}/{key}",
+                "source": CHUNK_SOURCE,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "transcript": None,
+                "error": None,
+                "diarization": None,
+                "runpod_job_status_link": None,
+                "runpod_request_count": 0,
+            },
+        )
+        chunk_ids.append(chunk["id"])
+    return project["id"], chunk_ids
+
+
+def _dispatch_fair_queues(stop: threading.Event) -> None:
+    from dembrane.fair_queue import dispatch_fair_queues
+
+    while not stop.wait(FAIR_QUEUE_DISPATCH_INTERVAL_SECONDS):
+        try:
+            dispatch_fair_queues()
+        except Exception as e:
+            logger.warning(f"Failed to dispatch the fair queues: {e}")
+
+
+def run(
+    args: argparse.Namespace,
+    workers: int,
+    directus: InMemoryDirectus,
+    s3: InMemoryS3,
+    middleware: BenchmarkMiddleware,
+) -> RunResult:
+    from dembrane.lanes import send_chunk_message
+    from dembrane.tasks import broker, task_process_conversation_chunk
+
+    _reset_redis()
+    project_id, chunk_ids = _seed(args, directus, s3)
+    tracker = ChunkTracker(chunk_ids)
+    directus.on_write = tracker.on_write
+    middleware.reset()
+
+    stop_dispatching = threading.Event()
+    dispatcher = threading.Thread(target=_dispatch_fair_queues, args=(stop_dispatching,))
+    worker = dramatiq.Worker(broker, worker_threads=workers)
+    dispatcher.start()
+    worker.start()
+    started_at = time.monotonic()
+    try:
+        for chunk_id in chunk_ids:
+            tracker.sent(chunk_id)
+            send_chunk_message(
+                task_process_conversation_chunk.message(chunk_id, use_transcript_cache=False),
+                source=CHUNK_SOURCE,
+                project_id=project_id,
+            )
+        if not tracker.wait(args.timeout):
+            logger.warning(f"{workers} workers: timed out after {args.timeout}s")
+    finally:
+        worker.stop()
+        stop_dispatching.set()
+        dispatcher.join()
+        directus.on_write = None
+
+    last_done_at = max(tracker.done_at.values(), default=started_at)
+    return RunResult(
+        workers=workers,
+        chunks=len(chunk_ids),
+        done=len(tracker.done_at),
+        failed=len(tracker.failed),
+        elapsed_seconds=last_done_at - started_at,
+        failed_messages=middleware.failed_messages,
+        chunk_latency_ms=tracker.latencies_ms(),
+        queue_wait_ms=list(middleware.queue_wait_ms),
+    )
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--redis-url",
+        required=True,
+        help="a scratch Redis, as REDIS_URL: its broker queues and dembrane:* keys are deleted",
+    )
+    parser.add_argument("--provider", choices=["AssemblyAI", "Runpod"], default="AssemblyAI")
+    parser.add_argument("--chunks", type=int, default=100)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument(
+        "--workers",
+        type=lambda value: [int(workers) for workers in value.split(",")],
+        default=[1, 4, 8],
+        help="comma separated worker counts, one run each",
+    )
+    parser.add_argument("--latency-ms", type=float, default=1000)
+    parser.add_argument("--jitter-ms", type=float, default=500)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="jobs that fail")
+    parser.add_argument(
+        "--submit-error-rate", type=float, default=0.0, help="submissions answered with a 503"
+    )
+    parser.add_argument("--chunk-kb", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=600, help="per run, in seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+
+    provider = FakeTranscriptionProvider(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        submit_error_rate=args.submit_error_rate,
+        seed=args.seed,
+    )
+    directus = InMemoryDirectus()
+    s3 = InMemoryS3()
+    with provider, directus, s3:
+        _import_dembrane(_stand_in_environment(args, provider, directus, s3))
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+        from dembrane.tasks import broker
+        from dembrane.webhook_queue import enqueue_runpod_webhook
+
+        # no API server here to take the webhooks of the fake RunPod
+        provider.deliver_webhook = enqueue_runpod_webhook
+
+        # set up by the dramatiq CLI in each worker process, which this is not
+        broker.middleware[:] = [m for m in broker.middleware if not isinstance(m, Prometheus)]
+        middleware = BenchmarkMiddleware()
+        broker.add_middleware(middleware)
+
+        results = []
+        try:
+            for workers in args.workers:
+                results.append(run(args, workers, directus, s3, middleware))
+                print(
+                    f"{workers} workers: {results[-1].done}/{results[-1].chunks} chunks",
+                    flush=True,
+                )
+        finally:
+            _reset_redis()
+
+        print(
+            f"\n{args.provider}, {args.chunks} chunks of {args.chunk_kb}KB, "
+            f"latency {args.latency_ms:.0f}ms (+ up to {args.jitter_ms:.0f}ms), "
+            f"error rate {args.error_rate:.0%}, submit error rate {args.submit_error_rate:.0%}\n"
+            f"provider jobs {provider.submitted}, rejected {provider.rejected}, "
+            f"Directus requests {directus.requests}, S3 requests {s3.requests}\n"
+        )
+        print(format_report(results))
+
+    # injected errors fail chunks, chunks left unfinished mean the run timed out
+    return 0 if all(result.done + result.failed == result.chunks for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
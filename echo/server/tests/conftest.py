@@ -0,0 +1,39 @@
+from weakref import WeakKeyDictionary
+
+import pytest
+import dramatiq
+import fakeredis
+
+
+class RecordingBroker:
+    """Stands in for the broker: keeps the enqueued messages instead of sending them."""
+
+    def __init__(self):
+        self.messages: list[dramatiq.Message] = []
+
+    def enqueue(self, message, *, delay=None):  # noqa: ARG002
+        self.messages.append(message)
+        return message
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    recording_broker = RecordingBroker()
+    monkeypatch.setattr("dramatiq.get_broker", lambda: recording_broker)
+    return recording_broker
+
+
+@pytest.fixture(autouse=True)
+def redis_server(monkeypatch):
+    """
+    Give every test an empty in-memory Redis behind get_redis_client, so the suite
+    never touches the database at REDIS_URL.
+    """
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr("dembrane.redis_utils._redis_client", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr("dembrane.redis_utils._async_redis_clients_by_loop", WeakKeyDictionary())
+    monkeypatch.setattr(
+        "dembrane.redis_utils._create_async_redis_client",
+        lambda: fakeredis.FakeAsyncRedis(server=server),
+    )
+    return server
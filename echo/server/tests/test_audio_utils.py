@@ -14,6 +14,7 @@ from dembrane.audio_utils import (
     split_audio_chunk,
     get_duration_from_s3,
     convert_and_save_to_s3,
+    get_llm_audio_rendition,
     get_file_format_from_file_path,
     merge_multiple_audio_files_and_save_to_s3,
 )
@@ -482,3 +483,27 @@ def test_merge_specific_format_pairs(file_formats, output_format):
         s3_client.delete_object(Bucket=STORAGE_S3_BUCKET, Key=get_sanitized_s3_key(file_name))
 
     s3_client.delete_object(Bucket=STORAGE_S3_BUCKET, Key=get_sanitized_s3_key(merged_file_key))
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES)
+def test_get_llm_audio_rendition(file_name: str):
+    input_file_key = "tests/" + generate_uuid() + "." + get_file_format_from_file_path(file_name)
+
+    with open(os.path.join(BASE_DIR, "tests", "data", "audio", file_name), "rb") as f:
+        file_bytes = f.read()
+
+    s3_client.put_object(
+        Bucket=STORAGE_S3_BUCKET,
+        Key=get_sanitized_s3_key(input_file_key),
+        Body=file_bytes,
+    )
+
+    rendition = get_llm_audio_rendition(input_file_key)
+
+    probe = probe_from_bytes(rendition, "ogg")
+    assert probe["streams"][0]["codec_name"] == "opus"
+    assert probe["streams"][0]["channels"] == 1
+    assert len(rendition) < len(file_bytes)
+
+    # cached: the same rendition without transcoding again
+    assert get_llm_audio_rendition(input_file_key) == rendition
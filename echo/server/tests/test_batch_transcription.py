@@ -0,0 +1,177 @@
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from dembrane.tasks import task_transcribe_chunks
+from dembrane.batch_transcription import (
+    BATCH_TRANSCRIPTION_CONCURRENCY,
+    BATCH_TRANSCRIPTION_TIMEOUT_SECONDS,
+    _Job,
+    transcribe_chunks,
+)
+from dembrane.transcription_context import TranscriptionContext
+
+# polls before a fake AssemblyAI job completes
+POLLS_PER_JOB = 2
+REQUEST_LATENCY_SECONDS = 0.05
+
+
+class FakeAssemblyAI:
+    def __init__(self, failing_chunk_ids=(), slow_chunk_ids=()):
+        self.failing_chunk_ids = set(failing_chunk_ids)
+        self.slow_chunk_ids = set(slow_chunk_ids)
+        self.polls: dict[str, int] = {}
+        self.submitted = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(REQUEST_LATENCY_SECONDS)
+            return self._respond(request)
+        finally:
+            self.in_flight -= 1
+
+    def _respond(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            self.submitted += 1
+            chunk_id = json.loads(request.content)["audio_url"].rsplit("/", 1)[1]
+            self.polls[chunk_id] = 0
+            return httpx.Response(200, json={"id": chunk_id})
+
+        chunk_id = request.url.path.rsplit("/", 1)[1]
+        self.polls[chunk_id] += 1
+        if self.polls[chunk_id] < POLLS_PER_JOB or chunk_id in self.slow_chunk_ids:
+            return httpx.Response(200, json={"status": "processing"})
+        if chunk_id in self.failing_chunk_ids:
+            return httpx.Response(200, json={"status": "error", "error": "bad audio"})
+        return httpx.Response(
+            200, json={"status": "completed", "text": f"transcript of {chunk_id}", "words": []}
+        )
+
+
+class FakeProcessingStatusContext:
+    def __init__(self, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+@pytest.fixture
+def assemblyai(monkeypatch):
+    fake = FakeAssemblyAI(failing_chunk_ids=["chunk-7"], slow_chunk_ids=["chunk-slow"])
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handle))
+    saved: dict[str, str] = {}
+    transcribed_one_by_one: list[str] = []
+
+    def prepare_job(chunk_id, provider, use_cache):  # noqa: ARG001
+        return _Job(
+            {"id": chunk_id, "path": f"audio/{chunk_id}"},
+            TranscriptionContext(
+                conversation_id="conversation-1",
+                project_id="project-1",
+                language="en",
+                provider="AssemblyAI",
+            ),
+            cache_key=None,
+        )
+
+    def save_transcript(chunk_id, transcript, **kwargs):  # noqa: ARG001
+        saved[chunk_id] = transcript
+
+    monkeypatch.setattr(
+        "dembrane.batch_transcription.BATCH_TRANSCRIPTION_POLL_INTERVAL_SECONDS", 0.01
+    )
+    monkeypatch.setattr(
+        "dembrane.batch_transcription._get_transcript_provider", lambda: "AssemblyAI"
+    )
+    monkeypatch.setattr("dembrane.batch_transcription.get_provider_order", lambda p: [p])
+    monkeypatch.setattr("dembrane.batch_transcription.get_async_http_client", lambda: client)
+    monkeypatch.setattr("dembrane.batch_transcription.get_signed_url", lambda path, **_: path)
+    monkeypatch.setattr("dembrane.batch_transcription._prepare_job", prepare_job)
+    monkeypatch.setattr("dembrane.batch_transcription._save_transcript", save_transcript)
+    monkeypatch.setattr(
+        "dembrane.batch_transcription.transcribe_conversation_chunk",
+        lambda chunk_id, use_cache: transcribed_one_by_one.append(chunk_id),  # noqa: ARG005
+    )
+    return fake, saved, transcribed_one_by_one
+
+
+def test_a_batch_keeps_its_requests_in_flight_together(assemblyai):
+    fake, saved, _ = assemblyai
+    chunk_ids = [f"chunk-{i}" for i in range(50)]
+
+    errors = asyncio.run(transcribe_chunks(chunk_ids))
+
+    # the chunks are not transcribed one after the other, nor all at once
+    assert fake.max_in_flight == BATCH_TRANSCRIPTION_CONCURRENCY
+    assert fake.submitted == 50
+    assert errors == {chunk_id: None for chunk_id in chunk_ids}
+    assert len(saved) == 49
+    assert saved["chunk-3"] == "transcript of chunk-3"
+
+
+def test_failed_jobs_are_transcribed_one_by_one(assemblyai):
+    _, saved, transcribed_one_by_one = assemblyai
+
+    asyncio.run(transcribe_chunks(["chunk-6", "chunk-7"]))
+
+    assert list(saved) == ["chunk-6"]
+    assert transcribed_one_by_one == ["chunk-7"]
+
+
+def test_an_unhealthy_provider_routes_the_batch_one_by_one(assemblyai, monkeypatch):
+    fake, saved, transcribed_one_by_one = assemblyai
+    monkeypatch.setattr("dembrane.batch_transcription.get_provider_order", lambda p: ["LiteLLM", p])
+
+    asyncio.run(transcribe_chunks(["chunk-1", "chunk-2"]))
+
+    assert fake.submitted == 0
+    assert saved == {}
+    assert sorted(transcribed_one_by_one) == ["chunk-1", "chunk-2"]
+
+
+def test_jobs_slower_than_the_hedge_delay_are_routed_one_by_one(assemblyai, monkeypatch):
+    _, saved, transcribed_one_by_one = assemblyai
+    monkeypatch.setattr("dembrane.batch_transcription.get_provider_order", lambda p: [p, "LiteLLM"])
+    monkeypatch.setattr("dembrane.batch_transcription.get_hedge_delay_seconds", lambda _: 0.5)
+
+    started_at = time.monotonic()
+    errors = asyncio.run(transcribe_chunks(["chunk-1", "chunk-slow"]))
+
+    assert list(saved) == ["chunk-1"]
+    assert transcribed_one_by_one == ["chunk-slow"]
+    assert errors == {"chunk-1": None, "chunk-slow": None}
+    # not the batch timeout
+    assert time.monotonic() - started_at < 5
+
+
+def test_the_batch_actor_outlives_the_batch_timeout():
+    # the batch timeout, then the one-by-one fallback of the unfinished chunks
+    assert task_transcribe_chunks.options["time_limit"] > BATCH_TRANSCRIPTION_TIMEOUT_SECONDS * 1000
+
+
+def test_failed_chunks_are_retried_in_the_lane_of_the_batch(broker, monkeypatch):
+    async def transcribe(chunk_ids, use_cache):  # noqa: ARG001
+        return {"chunk-1": None, "chunk-2": "bad audio"}
+
+    monkeypatch.setattr("dembrane.lanes.ENABLE_LIVE_LANES", True)
+    monkeypatch.setattr("dembrane.batch_transcription.transcribe_chunks", transcribe)
+    monkeypatch.setattr("dembrane.tasks.ProcessingStatusContext", FakeProcessingStatusContext)
+
+    asyncio.run(
+        task_transcribe_chunks.fn.__wrapped__(
+            ["chunk-1", "chunk-2"], "conversation-1", source="PORTAL_AUDIO"
+        )
+    )
+
+    assert [(m.queue_name, m.args[0]) for m in broker.messages] == [("network_live", "chunk-2")]
@@ -0,0 +1,148 @@
+import threading
+
+import boto3
+import pytest
+import requests
+from directus_py_sdk import DirectusClient
+from botocore.exceptions import ClientError
+
+from dembrane.transcribe import TranscriptionError, transcribe_audio_assemblyai
+from tests.benchmark.stand_ins import InMemoryS3, InMemoryDirectus, FakeTranscriptionProvider
+from tests.benchmark.transcription_throughput import ChunkTracker, percentile
+
+
+def test_the_in_memory_directus_serves_the_directus_client():
+    with InMemoryDirectus() as directus:
+        client = DirectusClient(url=directus.url, token="benchmark")
+        project = client.create_item("project", {"language": "nl"})["data"]
+        conversation = client.create_item("conversation", {"project_id": project["id"]})["data"]
+        chunks = client.create_item(
+            "conversation_chunk",
+            [
+                {"conversation_id": conversation["id"], "timestamp": f"2025-01-01T00:00:0{i}"}
+                for i in (2, 1, 3)
+            ],
+        )["data"]
+
+        rows = client.get_items(
+            "conversation",
+            {
+                "query": {
+                    "filter": {"id": {"_eq": conversation["id"]}},
+                    "fields": ["id", "project_id.id", "project_id.language"],
+                }
+            },
+        )
+        assert rows == [
+            {"id": conversation["id"], "project_id": {"id": project["id"], "language": "nl"}}
+        ]
+
+        client.update_item("conversation_chunk", chunks[0]["id"], {"transcript": "hello"})
+        client.patch("/items/conversation_chunk", json=[{"id": chunks[1]["id"], "error": "x"}])
+        pending = client.get_items(
+            "conversation_chunk",
+            {
+                "query": {
+                    "filter": {
+                        "_and": [
+                            {"conversation_id": {"project_id": {"_eq": project["id"]}}},
+                            {"transcript": {"_null": True}},
+                        ]
+                    },
+                    "sort": ["-timestamp"],
+                    "limit": -1,
+                }
+            },
+        )
+        assert [chunk["timestamp"][-1] for chunk in pending] == ["3", "1"]
+        assert pending[1]["error"] == "x"
+
+        client.delete_item("conversation_chunk", chunks[2]["id"])
+        assert len(client.get_items("conversation_chunk", {"query": {"limit": -1}})) == 2
+
+
+def test_the_in_memory_s3_serves_boto3():
+    with InMemoryS3() as s3:
+        client = boto3.client(
+            "s3",
+            endpoint_url=s3.url,
+            region_name="us-east-1",
+            aws_access_key_id="benchmark",
+            aws_secret_access_key="benchmark",
+        )
+        client.put_object(Bucket="benchmark", Key="audio/1.mp3", Body=b"audio")
+
+        assert client.head_object(Bucket="benchmark", Key="audio/1.mp3")["ContentLength"] == 5
+        body = client.get_object(Bucket="benchmark", Key="audio/1.mp3")["Body"]
+        assert body.read() == b"audio"
+        signed_url = client.generate_presigned_url(
+            "get_object", Params={"Bucket": "benchmark", "Key": "audio/1.mp3"}
+        )
+        assert requests.get(signed_url, timeout=5).content == b"audio"
+
+        client.delete_object(Bucket="benchmark", Key="audio/1.mp3")
+        with pytest.raises(ClientError):
+            client.head_object(Bucket="benchmark", Key="audio/1.mp3")
+
+
+def test_the_fake_provider_answers_as_assemblyai(monkeypatch):
+    with FakeTranscriptionProvider(latency_ms=0) as provider:
+        monkeypatch.setattr("dembrane.transcribe.ASSEMBLYAI_BASE_URL", provider.url)
+
+        transcript, response = transcribe_audio_assemblyai("http://audio", "en", None)
+        assert transcript.startswith("Transcript of")
+        assert response["words"]
+
+        provider.error_rate = 1.0
+        with pytest.raises(TranscriptionError):
+            transcribe_audio_assemblyai("http://audio", "en", None)
+
+        provider.submit_error_rate = 1.0
+        with pytest.raises(TranscriptionError):
+            transcribe_audio_assemblyai("http://audio", "en", None)
+        assert (provider.submitted, provider.rejected) == (2, 1)
+
+
+def test_the_fake_provider_delivers_runpod_webhooks():
+    delivered = []
+    done = threading.Event()
+
+    def deliver_webhook(payload: dict) -> None:
+        delivered.append(payload)
+        done.set()
+
+    with FakeTranscriptionProvider(latency_ms=50, deliver_webhook=deliver_webhook) as provider:
+        response = requests.post(
+            f"{provider.url}/run",
+            json={"input": {"conversation_chunk_id": "chunk-1", "language": "nl"}},
+            timeout=5,
+        )
+        job_id = response.json()["id"]
+        assert requests.get(f"{provider.url}/status/{job_id}", timeout=5).json()["status"] == (
+            "IN_PROGRESS"
+        )
+
+        assert done.wait(5)
+        assert delivered[0]["status"] == "COMPLETED"
+        assert delivered[0]["output"]["conversation_chunk_id"] == "chunk-1"
+        assert delivered[0]["output"]["language"] == "nl"
+
+
+def test_chunks_are_tracked_until_transcribed_or_failed():
+    tracker = ChunkTracker(["chunk-1", "chunk-2"])
+    for chunk_id in ("chunk-1", "chunk-2"):
+        tracker.sent(chunk_id)
+
+    tracker.on_write("conversation_chunk", {"id": "chunk-1", "error": "Injected error"})
+    tracker.on_write("conversation_chunk", {"id": "chunk-1", "transcript": "hello"})
+    tracker.on_write("processing_status", {"id": "chunk-2", "error": "unrelated"})
+    assert not tracker.wait(0)
+
+    tracker.on_write("conversation_chunk", {"id": "chunk-2", "error": "Injected error"})
+    assert tracker.wait(0)
+    assert list(tracker.done_at) == ["chunk-1"]
+    assert tracker.failed == {"chunk-2"}
+    assert len(tracker.latencies_ms()) == 1
+
+    assert percentile([], 0.5) is None
+    assert percentile([float(i) for i in range(1, 101)], 0.95) == 95.0
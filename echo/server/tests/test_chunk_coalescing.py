@@ -0,0 +1,168 @@
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+
+from dembrane.tasks import task_transcribe_coalesced_chunks
+from dembrane.chunk_coalescing import (
+    claim_window,
+    release_window,
+    add_chunk_to_window,
+    split_words_by_chunk,
+    transcribe_coalesced_chunks,
+)
+from dembrane.transcription_context import TranscriptionContext
+
+
+def _word(text: str, start: int, end: int) -> dict:
+    return {"text": text, "start": start, "end": end, "confidence": 0.9}
+
+
+def test_words_are_split_by_midpoint_and_made_relative():
+    words = [
+        _word("hello", 100, 600),
+        _word("there", 9800, 10400),  # midpoint 10100: second chunk
+        _word("general", 10500, 11000),
+        _word("kenobi", 25500, 26000),
+    ]
+
+    chunk_words = split_words_by_chunk(words, [10000, 10000, 10000])
+
+    assert [[word["text"] for word in chunk] for chunk in chunk_words] == [
+        ["hello"],
+        ["there", "general"],
+        ["kenobi"],
+    ]
+    assert chunk_words[1][0]["start"] == 0
+    assert chunk_words[1][0]["end"] == 400
+    assert chunk_words[2][0]["start"] == 5500
+
+
+def test_windows_collect_chunks_until_flushed():
+    window_id, opened, total_ms = add_chunk_to_window("conversation-1", "chunk-1", 4000)
+    assert opened
+    assert total_ms == 4000
+
+    same_window_id, opened, total_ms = add_chunk_to_window("conversation-1", "chunk-2", 5000)
+    assert same_window_id == window_id
+    assert not opened
+    assert total_ms == 9000
+
+    assert [entry["id"] for entry in claim_window("conversation-1", window_id, "flush-1")] == [
+        "chunk-1",
+        "chunk-2",
+    ]
+    # a second (delayed) flush of the same window finds nothing
+    assert claim_window("conversation-1", window_id, "flush-2") == []
+    # a retry of the first one finds it again, until it is released
+    assert len(claim_window("conversation-1", window_id, "flush-1")) == 2
+    release_window(window_id)
+    assert claim_window("conversation-1", window_id, "flush-1") == []
+
+    next_window_id, opened, _ = add_chunk_to_window("conversation-1", "chunk-3", 4000)
+    assert next_window_id != window_id
+    assert opened
+
+
+@pytest.fixture
+def coalesced_transcription(monkeypatch):
+    chunks = {
+        "chunk-1": {"id": "chunk-1", "path": "a.mp3", "timestamp": "2025-01-01T00:00:00"},
+        "chunk-2": {"id": "chunk-2", "path": "b.mp3", "timestamp": "2025-01-01T00:00:04"},
+    }
+    response = {
+        "text": "one two three",
+        "audio_duration": 9.0,
+        "words": [_word("one", 0, 500), _word("two", 3000, 3500), _word("three", 5000, 5500)],
+    }
+    saved = {}
+
+    def save_transcript(chunk_id, transcript, diarization, **kwargs):  # noqa: ARG001
+        saved[chunk_id] = (transcript, diarization)
+
+    monkeypatch.setattr("dembrane.chunk_coalescing._fetch_chunk", chunks.__getitem__)
+    monkeypatch.setattr(
+        "dembrane.chunk_coalescing._get_transcription_context",
+        lambda conversation_id: TranscriptionContext(
+            conversation_id=conversation_id,
+            project_id="project-1",
+            language="en",
+            provider="AssemblyAI",
+        ),
+    )
+    monkeypatch.setattr(
+        "dembrane.chunk_coalescing.merge_multiple_audio_files_and_save_to_s3",
+        lambda paths, output, fmt: output,  # noqa: ARG005
+    )
+    monkeypatch.setattr("dembrane.chunk_coalescing.get_signed_url", lambda path, **_: path)
+    monkeypatch.setattr("dembrane.chunk_coalescing.delete_from_s3", lambda _: None)
+    monkeypatch.setattr(
+        "dembrane.chunk_coalescing.transcribe_audio_assemblyai",
+        lambda *_: (response["text"], response),
+    )
+    monkeypatch.setattr("dembrane.chunk_coalescing._get_transcript_cache_key", lambda *_: None)
+    monkeypatch.setattr("dembrane.chunk_coalescing._save_transcript", save_transcript)
+    return response, saved
+
+
+def test_one_request_is_mapped_back_to_every_chunk(coalesced_transcription):
+    _, saved = coalesced_transcription
+    # the second chunk arrived first
+    window_id, _, _ = add_chunk_to_window("conversation-1", "chunk-2", 5000)
+    add_chunk_to_window("conversation-1", "chunk-1", 4000)
+
+    assert transcribe_coalesced_chunks("conversation-1", window_id, "flush-1") == []
+
+    assert saved["chunk-1"][0] == "one two"
+    assert saved["chunk-2"][0] == "three"
+    assert saved["chunk-2"][1]["data"][0]["start"] == 1000
+    assert saved["chunk-2"][1]["coalesced"] == {"chunks": ["chunk-1", "chunk-2"]}
+
+
+def test_chunks_are_transcribed_alone_when_the_audio_does_not_add_up(coalesced_transcription):
+    response, saved = coalesced_transcription
+    response["audio_duration"] = 4.0
+    window_id, _, _ = add_chunk_to_window("conversation-1", "chunk-1", 4000)
+    add_chunk_to_window("conversation-1", "chunk-2", 5000)
+
+    remaining_entries = transcribe_coalesced_chunks("conversation-1", window_id, "flush-1")
+    assert [entry["id"] for entry in remaining_entries] == ["chunk-1", "chunk-2"]
+    assert saved == {}
+
+
+def test_a_retried_flush_sends_the_chunks_it_failed_to_send(coalesced_transcription, monkeypatch):
+    response, _ = coalesced_transcription
+    response["audio_duration"] = 4.0
+    window_id, _, _ = add_chunk_to_window(
+        "conversation-1", "chunk-1", 4000, source="PORTAL_AUDIO", use_transcript_cache=False
+    )
+    add_chunk_to_window("conversation-1", "chunk-2", 5000, source="PORTAL_AUDIO")
+
+    sent_messages = []
+
+    def send_chunk_message(message, source):
+        if not sent_messages:
+            sent_messages.append(None)
+            raise ConnectionError("broker unavailable")
+        sent_messages.append((message.args[0], message.kwargs, source))
+
+    monkeypatch.setattr("dembrane.tasks.send_chunk_message", send_chunk_message)
+    monkeypatch.setattr(
+        "dembrane.tasks.ProcessingStatusContext", lambda **_: contextlib.nullcontext()
+    )
+    monkeypatch.setattr(
+        "dembrane.tasks.CurrentMessage.get_current_message",
+        lambda: SimpleNamespace(message_id="message-1"),
+    )
+
+    with pytest.raises(ConnectionError):
+        task_transcribe_coalesced_chunks.fn("conversation-1", window_id)
+    task_transcribe_coalesced_chunks.fn("conversation-1", window_id)
+
+    assert sent_messages[1:] == [
+        ("chunk-1", {"use_transcript_cache": False}, "PORTAL_AUDIO"),
+        ("chunk-2", {"use_transcript_cache": True}, "PORTAL_AUDIO"),
+    ]
+    # released: the delayed flush of the window finds nothing
+    task_transcribe_coalesced_chunks.fn("conversation-1", window_id)
+    assert len(sent_messages) == 3
@@ -0,0 +1,91 @@
+import pytest
+
+from dembrane.utils import generate_uuid
+from dembrane.chunk_counts import (
+    get_chunk_counts,
+    forget_chunk_status,
+    record_chunk_status,
+    reconcile_chunk_counts,
+    get_tracked_chunk_counts,
+)
+
+
+@pytest.fixture
+def chunk_statuses(monkeypatch):
+    """What a scan of Directus returns: chunk_id -> status."""
+    statuses: dict[str, str] = {}
+    monkeypatch.setattr(
+        "dembrane.chunk_counts.scan_chunk_statuses",
+        lambda conversation_id: dict(statuses),  # noqa: ARG005
+    )
+    return statuses
+
+
+def _chunk(conversation_id: str, chunk_id: str, **fields) -> dict:
+    return {
+        "id": chunk_id,
+        "conversation_id": conversation_id,
+        "error": None,
+        "transcript": None,
+        **fields,
+    }
+
+
+def test_counts_follow_chunk_transitions(chunk_statuses):
+    conversation_id = generate_uuid()
+    chunk_statuses.update({"a": "ok", "b": "pending"})
+
+    # seeded from one scan
+    assert get_chunk_counts(conversation_id)["pending"] == 1
+
+    record_chunk_status(_chunk(conversation_id, "c"))
+    record_chunk_status(_chunk(conversation_id, "b", transcript="hello"))
+    record_chunk_status(_chunk(conversation_id, "c", error="failed"))
+    # recording the same status twice does not double count
+    record_chunk_status(_chunk(conversation_id, "c", error="failed"))
+    forget_chunk_status(conversation_id, "a")
+
+    assert get_tracked_chunk_counts(conversation_id) == {
+        "total": 2,
+        "processed": 2,
+        "error": 1,
+        "pending": 0,
+        "ok": 1,
+    }
+
+
+def test_partial_rows_and_reconcile_fix_drift(chunk_statuses):
+    conversation_id = generate_uuid()
+    chunk_statuses.update({"a": "pending"})
+    get_chunk_counts(conversation_id)
+
+    # a row without the status fields cannot be tracked, the next read rescans
+    record_chunk_status({"id": "a", "conversation_id": conversation_id})
+    assert get_tracked_chunk_counts(conversation_id) is None
+
+    get_chunk_counts(conversation_id)
+    # a write that bypassed the counters
+    chunk_statuses["a"] = "ok"
+
+    reconcile_chunk_counts()
+
+    assert get_tracked_chunk_counts(conversation_id)["ok"] == 1
+
+
+def test_transitions_during_the_first_scan_are_replayed(chunk_statuses, monkeypatch):
+    conversation_id = generate_uuid()
+    chunk_statuses.update({"a": "pending", "b": "pending"})
+
+    def scan_while_chunks_change(conversation_id: str) -> dict[str, str]:
+        scanned = dict(chunk_statuses)
+        # written after the scan read them, before the seed
+        record_chunk_status(_chunk(conversation_id, "a", transcript="hello"))
+        record_chunk_status(_chunk(conversation_id, "c"))
+        forget_chunk_status(conversation_id, "b")
+        return scanned
+
+    monkeypatch.setattr("dembrane.chunk_counts.scan_chunk_statuses", scan_while_chunks_change)
+
+    expected = {"total": 2, "processed": 1, "error": 0, "pending": 1, "ok": 1}
+    assert get_chunk_counts(conversation_id) == expected
+    assert get_tracked_chunk_counts(conversation_id) == expected
@@ -0,0 +1,87 @@
+from contextlib import contextmanager
+
+import pytest
+
+from dembrane.conversation_clone import (
+    get_clone_progress,
+    set_clone_progress,
+    clone_conversation_chunks,
+)
+
+
+class FakeDirectus:
+    def __init__(self, chunks: list[dict]):
+        self.chunks = chunks
+        self.created: list[list[dict]] = []
+
+    def get_items(self, collection: str, request: dict) -> list[dict]:  # noqa: ARG002
+        return list(self.chunks)
+
+    def create_item(self, collection: str, item_data: list[dict]) -> dict:
+        assert collection == "conversation_chunk"
+        self.created.append(item_data)
+        return {"data": item_data}
+
+
+@pytest.fixture
+def cloning(monkeypatch):
+    chunks = [
+        {
+            "id": f"chunk-{i}",
+            "timestamp": f"2025-01-01T00:{i // 60:02}:{i % 60:02}",
+            "path": f"s3/{i}",
+        }
+        for i in range(250)
+    ]
+    chunks.append({"id": "text", "timestamp": "2025-01-01T01:00:00", "transcript": "typed"})
+    directus = FakeDirectus(chunks)
+    sent = []
+
+    @contextmanager
+    def directus_client_context():
+        yield directus
+
+    monkeypatch.setattr(
+        "dembrane.conversation_clone.directus_client_context", directus_client_context
+    )
+    monkeypatch.setattr(
+        "dembrane.conversation_clone.send_fair_many",
+        lambda messages, project_id: sent.append((messages, project_id)),
+    )
+    return directus, sent
+
+
+def test_chunks_are_cloned_in_batches_and_queued_as_one_group(cloning):
+    directus, sent = cloning
+
+    queued = clone_conversation_chunks("source", "clone", "project-1")
+
+    assert [len(batch) for batch in directus.created] == [100, 100, 51]
+    assert len(queued) == 250
+    assert len(sent) == 1
+    messages, project_id = sent[0]
+    assert project_id == "project-1"
+    assert [message.args[0] for message in messages] == queued
+    assert messages[0].actor_name == "task_process_conversation_chunk"
+
+    text_chunk = directus.created[-1][-1]
+    assert text_chunk["transcript"] == "typed"
+    assert text_chunk["id"] not in queued
+    assert all(item["conversation_id"] == "clone" for batch in directus.created for item in batch)
+
+
+@pytest.mark.usefixtures("cloning")
+def test_progress_is_reported_with_the_chunk_counts():
+    set_clone_progress("clone", status="queued")
+    assert get_clone_progress("clone") == {"status": "queued"}
+
+    clone_conversation_chunks("source", "clone", "project-1")
+
+    progress = get_clone_progress("clone")
+    assert progress["status"] == "transcribing"
+    assert (progress["total"], progress["cloned"]) == (251, 251)
+    assert progress["chunks"]["total"] == 251
+    assert progress["chunks"]["ok"] == 1
+    assert progress["chunks"]["pending"] == 250
+
+    assert get_clone_progress("not-a-clone") is None
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+import dembrane.tasks as tasks
+from dembrane.conversation_health import check_runpod_diarization, submit_runpod_diarization
+
+
+class FakeResponse:
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return self.payload
+
+
+@pytest.fixture
+def runpod(monkeypatch):
+    """RunPod diarization endpoint that answers IN_PROGRESS until a status is set."""
+    state: dict = {"status": "IN_PROGRESS", "updates": [], "cancelled": []}
+
+    def post(url: str, **_):
+        if "/cancel/" in url:
+            state["cancelled"].append(url.rsplit("/", 1)[-1])
+            return FakeResponse({})
+        return FakeResponse({"id": "job-1"})
+
+    def get(url: str, **_):  # noqa: ARG001
+        return FakeResponse({"status": state["status"], "output": {"noise_ratio": 0.1}})
+
+    monkeypatch.setattr("dembrane.conversation_health.ENABLE_RUNPOD_DIARIZATION", True)
+    monkeypatch.setattr(
+        "dembrane.conversation_health._fetch_chunk_data", lambda _: ("audio/1.mp3", "en")
+    )
+    monkeypatch.setattr("dembrane.conversation_health._generate_audio_url", lambda path: path)
+    monkeypatch.setattr("dembrane.conversation_health.requests.post", post)
+    monkeypatch.setattr("dembrane.conversation_health.requests.get", get)
+    monkeypatch.setattr(
+        "dembrane.conversation_health.directus.update_item",
+        lambda collection, item_id, data: state["updates"].append((collection, item_id, data)),
+    )
+    return state
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    messages: list[dict] = []
+    monkeypatch.setattr(
+        tasks.task_check_runpod_diarization,
+        "send_with_options",
+        lambda **options: messages.append(options),
+    )
+    return messages
+
+
+def test_a_submitted_job_is_checked_until_it_completes(runpod):
+    job_id, job_status_link = submit_runpod_diarization("chunk-1")
+    assert job_status_link.endswith(f"/status/{job_id}")
+
+    submitted_at = time.time()
+    assert not check_runpod_diarization("chunk-1", job_id, job_status_link, submitted_at)
+    assert runpod["updates"] == []
+
+    runpod["status"] = "COMPLETED"
+    assert check_runpod_diarization("chunk-1", job_id, job_status_link, submitted_at)
+    assert runpod["updates"][0][:2] == ("conversation_chunk", "chunk-1")
+    assert runpod["updates"][0][2]["noise_ratio"] == 0.1
+
+
+def test_a_job_past_the_timeout_is_cancelled(runpod):
+    submitted_at = time.time() - tasks.RUNPOD_DIARIZATION_TIMEOUT
+    assert check_runpod_diarization("chunk-1", "job-1", "http://runpod/status/job-1", submitted_at)
+    assert runpod["cancelled"] == ["job-1"]
+
+
+def test_the_task_reschedules_pending_jobs(runpod, sent):  # noqa: ARG001
+    submitted_at = time.time()
+    tasks.task_check_runpod_diarization.fn("chunk-1", "job-1", "http://status", submitted_at)
+
+    assert sent == [
+        {
+            "args": ("chunk-1", "job-1", "http://status", submitted_at),
+            "delay": tasks.RUNPOD_DIARIZATION_POLL_INTERVAL_MS,
+        }
+    ]
+
+
+def test_failed_checks_are_retried_with_backoff_until_the_timeout(runpod, sent, monkeypatch):
+    def fail(*_):
+        raise RuntimeError("Directus is down")
+
+    runpod["status"] = "COMPLETED"
+    monkeypatch.setattr("dembrane.conversation_health.directus.update_item", fail)
+
+    submitted_at = time.time()
+    tasks.task_check_runpod_diarization.fn("chunk-1", "job-1", "http://status", submitted_at)
+    tasks.task_check_runpod_diarization.fn("chunk-1", "job-1", "http://status", submitted_at, 1)
+    assert [message["args"][-1] for message in sent] == [1, 2]
+    assert sent[1]["delay"] == 2 * sent[0]["delay"]
+
+    expired = time.time() - tasks.RUNPOD_DIARIZATION_TIMEOUT
+    tasks.task_check_runpod_diarization.fn("chunk-1", "job-1", "http://status", expired, 2)
+    assert len(sent) == 2
@@ -0,0 +1,44 @@
+import logging
+from datetime import timedelta
+
+from dembrane.utils import generate_uuid, get_utc_timestamp
+from dembrane.conversation_timers import (
+    pop_due_conversation_timers,
+    reset_conversation_inactivity_timer,
+    cancel_conversation_inactivity_timer,
+)
+
+logger = logging.getLogger("test_conversation_timers")
+
+
+def test_inactivity_timer_fires_once_after_threshold():
+    conversation_id = generate_uuid()
+    now = get_utc_timestamp()
+
+    reset_conversation_inactivity_timer(conversation_id, now=now)
+
+    assert conversation_id not in pop_due_conversation_timers(now=now + timedelta(minutes=4))
+    assert conversation_id in pop_due_conversation_timers(now=now + timedelta(minutes=6))
+    assert conversation_id not in pop_due_conversation_timers(now=now + timedelta(minutes=7))
+
+
+def test_inactivity_timer_is_pushed_back_by_activity():
+    conversation_id = generate_uuid()
+    now = get_utc_timestamp()
+
+    reset_conversation_inactivity_timer(conversation_id, now=now)
+    # a new chunk arrives 3 minutes later
+    reset_conversation_inactivity_timer(conversation_id, now=now + timedelta(minutes=3))
+
+    assert conversation_id not in pop_due_conversation_timers(now=now + timedelta(minutes=6))
+    assert conversation_id in pop_due_conversation_timers(now=now + timedelta(minutes=9))
+
+
+def test_cancelled_inactivity_timer_does_not_fire():
+    conversation_id = generate_uuid()
+    now = get_utc_timestamp()
+
+    reset_conversation_inactivity_timer(conversation_id, now=now)
+    cancel_conversation_inactivity_timer(conversation_id)
+
+    assert conversation_id not in pop_due_conversation_timers(now=now + timedelta(minutes=6))
@@ -1,11 +1,20 @@
 import logging
-from datetime import timedelta
+from datetime import datetime, timedelta
+
+import pytest
 
 from dembrane.utils import get_utc_timestamp
 from dembrane.directus import directus
+from dembrane.redis_utils import get_redis_client
 from dembrane.conversation_utils import (
+    CONVERSATION_ACTIVITY_KEY,
+    CONVERSATION_ACTIVITY_SETTLE_SECONDS,
+    _read_activity_window,
+    _advance_activity_cursor,
+    record_conversation_activity,
     collect_unfinished_conversations,
     collect_unfinished_audio_processing_conversations,
+    collect_recent_unfinished_audio_processing_conversations,
 )
 
 from .common import (
@@ -160,9 +169,9 @@ def test_collect_unfinished_conversations():
     )["data"]
     res = collect_unfinished_conversations()
 
-    assert (
-        c["id"] not in res
-    ), "TEST 10min: Conversation with two chunks (1hr old, 16min old, 10min old)"
+    assert c["id"] not in res, (
+        "TEST 10min: Conversation with two chunks (1hr old, 16min old, 10min old)"
+    )
 
     delete_conversation_chunk(cc["id"])
     delete_conversation_chunk(cc2["id"])
@@ -215,3 +224,108 @@ def test_collect_unfinished_audio_processing_conversations():
     delete_conversation(c2["id"])
     delete_conversation(c3["id"])
     delete_project(p["id"])
+
+
+class FakeDirectus:
+    """The conversation / conversation_segment queries of the incremental sweep."""
+
+    def __init__(self, conversations: list[dict], segments: list[dict]):
+        self.conversations = conversations
+        self.segments = segments
+        self.queries: list[str] = []
+        self.updated: list[str] = []
+
+    def get_items(self, collection: str, query: dict) -> list[dict]:
+        self.queries.append(collection)
+        item_filter = query["query"]["filter"]
+        if collection == "conversation":
+            return [c for c in self.conversations if c["id"] in item_filter["id"]["_in"]]
+        ids = item_filter["conversation_id"]["_in"]
+        return [s for s in self.segments if s["conversation_id"] in ids]
+
+    def update_item(self, collection: str, item_id: str, data: dict) -> None:  # noqa: ARG002
+        self.updated.append(item_id)
+
+
+@pytest.fixture
+def sweep(monkeypatch):
+    now = {"value": get_utc_timestamp()}
+    fake = FakeDirectus(conversations=[], segments=[])
+    monkeypatch.setattr("dembrane.conversation_utils.directus", fake)
+    monkeypatch.setattr("dembrane.conversation_utils.get_utc_timestamp", lambda: now["value"])
+    return now, fake
+
+
+def _active(conversation_id: str, seconds_ago: float, now: datetime) -> None:
+    record_conversation_activity(conversation_id, now - timedelta(seconds=seconds_ago))
+
+
+def test_the_sweep_reads_settled_activity_once_and_prunes_it(sweep):
+    now, fake = sweep
+    fake.conversations = [
+        {"id": conversation_id, "is_audio_processing_finished": False}
+        for conversation_id in ("c1", "c2")
+    ]
+    settle = CONVERSATION_ACTIVITY_SETTLE_SECONDS
+    _active("c1", settle * 2, now["value"])
+    # may still be racing a sweep: left for the next one
+    _active("c2", settle / 2, now["value"])
+
+    assert collect_recent_unfinished_audio_processing_conversations() == ["c1"]
+    assert get_redis_client().zrange(CONVERSATION_ACTIVITY_KEY, 0, -1) == [b"c2"]
+    assert collect_recent_unfinished_audio_processing_conversations() == []
+
+    now["value"] += timedelta(seconds=settle)
+    assert collect_recent_unfinished_audio_processing_conversations() == ["c2"]
+    assert get_redis_client().zcard(CONVERSATION_ACTIVITY_KEY) == 0
+
+    # activity after the sweep is read again
+    _active("c1", settle, now["value"] + timedelta(seconds=settle))
+    now["value"] += timedelta(seconds=settle * 2)
+    assert collect_recent_unfinished_audio_processing_conversations() == ["c1"]
+
+
+def test_entries_are_kept_until_every_cursor_consumed_them(sweep, monkeypatch):
+    now, _ = sweep
+    monkeypatch.setattr("dembrane.conversation_utils._SWEEP_CURSORS", ["audio_processing", "other"])
+    _active("c1", CONVERSATION_ACTIVITY_SETTLE_SECONDS * 2, now["value"])
+
+    collect_recent_unfinished_audio_processing_conversations()
+    assert get_redis_client().zcard(CONVERSATION_ACTIVITY_KEY) == 1
+
+    horizon = now["value"].timestamp() - CONVERSATION_ACTIVITY_SETTLE_SECONDS
+    assert _read_activity_window("other", horizon) == ["c1"]
+    _advance_activity_cursor("other", horizon)
+    assert get_redis_client().zcard(CONVERSATION_ACTIVITY_KEY) == 0
+
+
+def test_conversations_are_classified_with_batched_queries(sweep):
+    now, fake = sweep
+    fake.conversations = [
+        {"id": "unfinished", "is_audio_processing_finished": False},
+        {"id": "processed", "is_audio_processing_finished": True},
+        {"id": "unprocessed_segment", "is_audio_processing_finished": True},
+        {"id": "no_segments", "is_audio_processing_finished": True},
+        # "not_enhanced" is filtered out by Directus (project without enhanced processing)
+    ]
+    fake.segments = [
+        {"conversation_id": "processed", "lightrag_flag": True},
+        {"conversation_id": "unprocessed_segment", "lightrag_flag": True},
+        {"conversation_id": "unprocessed_segment", "lightrag_flag": False},
+    ]
+    for conversation_id in (
+        "unfinished",
+        "processed",
+        "unprocessed_segment",
+        "no_segments",
+        "not_enhanced",
+    ):
+        _active(conversation_id, CONVERSATION_ACTIVITY_SETTLE_SECONDS * 2, now["value"])
+
+    assert sorted(collect_recent_unfinished_audio_processing_conversations()) == [
+        "no_segments",
+        "unfinished",
+        "unprocessed_segment",
+    ]
+    assert fake.queries == ["conversation", "conversation_segment"]
+    assert fake.updated == ["no_segments"]
@@ -0,0 +1,75 @@
+from dembrane.correction_gate import decide_correction, format_suspect_spans
+
+
+def _words(*items: tuple[str, float], gap_after: dict[int, int] | None = None) -> list[dict]:
+    """Words of 500ms each, back to back, unless gap_after adds silence (ms) after an index."""
+    words = []
+    start = 0
+    for i, (text, confidence) in enumerate(items):
+        words.append({"text": text, "start": start, "end": start + 500, "confidence": confidence})
+        start += 500 + (gap_after or {}).get(i, 0)
+    return words
+
+
+CLEAN = [("we", 0.99), ("talked", 0.97), ("about", 0.98), ("the", 0.99), ("budget", 0.95)] * 6
+
+
+def test_clean_transcripts_skip_correction():
+    decision = decide_correction(_words(*CLEAN), audio_duration_seconds=15, hotwords=["Dembrane"])
+
+    assert not decision.run
+    assert decision.spans == []
+
+
+def test_low_confidence_runs_are_flagged_with_context():
+    words = _words(*CLEAN[:10], ("semir", 0.3), ("dembrain", 0.4), *CLEAN[:10])
+
+    decision = decide_correction(words, audio_duration_seconds=11, hotwords=None)
+
+    assert decision.run
+    assert decision.reasons == ["low_confidence"]
+    (span,) = decision.spans
+    assert "semir dembrain" in span.text
+    assert span.start_ms < words[10]["start"] and span.end_ms > words[11]["end"]
+
+
+def test_a_single_unsure_word_in_a_long_chunk_is_not_enough():
+    words = _words(*CLEAN, ("um", 0.4), *CLEAN)
+
+    assert not decide_correction(words, audio_duration_seconds=31, hotwords=None).run
+
+
+def test_gaps_and_untranscribed_tails_are_flagged():
+    words = _words(*CLEAN[:5], gap_after={2: 8000})
+
+    decision = decide_correction(words, audio_duration_seconds=30, hotwords=None)
+
+    assert decision.reasons == ["gap"]
+    assert [(span.start_ms, span.end_ms) for span in decision.spans] == [
+        (1500, 9500),
+        (10500, 30000),
+    ]
+
+
+def test_misspelled_hotwords_are_flagged_but_exact_ones_are_not():
+    assert not decide_correction(
+        _words(*CLEAN, ("Dembrane", 0.9)), audio_duration_seconds=16, hotwords=["Dembrane"]
+    ).run
+
+    decision = decide_correction(
+        _words(*CLEAN, ("Dembrain", 0.9)), audio_duration_seconds=16, hotwords=["Dembrane"]
+    )
+    assert decision.reasons == ["hotword"]
+
+
+def test_empty_transcripts_are_corrected_unless_the_audio_is_tiny():
+    assert decide_correction([], audio_duration_seconds=20, hotwords=None).reasons == ["empty"]
+    assert not decide_correction([], audio_duration_seconds=1, hotwords=None).run
+
+
+def test_format_suspect_spans():
+    decision = decide_correction(
+        _words(*CLEAN, ("Dembrain", 0.9)), audio_duration_seconds=16, hotwords=["Dembrane"]
+    )
+
+    assert format_suspect_spans(decision.spans).startswith("- 14.0s-15.5s (hotword): ")
@@ -0,0 +1,110 @@
+import logging
+
+import dramatiq
+
+from dembrane.utils import generate_uuid
+from dembrane.fair_queue import (
+    FAIR_QUEUE_MAX_IN_FLIGHT,
+    FAIR_QUEUE_PROJECT_OPTION,
+    FairQueueMiddleware,
+    send_fair,
+    send_fair_many,
+    _dispatch_queue,
+    get_fair_queue_stats,
+)
+
+logger = logging.getLogger("test_fair_queue")
+
+
+def _message(queue_name: str, i: int) -> dramatiq.Message:
+    return dramatiq.Message(
+        queue_name=queue_name, actor_name="test_actor", args=(i,), kwargs={}, options={}
+    )
+
+
+def test_dispatch_round_robins_over_projects(broker):
+    queue_name = f"test_fair_{generate_uuid()}"
+    busy_project, quiet_project = generate_uuid(), generate_uuid()
+
+    for i in range(10):
+        send_fair(_message(queue_name, i), project_id=busy_project)
+    for i in range(2):
+        send_fair(_message(queue_name, i), project_id=quiet_project)
+
+    assert _dispatch_queue(queue_name, max_in_flight=4) == 4
+
+    dispatched_projects = [m.options[FAIR_QUEUE_PROJECT_OPTION] for m in broker.messages]
+    # the quiet project does not wait behind the backlog of the busy one
+    assert dispatched_projects.count(quiet_project) == 2
+    assert dispatched_projects.count(busy_project) == 2
+
+    # queue is full until something is processed
+    assert _dispatch_queue(queue_name, max_in_flight=4) == 0
+
+    stats = get_fair_queue_stats(queue_name)
+    assert stats[busy_project] == {"backlog": 8, "in_flight": 2}
+
+
+def test_processed_messages_free_their_slot(broker):
+    queue_name = f"test_fair_{generate_uuid()}"
+    project_id = generate_uuid()
+
+    for i in range(3):
+        send_fair(_message(queue_name, i), project_id=project_id)
+
+    assert _dispatch_queue(queue_name, max_in_flight=2) == 2
+
+    middleware = FairQueueMiddleware()
+    middleware.before_process_message(broker, broker.messages[0])
+    middleware.after_process_message(broker, broker.messages[0])
+
+    assert _dispatch_queue(queue_name, max_in_flight=2) == 1
+    # drained projects leave the ring
+    assert _dispatch_queue(queue_name, max_in_flight=2) == 0
+    assert project_id not in get_fair_queue_stats(queue_name)
+
+
+def test_send_without_project_goes_to_broker(broker):
+    queue_name = f"test_fair_{generate_uuid()}"
+
+    send_fair(_message(queue_name, 0))
+
+    assert len(broker.messages) == 1
+    assert FAIR_QUEUE_PROJECT_OPTION not in broker.messages[0].options
+
+
+def test_send_many_keeps_the_order_of_a_group(broker):
+    queue_name = f"test_fair_{generate_uuid()}"
+    project_id = generate_uuid()
+
+    send_fair_many([_message(queue_name, i) for i in range(1200)], project_id=project_id)
+
+    assert get_fair_queue_stats(queue_name)[project_id] == {"backlog": 1200, "in_flight": 0}
+    assert _dispatch_queue(queue_name, max_in_flight=3) == 3
+    assert [message.args[0] for message in broker.messages] == [0, 1, 2]
+
+
+def test_a_project_without_backlog_is_dispatched_directly(broker, monkeypatch):
+    queue_name = f"test_fair_{generate_uuid()}"
+    monkeypatch.setitem(FAIR_QUEUE_MAX_IN_FLIGHT, queue_name, 10)
+    monkeypatch.setattr("dembrane.fair_queue.FAIR_QUEUE_PROJECT_MAX_IN_FLIGHT", 2)
+    busy_project, quiet_project = generate_uuid(), generate_uuid()
+
+    send_fair_many([_message(queue_name, i) for i in range(15)], project_id=busy_project)
+
+    # nobody else has a backlog, so the busy project may use the whole queue
+    assert len(broker.messages) == 10
+    assert get_fair_queue_stats(queue_name)[busy_project] == {"backlog": 5, "in_flight": 10}
+
+    # later messages of a backlogged project wait their turn, even when a slot frees up
+    middleware = FairQueueMiddleware()
+    middleware.after_process_message(broker, broker.messages[0])
+    send_fair(_message(queue_name, 15), project_id=busy_project)
+    assert len(broker.messages) == 10
+
+    # a quiet project still gets its share while the queue has room
+    send_fair(_message(queue_name, 0), project_id=quiet_project)
+    assert len(broker.messages) == 11
+    assert broker.messages[-1].options[FAIR_QUEUE_PROJECT_OPTION] == quiet_project
+    send_fair(_message(queue_name, 1), project_id=quiet_project)
+    assert get_fair_queue_stats(queue_name)[quiet_project] == {"backlog": 1, "in_flight": 1}
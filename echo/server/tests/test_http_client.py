@@ -0,0 +1,28 @@
+import gc
+import asyncio
+
+from dembrane.http_client import get_async_http_client, _async_clients_by_loop
+
+
+async def _get_clients() -> tuple:
+    return get_async_http_client(), get_async_http_client()
+
+
+def test_a_loop_reuses_its_client_and_other_loops_get_their_own():
+    first, again = asyncio.run(_get_clients())
+    other, _ = asyncio.run(_get_clients())
+
+    assert first is again
+    assert other is not first
+
+
+def test_clients_go_away_with_their_loop():
+    loop = asyncio.new_event_loop()
+    client, _ = loop.run_until_complete(_get_clients())
+    assert _async_clients_by_loop[loop] is client
+
+    loop.close()
+    del loop
+    gc.collect()
+
+    assert client not in _async_clients_by_loop.values()
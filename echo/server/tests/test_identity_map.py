@@ -0,0 +1,49 @@
+from dembrane.identity_map import get_or_load, record_round_trip, identity_map_scope
+
+
+class CountingLoader:
+    def __init__(self, row: dict):
+        self.row = row
+        self.calls = 0
+
+    def __call__(self) -> dict:
+        self.calls += 1
+        return dict(self.row)
+
+
+def test_reads_are_cached_within_a_scope_only():
+    load = CountingLoader({"id": "chunk-1", "transcript": None})
+
+    with identity_map_scope("test"):
+        first = get_or_load("conversation_chunk", "chunk-1", load)
+        first["transcript"] = "mutated by the caller"
+        second = get_or_load("conversation_chunk", "chunk-1", load)
+
+    assert load.calls == 1
+    assert second["transcript"] is None
+
+    get_or_load("conversation_chunk", "chunk-1", load)
+    assert load.calls == 2
+
+
+def test_writes_invalidate_the_collection_and_its_embedders():
+    chunk_load = CountingLoader({"id": "chunk-1"})
+    conversation_load = CountingLoader({"id": "conversation-1", "chunks": []})
+    project_load = CountingLoader({"id": "project-1"})
+
+    with identity_map_scope("test") as identity_map:
+        get_or_load("conversation_chunk", "chunk-1", chunk_load)
+        get_or_load("conversation", "conversation-1", conversation_load, variant="chunks=True")
+        get_or_load("project", "project-1", project_load)
+
+        record_round_trip("/items/conversation_chunk/chunk-1", is_write=True)
+
+        get_or_load("conversation_chunk", "chunk-1", chunk_load)
+        get_or_load("conversation", "conversation-1", conversation_load, variant="chunks=True")
+        get_or_load("project", "project-1", project_load)
+
+        assert identity_map.round_trips == 1
+
+    assert chunk_load.calls == 2
+    assert conversation_load.calls == 2
+    assert project_load.calls == 1
@@ -0,0 +1,36 @@
+import pytest
+import dramatiq
+
+from dembrane.lanes import send_chunk_message
+from dembrane.utils import generate_uuid
+from dembrane.fair_queue import get_fair_queue_stats
+
+
+@pytest.fixture(autouse=True)
+def live_lanes(monkeypatch):
+    monkeypatch.setattr("dembrane.lanes.ENABLE_LIVE_LANES", True)
+
+
+def _message(queue_name: str) -> dramatiq.Message:
+    return dramatiq.Message(
+        queue_name=queue_name, actor_name="test_actor", args=(), kwargs={}, options={}
+    )
+
+
+def test_live_chunks_skip_the_bulk_lane(broker):
+    queue_name = f"test_lane_{generate_uuid()}"
+
+    send_chunk_message(_message(queue_name), source="PORTAL_AUDIO", project_id=generate_uuid())
+
+    assert [m.queue_name for m in broker.messages] == [f"{queue_name}_live"]
+    assert get_fair_queue_stats(queue_name) == {}
+
+
+def test_uploads_go_through_the_fair_queue(broker):
+    queue_name = f"test_lane_{generate_uuid()}"
+    project_id = generate_uuid()
+
+    send_chunk_message(_message(queue_name), source="DASHBOARD_UPLOAD", project_id=project_id)
+
+    assert broker.messages == []
+    assert get_fair_queue_stats(queue_name)[project_id]["backlog"] == 1
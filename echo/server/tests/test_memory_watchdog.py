@@ -0,0 +1,76 @@
+import signal
+
+import dramatiq
+
+from dembrane.redis_utils import get_redis_client
+from dembrane.memory_watchdog import MemoryWatchdogMiddleware, _recycle_lock_key
+
+
+def _message(actor_name: str) -> dramatiq.Message:
+    return dramatiq.Message(queue_name="cpu", actor_name=actor_name, args=(), kwargs={}, options={})
+
+
+def _process(middleware: MemoryWatchdogMiddleware, message: dramatiq.Message) -> None:
+    middleware.before_process_message(None, message)
+    middleware.after_process_message(None, message)
+
+
+def test_growth_is_attributed_to_actors(monkeypatch):
+    rss = iter([100.0, 180.0, 180.0, 185.0])
+    monkeypatch.setattr("dembrane.memory_watchdog.get_rss_mb", lambda: next(rss))
+    middleware = MemoryWatchdogMiddleware(max_rss_mb=0, max_tasks=0)
+
+    _process(middleware, _message("task_merge_conversation_chunks"))
+    _process(middleware, _message("task_transcribe_chunk"))
+
+    top_actors = middleware.get_top_actors()
+    assert [actor for actor, _ in top_actors] == [
+        "task_merge_conversation_chunks",
+        "task_transcribe_chunk",
+    ]
+    assert top_actors[0][1]["max_growth_mb"] == 80.0
+    assert not middleware.recycle_requested
+
+
+def test_recycles_once_after_max_tasks(monkeypatch):
+    signals: list[int] = []
+    monkeypatch.setattr("dembrane.memory_watchdog.get_rss_mb", lambda: 100.0)
+    monkeypatch.setattr("dembrane.memory_watchdog._is_dramatiq_process", lambda pid: False)  # noqa: ARG005
+    monkeypatch.setattr("dembrane.memory_watchdog.os.kill", lambda pid, sig: signals.append(sig))  # noqa: ARG005
+    middleware = MemoryWatchdogMiddleware(max_rss_mb=0, max_tasks=2)
+
+    _process(middleware, _message("task_transcribe_chunk"))
+    assert not middleware.recycle_requested
+
+    _process(middleware, _message("task_transcribe_chunk"))
+    _process(middleware, _message("task_transcribe_chunk"))
+    assert middleware.recycle_requested
+    # not running under the dramatiq CLI: nothing to signal
+    assert signals == []
+
+
+def test_one_sibling_signals_and_the_next_generation_can_recycle_again(monkeypatch):
+    signals: list[int] = []
+    monkeypatch.setattr("dembrane.memory_watchdog.get_rss_mb", lambda: 100.0)
+    monkeypatch.setattr("dembrane.memory_watchdog.os.getppid", lambda: 4242)
+    monkeypatch.setattr("dembrane.memory_watchdog._is_dramatiq_process", lambda pid: pid == 4242)
+    monkeypatch.setattr("dembrane.memory_watchdog.os.kill", lambda pid, sig: signals.append(sig))  # noqa: ARG005
+    get_redis_client().delete(_recycle_lock_key(4242))
+
+    worker, sibling = MemoryWatchdogMiddleware(max_tasks=1), MemoryWatchdogMiddleware(max_tasks=1)
+    _process(worker, _message("task_transcribe_chunk"))
+    _process(sibling, _message("task_transcribe_chunk"))
+
+    # a second SIGHUP would make dramatiq kill the workers
+    assert signals == [signal.SIGHUP]
+    assert worker.recycle_requested
+    assert not sibling.recycle_requested
+
+    # dramatiq execs itself under the same pid and boots a new generation of workers
+    next_generation = MemoryWatchdogMiddleware(max_tasks=1)
+    next_generation.after_worker_boot(None, None)
+    next_generation.before_worker_shutdown(None, None)
+    _process(next_generation, _message("task_transcribe_chunk"))
+
+    assert signals == [signal.SIGHUP, signal.SIGHUP]
+    assert next_generation.recycle_requested
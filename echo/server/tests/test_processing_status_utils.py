@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+
+import pytest
+
+from dembrane.directus import DirectusBadRequest, DirectusServerError
+from dembrane.processing_status_utils import (
+    PROCESSING_STATUS_MAX_ATTEMPTS,
+    ProcessingStatusBuffer,
+)
+
+
+class FakeDirectusClient:
+    def __init__(self):
+        self.batches: list[list[dict]] = []
+        self.next_id = 1
+        self.fail = False
+
+    def create_item(self, collection_name: str, item_data: list[dict]) -> dict:
+        assert collection_name == "processing_status"
+        if self.fail:
+            raise DirectusServerError("directus is down")
+        if any(item.get("conversation_chunk_id") == "deleted" for item in item_data):
+            raise DirectusBadRequest("invalid foreign key")
+
+        self.batches.append(item_data)
+        created = []
+        for item in item_data:
+            created.append({**item, "id": self.next_id})
+            self.next_id += 1
+        return {"data": created}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake_client = FakeDirectusClient()
+
+    @contextmanager
+    def fake_directus_client_context():
+        yield fake_client
+
+    monkeypatch.setattr(
+        "dembrane.processing_status_utils.directus_client_context", fake_directus_client_context
+    )
+    return fake_client
+
+
+def test_events_are_written_in_bulk_with_their_parent_ids(client):
+    buffer = ProcessingStatusBuffer(flush_size=1000, flush_interval_seconds=60)
+
+    started = buffer.add({"event": "task.started"})
+    buffer.add({"event": "task.completed"}, parent_key=started)
+    other_started = buffer.add({"event": "other.started"})
+    buffer.flush()
+
+    # parents in the first request, children in the second
+    assert [[item["event"] for item in batch] for batch in client.batches] == [
+        ["task.started", "other.started"],
+        ["task.completed"],
+    ]
+    assert client.batches[1][0]["parent_id"] == 1
+
+    # a child flushed after its parent still points at it
+    buffer.add({"event": "other.completed"}, parent_key=other_started)
+    buffer.flush()
+    assert client.batches[2][0]["parent_id"] == 2
+
+
+def test_events_are_kept_when_directus_is_down(client):
+    buffer = ProcessingStatusBuffer(flush_size=1000, flush_interval_seconds=60)
+    buffer.add({"event": "task.started"})
+
+    client.fail = True
+    with pytest.raises(DirectusServerError):
+        buffer.flush()
+
+    client.fail = False
+    buffer.flush()
+    assert [item["event"] for item in client.batches[0]] == ["task.started"]
+
+
+def test_an_invalid_event_does_not_hold_back_its_batch(client):
+    buffer = ProcessingStatusBuffer(flush_size=1000, flush_interval_seconds=60)
+
+    buffer.add({"event": "task.started"})
+    invalid = buffer.add({"event": "chunk.started", "conversation_chunk_id": "deleted"})
+    buffer.add({"event": "chunk.completed"}, parent_key=invalid)
+    buffer.add({"event": "task.completed"})
+    buffer.flush()
+
+    # the valid events are written, the invalid one and its child wait for a retry
+    assert sorted(item["event"] for batch in client.batches for item in batch) == [
+        "task.completed",
+        "task.started",
+    ]
+
+    # the last attempt drops it, and the child is written without it
+    for _ in range(PROCESSING_STATUS_MAX_ATTEMPTS - 1):
+        buffer.flush()
+    assert client.batches[-1] == [
+        {"event": "chunk.completed", "parent_id": None},
+    ]
+    buffer.flush()
+    assert sum(len(batch) for batch in client.batches) == 3
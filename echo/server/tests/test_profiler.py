@@ -0,0 +1,51 @@
+import time
+import threading
+
+from dembrane.profiler import (
+    SamplingProfiler,
+    get_os_thread_id,
+    parse_profile_actors,
+)
+
+
+def _busy_loop_for_profiler(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_collapses_the_stacks_of_other_threads():
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy_loop_for_profiler, args=(stop,), name="busy")
+    thread.start()
+
+    profiler = SamplingProfiler(interval=0.001).start()
+    time.sleep(0.2)
+    profiler.stop()
+    stop.set()
+    thread.join()
+
+    assert profiler.samples > 0
+    busy_stacks = [line for line in profiler.to_collapsed().splitlines() if "_busy_loop" in line]
+    assert busy_stacks
+    # root frame is the thread name, counts at the end
+    assert all(line.startswith("busy;") for line in busy_stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in busy_stacks)
+
+
+def test_profiler_can_follow_a_single_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy_loop_for_profiler, args=(stop,), name="busy")
+    thread.start()
+
+    profiler = SamplingProfiler(thread_id=get_os_thread_id(), interval=0.001).start()
+    time.sleep(0.1)
+    profiler.stop()
+    stop.set()
+    thread.join()
+
+    assert "_busy_loop" not in profiler.to_collapsed()
+
+
+def test_parse_profile_actors():
+    assert parse_profile_actors("") == {}
+    assert parse_profile_actors("task_a:0.1, task_b") == {"task_a": 0.1, "task_b": 1.0}
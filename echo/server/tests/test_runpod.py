@@ -0,0 +1,165 @@
+import asyncio
+
+import httpx
+import pytest
+
+import dembrane.tasks as tasks
+from dembrane.runpod import RUNPOD_RECONCILE_CONCURRENCY, reconcile_runpod_transcription_jobs
+
+# status link -> (status code, payload); a missing link raises a network error
+RUNPOD_STATUSES = {
+    "completed": (200, {"status": "COMPLETED", "output": {"joined_text": "hello"}}),
+    "failed": (200, {"status": "FAILED", "output": {"error": "bad audio"}}),
+    "pending": (200, {"status": "IN_PROGRESS"}),
+    "gone": (404, {}),
+    "cancelled": (200, {"status": "CANCELLED"}),
+    "overloaded": (503, {}),
+}
+
+
+def _no_wait():
+    while True:
+        yield 0
+
+
+class FakeRunPod:
+    def __init__(self):
+        self.requests: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        link = request.url.path.rsplit("/", 1)[1]
+        self.requests.append(link)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        if link not in RUNPOD_STATUSES:
+            raise httpx.ConnectError("connection refused", request=request)
+        status_code, payload = RUNPOD_STATUSES[link]
+        return httpx.Response(status_code, json=payload)
+
+
+@pytest.fixture
+def runpod(monkeypatch):
+    fake = FakeRunPod()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handle))
+    state: dict = {"updates": {}, "errors": {}, "finished": [], "requeued": [], "cached": []}
+
+    def update_chunks(chunk_updates: dict) -> list[dict]:
+        state["updates"].update(chunk_updates)
+        return []
+
+    def set_error_status(error: str, conversation_chunk_id: str) -> None:
+        state["errors"][conversation_chunk_id] = error
+
+    class RecordingGroup:
+        def __init__(self, messages):
+            self.messages = messages
+
+        def run(self) -> None:
+            state["requeued"].extend(message.args[0] for message in self.messages)
+
+    monkeypatch.setattr("dembrane.runpod.backoff.expo", _no_wait)
+    monkeypatch.setattr("dembrane.runpod.get_async_http_client", lambda: client)
+    monkeypatch.setattr("dembrane.runpod.conversation_service.update_chunks", update_chunks)
+    monkeypatch.setattr("dembrane.runpod.set_error_status", set_error_status)
+    monkeypatch.setattr(
+        "dembrane.runpod._finish_conversation_if_all_chunks_processed", state["finished"].append
+    )
+    monkeypatch.setattr("dembrane.runpod.group", RecordingGroup)
+    monkeypatch.setattr(
+        "dembrane.runpod.cache_pending_transcript",
+        lambda chunk_id, chunk_update: state["cached"].append(chunk_id),  # noqa: ARG005
+    )
+    return fake, state
+
+
+def _chunks(*links: str) -> list[dict]:
+    return [
+        {
+            "id": f"chunk-{link}",
+            "conversation_id": "conversation-1",
+            "runpod_job_status_link": f"http://runpod/status/{link}",
+        }
+        for link in links
+    ]
+
+
+def test_finished_jobs_are_written_back_and_gone_jobs_requeued(runpod):
+    _, state = runpod
+
+    result = asyncio.run(
+        reconcile_runpod_transcription_jobs(
+            _chunks("completed", "failed", "pending", "gone", "cancelled")
+        )
+    )
+
+    assert result == {
+        "completed": 1,
+        "failed": 1,
+        "pending": 1,
+        "requeued": 2,
+        "unavailable": 0,
+    }
+    assert state["updates"]["chunk-completed"]["transcript"] == "hello"
+    assert state["updates"]["chunk-failed"] == {"runpod_job_status_link": None}
+    assert state["errors"] == {"chunk-failed": "RunPod job failed: bad audio"}
+    assert state["finished"] == ["conversation-1"]
+    assert state["requeued"] == ["chunk-gone", "chunk-cancelled"]
+    # recovered results are cached like webhook results
+    assert state["cached"] == ["chunk-completed"]
+
+
+def test_unavailable_statuses_are_retried_and_never_requeued(runpod):
+    fake, state = runpod
+
+    result = asyncio.run(reconcile_runpod_transcription_jobs(_chunks("overloaded", "unreachable")))
+
+    assert result["unavailable"] == 2
+    assert fake.requests.count("overloaded") == 3
+    assert fake.requests.count("unreachable") == 3
+    assert state["updates"] == {}
+    assert state["requeued"] == []
+
+
+def test_statuses_are_fetched_concurrently(runpod):
+    fake, _ = runpod
+
+    chunks = [{**chunk, "id": f"chunk-{i}"} for i, chunk in enumerate(_chunks(*["pending"] * 50))]
+    asyncio.run(reconcile_runpod_transcription_jobs(chunks))
+
+    assert len(fake.requests) == 50
+    assert fake.max_in_flight == RUNPOD_RECONCILE_CONCURRENCY
+
+
+@pytest.mark.parametrize("page_size, next_pages", [(2, [("chunk-b",)]), (3, [])])
+def test_a_full_page_enqueues_the_next_one(monkeypatch, page_size, next_pages):
+    queries: list[dict] = []
+    reconciled: list[list[dict]] = []
+    sent: list[tuple] = []
+
+    def get_items(collection: str, query: dict) -> list[dict]:  # noqa: ARG001
+        queries.append(query["query"])
+        return [{"id": "chunk-a"}, {"id": "chunk-b"}]
+
+    async def reconcile(chunks: list[dict]) -> None:
+        reconciled.append(chunks)
+
+    monkeypatch.setattr(tasks, "RUNPOD_RECONCILE_PAGE_SIZE", page_size)
+    monkeypatch.setattr("dembrane.tasks.directus.get_items", get_items)
+    monkeypatch.setattr("dembrane.runpod.reconcile_runpod_transcription_jobs", reconcile)
+    monkeypatch.setattr(
+        tasks.task_update_runpod_transcription_response, "send", lambda *args: sent.append(args)
+    )
+
+    # the coroutine itself, .fn runs it on the AsyncIO middleware's loop
+    asyncio.run(tasks.task_update_runpod_transcription_response.fn.__wrapped__("chunk-0"))
+
+    assert queries[0]["filter"]["id"] == {"_gt": "chunk-0"}
+    assert queries[0]["limit"] == page_size
+    assert len(reconciled) == 1
+    assert sent == next_pages
@@ -0,0 +1,91 @@
+"""
+Startup budget of the worker and API processes.
+
+Each entrypoint is imported in a fresh interpreter with `python -X importtime`.
+The test fails when the import takes longer or the process uses more memory than
+its budget, or when a heavy dependency that should only be loaded on first use is
+imported at startup.
+
+Budgets have headroom over what a laptop measures; scale them on slow machines
+with STARTUP_BUDGET_SCALE (e.g. STARTUP_BUDGET_SCALE=2).
+"""
+
+import os
+import sys
+import json
+import logging
+import subprocess
+
+import pytest
+
+logger = logging.getLogger("test_startup")
+
+STARTUP_BUDGET_SCALE = float(os.environ.get("STARTUP_BUDGET_SCALE", "1"))
+
+# module -> (max import seconds, max RSS in MB after the import)
+STARTUP_BUDGETS = {
+    "dembrane.tasks": (3.0, 250),
+    "dembrane.main": (12.0, 600),
+}
+
+# loaded on first use only, see dembrane.ner, dembrane.quote_utils, dembrane.transcribe
+WORKER_LAZY_MODULES = [
+    "trankit",
+    "sklearn",
+    "pandas",
+    "tiktoken",
+    "lightrag",
+    "anthropic",
+    "litellm",
+]
+
+_PROBE = """
+import sys, json, resource
+import {module}
+print(json.dumps({{
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def _measure_import(module: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # "import time: self [us] | cumulative | imported package", nesting is indented
+    import_time_us = next(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[2] == f" {module}"
+    )
+
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    measurement["import_seconds"] = import_time_us / 1_000_000
+    measurement["max_rss_mb"] = measurement["max_rss_kb"] / 1024
+    return measurement
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("module", list(STARTUP_BUDGETS))
+def test_startup_within_budget(module: str):
+    max_seconds, max_rss_mb = STARTUP_BUDGETS[module]
+    measurement = _measure_import(module)
+
+    logger.info(
+        f"{module}: {measurement['import_seconds']:.2f}s, {measurement['max_rss_mb']:.0f}MB RSS"
+    )
+
+    assert measurement["import_seconds"] <= max_seconds * STARTUP_BUDGET_SCALE
+    assert measurement["max_rss_mb"] <= max_rss_mb * STARTUP_BUDGET_SCALE
+
+
+@pytest.mark.slow
+def test_workers_do_not_load_heavy_dependencies_at_startup():
+    modules = set(_measure_import("dembrane.tasks")["modules"])
+
+    assert [module for module in WORKER_LAZY_MODULES if module in modules] == []
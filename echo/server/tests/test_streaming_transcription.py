@@ -0,0 +1,152 @@
+import time
+import wave
+import asyncio
+
+import pytest
+from fastapi import FastAPI, WebSocketDisconnect
+from fastapi.testclient import TestClient
+
+from dembrane.redis_utils import get_redis_client
+from dembrane.api.participant import ParticipantRouter
+from dembrane.transcription_context import TranscriptionContext
+from dembrane.streaming_transcription import (
+    STREAM_BYTES_PER_MS,
+    LOCAL_STREAM_SEGMENT_MS,
+    LIVE_TRANSCRIPT_CHANNEL_PREFIX,
+    TranscriptEvent,
+    LocalStreamingSession,
+    StreamingTranscription,
+    pcm_to_wav,
+    publish_transcript_event,
+)
+
+
+def _audio(ms: int) -> bytes:
+    return b"\x01\x00" * (ms * STREAM_BYTES_PER_MS // 2)
+
+
+def test_the_local_session_sends_partials_then_finals():
+    async def run() -> list:
+        session = LocalStreamingSession()
+        for _ in range(LOCAL_STREAM_SEGMENT_MS // 1000 + 1):
+            await session.send_audio(_audio(1000))
+        await session.close()
+        return [event async for event in session.events()]
+
+    events = asyncio.run(run())
+
+    assert [event.type for event in events] == ["partial"] * 4 + ["final", "partial", "final"]
+    assert (events[4].start_ms, events[4].end_ms) == (0, LOCAL_STREAM_SEGMENT_MS)
+    assert (events[-1].start_ms, events[-1].end_ms) == (5000, 6000)
+
+
+def test_finals_are_saved_with_the_audio_since_the_previous_final():
+    saved = []
+
+    def save_final(conversation_id, started_at, event, pcm):  # noqa: ARG001
+        saved.append((event.text, len(pcm) // STREAM_BYTES_PER_MS))
+        return {"id": f"chunk-{len(saved)}"}
+
+    async def run() -> list:
+        transcription = StreamingTranscription(
+            "conversation-1", LocalStreamingSession(lambda _: "hello"), save_final
+        )
+        received = []
+
+        async def on_event(event):
+            received.append(event)
+
+        events = asyncio.create_task(transcription.handle_events(on_event))
+        for _ in range(7):
+            await transcription.send_audio(_audio(1000))
+        await transcription.session.close()
+        await events
+        return received
+
+    received = asyncio.run(run())
+
+    assert saved == [("hello", 5000), ("hello", 2000)]
+    assert [event.chunk_id for event in received if event.type == "final"] == [
+        "chunk-1",
+        "chunk-2",
+    ]
+
+
+def test_pcm_is_wrapped_as_16khz_mono_wav(tmp_path):
+    path = tmp_path / "stream.wav"
+    path.write_bytes(pcm_to_wav(_audio(500)))
+
+    with wave.open(str(path)) as wav_file:
+        assert wav_file.getframerate() == 16000
+        assert wav_file.getnchannels() == 1
+        assert wav_file.getnframes() == 8000
+
+
+def test_the_stream_endpoint_returns_partials_and_finals(monkeypatch):
+    saved = []
+    session_hotwords = []
+
+    def save_final(conversation_id, started_at, event, pcm):  # noqa: ARG001
+        saved.append((conversation_id, event.text))
+        return {"id": "chunk-1"}
+
+    async def open_session(hotwords=None):
+        session_hotwords.append(hotwords)
+        return LocalStreamingSession(lambda pcm: f"{len(pcm) // STREAM_BYTES_PER_MS}")
+
+    monkeypatch.setattr("dembrane.api.participant.ENABLE_STREAMING_TRANSCRIPTION", True)
+    monkeypatch.setattr("dembrane.api.participant._is_open_for_participation", lambda _: True)
+    monkeypatch.setattr(
+        "dembrane.transcribe._get_transcription_context",
+        lambda conversation_id: TranscriptionContext(
+            conversation_id=conversation_id,
+            project_id="project-1",
+            language="nl",
+            provider="AssemblyAI",
+            hotwords=["Dembrane"],
+        ),
+    )
+    monkeypatch.setattr("dembrane.streaming_transcription.open_streaming_session", open_session)
+    monkeypatch.setattr("dembrane.streaming_transcription.save_final_transcript", save_final)
+
+    app = FastAPI()
+    app.include_router(ParticipantRouter)
+    with TestClient(app).websocket_connect("/conversations/conversation-1/stream") as websocket:
+        websocket.send_bytes(_audio(1000))
+        assert websocket.receive_json()["type"] == "partial"
+        websocket.send_bytes(_audio(1000))
+        assert websocket.receive_json()["text"] == "2000"
+        websocket.send_text("stop")
+        final = websocket.receive_json()
+
+    assert final["type"] == "final"
+    assert final["chunk_id"] == "chunk-1"
+    assert saved == [("conversation-1", "2000")]
+    assert session_hotwords == [["Dembrane"]]
+
+
+def test_followers_get_the_published_events_of_open_conversations(monkeypatch):
+    open_conversations = {"conversation-1"}
+    monkeypatch.setattr("dembrane.api.participant.ENABLE_STREAMING_TRANSCRIPTION", True)
+    monkeypatch.setattr(
+        "dembrane.api.participant._is_open_for_participation", open_conversations.__contains__
+    )
+
+    app = FastAPI()
+    app.include_router(ParticipantRouter)
+    client = TestClient(app)
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/conversations/conversation-2/transcript") as websocket:
+            websocket.receive_json()
+
+    channel = LIVE_TRANSCRIPT_CHANNEL_PREFIX + "conversation-1"
+    with client.websocket_connect("/conversations/conversation-1/transcript") as websocket:
+        deadline = time.monotonic() + 5
+        while not get_redis_client().pubsub_numsub(channel)[0][1]:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        event = TranscriptEvent(type="final", text="hallo", start_ms=0, end_ms=1000)
+        asyncio.run(publish_transcript_event("conversation-1", event))
+        assert websocket.receive_json() == event.model_dump()
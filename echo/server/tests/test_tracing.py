@@ -0,0 +1,100 @@
+import pytest
+import dramatiq
+
+from dembrane.tracing import (
+    TRACE_CONTEXT_OPTION,
+    SpanContext,
+    TracingMiddleware,
+    span,
+    to_otlp_json,
+    pop_chunk_trace,
+    remember_chunk_trace,
+    get_current_traceparent,
+)
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    spans = []
+    monkeypatch.setattr("dembrane.tracing.OTEL_EXPORTER_OTLP_ENDPOINT", "http://collector:4318")
+    monkeypatch.setattr("dembrane.tracing._exporter.add", spans.append)
+    return spans
+
+
+def _message(**options) -> dramatiq.Message:
+    return dramatiq.Message(
+        queue_name="network",
+        actor_name="task_transcribe_chunk",
+        args=("chunk-1", "conversation-1"),
+        kwargs={},
+        options=options,
+    )
+
+
+def test_spans_are_noops_without_a_collector(monkeypatch):
+    monkeypatch.setattr("dembrane.tracing.OTEL_EXPORTER_OTLP_ENDPOINT", None)
+
+    with span("upload_conversation_chunk") as upload_span:
+        assert upload_span is None
+        assert get_current_traceparent() is None
+
+
+def test_nested_spans_share_the_trace(exported):
+    with span("upload_conversation_chunk") as upload_span:
+        with span("split_audio_chunk") as split_span:
+            pass
+        assert get_current_traceparent() == upload_span.context.to_traceparent()
+
+    assert get_current_traceparent() is None
+    assert [s.name for s in exported] == ["split_audio_chunk", "upload_conversation_chunk"]
+    assert split_span.context.trace_id == upload_span.context.trace_id
+    assert split_span.parent_span_id == upload_span.context.span_id
+
+
+def test_failed_spans_record_the_error(exported):
+    with pytest.raises(ValueError):
+        with span("transcribe.assemblyai"):
+            raise ValueError("boom")
+
+    body = to_otlp_json(exported, "dembrane-worker")
+    otlp_span = body["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert otlp_span["status"] == {"code": 2, "message": "ValueError: boom"}
+    assert len(otlp_span["traceId"]) == 32
+
+
+def test_trace_is_carried_through_messages(exported):
+    middleware = TracingMiddleware()
+    broker = dramatiq.get_broker()
+    message = _message()
+
+    with span("upload_conversation_chunk") as upload_span:
+        middleware.before_enqueue(broker, message, delay=None)
+
+    assert message.options[TRACE_CONTEXT_OPTION] == upload_span.context.to_traceparent()
+
+    middleware.before_process_message(broker, message)
+    assert get_current_traceparent().split("-")[1] == upload_span.context.trace_id
+    middleware.after_process_message(broker, message)
+    assert get_current_traceparent() is None
+
+    queue_span, actor_span = exported[-2:]
+    assert queue_span.name == "queue network"
+    assert actor_span.name == "task_transcribe_chunk"
+    assert actor_span.parent_span_id == upload_span.context.span_id
+
+
+@pytest.mark.usefixtures("exported")
+def test_chunk_trace_survives_the_webhook():
+    with span("runpod.queue") as queue_span:
+        remember_chunk_trace("chunk-1")
+
+    context, _ = pop_chunk_trace("chunk-1")
+    assert context.trace_id == queue_span.context.trace_id
+    assert pop_chunk_trace("chunk-1") is None
+
+
+def test_invalid_traceparents_are_ignored():
+    assert SpanContext.from_traceparent("garbage") is None
+    assert SpanContext.from_traceparent(None) is None
+    context = SpanContext.from_traceparent("00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+    assert context.sampled
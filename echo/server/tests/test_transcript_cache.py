@@ -0,0 +1,63 @@
+import pytest
+
+from dembrane.redis_utils import get_redis_client
+from dembrane.transcript_cache import (
+    cache_transcript,
+    get_cached_transcript,
+    cache_pending_transcript,
+    get_transcript_cache_key,
+    get_transcript_cache_stats,
+    remember_pending_transcript,
+)
+
+
+@pytest.fixture(autouse=True)
+def etags(monkeypatch):
+    etags = {"chunk-a.mp3": "etag-a", "chunk-b.mp3": "etag-b", "copy-of-a.mp3": "etag-a"}
+    monkeypatch.setattr("dembrane.transcript_cache.get_etag_from_s3", etags.__getitem__)
+    return etags
+
+
+def _key(path: str = "chunk-a.mp3", hotwords=None, language: str = "en") -> str:
+    return get_transcript_cache_key(path, "AssemblyAI", "universal", language, hotwords)
+
+
+def test_key_depends_on_audio_content_and_settings():
+    assert _key() == _key("copy-of-a.mp3")
+    assert _key() != _key("chunk-b.mp3")
+    assert _key() != _key(language="nl")
+    assert _key(hotwords=["Dembrane"]) != _key(hotwords=["Echo"])
+    assert _key("missing.mp3") is None
+
+
+def test_hits_are_counted_with_the_saved_provider_time():
+    chunk_update = {"transcript": "hello", "diarization": {"schema": "ASSEMBLYAI", "data": []}}
+
+    assert get_cached_transcript(_key(), "AssemblyAI") is None
+    cache_transcript(_key(), chunk_update, provider_seconds=12.5)
+    assert get_cached_transcript(_key("copy-of-a.mp3"), "AssemblyAI") == chunk_update
+
+    stats = get_transcript_cache_stats("AssemblyAI")
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["saved_provider_seconds"] == 12.5
+
+
+def test_webhook_results_are_cached_under_the_queued_key():
+    key = get_transcript_cache_key("chunk-b.mp3", "Runpod", None, "nl", ["Dembrane"])
+    remember_pending_transcript("chunk-1", key)
+
+    cache_pending_transcript("chunk-1", {"transcript": "hallo", "raw_transcript": None})
+
+    assert get_cached_transcript(key, "Runpod") == {"transcript": "hallo", "raw_transcript": None}
+    # applied once: a redelivered webhook does not overwrite it
+    cache_pending_transcript("chunk-1", {"transcript": "other"})
+    assert get_cached_transcript(key, "Runpod")["transcript"] == "hallo"
+
+
+def test_corrupt_entries_are_misses():
+    get_redis_client().set(_key(), b"not zlib")
+
+    assert get_cached_transcript(_key(), "AssemblyAI") is None
+    assert get_transcript_cache_stats("AssemblyAI")["misses"] == 1
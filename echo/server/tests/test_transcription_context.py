@@ -0,0 +1,92 @@
+import pytest
+
+from dembrane.transcription_context import (
+    TranscriptionContext,
+    get_transcription_context,
+    invalidate_transcription_context,
+    invalidate_project_transcription_context,
+)
+
+
+@pytest.fixture
+def loader():
+    loads: list[str] = []
+    hotwords = ["Dembrane"]
+
+    def load(conversation_id: str):
+        def _load() -> TranscriptionContext:
+            loads.append(conversation_id)
+            return TranscriptionContext(
+                conversation_id=conversation_id,
+                project_id="project-1",
+                language="nl",
+                provider="AssemblyAI",
+                hotwords=list(hotwords),
+            )
+
+        return _load
+
+    return load, loads, hotwords
+
+
+def test_the_context_is_loaded_once_per_conversation(loader):
+    load, loads, _ = loader
+
+    for _ in range(3):
+        context = get_transcription_context("conversation-1", load("conversation-1"))
+    get_transcription_context("conversation-2", load("conversation-2"))
+
+    assert loads == ["conversation-1", "conversation-2"]
+    assert context.language == "nl"
+    assert context.hotwords == ["Dembrane"]
+
+
+def test_a_project_change_reloads_the_contexts_of_its_conversations(loader):
+    load, loads, hotwords = loader
+    get_transcription_context("conversation-1", load("conversation-1"))
+    get_transcription_context("conversation-2", load("conversation-2"))
+
+    hotwords.append("ECHO")
+    invalidate_project_transcription_context("project-1")
+
+    assert get_transcription_context("conversation-1", load("conversation-1")).hotwords == [
+        "Dembrane",
+        "ECHO",
+    ]
+    get_transcription_context("conversation-2", load("conversation-2"))
+    get_transcription_context("conversation-2", load("conversation-2"))
+    assert loads == ["conversation-1", "conversation-2", "conversation-1", "conversation-2"]
+
+
+def test_a_conversation_can_be_invalidated_alone(loader):
+    load, loads, _ = loader
+    get_transcription_context("conversation-1", load("conversation-1"))
+    get_transcription_context("conversation-2", load("conversation-2"))
+
+    invalidate_transcription_context("conversation-1")
+    get_transcription_context("conversation-1", load("conversation-1"))
+    get_transcription_context("conversation-2", load("conversation-2"))
+
+    assert loads == ["conversation-1", "conversation-2", "conversation-1"]
+
+
+def test_a_change_while_loading_is_not_cached_as_current(loader):
+    load, loads, hotwords = loader
+
+    def load_during_an_edit() -> TranscriptionContext:
+        context = load("conversation-1")()
+        # the project is edited after Directus answered, before the context is stored
+        hotwords.append("ECHO")
+        invalidate_project_transcription_context("project-1")
+        return context
+
+    assert get_transcription_context("conversation-1", load_during_an_edit).hotwords == ["Dembrane"]
+    assert get_transcription_context("conversation-1", load("conversation-1")).hotwords == [
+        "Dembrane",
+        "ECHO",
+    ]
+    assert get_transcription_context("conversation-1", load("conversation-1")).hotwords == [
+        "Dembrane",
+        "ECHO",
+    ]
+    assert loads == ["conversation-1", "conversation-1"]
@@ -0,0 +1,124 @@
+import time
+import threading
+
+import pytest
+
+from dembrane.metrics import get_counter
+from dembrane.transcribe import transcribe_audio_assemblyai
+from tests.benchmark.stand_ins import FakeTranscriptionProvider
+from dembrane.transcription_router import (
+    TranscriptionCancelled,
+    get_provider_order,
+    route_transcription,
+    record_provider_outcome,
+)
+
+
+@pytest.fixture(autouse=True)
+def router(monkeypatch):
+    monkeypatch.setattr(
+        "dembrane.transcription_router.TRANSCRIPTION_FALLBACK_PROVIDERS", ["LiteLLM"]
+    )
+    monkeypatch.setattr("dembrane.transcription_router.TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR", 10)
+    monkeypatch.setattr("dembrane.transcription_router.is_provider_configured", lambda _: True)
+    monkeypatch.setattr("dembrane.transcription_router.get_hedge_delay_seconds", lambda _: 0.1)
+
+
+def _fake_providers(delays: dict, errors: tuple = ()):
+    cancelled = []
+
+    def transcribe(provider: str, cancel_event: threading.Event):
+        if provider in errors:
+            raise RuntimeError(f"{provider} is down")
+        if cancel_event.wait(delays[provider]):
+            cancelled.append(provider)
+            raise TranscriptionCancelled(provider)
+        return f"transcript from {provider}", {"schema": provider, "data": []}
+
+    return transcribe, cancelled
+
+
+def test_fast_primary_is_not_hedged():
+    transcribe, _ = _fake_providers({"AssemblyAI": 0.0, "LiteLLM": 0.0})
+
+    routed = route_transcription("AssemblyAI", transcribe)
+
+    assert routed.provider == "AssemblyAI"
+    assert routed.attempted == ["AssemblyAI"]
+    assert not routed.hedged
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    transcribe, cancelled = _fake_providers({"AssemblyAI": 5.0, "LiteLLM": 0.0})
+
+    started_at = time.monotonic()
+    routed = route_transcription("AssemblyAI", transcribe)
+
+    assert time.monotonic() - started_at < 1.0
+    assert routed.provider == "LiteLLM"
+    assert routed.transcript == "transcript from LiteLLM"
+    assert routed.to_dict() == {
+        "provider": "LiteLLM",
+        "attempted": ["AssemblyAI", "LiteLLM"],
+        "hedged": True,
+    }
+
+    # the losing request stops at its next check of the cancel event
+    deadline = time.monotonic() + 1.0
+    while not cancelled and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cancelled == ["AssemblyAI"]
+
+
+def test_errors_fail_over_without_using_the_hedge_budget(monkeypatch):
+    monkeypatch.setattr("dembrane.transcription_router.TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR", 0)
+    transcribe, _ = _fake_providers({"AssemblyAI": 0.0, "LiteLLM": 0.0}, errors=("AssemblyAI",))
+
+    routed = route_transcription("AssemblyAI", transcribe)
+
+    assert routed.provider == "LiteLLM"
+    assert not routed.hedged
+    assert get_counter("transcription.failover", tags={"provider": "LiteLLM"}) == 1
+
+
+def test_no_hedge_once_the_budget_is_used_up(monkeypatch):
+    monkeypatch.setattr("dembrane.transcription_router.TRANSCRIPTION_HEDGE_BUDGET_PER_HOUR", 1)
+    transcribe, _ = _fake_providers({"AssemblyAI": 0.3, "LiteLLM": 0.0})
+
+    assert route_transcription("AssemblyAI", transcribe).hedged
+    routed = route_transcription("AssemblyAI", transcribe)
+
+    assert routed.provider == "AssemblyAI"
+    assert not routed.hedged
+
+
+def test_all_providers_failing_raises_the_last_error():
+    transcribe, _ = _fake_providers({}, errors=("AssemblyAI", "LiteLLM"))
+
+    with pytest.raises(RuntimeError, match="LiteLLM is down"):
+        route_transcription("AssemblyAI", transcribe)
+
+
+def test_unhealthy_primary_goes_last():
+    for _ in range(5):
+        record_provider_outcome("AssemblyAI", 1.0, ok=False)
+
+    assert get_provider_order("AssemblyAI") == ["LiteLLM", "AssemblyAI"]
+    assert get_provider_order("LiteLLM") == ["LiteLLM"]
+
+
+def test_assemblyai_polling_stops_once_cancelled(monkeypatch):
+    with FakeTranscriptionProvider(latency_ms=60_000) as provider:
+        monkeypatch.setattr("dembrane.transcribe.ASSEMBLYAI_BASE_URL", provider.url)
+        cancel_event = threading.Event()
+        threading.Timer(0.2, cancel_event.set).start()
+
+        started_at = time.monotonic()
+        with pytest.raises(TranscriptionCancelled):
+            transcribe_audio_assemblyai("http://audio", "en", None, cancel_event=cancel_event)
+        assert time.monotonic() - started_at < 1.0
+
+        # cancelled before it was sent: not submitted at all
+        with pytest.raises(TranscriptionCancelled):
+            transcribe_audio_assemblyai("http://audio", "en", None, cancel_event=cancel_event)
+        assert provider.submitted == 1
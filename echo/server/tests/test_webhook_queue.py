@@ -0,0 +1,102 @@
+import pytest
+
+from dembrane.redis_utils import get_redis_client
+from dembrane.webhook_queue import (
+    RUNPOD_WEBHOOK_STREAM_KEY,
+    RUNPOD_WEBHOOK_MAX_DELIVERIES,
+    enqueue_runpod_webhook,
+    consume_runpod_webhooks,
+    validate_runpod_webhook_payload,
+)
+
+
+@pytest.fixture
+def scheduled_retries(monkeypatch):
+    retries: list[tuple[list[str], int]] = []
+    monkeypatch.setattr(
+        "dembrane.webhook_queue.schedule_runpod_webhook_retry",
+        lambda entry_ids, attempt: retries.append((entry_ids, attempt)),
+    )
+    return retries
+
+
+@pytest.fixture
+def applied_batches(monkeypatch, scheduled_retries):  # noqa: ARG001
+    batches: list[list[dict]] = []
+    monkeypatch.setattr("dembrane.webhook_queue.schedule_runpod_webhook_consumer", lambda: None)
+    monkeypatch.setattr("dembrane.runpod.apply_runpod_transcription_responses", batches.append)
+    get_redis_client().delete(RUNPOD_WEBHOOK_STREAM_KEY)
+    return batches
+
+
+def _payload(chunk_id: str) -> dict:
+    return {
+        "status": "COMPLETED",
+        "output": {"conversation_chunk_id": chunk_id, "joined_text": "hello"},
+    }
+
+
+def test_invalid_payloads_are_rejected():
+    with pytest.raises(ValueError):
+        validate_runpod_webhook_payload(["not", "a", "dict"])
+
+    with pytest.raises(ValueError):
+        validate_runpod_webhook_payload({"status": "COMPLETED"})
+
+
+def test_webhooks_are_applied_in_one_batch_and_removed(applied_batches):
+    for i in range(3):
+        enqueue_runpod_webhook(_payload(f"chunk-{i}"))
+
+    assert consume_runpod_webhooks() == 3
+
+    assert len(applied_batches) == 1
+    assert [p["output"]["conversation_chunk_id"] for p in applied_batches[0]] == [
+        "chunk-0",
+        "chunk-1",
+        "chunk-2",
+    ]
+    assert get_redis_client().xlen(RUNPOD_WEBHOOK_STREAM_KEY) == 0
+    assert consume_runpod_webhooks() == 0
+
+
+def test_failed_batches_stay_in_the_stream_and_are_retried(
+    applied_batches, scheduled_retries, monkeypatch
+):
+    def fail(payloads: list[dict]) -> None:  # noqa: ARG001
+        raise RuntimeError("Directus is down")
+
+    monkeypatch.setattr("dembrane.runpod.apply_runpod_transcription_responses", fail)
+    entry_id = enqueue_runpod_webhook(_payload("chunk-0"))
+
+    assert consume_runpod_webhooks() == 0
+    assert scheduled_retries == [([entry_id], 1)]
+    assert get_redis_client().xlen(RUNPOD_WEBHOOK_STREAM_KEY) == 1
+    assert applied_batches == []
+
+    # the retry fails again and backs off further
+    assert consume_runpod_webhooks([entry_id], 1) == 0
+    assert scheduled_retries[-1] == ([entry_id], 2)
+
+    monkeypatch.setattr(
+        "dembrane.runpod.apply_runpod_transcription_responses", applied_batches.append
+    )
+    assert consume_runpod_webhooks([entry_id], 2) == 1
+    assert [p["output"]["conversation_chunk_id"] for p in applied_batches[0]] == ["chunk-0"]
+    assert get_redis_client().xlen(RUNPOD_WEBHOOK_STREAM_KEY) == 0
+
+    # a retry of entries applied in the meantime is a no-op
+    assert consume_runpod_webhooks([entry_id], 2) == 0
+    assert len(applied_batches) == 1
+
+
+def test_retries_stop_after_the_maximum_deliveries(applied_batches, scheduled_retries, monkeypatch):  # noqa: ARG001
+    def fail(payloads: list[dict]) -> None:  # noqa: ARG001
+        raise RuntimeError("Directus is down")
+
+    monkeypatch.setattr("dembrane.runpod.apply_runpod_transcription_responses", fail)
+    entry_id = enqueue_runpod_webhook(_payload("chunk-0"))
+
+    assert consume_runpod_webhooks([entry_id], RUNPOD_WEBHOOK_MAX_DELIVERIES - 1) == 0
+    assert scheduled_retries == []
+    assert get_redis_client().xlen(RUNPOD_WEBHOOK_STREAM_KEY) == 1